@@ -0,0 +1,254 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from flexus_client_kit import ckit_utils
+
+logger = logging.getLogger("blkng")
+
+
+# Blocking SDKs (googleapiclient, google-ads grpc) run here, never on the event loop and never in the default
+# executor, which is shared with fi_localfile grep/find, fi_report rendering and anything else calling to_thread.
+#
+#   doc = await ckit_blocking.run("google_docs", req.execute)
+#
+# Every integration gets its own bounded pool, so one slow SDK can only queue up behind itself. If the awaiting
+# task is cancelled (tool call aborted), a call still in the queue never starts; a call already running can't be
+# interrupted, but cancel_requested() lets long loops inside fn (pagination) stop early.
+#
+# The guard: the first pool created installs a wrapper around googleapiclient's HttpRequest.execute, a sync call
+# made from the event loop thread is logged (FLEXUS_BLOCKING_GUARD=raise turns it into an error, handy in tests).
+
+
+T = TypeVar("T")
+
+DEFAULT_MAX_WORKERS = 4
+POOL_SIZES = {
+    "google_ads": 4,
+    "google_analytics": 4,
+    "google_docs": 4,
+}
+
+
+class SyncCallOnEventLoop(RuntimeError):
+    pass
+
+
+@dataclass
+class PoolMetrics:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    cancelled_queued: int = 0      # never started
+    cancelled_running: int = 0     # caller gave up, thread finished the call anyway
+    queued: int = 0
+    running: int = 0
+    max_queue_depth: int = 0
+    queue_wait_total_s: float = 0.0
+    queue_wait_max_s: float = 0.0
+    run_total_s: float = 0.0
+    run_max_s: float = 0.0
+
+
+_cancel_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("blocking_cancel_event", default=None)
+
+
+def cancel_requested() -> bool:
+    ev = _cancel_event.get()
+    return ev is not None and ev.is_set()
+
+
+class BlockingPool:
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.metrics = PoolMetrics()
+        self._lock = threading.Lock()   # metrics are touched from worker threads too
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"sdk-{name}")
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        cancel_ev = threading.Event()
+        m = self.metrics
+        t_submit = time.monotonic()
+
+        def work():
+            if cancel_ev.is_set():
+                with self._lock:
+                    m.queued -= 1
+                raise concurrent.futures.CancelledError()
+            t_start = time.monotonic()
+            wait = t_start - t_submit
+            with self._lock:
+                m.queued -= 1
+                m.running += 1
+                m.queue_wait_total_s += wait
+                m.queue_wait_max_s = max(m.queue_wait_max_s, wait)
+            _cancel_event.set(cancel_ev)
+            ok = False
+            try:
+                r = fn(*args, **kwargs)
+                ok = True
+                return r
+            finally:
+                took = time.monotonic() - t_start
+                with self._lock:
+                    m.running -= 1
+                    m.run_total_s += took
+                    m.run_max_s = max(m.run_max_s, took)
+                    if ok:
+                        m.completed += 1
+                    elif not cancel_ev.is_set():
+                        m.failed += 1
+
+        ctx = contextvars.copy_context()
+        with self._lock:
+            m.submitted += 1
+            m.queued += 1
+            m.max_queue_depth = max(m.max_queue_depth, m.queued)
+        cfut = self._executor.submit(ctx.run, work)
+        try:
+            return await asyncio.wrap_future(cfut, loop=loop)
+        except asyncio.CancelledError:
+            cancel_ev.set()
+            # wrap_future already tried cfut.cancel(), that only works while the call is still queued
+            with self._lock:
+                if cfut.cancelled():
+                    m.queued -= 1
+                    m.cancelled_queued += 1
+                else:
+                    m.cancelled_running += 1
+            raise
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pools: Dict[str, BlockingPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str) -> BlockingPool:
+    p = _pools.get(name)
+    if p is None:
+        with _pools_lock:
+            p = _pools.get(name)
+            if p is None:
+                install_loop_guard()
+                p = _pools[name] = BlockingPool(name, POOL_SIZES.get(name, DEFAULT_MAX_WORKERS))
+    return p
+
+
+async def run(pool_name: str, fn: Callable[..., T], *args, **kwargs) -> T:
+    return await get_pool(pool_name).run(fn, *args, **kwargs)
+
+
+def metrics_snapshot() -> Dict[str, dict]:
+    return {name: asdict(p.metrics) for name, p in _pools.items()}
+
+
+def shutdown_all() -> None:
+    with _pools_lock:
+        for p in _pools.values():
+            p.shutdown()
+        _pools.clear()
+
+
+def on_event_loop_thread() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def check_off_loop(what: str) -> None:
+    if not on_event_loop_thread():
+        return
+    if os.getenv("FLEXUS_BLOCKING_GUARD", "") == "raise":
+        raise SyncCallOnEventLoop(f"{what} called on the event loop thread, use ckit_blocking.run()")
+    ckit_utils.log_with_throttle(logger.warning, f"{what} called on the event loop thread, this blocks every persona in the process; use ckit_blocking.run()", interval_seconds=60)
+
+
+_guard_installed = False
+
+
+def install_loop_guard() -> None:
+    global _guard_installed
+    if _guard_installed:
+        return
+    # Only patch what the process already imported, importing googleapiclient here would itself stall the loop
+    googleapiclient_http = sys.modules.get("googleapiclient.http")
+    if googleapiclient_http is None:
+        return
+    _guard_installed = True
+    orig_execute = googleapiclient_http.HttpRequest.execute
+
+    @functools.wraps(orig_execute)
+    def guarded_execute(self, *args, **kwargs):
+        check_off_loop("googleapiclient %s %s" % (self.method, self.uri.split("?")[0]))
+        return orig_execute(self, *args, **kwargs)
+
+    googleapiclient_http.HttpRequest.execute = guarded_execute
+
+
+if __name__ == "__main__":
+    def slow_sdk_call(seconds: float) -> float:
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < seconds:
+            if cancel_requested():
+                return -1.0
+            time.sleep(0.01)
+        return seconds
+
+    async def stall_meter(stop: asyncio.Event, out: dict) -> None:
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(0.005)
+            out["max"] = max(out["max"], time.perf_counter() - t0 - 0.005)
+
+    async def main():
+        stop, stall = asyncio.Event(), {"max": 0.0}
+        meter = asyncio.create_task(stall_meter(stop, stall))
+
+        t0 = time.monotonic()
+        r = await asyncio.gather(*[run("google_docs", slow_sdk_call, 0.2) for _ in range(8)])
+        print(f"8 x 0.2s calls in a 4-thread pool: {time.monotonic() - t0:.2f}s, worst loop stall {stall['max']*1000:.1f}ms")
+        assert r == [0.2] * 8
+
+        # a busy pool doesn't slow down another integration's pool
+        busy = [asyncio.create_task(run("google_ads", slow_sdk_call, 1.0)) for _ in range(8)]
+        await asyncio.sleep(0.05)
+        t0 = time.monotonic()
+        await run("google_analytics", slow_sdk_call, 0.05)
+        print(f"analytics call while ads pool is saturated: {time.monotonic() - t0:.2f}s")
+
+        # tool call aborted: queued ones never start, running ones see cancel_requested()
+        for t in busy:
+            t.cancel()
+        await asyncio.gather(*busy, return_exceptions=True)
+        await asyncio.sleep(0.1)
+        stop.set()
+        await meter
+        for name, m in metrics_snapshot().items():
+            print(name, m)
+        ads = metrics_snapshot()["google_ads"]
+        assert ads["cancelled_queued"] == 4 and ads["cancelled_running"] == 4 and ads["running"] == 0 and ads["queued"] == 0
+
+        try:
+            os.environ["FLEXUS_BLOCKING_GUARD"] = "raise"
+            check_off_loop("test_sdk_call")
+            assert 0, "guard should have raised"
+        except SyncCallOnEventLoop as e:
+            print("guard:", e)
+        shutdown_all()
+
+    asyncio.run(main())
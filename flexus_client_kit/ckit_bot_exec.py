@@ -14,7 +14,7 @@ import gql.transport.exceptions
 
 from flexus_client_kit import ckit_client, gql_utils, ckit_service_exec, ckit_kanban, ckit_cloudtool
 from flexus_client_kit import ckit_ask_model, ckit_shutdown, ckit_utils, ckit_bot_query, ckit_scenario
-from flexus_client_kit import ckit_passwords, ckit_messages
+from flexus_client_kit import ckit_passwords, ckit_messages, ckit_heartbeat, ckit_logs, ckit_metrics
 from flexus_client_kit import erp_schema
 
 
@@ -142,6 +142,7 @@ class RobotContext:
         # logger.info("%s unpark_collected_events() started %d %d %d" % (self.persona.persona_id, len(self._parked_messages), len(self._parked_threads), len(self._parked_toolcalls)))
         did_anything = False
         self._parked_anything_new.clear()
+        ckit_metrics.PARKED_EVENTS.observe(len(self._parked_messages) + len(self._parked_threads) + len(self._parked_tasks) + len(self._parked_erp_changes) + len(self._parked_emessages) + len(self._parked_toolcalls))
 
         todo = list(self._parked_messages.keys())  # can appear more in the background, as we await in loop body
         for k in todo:
@@ -149,7 +150,8 @@ class RobotContext:
             did_anything = True
             if self._handler_updated_message:
                 try:
-                    await self._handler_updated_message(msg)
+                    with ckit_metrics.HANDLER_SECONDS.time("updated_message"):
+                        await self._handler_updated_message(msg)
                 except Exception as e:
                     logger.error("%s error in handler_updated_message handler: %s\n%s", self.persona.persona_id, type(e).__name__, e, exc_info=e)
 
@@ -159,7 +161,8 @@ class RobotContext:
             did_anything = True
             if self._handler_upd_thread:
                 try:
-                    await self._handler_upd_thread(thread)
+                    with ckit_metrics.HANDLER_SECONDS.time("updated_thread"):
+                        await self._handler_upd_thread(thread)
                 except Exception as e:
                     logger.error("%s error in on_updated_thread handler: %s\n%s", self.persona.persona_id, type(e).__name__, e, exc_info=e)
 
@@ -169,7 +172,8 @@ class RobotContext:
             did_anything = True
             if self._handler_updated_task:
                 try:
-                    await self._handler_updated_task(action, old_task, new_task)
+                    with ckit_metrics.HANDLER_SECONDS.time("updated_task"):
+                        await self._handler_updated_task(action, old_task, new_task)
                 except Exception as e:
                     logger.error("%s error in on_updated_task handler: %s\n%s", self.persona.persona_id, type(e).__name__, e, exc_info=e)
 
@@ -183,7 +187,8 @@ class RobotContext:
                     dataclass_type = erp_schema.ERP_TABLE_TO_SCHEMA[table_name]
                     old_record = gql_utils.dataclass_from_dict(old_record_dict, dataclass_type) if old_record_dict else None
                     new_record = gql_utils.dataclass_from_dict(new_record_dict, dataclass_type) if new_record_dict else None
-                    await handler(action, old_record, new_record)
+                    with ckit_metrics.HANDLER_SECONDS.time("erp_change"):
+                        await handler(action, old_record, new_record)
                 except Exception as e:
                     logger.error("%s error in on_erp_change(%r) handler: %s\n%s", self.persona.persona_id, table_name, type(e).__name__, e, exc_info=e)
 
@@ -197,7 +202,8 @@ class RobotContext:
                 logger.info("%s on_emessage(%r) handler not found, message is lost", self.persona.persona_id, emsg.emsg_type)
                 continue
             try:
-                await handler(emsg)
+                with ckit_metrics.HANDLER_SECONDS.time("emessage"):
+                    await handler(emsg)
             except Exception as e:
                 logger.error("%s error in on_emessage(%r) handler: %s\n%s", self.persona.persona_id, emsg.emsg_type, type(e).__name__, e, exc_info=e)
 
@@ -210,11 +216,13 @@ class RobotContext:
                 continue
             if c.fcall_name not in turn_tool_calls_into_bg_tasks:
                 try:
-                    await self._local_tool_call(self.fclient, c)
+                    with ckit_logs.log_context(ft_id=c.fcall_ft_id, fcall_id=c.fcall_id):
+                        await self._local_tool_call(self.fclient, c)
                 except Exception as e:
                     logger.error("%s error in on_tool_call() handler: %s\n%s", self.persona.persona_id, type(e).__name__, e, exc_info=e)
             else:
-                task = asyncio.create_task(self._local_tool_call(self.fclient, c))
+                with ckit_logs.log_context(ft_id=c.fcall_ft_id, fcall_id=c.fcall_id):   # create_task() copies the context
+                    task = asyncio.create_task(self._local_tool_call(self.fclient, c))
                 task.add_done_callback(lambda t: self.bg_call_tasks.discard(t))
                 self.bg_call_tasks.add(task)
 
@@ -241,6 +249,10 @@ class RobotContext:
             await asyncio.gather(*pending, return_exceptions=True)
 
     async def _local_tool_call(self, fclient: ckit_client.FlexusClient, toolcall: ckit_cloudtool.FCloudtoolCall) -> None:
+        with ckit_metrics.tool_call("bot", toolcall.fcall_name, toolcall.fcall_id, toolcall.fcall_ft_id):
+            await self._local_tool_call_unmetered(fclient, toolcall)
+
+    async def _local_tool_call_unmetered(self, fclient: ckit_client.FlexusClient, toolcall: ckit_cloudtool.FCloudtoolCall) -> None:
         logger.info("%s local_tool_call %s %s(%s) from thread %s" % (self.persona.persona_id, toolcall.fcall_id, toolcall.fcall_name, toolcall.fcall_arguments, toolcall.fcall_ft_id))
         subchats_list = None
         dollars = 0.0
@@ -303,6 +315,7 @@ async def _close_messengers(rcx: RobotContext) -> None:
 
 
 async def crash_boom_bang(fclient: ckit_client.FlexusClient, rcx: RobotContext, bot_main_loop: Callable[[ckit_client.FlexusClient, RobotContext], Awaitable[None]]) -> None:
+    ckit_logs.set_log_context(persona_id=rcx.persona.persona_id)   # this task and everything it starts
     logger.info("%s START name=%r" % (rcx.persona.persona_id, rcx.persona.persona_name))
     while not ckit_shutdown.shutdown_event.is_set():
         try:
@@ -340,40 +353,21 @@ async def i_am_still_alive(
     marketable_name: str,
     marketable_version: int,
 ) -> None:
-    while not ckit_shutdown.shutdown_event.is_set():
-        try:
-            http_client = await fclient.use_http_on_behalf(None, "")
-            async with http_client as http:
-                # group_id takes priority over ws_id, send only one (not both)
-                use_group_id = fclient.group_id if fclient.group_id else None
-                use_ws_id_prefix = None if use_group_id else fclient.ws_id
-                await http.execute(
-                    gql.gql("""mutation BotConfirmExists($marketable_name: String!, $marketable_version: Int!, $ws_id_prefix: String, $group_id: String) {
-                        bot_confirm_exists(marketable_name: $marketable_name, marketable_version: $marketable_version, ws_id_prefix: $ws_id_prefix, group_id: $group_id)
-                    }"""),
-                    variable_values={
-                        "marketable_name": marketable_name,
-                        "marketable_version": marketable_version,
-                        "ws_id_prefix": use_ws_id_prefix,
-                        "group_id": use_group_id,
-                    },
-                )
-                logger.info("i_am_still_alive %s:%d %s=%s", marketable_name, marketable_version, "ws_id" if fclient.ws_id else "group_id", fclient.ws_id or fclient.group_id)
-            if await ckit_shutdown.wait(120):
-                break
-
-        except (
-            gql.transport.exceptions.TransportError,
-            asyncio.exceptions.TimeoutError,
-        ) as e:
-            if "403:" in str(e):
-                # It's gql.transport.exceptions.TransportQueryError with {'message': "403: Whoops your key didn't work (1).", ...}
-                # Unfortunately, no separate exception class for 403
-                logger.error("That looks bad, my key doesn't work: %s", e)
-            else:
-                logger.info("i_am_still_alive connection problem")
-            if await ckit_shutdown.wait(60):
-                break
+    # group_id takes priority over ws_id, send only one (not both)
+    use_group_id = fclient.group_id if fclient.group_id else None
+    use_ws_id_prefix = None if use_group_id else fclient.ws_id
+    key = f"bot:{marketable_name}:{marketable_version}:{use_group_id or use_ws_id_prefix}"
+    ckit_heartbeat.register(key, fclient, "bot_confirm_exists", {
+        "marketable_name": ("String!", marketable_name),
+        "marketable_version": ("Int!", marketable_version),
+        "ws_id_prefix": ("String", use_ws_id_prefix),
+        "group_id": ("String", use_group_id),
+    })
+    logger.info("i_am_still_alive %s:%d %s=%s", marketable_name, marketable_version, "ws_id" if fclient.ws_id else "group_id", fclient.ws_id or fclient.group_id)
+    try:
+        await ckit_shutdown.shutdown_event.wait()
+    finally:
+        ckit_heartbeat.unregister(key)
 
 
 class BotsCollection:
@@ -461,7 +455,11 @@ async def subscribe_and_produce_callbacks(
                 "group_id": use_group_id,
             },
         ):
+            if ckit_utils.RECORD_PATH:
+                ckit_utils.record(r)
+            t0 = time.perf_counter()
             upd = gql_utils.dataclass_from_dict(r["bot_threads_calls_tasks"], ckit_bot_query.FBotThreadsCallsTasks)
+            ckit_metrics.SUBS_DECODE_SECONDS.observe(time.perf_counter() - t0, upd.news_about)
             handled = False
             reassign_threads = False
             # logger.info("subs %s %s %s" % (upd.news_action, upd.news_about, upd.news_payload_id))
@@ -1131,13 +1129,17 @@ async def run_bots_in_this_group(
     keepalive_task.add_done_callback(lambda t: ckit_utils.report_crash(t, logger))
     emsg_flush_task = asyncio.create_task(flush_handled_emsg_ids(fclient, bc))
     emsg_flush_task.add_done_callback(lambda t: ckit_utils.report_crash(t, logger))
+    metrics_task = asyncio.create_task(ckit_metrics.export_forever(fclient.service_name))
+    metrics_task.add_done_callback(lambda t: ckit_utils.report_crash(t, logger))
     try:
         await ckit_service_exec.run_typical_single_subscription_with_restart_on_network_errors(fclient, subscribe_and_produce_callbacks, bc)
     finally:
         keepalive_task.cancel()
         emsg_flush_task.cancel()
-        await asyncio.gather(keepalive_task, emsg_flush_task, return_exceptions=True)
+        metrics_task.cancel()
+        await asyncio.gather(keepalive_task, emsg_flush_task, metrics_task, return_exceptions=True)
         await shutdown_bots(bc)
+        await ckit_shutdown.flush_all()
     logger.info("run_bots_in_this_group exit")
 
 
@@ -91,6 +91,7 @@ async def marketplace_upsert_dev_bot(
     marketable_auth_scopes: Optional[Dict[str, List[str]]] = None,
     marketable_features: List[str] = [],
     add_integrations_into_expert_system_prompt: Optional[List[ckit_integrations_db.IntegrationRecord]] = None,
+    precompile_skills: bool = False,   # write bot_dir/skills.compiled.json (not committed), so the bot skips skill validation at startup
 ) -> FBotInstallOutput:
     assert ws_id, "Set FLEXUS_WORKSPACE environment variable to your workspace ID"
     assert not ws_id.startswith("fx-"), "You can find workspace id in the browser address bar, when visiting for example the statistics page"
@@ -181,6 +182,11 @@ async def marketplace_upsert_dev_bot(
         expert_dict["fexp_name"] = f"{marketable_name}_{expert_name}"
         experts_input.append(expert_dict)
 
+    if precompile_skills:
+        all_skills = sorted({s["name"] for _, e in marketable_experts for s in json.loads(e.fexp_builtin_skills)})
+        if all_skills:
+            print(f"  {len(all_skills)} skills precompiled into {ckit_skills.precompile(bot_dir, all_skills)}")
+
     mutation = gql.gql(f"""mutation InstallBot($ws: String!, $name: String!, $ver: String!, $title1: String!, $title2: String!, $author: String!, $accent_color: String!, $occupation: String!, $desc: String!, $typical_group: String!, $repo: String!, $run: String!, $setup: String!, $featured: [FFeaturedActionInput!]!, $intro: String!, $model_expensive: String!, $model_cheap: String!, $reasoning_expensive: String, $reasoning_cheap: String, $daily: Int!, $inbox: Int!, $experts: [FMarketplaceExpertInput!]!, $schedule: String!, $big: String!, $small: String!, $tags: [String!]!, $forms: String, $required_policydocs: [String!]!, $auth_needed: [String!]!, $auth_supported: [String!]!, $auth_scopes: String, $max_inprogress: Int!, $features: [String!]!) {{
         marketplace_upsert_dev_bot(
             ws_id: $ws,
@@ -23,9 +23,19 @@ class OpError(Exception):
     pass
 
 
+class ArgError(Exception):
+    def __init__(self, msg: str):
+        super().__init__(msg)
+        self.msg = msg
+        self.where: List[str] = []     # filled in on the way out of nested validators, ["targeting", ".geo", "[0]"]
+
+    def __str__(self):
+        return f"{''.join(self.where)}: {self.msg}" if self.where else self.msg
+
+
 def _type_to_schema(annotation) -> dict:
     if annotation is inspect.Parameter.empty or annotation is Any:
-        return {"type": "string"}
+        return {}
     origin = get_origin(annotation)
     args = get_args(annotation)
     if origin is Literal:
@@ -78,6 +88,7 @@ def _func_schema(func: Callable, skip_first: type = None) -> dict:
         assert first_ann is skip_first or (isinstance(first_ann, type) and issubclass(first_ann, skip_first)), \
             f"{func.__name__}: first param '{first_name}' hinted as {first_ann}, expected {skip_first}"
         params = params[1:]
+    nullable = []
     for name, param in params:
         if name == "self":
             continue
@@ -88,9 +99,183 @@ def _func_schema(func: Callable, skip_first: type = None) -> dict:
         properties[name] = schema
         if param.default is inspect.Parameter.empty and not _is_optional(ann):
             required.append(name)
+        if _is_optional(ann) or param.default is None or ann is inspect.Parameter.empty or ann is Any:
+            nullable.append(name)
     doc = inspect.getdoc(func) or ""
     first_line = doc.split("\n")[0].strip() if doc else func.__name__
-    return {"description": first_line, "properties": properties, "required": required}
+    return {"description": first_line, "properties": properties, "required": required, "nullable": nullable}
+
+
+# Validators are compiled once per method from the schema above. Each one takes the model's value and returns it
+# coerced to what the annotation asks for ("5" -> 5 for int, 5 -> "5" for str, "true" -> True), or raises ArgError.
+# Nothing reaches the function (and its API calls) until every argument passed.
+
+
+def _v_any(v):
+    return v
+
+
+def _v_str(v):
+    if isinstance(v, str):
+        return v
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return str(v)
+    raise ArgError(f"expected string, got {type(v).__name__}")
+
+
+def _v_int(v):
+    if isinstance(v, int) and not isinstance(v, bool):
+        return v
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    if isinstance(v, str):
+        try:
+            return int(v.strip())
+        except ValueError:
+            pass
+    raise ArgError(f"expected integer, got {v!r}"[:200])
+
+
+def _v_number(v):
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return v
+    if isinstance(v, str):
+        try:
+            return float(v.strip())
+        except ValueError:
+            pass
+    raise ArgError(f"expected number, got {v!r}"[:200])
+
+
+_BOOL_STRINGS = {"true": True, "false": False, "1": True, "0": False, "yes": True, "no": False}
+
+
+def _v_bool(v):
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, int) and v in (0, 1):
+        return bool(v)
+    if isinstance(v, str) and v.strip().lower() in _BOOL_STRINGS:
+        return _BOOL_STRINGS[v.strip().lower()]
+    raise ArgError(f"expected boolean, got {v!r}"[:200])
+
+
+# a value of exactly this type passes its validator unchanged, checking type() is cheaper than calling it
+_PASS_TYPES = {_v_str: (str,), _v_int: (int,), _v_number: (int, float), _v_bool: (bool,)}
+
+
+def _maybe_json(v, want: type):
+    # models sometimes send a nested list/object as an escaped json string
+    if isinstance(v, str) and v.strip()[:1] in ("[", "{"):
+        try:
+            parsed = json.loads(v)
+        except json.JSONDecodeError:
+            return v
+        if isinstance(parsed, want):
+            return parsed
+    return v
+
+
+def _compile_validator(schema: dict) -> Callable[[Any], Any]:
+    t = schema.get("type")
+    if t == "array":
+        item_v = _compile_validator(schema.get("items") or {})
+        item_pass = _PASS_TYPES.get(item_v, ())
+
+        def v_array(v):
+            if type(v) is not list:
+                v = _maybe_json(v, list)
+            if not isinstance(v, list):
+                raise ArgError(f"expected array, got {type(v).__name__}")
+            if item_v is _v_any or (item_pass and all(type(x) in item_pass for x in v)):
+                return v
+            out = []
+            for i, x in enumerate(v):
+                try:
+                    out.append(item_v(x))
+                except ArgError as e:
+                    e.where.insert(0, f"[{i}]")
+                    raise
+            return out
+        base = v_array
+    elif t == "object":
+        value_v = _compile_validator(schema.get("additionalProperties") or {})
+        value_pass = _PASS_TYPES.get(value_v, ())
+
+        def v_object(v):
+            if type(v) is not dict:
+                v = _maybe_json(v, dict)
+            if not isinstance(v, dict):
+                raise ArgError(f"expected object, got {type(v).__name__}")
+            if value_v is _v_any or (value_pass and all(type(x) in value_pass for x in v.values())):
+                return v
+            out = {}
+            for k, x in v.items():
+                try:
+                    out[k] = value_v(x)
+                except ArgError as e:
+                    e.where.insert(0, f".{k}")
+                    raise
+            return out
+        base = v_object
+    else:
+        base = {"string": _v_str, "integer": _v_int, "number": _v_number, "boolean": _v_bool}.get(t, _v_any)
+
+    if "enum" not in schema:
+        return base
+    allowed = list(schema["enum"])
+    allowed_set = set(allowed)
+
+    def v_enum(v):
+        v = base(v)
+        if v not in allowed_set:
+            raise ArgError(f"must be one of {allowed}, got {v!r}"[:300])
+        return v
+    return v_enum
+
+
+_CALL_KEYS = frozenset(("op", "method", "args"))
+
+
+class _CallPlan:
+    __slots__ = ("func", "is_async", "params", "known")
+
+    def __init__(self, func: Callable, schema: dict):
+        self.func = func
+        self.is_async = inspect.iscoroutinefunction(func)
+        required, nullable = set(schema["required"]), set(schema["nullable"])
+        self.params = []    # (name, validator, types that skip the validator, required, nullable)
+        for name, ps in schema["properties"].items():
+            v = _compile_validator(ps)
+            self.params.append((name, v, _PASS_TYPES.get(v, ()), name in required, name in nullable))
+        self.known = frozenset(schema["properties"])
+
+    def bind(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        kwargs = {}
+        missing = []
+        for name, v, pass_types, required, nullable in self.params:
+            x = args.get(name)
+            if x is None:
+                if name not in args:
+                    if required:
+                        missing.append(name)
+                    continue
+                if nullable:
+                    kwargs[name] = None
+                elif required:
+                    missing.append(name)
+                continue    # explicit null for a param that has a default, let the default apply
+            if type(x) in pass_types:
+                kwargs[name] = x
+                continue
+            try:
+                kwargs[name] = v(x)
+            except ArgError as e:
+                e.where.insert(0, name)
+                raise
+        if missing:
+            raise ArgError(f"missing required args: {', '.join(missing)}")
+        return kwargs
 
 
 class BunchOfPythonFunctions:
@@ -103,12 +288,14 @@ class BunchOfPythonFunctions:
         self._ContextType = ContextType
         self._schemas: Dict[str, dict] = {}
         self._funcs: Dict[str, Callable] = {}
+        self._plans: Dict[str, _CallPlan] = {}
 
     def add(self, group_name: str, funcs: List[Callable]):
         for func in funcs:
             name = f"{group_name}{func.__name__}"
             self._schemas[name] = _func_schema(func, skip_first=self._ContextType)
             self._funcs[name] = func
+            self._plans[name] = _CallPlan(func, self._schemas[name])
 
     def make_tool(self) -> ckit_cloudtool.CloudTool:
         return ckit_cloudtool.CloudTool(
@@ -157,35 +344,33 @@ class BunchOfPythonFunctions:
         # op == "call"
         if not method:
             return "ERROR: method is required for op=\"call\""
-        func = self._funcs.get(method)
-        if not func:
+        plan = self._plans.get(method)
+        if not plan:
             return f"Unknown method '{method}'. Use op=\"list\"."
 
-        # model sometimes puts keys at top level instead of inside args
         args = model_produced_args.get("args") or {}
-        if isinstance(model_produced_args, dict):
-            for k in model_produced_args:
-                if k not in ("op", "method", "args") and k not in args:
-                    args[k] = model_produced_args[k]
         # model might escape args as json
         if isinstance(args, str):
             try:
                 args = json.loads(args)
             except (json.JSONDecodeError, TypeError):
                 return "ERROR: args must be an object, got unparseable string"
+        if not isinstance(args, dict):
+            return f"ERROR: args must be an object, got {type(args).__name__}"
+        # model sometimes puts keys at top level instead of inside args
+        if not model_produced_args.keys() <= _CALL_KEYS:
+            args = {**{k: v for k, v in model_produced_args.items() if k not in _CALL_KEYS}, **args}
 
-        # check required parameters exist only top level checked
-        schema = self._schemas[method]
-        missing = [r for r in schema["required"] if r not in args]
-        if missing:
-            return f"ERROR: method {method!r} missing required args: {', '.join(missing)}"
-        kwargs = {k: v for k, v in args.items() if k in schema["properties"]}
+        try:
+            kwargs = plan.bind(args)
+        except ArgError as e:
+            return f"ERROR: method {method!r} {e}. Use op=\"help\" to see the schema."
         try:
             if self._ContextType is not None:
-                maybe_result = func(cx, **kwargs)
+                maybe_result = plan.func(cx, **kwargs)
             else:
-                maybe_result = func(**kwargs)
-            if inspect.isawaitable(maybe_result):
+                maybe_result = plan.func(**kwargs)
+            if plan.is_async or inspect.isawaitable(maybe_result):
                 result = await maybe_result
             else:
                 result = maybe_result
@@ -229,3 +414,74 @@ if __name__ == "__main__":
     print(asyncio.run(gi.called_by_model(None, None, {"op": "call", "method": "math.add", "args": [4, 5]})))
     print("\n=== problem3 ===")
     print(asyncio.run(gi.called_by_model(None, None, {"op": "call", "method": "math.add", "args": "not a json"})))
+    print("\n=== coercion ===")
+    print(asyncio.run(gi.called_by_model(None, None, {"op": "call", "method": "math.mul", "args": {"a": "3", "b": 4.0, "verbose": "true"}})))
+
+    import time
+
+    api_calls = []
+
+    async def update_adset(
+        adset_id: str,
+        status: Optional[Literal["ACTIVE", "PAUSED"]] = None,
+        daily_budget: Optional[int] = None,
+        bid_amount: Optional[float] = None,
+        targeting: Optional[Dict[str, Any]] = None,
+        placements: Optional[List[Dict[str, str]]] = None,
+        dry_run: bool = False,
+    ) -> str:
+        """Update an ad set."""
+        api_calls.append(adset_id)   # stands for the Graph API round trip
+        return "ok"
+
+    gi.add("adset.", [update_adset])
+    good = {"op": "call", "method": "adset.update_adset", "args": {
+        "adset_id": 120210000000001, "status": "PAUSED", "daily_budget": "5000", "bid_amount": 1.5,
+        "targeting": {"geo_locations": {"countries": ["US"]}, "age_min": 25},
+        "placements": [{"publisher": "facebook", "position": "feed"}, {"publisher": "instagram", "position": "story"}],
+    }}
+    bad = [
+        {"op": "call", "method": "adset.update_adset", "args": {"adset_id": "1", "status": "PAUSE"}},
+        {"op": "call", "method": "adset.update_adset", "args": {"adset_id": "1", "daily_budget": "50 dollars"}},
+        {"op": "call", "method": "adset.update_adset", "args": {"adset_id": "1", "placements": [{"publisher": "facebook"}, {"publisher": ["instagram"]}]}},
+        {"op": "call", "method": "adset.update_adset", "args": {"adset_id": "1", "targeting": "US only"}},
+    ]
+    print("\n=== rejected before the call ===")
+    for b in bad:
+        print(asyncio.run(gi.called_by_model(None, None, b)))
+    assert not api_calls
+
+    async def legacy_dispatch(bunch, margs):
+        # what called_by_model did before compiled call plans: required keys only, per-call filtering, raw values
+        func = bunch._funcs.get(margs["method"])
+        args = margs.get("args") or {}
+        for k in margs:
+            if k not in ("op", "method", "args") and k not in args:
+                args[k] = margs[k]
+        schema = bunch._schemas[margs["method"]]
+        missing = [r for r in schema["required"] if r not in args]
+        if missing:
+            return "ERROR"
+        r = func(**{k: v for k, v in args.items() if k in schema["properties"]})
+        return await r if inspect.isawaitable(r) else r
+
+    async def bench():
+        n = 10_000
+        for label, call in [
+            ("legacy dispatch (no validation)", lambda: legacy_dispatch(gi, good)),
+            ("compiled plan (validate + coerce)", lambda: gi.called_by_model(None, None, good)),
+        ]:
+            api_calls.clear()
+            t0 = time.perf_counter()
+            for _ in range(n):
+                assert await call() == "ok"
+            dt = time.perf_counter() - t0
+            print(f"{label:36s} {n} calls {dt * 1000:7.1f}ms, {dt / n * 1e6:5.1f}us per call")
+        t0 = time.perf_counter()
+        for i in range(n):
+            await gi.called_by_model(None, None, bad[i % len(bad)])
+        dt = time.perf_counter() - t0
+        print(f"{'malformed, rejected':36s} {n} calls {dt * 1000:7.1f}ms, {dt / n * 1e6:5.1f}us per call, reached the function {len(api_calls) - n} times")
+
+    print("\n=== benchmark ===")
+    asyncio.run(bench())
@@ -10,7 +10,7 @@ import re
 from gql.transport.websockets import WebsocketsTransport
 from gql.transport.aiohttp import AIOHTTPTransport
 
-from flexus_client_kit import ckit_logs
+from flexus_client_kit import ckit_logs, ckit_metrics
 from flexus_client_kit import ckit_passwords, gql_utils
 
 
@@ -28,6 +28,25 @@ export FLEXUS_API_BASEURL=https://flexus.team/
 FLEXUS_API_BASEURL_DEFAULT = "https://flexus.team/"
 
 
+def _operation_name(request) -> str:
+    if request.operation_name:
+        return request.operation_name
+    for d in request.document.definitions:
+        if getattr(d, "name", None) is not None:
+            return d.name.value
+    return "anonymous"
+
+
+class MeteredAIOHTTPTransport(AIOHTTPTransport):
+    # Round trip histogram per operation, and a child span when inside a tool call trace
+    async def execute(self, request, *args, **kwargs):
+        with ckit_metrics.graphql_call(_operation_name(request)) as m:
+            result = await super().execute(request, *args, **kwargs)
+            if result.errors:
+                m.fail("graphql errors: %s" % str(result.errors)[:200])
+            return result
+
+
 class FlexusClient:
     def __init__(self,
         service_name: str,
@@ -73,7 +92,7 @@ class FlexusClient:
     @deprecated("replace with use_http_on_behalf, so the backend knows which persona is making the call, and can trace the original call via fcall_untrusted_key")
     async def use_http(self, execute_timeout: float = 10) -> gql.Client:
         headers = await self._base_headers()
-        transport = AIOHTTPTransport(url=self.http_url, headers=headers)
+        transport = MeteredAIOHTTPTransport(url=self.http_url, headers=headers)
         return gql.Client(transport=transport, fetch_schema_from_transport=False, execute_timeout=execute_timeout)
 
     async def use_http_on_behalf(self, persona_id: Optional[str], fcall_untrusted_key: str, execute_timeout: float = 10) -> gql.Client:
@@ -81,7 +100,7 @@ class FlexusClient:
         if persona_id:
             headers["x-flexus-persona-id"] = persona_id
         headers["x-flexus-call-untrusted-key"] = fcall_untrusted_key
-        transport = AIOHTTPTransport(url=self.http_url, headers=headers)
+        transport = MeteredAIOHTTPTransport(url=self.http_url, headers=headers)
         return gql.Client(transport=transport, fetch_schema_from_transport=False, execute_timeout=execute_timeout)
 
     async def _base_headers(self) -> dict:
@@ -1,4 +1,5 @@
 import asyncio
+import copy
 import json
 import logging
 import time
@@ -11,6 +12,8 @@ import websockets
 import websockets.exceptions
 
 from flexus_client_kit import ckit_client
+from flexus_client_kit import ckit_heartbeat
+from flexus_client_kit import ckit_metrics
 from flexus_client_kit import ckit_shutdown
 from flexus_client_kit import ckit_utils
 from flexus_client_kit import ckit_passwords
@@ -164,7 +167,7 @@ class CloudTool:
                         check_strict(f"{path}.anyOf[{i}]", variant)
             check_strict("parameters", self.parameters)
 
-        params = self.parameters.copy()
+        params = copy.deepcopy(self.parameters)   # add_order() writes into nested dicts, tool objects are shared
         add_order(params)
         return {
             "type": "function",
@@ -376,43 +379,26 @@ async def cloudtool_i_am_still_alive(
         fuser_id: Optional[str],
         shared: bool,
 ) -> None:
+    # Tools are confirmed by the process-wide heartbeat, batched with every other tool and bot in this process
+    keys = []
     for t in tool_list:
         # for verification of strict tools, does not have side effects
         _ = t.openai_style_tool()
-    while not ckit_shutdown.shutdown_event.is_set():
-        try:
-            http_client = await fclient.use_http_on_behalf("", "")
-            async with http_client as http:
-                for t in tool_list:
-                    await http.execute(
-                        gql.gql("""mutation CloudtoolConfirm($name: String!, $desc: String!, $params: String!, $fgroup_id: String, $fuser_id: String, $shared: Boolean!, $strict: Boolean!) {
-                            cloudtool_confirm_exists(tool_name: $name, ctool_description: $desc, ctool_parameters: $params, fgroup_id: $fgroup_id, fuser_id: $fuser_id, shared: $shared, ctool_strict: $strict)
-                        }"""),
-                        variable_values={
-                            "name": t.name,
-                            "desc": t.description,
-                            "params": json.dumps(t.parameters),
-                            "fgroup_id": fgroup_id,
-                            "fuser_id": fuser_id,
-                            "shared": shared,
-                            "strict": t.strict,
-                        },
-                    )
-                    # logger.info("cloudtool_i_am_still_alive %s", t.name)
-            if await ckit_shutdown.wait(120):
-                break
-
-        except (
-            gql.transport.exceptions.TransportError,
-            asyncio.exceptions.TimeoutError,
-        ) as e:
-            if "403:" in str(e):
-                # It's gql.transport.exceptions.TransportQueryError with {'message': "403: Whoops your key didn't work (1).", ...}
-                # Unfortunately, no separate exception class for 403
-                logger.error("That looks bad, my key doesn't work: %s", e)
-            else:
-                logger.info("cloudtool_i_am_still_alive connection problem")
-            await ckit_shutdown.wait(60)
+    try:
+        for t in tool_list:
+            keys.append(ckit_heartbeat.register(f"cloudtool:{fgroup_id}:{fuser_id}:{t.name}", fclient, "cloudtool_confirm_exists", {
+                "tool_name": ("String!", t.name),
+                "ctool_description": ("String!", t.description),
+                "ctool_parameters": ("String!", json.dumps(t.parameters)),
+                "fgroup_id": ("String", fgroup_id),
+                "fuser_id": ("String", fuser_id),
+                "shared": ("Boolean!", shared),
+                "ctool_strict": ("Boolean!", t.strict),
+            }))
+        await ckit_shutdown.shutdown_event.wait()
+    finally:
+        for k in keys:
+            ckit_heartbeat.unregister(k)
 
 
 async def run_cloudtool_service_real(
@@ -442,6 +428,7 @@ async def run_cloudtool_service_real(
         while not ckit_shutdown.shutdown_event.is_set():
             if await ckit_shutdown.wait(1):
                 break
+            ckit_metrics.CLOUDTOOL_WORKSET.set(len(workset), service_name)
             if len(workset) == 0:
                 idle_sec += 1
             if len(workset) == max_tasks:
@@ -456,6 +443,10 @@ async def run_cloudtool_service_real(
                 full_sec = 0
                 minute = now_minute
 
+    async def metered_call(call: FCloudtoolCall) -> None:
+        with ckit_metrics.tool_call("cloudtool", call.fcall_name, call.fcall_id, call.fcall_ft_id):
+            await call_python_function_and_save_result(call, the_python_function, service_name, fclient)
+
     def workset_done(task: asyncio.Task, call: FCloudtoolCall) -> None:
         workset.discard(task)
         ckit_utils.report_crash(task, logger)
@@ -464,6 +455,8 @@ async def run_cloudtool_service_real(
     still_alive.add_done_callback(lambda t: ckit_utils.report_crash(t, logger))
     perfmon = asyncio.create_task(monitor_performance())
     perfmon.add_done_callback(lambda t: ckit_utils.report_crash(t, logger))
+    metrics_export = asyncio.create_task(ckit_metrics.export_forever(service_name))
+    metrics_export.add_done_callback(lambda t: ckit_utils.report_crash(t, logger))
 
     ws_client = await fclient.use_ws()
     ckit_shutdown.give_ws_client(service_name, ws_client)
@@ -486,10 +479,12 @@ async def run_cloudtool_service_real(
                     logger.warning("too many tasks %d, sleeping instead of reading subs", len(workset))
                     if await ckit_shutdown.wait(1):
                         break
+                if ckit_utils.RECORD_PATH:
+                    ckit_utils.record(r)
                 call = gql_utils.dataclass_from_dict(r["cloudtool_wait_for_call"], FCloudtoolCall)
                 logger.info(" %s %s:%03d:%03d %+d %s(%s)", call.fcall_id, call.fcall_ft_id, call.fcall_ftm_alt, call.fcall_called_ftm_num, call.fcall_call_n, call.fcall_name, str(call.fcall_arguments)[:20])
 
-                t = asyncio.create_task(call_python_function_and_save_result(call, the_python_function, service_name, fclient))
+                t = asyncio.create_task(metered_call(call))
                 t.add_done_callback(lambda t, c = call: workset_done(t, c))
                 workset.add(t)
     finally:
@@ -497,7 +492,8 @@ async def run_cloudtool_service_real(
         ckit_shutdown.take_away_ws_client(service_name)
         perfmon.cancel()
         still_alive.cancel()
-        await asyncio.gather(still_alive, perfmon, *workset, return_exceptions=True)
+        metrics_export.cancel()
+        await asyncio.gather(still_alive, perfmon, metrics_export, *workset, return_exceptions=True)
 
 
 async def run_cloudtool_service(
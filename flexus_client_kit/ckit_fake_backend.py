@@ -0,0 +1,634 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import functools
+import dataclasses
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union, get_type_hints
+
+import graphql
+
+from flexus_client_kit import ckit_utils
+
+logger = logging.getLogger("fakebk")
+
+
+# In-process stand-in for the Flexus GraphQL backend, for load and performance work on the kit without a deployment:
+#
+#   POST /v1/graphql     queries and mutations, answered by resolvers keyed by top-level field name (aliases work,
+#                        so the heartbeat's batched h0:/h1: mutation is resolved field by field, with partial errors)
+#   GET  /v1/graphql     graphql-transport-ws, bot_threads_calls_tasks and cloudtool_wait_for_call subscriptions
+#
+#   be = FakeFlexusBackend(latency={"*": Latency(base=0.02)}, faults=Faults(graphql_error=0.01))
+#   base_url = await be.start()
+#   fclient = ckit_client.FlexusClient("mybot_test", api_key="fx-fake", base_url=base_url)
+#   report = await be.run_load(LoadScenario(personas=10, threads_per_persona=5, toolcalls_per_s=200, seconds=5))
+#
+# Record a real stream by running a bot or a cloudtool service with FLEXUS_RECORD_SUBSCRIPTIONS=stream.jsonl,
+# play it back into whatever subscribes here with be.replay("stream.jsonl", speed=10).
+#
+# Benchmarks of the kit's hot paths against this backend: python -m flexus_client_kit.ckit_fake_backend --help
+
+
+BOT_SUBS = "bot_threads_calls_tasks"
+CLOUDTOOL_SUBS = "cloudtool_wait_for_call"
+WS_PROTOCOL = "graphql-transport-ws"
+_COMPLETE = object()
+
+
+class FakeGraphQLError(Exception):
+    # Raise from a resolver to answer with {"errors": [{"message": ..., "path": [alias]}]} for that field
+    pass
+
+
+@dataclass
+class Latency:
+    base: float = 0.0       # seconds before every answer
+    jitter: float = 0.0     # plus uniform 0..jitter
+    tail_p: float = 0.0     # this fraction of answers...
+    tail: float = 0.0       # ...gets this much on top, to shape p99
+
+    def sample(self, rnd: random.Random) -> float:
+        t = self.base + (rnd.random() * self.jitter if self.jitter else 0.0)
+        if self.tail_p and rnd.random() < self.tail_p:
+            t += self.tail
+        return t
+
+
+@dataclass
+class Faults:
+    http_5xx: float = 0.0       # fraction of HTTP requests answered with 502
+    http_429: float = 0.0       # ... with 429 and Retry-After: 1
+    graphql_error: float = 0.0  # fraction of resolved fields that come back as an error instead
+    ws_drop_after: int = 0      # close a subscription websocket after this many events, 0 = never
+
+
+@dataclass
+class LoadScenario:
+    personas: int = 10
+    threads_per_persona: int = 5
+    toolcalls_per_s: float = 100.0
+    seconds: float = 5.0
+    target: str = "bot"                 # "bot": flexus_tool_call news on bot_threads_calls_tasks, "cloudtool": cloudtool_wait_for_call
+    tool_name: str = "fake_tool"
+    marketable_name: str = "fakebot"
+    marketable_version: int = 1
+    messages_per_call: int = 0          # thread message updates sent ahead of each tool call (bot target)
+    drain_timeout: float = 10.0         # wait this long for results still in flight when sending stops
+
+
+@dataclass
+class LoadReport:
+    sent: int
+    completed: int
+    seconds: float
+    throughput: float       # results per second
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+    http_requests: int
+    ws_events: int
+
+    def __str__(self) -> str:
+        return "sent %d done %d in %.1fs, %.0f/s, latency p50 %.1fms p99 %.1fms max %.1fms, %.2f http requests per call" % (
+            self.sent, self.completed, self.seconds, self.throughput, self.p50_ms, self.p99_ms, self.max_ms, self.http_requests / max(self.sent, 1))
+
+
+# ---- payloads ----
+
+def _blank(tp: Any) -> Any:
+    if getattr(tp, "__origin__", None) is Union:
+        return None
+    return {str: "", int: 0, float: 0.0, bool: False}.get(tp)
+
+
+def fake_dict(cls: type, **overrides: Any) -> Dict[str, Any]:
+    # Every field of a kit dataclass present, as the real backend sends it; blanks for what isn't given
+    d = {}
+    for name, tp in get_type_hints(cls).items():
+        f = cls.__dataclass_fields__[name]
+        if f.default is not dataclasses.MISSING:
+            d[name] = f.default
+        elif f.default_factory is not dataclasses.MISSING:
+            d[name] = f.default_factory()
+        else:
+            d[name] = _blank(tp)
+    d.update(overrides)
+    return d
+
+
+def news(action: str, about: str, payload_id: str, **payload: Any) -> Dict[str, Any]:
+    from flexus_client_kit import ckit_bot_query
+    return fake_dict(ckit_bot_query.FBotThreadsCallsTasks, news_action=action, news_about=about, news_payload_id=payload_id, **payload)
+
+
+def make_persona(persona_id: str, marketable_name: str, marketable_version: int, **kw: Any) -> Dict[str, Any]:
+    from flexus_client_kit import ckit_bot_query
+    return fake_dict(ckit_bot_query.FPersonaOutput, persona_id=persona_id, persona_name=persona_id, persona_marketable_name=marketable_name,
+        persona_marketable_version=marketable_version, persona_setup={}, ws_id="fakews", ws_timezone="UTC", ws_root_group_id="fakegroup",
+        located_fgroup_id="fakegroup", owner_fuser_id="fakeuser", persona_created_ts=time.time(), **kw)
+
+
+def make_thread(ft_id: str, persona_id: str, **kw: Any) -> Dict[str, Any]:
+    from flexus_client_kit import ckit_ask_model
+    return fake_dict(ckit_ask_model.FThreadOutput, ft_id=ft_id, ft_persona_id=persona_id, owner_fuser_id="fakeuser", ft_toolset=[],
+        ft_created_ts=time.time(), ft_updated_ts=time.time(), **kw)
+
+
+def make_message(ft_id: str, num: int, content: str, role: str = "user", **kw: Any) -> Dict[str, Any]:
+    from flexus_client_kit import ckit_ask_model
+    return fake_dict(ckit_ask_model.FThreadMessageOutput, ftm_belongs_to_ft_id=ft_id, ftm_role=role, ftm_content=content, ftm_num=num,
+        ftm_alt=100, ftm_prev_alt=100, ftm_created_ts=time.time(), **kw)
+
+
+def make_toolcall(fcall_id: str, name: str, arguments: Dict[str, Any], persona_id: Optional[str] = None, ft_id: str = "", **kw: Any) -> Dict[str, Any]:
+    from flexus_client_kit import ckit_cloudtool
+    return fake_dict(ckit_cloudtool.FCloudtoolCall, fcall_id=fcall_id, fcall_name=name, fcall_arguments=json.dumps(arguments),
+        connected_persona_id=persona_id, fcall_ft_id=ft_id, fcall_untrusted_key="untrusted-" + fcall_id, ws_id="fakews",
+        located_fgroup_id="fakegroup", caller_fuser_id="fakeuser", fcall_ftm_alt=100, fcall_created_ts=time.time(), **kw)
+
+
+# ---- backend ----
+
+@functools.lru_cache(maxsize=1024)
+def _parse(query: str, operation_name: Optional[str]) -> Tuple[str, List[Tuple[str, str, Any]]]:
+    doc = graphql.parse(query)
+    ops = [d for d in doc.definitions if isinstance(d, graphql.OperationDefinitionNode)]
+    op = next((o for o in ops if operation_name and o.name and o.name.value == operation_name), ops[0])
+    fields = [(f.alias.value if f.alias else f.name.value, f.name.value, f) for f in op.selection_set.selections]
+    return op.operation.value, fields
+
+
+def _args(node: Any, variables: Dict[str, Any]) -> Dict[str, Any]:
+    return {a.name.value: graphql.value_from_ast_untyped(a.value, variables) for a in node.arguments}
+
+
+@dataclass
+class _Subscriber:
+    sub_id: str
+    field: str
+    alias: str
+    args: Dict[str, Any]
+    ws: Any
+    q: "asyncio.Queue[Tuple[Any, float]]" = field(default_factory=asyncio.Queue)   # (event, monotonic time it's due)
+    sent: int = 0
+    task: Optional[asyncio.Task] = None
+
+
+Resolver = Callable[[Dict[str, Any], Dict[str, Any]], Union[Any, Awaitable[Any]]]
+
+
+class FakeFlexusBackend:
+    def __init__(self, *, latency: Optional[Dict[str, Latency]] = None, faults: Optional[Faults] = None, seed: int = 0, record_path: str = ""):
+        self.latency = latency or {}      # top-level field name -> Latency, "*" for the rest
+        self.faults = faults or Faults()
+        self.rnd = random.Random(seed)
+        self.resolvers: Dict[str, Resolver] = {
+            "cloudtool_post_result": self._post_result,
+            "cloudtool_confirm_exists": lambda args, ctx: True,
+            "bot_confirm_exists": lambda args, ctx: True,
+        }
+        self.calls: Dict[str, int] = defaultdict(int)    # top-level field -> times resolved
+        self.unknown: Dict[str, int] = defaultdict(int)  # fields nobody resolves, answered with null
+        self.http_requests = 0
+        self.ws_events = 0
+        self.subscribers: Dict[str, List[_Subscriber]] = defaultdict(list)
+        self._subscribed = asyncio.Event()
+        self.personas: Dict[str, Dict[str, Any]] = {}
+        self.threads: Dict[str, Dict[str, Any]] = {}
+        self.results: Dict[str, Dict[str, Any]] = {}     # fcall_id -> CloudtoolResultInput
+        self.result_ts: Dict[str, float] = {}
+        self._result_waiters: Dict[str, asyncio.Future] = {}
+        self.recorder = ckit_utils.SubscriptionRecorder(record_path) if record_path else None
+        self._loads = 0
+        self._runner = None
+
+    # -- lifecycle --
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        from aiohttp import web
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/graphql", self._http)
+        app.router.add_get("/v1/graphql", self._ws)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{self.port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        self.complete_all()
+        for subs in self.subscribers.values():
+            for s in subs:
+                if s.task:
+                    s.task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+        if self.recorder:
+            self.recorder.close()
+
+    # -- graphql --
+
+    def latency_for(self, field_name: str) -> float:
+        lat = self.latency.get(field_name) or self.latency.get("*")
+        return lat.sample(self.rnd) if lat else 0.0
+
+    async def execute(self, query: str, variables: Dict[str, Any], ctx: Dict[str, Any], operation_name: Optional[str] = None) -> Dict[str, Any]:
+        _, fields = _parse(query, operation_name)
+        data: Dict[str, Any] = {}
+        errors: List[Dict[str, Any]] = []
+        for alias, name, node in fields:
+            self.calls[name] += 1
+            fn = self.resolvers.get(name)
+            if fn is None:
+                self.unknown[name] += 1
+                data[alias] = None
+                continue
+            if self.faults.graphql_error and self.rnd.random() < self.faults.graphql_error:
+                errors.append({"message": "500 fake backend: injected error", "path": [alias]})
+                data[alias] = None
+                continue
+            try:
+                v = fn(_args(node, variables), ctx)
+                if asyncio.iscoroutine(v):
+                    v = await v
+                data[alias] = v
+            except FakeGraphQLError as e:
+                errors.append({"message": str(e), "path": [alias]})
+                data[alias] = None
+        out: Dict[str, Any] = {"data": data}
+        if errors:
+            out["errors"] = errors
+        return out
+
+    async def _http(self, request):
+        from aiohttp import web
+        self.http_requests += 1
+        body = await request.json()
+        f = self.faults
+        if f.http_5xx and self.rnd.random() < f.http_5xx:
+            return web.Response(status=502, text="502 Bad Gateway (fake)")   # from the proxy, not GraphQL
+        if f.http_429 and self.rnd.random() < f.http_429:
+            return web.Response(status=429, text="429 Too Many Requests (fake)", headers={"Retry-After": "1"})
+        _, fields = _parse(body["query"], body.get("operationName"))
+        delay = max([self.latency_for(name) for _, name, _ in fields] or [0.0])
+        if delay:
+            await asyncio.sleep(delay)
+        return web.json_response(await self.execute(body["query"], body.get("variables") or {}, dict(request.headers), body.get("operationName")))
+
+    def _post_result(self, args: Dict[str, Any], ctx: Dict[str, Any]) -> bool:
+        inp = args["input"]
+        fcall_id = inp["fcall_id"]
+        self.results[fcall_id] = inp
+        self.result_ts[fcall_id] = time.perf_counter()
+        if (fut := self._result_waiters.pop(fcall_id, None)) and not fut.done():
+            fut.set_result(inp)
+        return True
+
+    async def wait_result(self, fcall_id: str, timeout: float = 10.0) -> Dict[str, Any]:
+        if fcall_id in self.results:
+            return self.results[fcall_id]
+        fut = self._result_waiters.setdefault(fcall_id, asyncio.get_running_loop().create_future())
+        return await asyncio.wait_for(asyncio.shield(fut), timeout)
+
+    # -- subscriptions --
+
+    async def _ws(self, request):
+        from aiohttp import web, WSMsgType
+        ws = web.WebSocketResponse(protocols=(WS_PROTOCOL,), max_msg_size=16 * 1024 * 1024)
+        await ws.prepare(request)
+        ctx: Dict[str, Any] = {}
+        mine: Dict[str, _Subscriber] = {}
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    break
+                m = json.loads(msg.data)
+                t = m.get("type")
+                if t == "connection_init":
+                    ctx = m.get("payload") or {}
+                    await ws.send_json({"type": "connection_ack"})
+                elif t == "ping":
+                    await ws.send_json({"type": "pong"})
+                elif t == "subscribe":
+                    p = m["payload"]
+                    op, fields = _parse(p["query"], p.get("operationName"))
+                    if op != "subscription":
+                        out = await self.execute(p["query"], p.get("variables") or {}, ctx, p.get("operationName"))
+                        await ws.send_json({"id": m["id"], "type": "next", "payload": out})
+                        await ws.send_json({"id": m["id"], "type": "complete"})
+                        continue
+                    alias, name, node = fields[0]
+                    s = _Subscriber(m["id"], name, alias, _args(node, p.get("variables") or {}), ws)
+                    mine[s.sub_id] = s
+                    for ev in self._initial_events(s):
+                        s.q.put_nowait((ev, 0.0))
+                    s.task = asyncio.create_task(self._pump(s))
+                    self.subscribers[name].append(s)
+                    self._subscribed.set()
+                elif t == "complete":
+                    if s := mine.pop(m["id"], None):
+                        self._unsubscribe(s)
+        finally:
+            for s in mine.values():
+                self._unsubscribe(s)
+        return ws
+
+    def _unsubscribe(self, s: _Subscriber) -> None:
+        if s in self.subscribers[s.field]:
+            self.subscribers[s.field].remove(s)
+        if s.task and s.task is not asyncio.current_task():
+            s.task.cancel()
+
+    def _initial_events(self, s: _Subscriber) -> List[Any]:
+        # What the real backend sends right after a bot subscribes: its personas, their threads, then the marker
+        if s.field != BOT_SUBS:
+            return []
+        mname = s.args.get("marketable_name")
+        evs = [news("INSERT", "flexus_persona", pid, news_payload_persona=p) for pid, p in self.personas.items() if p["persona_marketable_name"] == mname]
+        pids = {p["persona_id"] for p in self.personas.values() if p["persona_marketable_name"] == mname}
+        evs += [news("INSERT", "flexus_thread", tid, news_payload_thread=t) for tid, t in self.threads.items() if t["ft_persona_id"] in pids]
+        evs.append(news("INITIAL_UPDATES_OVER", "", ""))
+        return evs
+
+    async def _pump(self, s: _Subscriber) -> None:
+        try:
+            while True:
+                ev, due = await s.q.get()
+                if ev is _COMPLETE:
+                    # Not a "complete" message: gql sets its keep-alive event on it, and closing right after that
+                    # loses the cancel in asyncio.wait_for on 3.11, hanging the client close for keep_alive_timeout
+                    await s.ws.close(code=1001, message=b"fake backend: going away")
+                    break
+                if (wait := due - time.monotonic()) > 0:   # latency is a delay per event, pipelined like the real thing
+                    await asyncio.sleep(wait)
+                await s.ws.send_str(json.dumps({"id": s.sub_id, "type": "next", "payload": {"data": {s.alias: ev}}}))
+                s.sent += 1
+                self.ws_events += 1
+                if self.faults.ws_drop_after and s.sent >= self.faults.ws_drop_after:
+                    await s.ws.close(code=1011, message=b"fake backend: injected disconnect")
+                    break
+        except (ConnectionResetError, RuntimeError):
+            pass
+        finally:
+            self._unsubscribe(s)
+
+    async def wait_subscribed(self, field_name: str, timeout: float = 10.0) -> None:
+        t0 = time.monotonic()
+        while not self.subscribers[field_name]:
+            self._subscribed.clear()
+            await asyncio.wait_for(self._subscribed.wait(), max(timeout - (time.monotonic() - t0), 0.01))
+
+    def publish(self, field_name: str, event: Dict[str, Any], match: Optional[Callable[[Dict[str, Any]], bool]] = None) -> int:
+        if self.recorder:
+            self.recorder.write({field_name: event})
+        n = 0
+        for s in self.subscribers[field_name]:
+            if match is None or match(s.args):
+                s.q.put_nowait((event, time.monotonic() + self.latency_for(field_name)))
+                n += 1
+        return n
+
+    def complete_all(self, field_name: Optional[str] = None) -> None:
+        # Ends the subscriptions like a backend restart would, the websocket closes and clients see TransportClosed
+        for name, subs in self.subscribers.items():
+            if field_name is None or name == field_name:
+                for s in subs:
+                    s.q.put_nowait((_COMPLETE, 0.0))
+
+    # -- state and traffic --
+
+    def add_persona(self, persona: Dict[str, Any]) -> None:
+        # Added before a bot subscribes, personas come in its initial updates; after, as news
+        self.personas[persona["persona_id"]] = persona
+        self.publish(BOT_SUBS, news("INSERT", "flexus_persona", persona["persona_id"], news_payload_persona=persona),
+            lambda args: args.get("marketable_name") == persona["persona_marketable_name"])
+
+    def add_thread(self, thread: Dict[str, Any]) -> None:
+        self.threads[thread["ft_id"]] = thread
+        self.publish(BOT_SUBS, news("INSERT", "flexus_thread", thread["ft_id"], news_payload_thread=thread))
+
+    def add_message(self, message: Dict[str, Any]) -> None:
+        self.publish(BOT_SUBS, news("INSERT", "flexus_thread_message", "%s:%d" % (message["ftm_belongs_to_ft_id"], message["ftm_num"]), news_payload_thread_message=message))
+
+    def call_tool(self, call: Dict[str, Any]) -> int:
+        # In a bot if connected_persona_id is set, otherwise in whichever cloudtool service has this tool name
+        if call.get("connected_persona_id"):
+            return self.publish(BOT_SUBS, news("CALL", "flexus_tool_call", call["fcall_id"], news_payload_toolcall=call))
+        return self.publish(CLOUDTOOL_SUBS, call, lambda args: call["fcall_name"] in (args.get("tool_names") or []))
+
+    async def replay(self, path: str, speed: float = 1.0) -> int:
+        # speed=0 sends as fast as the subscribers take it; waits for a subscriber to the first field it sees
+        with open(path) as f:
+            lines = [json.loads(x) for x in f if x.strip()]
+        if not lines:
+            return 0
+        await self.wait_subscribed(lines[0]["field"])
+        t0 = time.monotonic()
+        for rec in lines:
+            if speed:
+                wait = rec["t"] / speed - (time.monotonic() - t0)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            self.publish(rec["field"], rec["event"])
+        return len(lines)
+
+    def populate(self, sc: LoadScenario) -> List[Tuple[str, str]]:
+        # The scenario's personas and threads, [(ft_id, persona_id)], adding the ones not there yet
+        threads: List[Tuple[str, str]] = []
+        if sc.target != "bot":
+            return [("fakethread%d" % i, "") for i in range(max(sc.personas * sc.threads_per_persona, 1))]
+        for i in range(sc.personas):
+            pid = "fakepersona%d" % i
+            if pid not in self.personas:
+                self.add_persona(make_persona(pid, sc.marketable_name, sc.marketable_version))
+            for j in range(sc.threads_per_persona):
+                ft_id = "fakethread%d_%d" % (i, j)
+                if ft_id not in self.threads:
+                    self.add_thread(make_thread(ft_id, pid))
+                threads.append((ft_id, pid))
+        return threads
+
+    async def run_load(self, sc: LoadScenario) -> LoadReport:
+        http0, ws0 = self.http_requests, self.ws_events
+        self._loads += 1
+        threads = self.populate(sc)
+        await self.wait_subscribed(BOT_SUBS if sc.target == "bot" else CLOUDTOOL_SUBS)
+
+        total = int(sc.toolcalls_per_s * sc.seconds)
+        sent_ts: Dict[str, float] = {}
+        t_start = time.perf_counter()
+        for n in range(total):
+            due = t_start + n / sc.toolcalls_per_s
+            if (wait := due - time.perf_counter()) > 0:
+                await asyncio.sleep(wait)
+            ft_id, pid = threads[n % len(threads)]
+            for k in range(sc.messages_per_call):
+                self.add_message(make_message(ft_id, n * (sc.messages_per_call + 1) + k, "message %d" % n))
+            fcall_id = "fakecall%d_%d" % (self._loads, n)
+            sent_ts[fcall_id] = time.perf_counter()
+            self.call_tool(make_toolcall(fcall_id, sc.tool_name, {"n": n}, persona_id=pid or None, ft_id=ft_id))
+
+        deadline = time.monotonic() + sc.drain_timeout
+        pending = set(sent_ts)
+        while pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+            pending = {c for c in pending if c not in self.result_ts}
+        lat = sorted(self.result_ts[c] - t0 for c, t0 in sent_ts.items() if c in self.result_ts)
+        last = max((self.result_ts[c] for c in sent_ts if c in self.result_ts), default=time.perf_counter())
+        elapsed = last - t_start
+
+        def pct(p: float) -> float:
+            return lat[min(int(len(lat) * p), len(lat) - 1)] * 1000 if lat else float("nan")
+
+        return LoadReport(
+            sent=total,
+            completed=len(lat),
+            seconds=elapsed,
+            throughput=len(lat) / elapsed if elapsed > 0 else 0.0,
+            p50_ms=pct(0.5),
+            p99_ms=pct(0.99),
+            max_ms=lat[-1] * 1000 if lat else float("nan"),
+            http_requests=self.http_requests - http0,
+            ws_events=self.ws_events - ws0,
+        )
+
+
+# ---- benchmarks ----
+
+async def bench_graphql_roundtrip(be: FakeFlexusBackend, n: int = 2000, concurrency: int = 20) -> Dict[str, float]:
+    # The pattern all over the kit: a client per call from use_http_on_behalf(), one mutation, closed again
+    import gql
+    from flexus_client_kit import ckit_client
+    fclient = ckit_client.FlexusClient("fake_bench", api_key="fx-fake", base_url=be.base_url, skip_logger_init=True)
+    q = gql.gql("mutation BenchConfirm($n: Int!) { bot_confirm_exists(n: $n) }")
+    lat: List[float] = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with sem:
+            t0 = time.perf_counter()
+            async with (await fclient.use_http_on_behalf(None, "")) as http:
+                await http.execute(q, variable_values={"n": i})
+            lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(n)])
+    took = time.perf_counter() - t0
+    lat.sort()
+    return {"throughput": n / took, "p50_ms": lat[len(lat) // 2] * 1000, "p99_ms": lat[int(len(lat) * 0.99)] * 1000}
+
+
+async def bench_cloudtool(be: FakeFlexusBackend, sc: LoadScenario) -> LoadReport:
+    from flexus_client_kit import ckit_cloudtool, ckit_shutdown
+    os.environ["FLEXUS_API_KEY"] = "fx-fake"
+    os.environ["FLEXUS_API_BASEURL"] = be.base_url
+    tool = ckit_cloudtool.CloudTool(strict=False, name=sc.tool_name, description="fake", parameters={"type": "object", "properties": {"n": {"type": "integer"}}})
+
+    async def fn(fclient, call, args):
+        return json.dumps("ok %d" % args["n"]), json.dumps({"system": "fake_cloudtool"})
+
+    svc = asyncio.create_task(ckit_cloudtool.run_cloudtool_service("fake_cloudtool", "/v1/graphql", False, [tool], fn, max_tasks=256))
+    try:
+        return await be.run_load(dataclasses.replace(sc, target="cloudtool"))
+    finally:
+        ckit_shutdown.shutdown_event.set()
+        be.complete_all(CLOUDTOOL_SUBS)
+        await asyncio.wait_for(svc, 10)
+        ckit_shutdown.shutdown_event.clear()
+
+
+async def bench_bot(be: FakeFlexusBackend, sc: LoadScenario) -> LoadReport:
+    import gql.transport.exceptions
+    from flexus_client_kit import ckit_bot_exec, ckit_client, ckit_cloudtool, ckit_shutdown
+    tool = ckit_cloudtool.CloudTool(strict=False, name=sc.tool_name, description="fake", parameters={"type": "object", "properties": {"n": {"type": "integer"}}})
+
+    async def main_loop(fclient, rcx):
+        @rcx.on_tool_call(sc.tool_name)
+        async def toolcall(toolcall, args):
+            return "ok %d" % args["n"]
+
+        while not ckit_shutdown.shutdown_event.is_set():
+            await rcx.unpark_collected_events(sleep_if_no_work=10.0)
+
+    fclient = ckit_client.FlexusClient(sc.marketable_name + "_bench", api_key="fx-fake", base_url=be.base_url, skip_logger_init=True)
+    fclient.group_id = "fakegroup"
+    be.populate(dataclasses.replace(sc, target="bot"))
+    bc = ckit_bot_exec.BotsCollection("", sc.marketable_name, sc.marketable_version, [tool], main_loop)
+    subs = asyncio.create_task(ckit_bot_exec.subscribe_and_produce_callbacks(fclient, await fclient.use_ws(), bc))
+    try:
+        return await be.run_load(dataclasses.replace(sc, target="bot"))
+    finally:
+        be.complete_all(BOT_SUBS)
+        try:
+            await asyncio.wait_for(subs, 10)
+        except gql.transport.exceptions.TransportError:
+            pass
+        await ckit_bot_exec.shutdown_bots(bc)
+
+
+async def run_benchmarks(quick: bool) -> Dict[str, Dict[str, float]]:
+    secs = 2.0 if quick else 5.0
+    results: Dict[str, Dict[str, float]] = {}
+
+    async def with_backend(name: str, coro_fn, **kw):
+        be = FakeFlexusBackend(**kw)
+        await be.start()
+        try:
+            r = await coro_fn(be)
+        finally:
+            await be.stop()
+        d = dataclasses.asdict(r) if dataclasses.is_dataclass(r) else r
+        results[name] = {k: round(v, 3) if isinstance(v, float) else v for k, v in d.items()}
+        print("%-34s %s" % (name, r if dataclasses.is_dataclass(r) else ", ".join("%s %.1f" % kv for kv in d.items())), flush=True)
+
+    await with_backend("graphql_roundtrip", lambda be: bench_graphql_roundtrip(be, n=500 if quick else 2000))
+    await with_backend("cloudtool_200_per_s", lambda be: bench_cloudtool(be, LoadScenario(toolcalls_per_s=200, seconds=secs)))
+    await with_backend("bot_10p_5t_200_per_s", lambda be: bench_bot(be, LoadScenario(personas=10, threads_per_persona=5, toolcalls_per_s=200, seconds=secs, messages_per_call=2)))
+    await with_backend("bot_50p_2t_500_per_s", lambda be: bench_bot(be, LoadScenario(personas=50, threads_per_persona=2, toolcalls_per_s=500, seconds=secs)))
+    await with_backend("bot_200_per_s_backend_20ms", lambda be: bench_bot(be, LoadScenario(toolcalls_per_s=200, seconds=secs)),
+        latency={"*": Latency(base=0.02, jitter=0.01, tail_p=0.01, tail=0.2)})
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], path: str) -> None:
+    # Appends this run to a JSON lines file and prints the change against the previous run in it
+    prev = None
+    if os.path.exists(path):
+        with open(path) as f:
+            lines = [x for x in f if x.strip()]
+        if lines:
+            prev = json.loads(lines[-1])["results"]
+    if prev:
+        for name, r in results.items():
+            p = prev.get(name)
+            if not p:
+                continue
+            diffs = []
+            for k in ("throughput", "p99_ms"):
+                if p.get(k) and r.get(k) is not None:
+                    diffs.append("%s %+.0f%%" % (k, (r[k] - p[k]) / p[k] * 100))
+            print("%-34s vs previous: %s" % (name, ", ".join(diffs)))
+    with open(path, "a") as f:
+        f.write(json.dumps({"ts": time.time(), "python": sys.version.split()[0], "results": results}) + "\n")
+
+
+if __name__ == "__main__":
+    import argparse
+    from flexus_client_kit import ckit_logs
+    parser = argparse.ArgumentParser(description="Throughput and p99 of the kit's hot paths against an in-process fake backend")
+    parser.add_argument("--quick", action="store_true", help="2 second scenarios instead of 5")
+    parser.add_argument("--out", default="", help="append results to this JSON lines file and compare with the previous run there")
+    args = parser.parse_args()
+    ckit_logs.setup_logger()
+    logging.getLogger().setLevel(logging.WARNING)
+    res = asyncio.run(run_benchmarks(args.quick))
+    if args.out:
+        compare(res, args.out)
@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import gql
+import gql.transport.exceptions
+
+from flexus_client_kit import ckit_client
+from flexus_client_kit import ckit_shutdown
+from flexus_client_kit import ckit_utils
+
+logger = logging.getLogger("hbeat")
+
+
+# One heartbeat loop per process: every cloudtool and bot group registers here, and each interval all of them
+# that share a FlexusClient are confirmed in a single aliased mutation over one HTTP request:
+#
+#   mutation Heartbeat($h0_tool_name: String!, ..., $h1_marketable_name: String!, ...) {
+#       h0: cloudtool_confirm_exists(tool_name: $h0_tool_name, ...)
+#       h1: bot_confirm_exists(marketable_name: $h1_marketable_name, ...)
+#   }
+#
+# New registrations are flushed almost immediately (the backend learns tool descriptions from these calls),
+# after that everything rides the shared timer with jitter, so a fleet of processes doesn't beat in lockstep.
+
+
+HEARTBEAT_INTERVAL = 120.0
+HEARTBEAT_JITTER = 0.1          # fraction of the interval, +-
+HEARTBEAT_RETRY = 60.0          # after a failed batch
+HEARTBEAT_COALESCE = 0.2        # wait this long after a registration so a burst of them goes out together
+HEARTBEAT_MAX_FIELDS = 100      # per request
+
+
+@dataclass
+class HeartbeatFailure:
+    keys: List[str]
+    error: BaseException
+    auth_problem: bool          # 403, retrying won't help until the key changes
+
+
+@dataclass
+class _Entry:
+    key: str
+    fclient: ckit_client.FlexusClient
+    mutation: str                                   # "cloudtool_confirm_exists" or "bot_confirm_exists"
+    args: Dict[str, Tuple[str, Any]]                # arg name -> (graphql type, value)
+    due: float = 0.0
+    failures: int = 0
+    refs: int = 1                                   # registrations with this key, it beats until the last one goes
+
+
+def _default_on_failure(f: HeartbeatFailure) -> None:
+    if f.auth_problem:
+        # It's gql.transport.exceptions.TransportQueryError with {'message': "403: Whoops your key didn't work (1).", ...}
+        # Unfortunately, no separate exception class for 403
+        logger.error("That looks bad, my key doesn't work: %s (%s)", f.error, ", ".join(f.keys))
+    else:
+        logger.info("heartbeat connection problem, %d keys: %s %s", len(f.keys), type(f.error).__name__, f.error)
+
+
+class HeartbeatService:
+    def __init__(
+        self,
+        interval: float = HEARTBEAT_INTERVAL,
+        jitter: float = HEARTBEAT_JITTER,
+        on_failure: Optional[Callable[[HeartbeatFailure], None]] = None,
+    ):
+        self.interval = interval
+        self.jitter = jitter
+        self.on_failure = on_failure or _default_on_failure
+        self.entries: Dict[str, _Entry] = {}
+        self.requests_sent = 0
+        self.fields_sent = 0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, key: str, fclient: ckit_client.FlexusClient, mutation: str, args: Dict[str, Tuple[str, Any]]) -> str:
+        # Each register() needs its own unregister(), two bot groups or tool loops with the same key share one heartbeat
+        old = self.entries.get(key)
+        self.entries[key] = _Entry(key=key, fclient=fclient, mutation=mutation, args=args, due=0.0, refs=old.refs + 1 if old else 1)
+        self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            self._task.add_done_callback(lambda t: ckit_utils.report_crash(t, logger))
+        return key
+
+    def unregister(self, key: str) -> None:
+        e = self.entries.get(key)
+        if e is None:
+            return
+        e.refs -= 1
+        if e.refs <= 0:
+            del self.entries[key]
+            self._wake.set()
+
+    def _next_interval(self) -> float:
+        return self.interval * (1.0 + random.uniform(-self.jitter, self.jitter))
+
+    async def _loop(self) -> None:
+        try:
+            while self.entries and not ckit_shutdown.shutdown_event.is_set():
+                now = time.monotonic()
+                due = [e for e in self.entries.values() if e.due <= now]
+                if due:
+                    await asyncio.sleep(HEARTBEAT_COALESCE)
+                    now = time.monotonic()
+                    due = [e for e in self.entries.values() if e.due <= now]
+                    await self.beat(due)
+                    continue
+                self._wake.clear()
+                sleep = min(e.due for e in self.entries.values()) - now
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=sleep)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._task = None
+
+    async def beat(self, entries: List[_Entry]) -> None:
+        by_client: Dict[int, List[_Entry]] = {}
+        for e in entries:
+            by_client.setdefault(id(e.fclient), []).append(e)
+        for group in by_client.values():
+            for i in range(0, len(group), HEARTBEAT_MAX_FIELDS):
+                await self._send(group[i:i + HEARTBEAT_MAX_FIELDS])
+
+    async def _send(self, batch: List[_Entry]) -> None:
+        decls, fields, variables = [], [], {}
+        for n, e in enumerate(batch):
+            call_args = []
+            for arg, (gql_type, value) in e.args.items():
+                var = f"h{n}_{arg}"
+                decls.append(f"${var}: {gql_type}")
+                call_args.append(f"{arg}: ${var}")
+                variables[var] = value
+            fields.append(f"h{n}: {e.mutation}({', '.join(call_args)})")
+        doc = "mutation Heartbeat(%s) {\n    %s\n}" % (", ".join(decls), "\n    ".join(fields))
+        failed: Dict[int, BaseException] = {}
+        try:
+            http_client = await batch[0].fclient.use_http_on_behalf(None, "")
+            async with http_client as http:
+                await http.execute(gql.gql(doc), variable_values=variables)
+        except gql.transport.exceptions.TransportQueryError as e:
+            # One aliased field failing doesn't fail its neighbours: errors come with path ["h3"]. An error without
+            # a path (403 and the like) is about the whole request.
+            paths = [(err.get("path") or [None])[0] for err in (e.errors or [])]
+            if paths and all(isinstance(a, str) and re.fullmatch(r"h\d+", a) for a in paths):
+                for a, err in zip(paths, e.errors):
+                    failed[int(a[1:])] = gql.transport.exceptions.TransportQueryError(str(err.get("message", err)), errors=[err])
+            else:
+                failed = {n: e for n in range(len(batch))}
+        except Exception as e:
+            # not only transport problems: a bug here must not end the loop, heartbeats would silently stop forever
+            failed = {n: e for n in range(len(batch))}
+        if len(failed) < len(batch):
+            self.requests_sent += 1
+            self.fields_sent += len(batch) - len(failed)
+        next_due = time.monotonic() + self._next_interval()
+        retry_at = time.monotonic() + HEARTBEAT_RETRY
+        by_error: Dict[int, Tuple[BaseException, List[str]]] = {}
+        for n, entry in enumerate(batch):
+            if n in failed:
+                entry.failures += 1
+                entry.due = retry_at
+                by_error.setdefault(id(failed[n]), (failed[n], []))[1].append(entry.key)
+            else:
+                entry.failures = 0
+                entry.due = next_due
+        for e, keys in by_error.values():
+            try:
+                self.on_failure(HeartbeatFailure(keys=keys, error=e, auth_problem="403:" in str(e)))
+            except Exception as cb_err:
+                logger.error("heartbeat on_failure callback crashed: %s", cb_err, exc_info=cb_err)
+        if not failed:
+            logger.debug("heartbeat ok, %d keys in one request", len(batch))
+
+_service: Optional[HeartbeatService] = None
+_service_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_service() -> HeartbeatService:
+    global _service, _service_loop
+    loop = asyncio.get_running_loop()
+    if _service is None or _service_loop is not loop:
+        _service = HeartbeatService()
+        _service_loop = loop
+    return _service
+
+
+def set_failure_callback(cb: Optional[Callable[[HeartbeatFailure], None]]) -> None:
+    get_service().on_failure = cb or _default_on_failure
+
+
+def register(key: str, fclient: ckit_client.FlexusClient, mutation: str, args: Dict[str, Tuple[str, Any]]) -> str:
+    return get_service().register(key, fclient, mutation, args)
+
+
+def unregister(key: str) -> None:
+    if _service is not None:
+        _service.unregister(key)
+
+
+if __name__ == "__main__":
+    from aiohttp import web
+
+    async def stub_backend_test():
+        seen: List[dict] = []
+        broken_tools = set()
+
+        async def graphql(request):
+            body = await request.json()
+            seen.append(body)
+            n = body["query"].count("_confirm_exists(")
+            bad = [i for i in range(n) if body["variables"].get(f"h{i}_tool_name") in broken_tools]
+            data = {f"h{i}": None if i in bad else True for i in range(n)}
+            if bad:
+                return web.json_response({"data": data, "errors": [{"message": "no such tool", "path": [f"h{i}"]} for i in bad]})
+            return web.json_response({"data": data})
+
+        app = web.Application()
+        app.router.add_post("/v1/graphql", graphql)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        fclient = ckit_client.FlexusClient("hbeat_test", api_key="fx-bench", base_url=f"http://127.0.0.1:{port}", skip_logger_init=True)
+
+        svc = get_service()
+        svc.interval = 0.5
+        for i in range(40):
+            register(f"tool:t{i}", fclient, "cloudtool_confirm_exists", {
+                "tool_name": ("String!", f"t{i}"),
+                "ctool_description": ("String!", "desc"),
+                "shared": ("Boolean!", True),
+            })
+        register("bot:b", fclient, "bot_confirm_exists", {
+            "marketable_name": ("String!", "b"),
+            "marketable_version": ("Int!", 1),
+        })
+        await asyncio.sleep(1.4)
+        print(f"41 registrations -> {len(seen)} requests in 1.4s at interval 0.5s, fields per request {[q['query'].count('_confirm_exists(') for q in seen]}")
+        assert all(q["query"].count("_confirm_exists(") == 41 for q in seen) and 2 <= len(seen) <= 4
+
+        failures: List[HeartbeatFailure] = []
+        set_failure_callback(failures.append)
+
+        def beat_all_now():
+            for e in svc.entries.values():
+                e.due = 0.0
+            svc._wake.set()
+
+        broken_tools.add("t7")
+        beat_all_now()
+        await asyncio.sleep(0.4)
+        print("one broken field ->", [f.keys for f in failures], failures[0].error)
+        assert [f.keys for f in failures] == [["tool:t7"]]
+        assert [k for k, e in svc.entries.items() if e.failures] == ["tool:t7"]
+        broken_tools.clear()
+        failures.clear()
+
+        real_use_http = fclient.use_http_on_behalf
+        async def boom(*args):
+            raise KeyError("surprise")
+        fclient.use_http_on_behalf = boom
+        beat_all_now()
+        await asyncio.sleep(0.4)
+        print("unexpected exception ->", type(failures[0].error).__name__, len(failures[0].keys), "keys, loop alive:", svc._task is not None)
+        assert len(failures[0].keys) == 41 and svc._task is not None and not svc._task.done()
+        fclient.use_http_on_behalf = real_use_http
+        failures.clear()
+
+        await runner.cleanup()
+        beat_all_now()
+        await asyncio.sleep(0.5)
+        print("backend down ->", failures[0].keys[:3], "...", type(failures[0].error).__name__)
+        assert failures and not failures[0].auth_problem
+
+        register("bot:b", fclient, "bot_confirm_exists", {"marketable_name": ("String!", "b"), "marketable_version": ("Int!", 1)})
+        unregister("bot:b")
+        assert "bot:b" in svc.entries, "the first registration of bot:b still needs it"
+        for k in list(svc.entries):
+            unregister(k)
+        await asyncio.sleep(0.1)
+        assert svc._task is None
+
+    asyncio.run(stub_backend_test())
@@ -0,0 +1,384 @@
+import asyncio
+import collections
+import email.utils
+import importlib.util
+import logging
+import random
+import socket
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from flexus_client_kit import ckit_metrics
+
+logger = logging.getLogger("ckit_http")
+
+
+# Shared HTTP layer for REST integrations: one pooled client per base URL, token buckets per credential,
+# Retry-After and rate-limit headers honoured, a circuit breaker per base URL, and request/latency metrics.
+#
+# Usage:
+#   r = await ckit_http.get_client("https://api.hubapi.com", rate_limit=ckit_http.RateLimit(10, 100)).request(
+#       "GET", "/crm/v3/objects/contacts", credential_key=token, headers=...)
+#
+# Responses are returned as is (including 4xx and a final 429), integrations keep their own error mapping.
+
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+RETRY_STATUSES = (429, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+BUCKETS_MAX = 10000   # per client, token buckets and per-credential breakers, least recently used forgotten first
+
+
+@dataclass
+class RateLimit:
+    rate: float    # sustained requests per second
+    burst: float   # bucket size
+
+
+class CircuitOpenError(httpx.TransportError):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rl: RateLimit):
+        self.rate = rl.rate
+        self.burst = rl.burst
+        self.tokens = rl.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, cost: float = 1.0) -> float:
+        # cost is for quota-unit APIs (Gmail: a send is 100 units, a get is 5), never more than a full bucket
+        cost = min(cost, self.burst)
+        waited = 0.0
+        async with self._lock:   # FIFO among waiters for the same credential
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = max(self.paused_until - now, 0.0)
+                if wait == 0.0:
+                    if self.tokens >= cost:
+                        self.tokens -= cost
+                        return waited
+                    wait = (cost - self.tokens) / self.rate
+                await asyncio.sleep(wait)
+                waited += wait
+
+    def pause(self, seconds: float) -> None:
+        # Provider told us to back off, nobody using this credential should send anything until then
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_ts = 0.0
+        self.probing = False
+
+    def allow(self) -> bool:
+        if self.failures < self.failure_threshold:
+            return True
+        # Half-open: once reset_timeout has passed exactly one probe goes through, everyone else is rejected until
+        # its result closes the circuit or re-opens it for another period
+        if self.probing or time.monotonic() - self.opened_ts < self.reset_timeout:
+            return False
+        self.probing = True
+        return True
+
+    def abandon_probe(self) -> None:
+        # The request got cancelled or failed with no answer about the server, let the next one probe
+        self.probing = False
+
+    def record(self, ok: bool) -> None:
+        self.probing = False
+        if ok:
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_ts = time.monotonic()
+
+
+@dataclass
+class HttpMetrics:
+    requests: int = 0
+    responses_2xx: int = 0
+    responses_4xx: int = 0
+    responses_5xx: int = 0
+    transport_errors: int = 0
+    throttled: int = 0
+    retries: int = 0
+    circuit_rejects: int = 0
+    bucket_wait_s: float = 0.0
+    latency_total_s: float = 0.0
+    latency_max_s: float = 0.0
+
+    def observe(self, status: int, latency: float) -> None:
+        self.requests += 1
+        self.latency_total_s += latency
+        self.latency_max_s = max(self.latency_max_s, latency)
+        if status >= 500:
+            self.responses_5xx += 1
+        elif status >= 400:
+            self.responses_4xx += 1
+        else:
+            self.responses_2xx += 1
+
+
+def retry_after_seconds(headers: httpx.Headers) -> Optional[float]:
+    v = headers.get("retry-after")
+    if v:
+        try:
+            return max(float(v), 0.0)
+        except ValueError:
+            try:
+                return max(email.utils.parsedate_to_datetime(v).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    # X-RateLimit-Reset is seconds-until-reset for most providers, a unix timestamp for a few
+    for name in ("x-ratelimit-reset", "x-rate-limit-reset", "ratelimit-reset"):
+        if v := headers.get(name):
+            try:
+                f = float(v)
+            except ValueError:
+                continue
+            return max(f - time.time(), 0.0) if f > 1e9 else max(f, 0.0)
+    return None
+
+
+def quota_exhausted(headers: httpx.Headers) -> bool:
+    for name in ("x-ratelimit-remaining", "x-rate-limit-remaining", "ratelimit-remaining", "x-hubspot-ratelimit-remaining"):
+        if (v := headers.get(name)) is not None and v.strip() == "0":
+            return True
+    if v := headers.get("x-shopify-shop-api-call-limit"):   # "39/40"
+        used, _, total = v.partition("/")
+        if used.strip().isdigit() and total.strip().isdigit() and int(used) >= int(total):
+            return True
+    return False
+
+
+class RateLimitedClient:
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        rate_limit: Optional[RateLimit] = None,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        max_retry_wait: float = 60.0,
+        breaker_failures: int = 5,
+        breaker_reset: float = 30.0,
+        breaker_per_credential: bool = False,
+        follow_redirects: bool = False,
+    ):
+        self.base_url = base_url
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        # For APIs where one customer's credential can fail on its own (Graph API answers 500 for broken ad accounts),
+        # a breaker per credential_key, so one bad token doesn't cut everyone else off
+        self.breaker_per_credential = breaker_per_credential
+        self.breakers: collections.OrderedDict[str, CircuitBreaker] = collections.OrderedDict()
+        self.metrics = HttpMetrics()
+        self.buckets: collections.OrderedDict[str, TokenBucket] = collections.OrderedDict()
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            http2=HTTP2_AVAILABLE,
+            follow_redirects=follow_redirects,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60.0),
+        )
+
+    def _bucket(self, credential_key: str) -> Optional[TokenBucket]:
+        if self.rate_limit is None:
+            return None
+        b = self.buckets.get(credential_key)
+        if b is None:
+            b = self.buckets[credential_key] = TokenBucket(self.rate_limit)
+            while len(self.buckets) > BUCKETS_MAX:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(credential_key)
+        return b
+
+    def _breaker(self, credential_key: str) -> CircuitBreaker:
+        if not self.breaker_per_credential:
+            return self.breaker
+        b = self.breakers.get(credential_key)
+        if b is None:
+            b = self.breakers[credential_key] = CircuitBreaker(self.breaker.failure_threshold, self.breaker.reset_timeout)
+            while len(self.breakers) > BUCKETS_MAX:
+                self.breakers.popitem(last=False)
+        else:
+            self.breakers.move_to_end(credential_key)
+        return b
+
+    async def request(self, method: str, url: str, *, credential_key: str = "", cost: float = 1.0, **kwargs) -> httpx.Response:
+        bucket = self._bucket(credential_key)
+        breaker = self._breaker(credential_key)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                self.metrics.circuit_rejects += 1
+                raise CircuitOpenError(f"circuit open for {self.base_url} after {breaker.failures} consecutive failures")
+            if bucket:
+                self.metrics.bucket_wait_s += await bucket.acquire(cost)
+            t0 = time.monotonic()
+            try:
+                with ckit_metrics.span("http " + method.upper(), base_url=self.base_url, attempt=attempt):   # not the url, query strings carry keys
+                    r = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                self.metrics.transport_errors += 1
+                breaker.record(False)
+                raise
+            except BaseException:
+                breaker.abandon_probe()
+                raise
+            self.metrics.observe(r.status_code, time.monotonic() - t0)
+            breaker.record(r.status_code < 500)
+            # 429 means the request was not processed, safe to resend anything; a 5xx after a POST might have been
+            if r.status_code not in RETRY_STATUSES or (r.status_code != 429 and method.upper() not in IDEMPOTENT_METHODS):
+                if bucket and quota_exhausted(r.headers) and (wait := retry_after_seconds(r.headers)):
+                    bucket.pause(min(wait, self.max_retry_wait))
+                return r
+            if r.status_code == 429:
+                self.metrics.throttled += 1
+            wait = retry_after_seconds(r.headers)
+            if wait is None:
+                wait = min(2 ** attempt, 30) * (0.5 + random.random() / 2)
+            if attempt >= self.max_retries or wait > self.max_retry_wait:
+                return r
+            logger.warning("%s %s got %d, retry in %.1fs (attempt %d)", method, r.request.url, r.status_code, wait, attempt + 1)
+            if bucket and r.status_code == 429:
+                bucket.pause(wait)
+            await r.aclose()
+            await asyncio.sleep(wait)
+            self.metrics.retries += 1
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    def abandon(self) -> None:
+        # For a client whose event loop is gone, aclose() can't run there anymore. Shut the pooled connections down so
+        # the servers see them go now, the file descriptors are freed with the transports.
+        pool = getattr(self.client._transport, "_pool", None)
+        for conn in list(getattr(pool, "connections", [])):
+            stream = getattr(getattr(conn, "_connection", None), "_network_stream", None)
+            sock = stream.get_extra_info("socket") if stream is not None else None
+            if sock is None:
+                continue
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+_clients: Dict[str, Tuple[asyncio.AbstractEventLoop, RateLimitedClient]] = {}
+
+
+def get_client(base_url: str, **kwargs) -> RateLimitedClient:
+    # kwargs only apply when the client is first created, callers sharing a base URL should pass the same ones
+    loop = asyncio.get_running_loop()
+    hit = _clients.get(base_url)
+    if hit and hit[0] is loop:
+        return hit[1]
+    if hit:
+        _discard(*hit)
+    c = RateLimitedClient(base_url, **kwargs)
+    _clients[base_url] = (loop, c)
+    return c
+
+
+def _discard(loop: asyncio.AbstractEventLoop, c: RateLimitedClient) -> None:
+    # A client's connections belong to the loop that created it: close it there if that loop still runs (another
+    # thread), otherwise nothing can await aclose() anymore
+    if loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(c.aclose(), loop)
+    else:
+        c.abandon()
+
+
+def metrics_snapshot() -> Dict[str, dict]:
+    return {base_url: asdict(c.metrics) for base_url, (_, c) in _clients.items()}
+
+
+async def close_all() -> None:
+    for _, c in list(_clients.values()):
+        await c.aclose()
+    _clients.clear()
+
+
+if __name__ == "__main__":
+    from aiohttp import web
+
+    async def mock_server_test():
+        hits = {"throttled": 0, "ok": 0}
+
+        async def throttled(request):
+            if hits["throttled"] < 2:
+                hits["throttled"] += 1
+                return web.json_response({"error": "slow down"}, status=429, headers={"Retry-After": "1"})
+            return web.json_response({"ok": True})
+
+        async def ok(request):
+            hits["ok"] += 1
+            return web.json_response({"ok": True})
+
+        async def broken(request):
+            return web.json_response({"error": "down"}, status=500)
+
+        app = web.Application()
+        app.router.add_get("/throttled", throttled)
+        app.router.add_get("/ok", ok)
+        app.router.add_get("/broken", broken)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        base = f"http://127.0.0.1:{port}"
+
+        c = get_client(base, rate_limit=RateLimit(rate=20, burst=5), breaker_failures=3, breaker_reset=60)
+        t0 = time.monotonic()
+        r = await c.request("GET", "/throttled", credential_key="tok1")
+        dt = time.monotonic() - t0
+        print(f"429 x2 with Retry-After: 1 -> status {r.status_code} after {dt:.2f}s")
+        assert r.status_code == 200 and dt >= 2.0
+
+        t0 = time.monotonic()
+        await asyncio.gather(*[c.request("GET", "/ok", credential_key="tok2") for _ in range(45)])
+        dt = time.monotonic() - t0
+        print(f"45 requests at 20/s burst 5 -> {dt:.2f}s")
+        assert hits["ok"] == 45 and dt >= (45 - 5) / 20 * 0.9
+
+        t0 = time.monotonic()
+        await asyncio.gather(*[c.request("GET", "/ok", credential_key=f"other{i}") for i in range(5)])
+        print(f"5 requests on fresh credentials -> {time.monotonic() - t0:.2f}s (separate buckets)")
+
+        for _ in range(3):
+            r = await c.request("GET", "/broken")
+            assert r.status_code == 500
+        try:
+            await c.request("GET", "/ok")
+            assert 0, "circuit should be open"
+        except CircuitOpenError as e:
+            print("circuit breaker:", e)
+
+        print(metrics_snapshot())
+        await close_all()
+        await runner.cleanup()
+
+    asyncio.run(mock_server_test())
@@ -1,7 +1,14 @@
+import asyncio
+import dataclasses
+import hashlib
 import importlib
+import importlib.util
 import inspect
+import json
 import logging
 import os
+import sys
+import time
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, Awaitable, Callable
@@ -11,10 +18,6 @@ from flexus_client_kit import ckit_ask_model, ckit_bot_exec, ckit_cloudtool, cki
 GOOGLE_OAUTH_BASE_SCOPES = ["openid", "email", "profile"]
 
 
-def _should_fake_in_scenario(integr_name: str, integr_provider: str = "") -> bool:
-    return bool(integr_provider) or integr_name in {"erp", "crm"}
-
-
 def _register_tool_handler(
     rcx,
     tool_name: str,
@@ -23,7 +26,8 @@ def _register_tool_handler(
 ):
     async def _wrapped(toolcall, *args, **kwargs):
         if fake_in_scenario and rcx.running_test_scenario:
-            source = Path(p).read_text() if (p := inspect.getsourcefile(handler)) else ""
+            p = getattr(handler, "source_path", None) or inspect.getsourcefile(handler)
+            source = Path(p).read_text() if p else ""
             return await ckit_scenario.scenario_generate_tool_result_via_model(rcx.fclient, toolcall, source)
         return await handler(toolcall, *args, **kwargs)
     return rcx.on_tool_call(tool_name)(_wrapped)
@@ -43,6 +47,456 @@ class IntegrationRecord:
     integr_prompt: str = ""
     integr_is_messenger: bool = False
     integr_need_mongo: bool = False
+    integr_lazy: bool = False   # object is built on the first tool call, main_loop_integrations_init() returns a _LazyIntegration
+    integr_module: str = ""     # flexus_client_kit.integrations.<integr_module>, imported on first use
+
+
+# Integrations are declared below, not imported: the modules pull in Google SDKs, discord, slack_sdk, jira and so on,
+# and a bot only needs their tool schemas, scopes and prompts to start. Those come from the schema cache, the module
+# itself is imported when a persona with the integration connected starts (in a thread, not to stall other personas),
+# or for plain fi_{name} data providers, on their first tool call.
+#
+# The cache is a json file keyed by a fingerprint of the integration sources, filled on the first load that misses it.
+# Bake it into an image with `python -m flexus_client_kit.ckit_integrations_db --build-cache`, profile bot startup with
+# `python -m flexus_client_kit.ckit_integrations_db --profile [--out results.jsonl]`.
+
+SCHEMA_CACHE_PATH = os.getenv("FLEXUS_INTEGRATIONS_CACHE", str(Path.home() / ".cache" / "flexus" / "integrations_schema.json"))   # "" to disable
+EAGER = os.getenv("FLEXUS_INTEGRATIONS_EAGER", "") == "1"   # import at load like it used to be, for debugging and the profiler baseline
+
+
+@dataclass(frozen=True)
+class IntegrationSpec:
+    module: str                                        # flexus_client_kit.integrations.<module>
+    tools: tuple[str, ...] = ()                        # module attributes holding the tools
+    methods: tuple[str, ...] = ("called_by_model",)    # method of the integration object serving each tool, same order
+    init: Callable | None = None                       # (mod, rcx, setup, bracket_list) -> object, or a coroutine
+    setup: Callable | None = None                      # (mod, obj, rcx) registers handlers itself, instead of `methods`
+    subsets: dict[str, tuple[str, str]] = field(default_factory=dict)   # "erp[meta, data]": name -> (tool attribute, method)
+    make_tools: Callable | None = None                 # (mod, bracket_list) -> tools, for tools built at load time
+    integr_name: str = ""                              # default: PROVIDER_NAME in the module, or the allowlist name
+    provider: str = ""
+    scopes: str | tuple[str, ...] = ()                 # module attribute, or the scopes themselves
+    prompt: str = ""                                   # module attribute, "fi_other.ATTR" for another module
+    is_messenger: bool = False
+    need_mongo: bool = False                           # also NEED_MONGO = True in the module
+    fake_in_scenario: bool = True
+    lazy: bool = False
+
+
+def _construct(class_name: str, with_fclient: bool = True):
+    def _init(mod, rcx, setup, bracket_list):
+        return getattr(mod, class_name)(rcx.fclient, rcx) if with_fclient else getattr(mod, class_name)(rcx)
+    return _init
+
+
+def _init_nothing(mod, rcx, setup, bracket_list):
+    return None
+
+
+def _init_google_ads(mod, rcx, setup, bracket_list):
+    cf = (rcx.external_auth.get("google_ads") or {}).get("connect_fields") or {}
+    return mod.IntegrationGoogleAds(
+        rcx.fclient, rcx,
+        developer_token=cf.get("developer_token", ""),
+        customer_id=cf.get("customer_id", ""),
+        login_customer_id=cf.get("login_customer_id", ""),
+    )
+
+
+def _init_jira(mod, rcx, setup, bracket_list):
+    return mod.IntegrationJira(rcx.fclient, rcx, jira_instance_url=(setup or {}).get("jira_instance_url", ""))
+
+
+def _facebook_tools(mod, bracket_list):
+    # In manifest.json, it's not possible to write [] brackets (according to the json schema), but in a
+    # bot defined by code, you can
+    fb_tool = mod.make_facebook_bunch(bracket_list).make_tool()
+    fb_tool.auth_required = "facebook"
+    return [fb_tool]
+
+
+def _init_facebook(mod, rcx, setup, bracket_list):
+    return mod.IntegrationFacebook2(rcx.fclient, rcx, mod.make_facebook_bunch(bracket_list))
+
+
+def _init_linkedin_b2b(mod, rcx, setup, bracket_list):
+    return mod.IntegrationLinkedinB2B(
+        rcx,
+        ad_account_id=(setup or {}).get("ad_account_id", ""),
+        organization_id=(setup or {}).get("organization_id", ""),
+        linkedin_api_version=(setup or {}).get("linkedin_api_version", "202509"),
+    )
+
+
+async def _init_slack(mod, rcx, setup, bracket_list):
+    bot_name = (setup or {}).get("slack_bot_name", "") or rcx.persona.persona_name
+    bot_icon_url = (setup or {}).get("slack_bot_icon_url", "")
+    if not bot_icon_url:
+        # Auto-fill from marketplace avatar, must be public URL (Slack fetches it server-side)
+        # Also must be PNG via ?format=png — Slack doesn't support WebP
+        pub_url = os.environ.get("FLEXUS_WEB_URL", rcx.fclient.base_url_http).rstrip("/")
+        bot_icon_url = "%s/v1/marketplace/%s/%s/small.webp?format=png" % (
+            pub_url, rcx.persona.persona_marketable_name, rcx.persona.persona_marketable_version)
+    obj = mod.IntegrationSlack(rcx.fclient, rcx, bot_name=bot_name, bot_icon_url=bot_icon_url)
+    await obj.load_workspace_maps()
+    return obj
+
+
+def _messengers_platform(platform: str):
+    def _init(mod, rcx, setup, bracket_list):
+        return {"platform": platform.lower(), "connected": True}
+    def _setup(mod, obj, rcx):
+        _register_tool_handler(rcx, mod.FLEXUS_MESSENGER_TOOL.name, lambda toolcall, args: mod.flexus_messenger_called_by_model(rcx, toolcall, args), fake_in_scenario=True)
+        rcx.on_emessage(platform)(lambda emsg: mod.default_handle_emessage(rcx, emsg))
+    return _init, _setup
+
+
+async def _init_discord(mod, rcx, setup, bracket_list):
+    obj = mod.IntegrationDiscord(rcx.fclient, rcx, watch_channels=(setup or {}).get("discord_watch_channels", ""))
+    await obj.start_reactive()
+    return obj
+
+
+def _init_resend(mod, rcx, setup, bracket_list):
+    return mod.IntegrationResend(rcx.fclient, rcx, (rcx.persona.persona_setup or {}).get("DOMAINS", {}))
+
+
+def _generic_tools(mod, bracket_list):
+    if _generic_class(mod) is None:
+        raise ValueError(f"No Integration* class found in {mod.__name__}")
+    provider_name = getattr(mod, "PROVIDER_NAME", mod.__name__.rsplit(".fi_", 1)[1])
+    # All fi_*.py integrations speak the same op=help|status|list_methods|call protocol,
+    # so one tool schema covers all of them.
+    return [ckit_cloudtool.CloudTool(
+        strict=True,
+        name=provider_name,
+        description=f"{provider_name}: data provider. op=help|status|list_methods|call",
+        parameters={
+            "type": "object",
+            "properties": {
+                "op": {"type": "string", "enum": ["help", "status", "list_methods", "call"]},
+                "args": {
+                    "anyOf": [
+                        {"type": "object", "additionalProperties": False},
+                        {"type": "null"},
+                    ],
+                },
+            },
+            "required": ["op", "args"],
+            "additionalProperties": False,
+        },
+    )]
+
+
+def _generic_class(mod):
+    # The c.__module__ == mod.__name__ guard skips classes that were *imported into* the
+    # module from elsewhere (e.g. base classes), keeping only the one defined there.
+    return next(
+        (c for _, c in inspect.getmembers(mod, inspect.isclass)
+         if c.__name__.startswith("Integration") and c.__module__ == mod.__name__),
+        None,
+    )
+
+
+def _init_generic(mod, rcx, setup, bracket_list):
+    # XXX: fi_*.py constructors are inconsistent: some accept (rcx), some accept
+    # nothing. Try the more common (rcx) first; fall back to () on TypeError.
+    cls = _generic_class(mod)
+    try:
+        return cls(rcx)
+    except TypeError:
+        return cls()
+
+
+_telegram_init, _telegram_setup = _messengers_platform("TELEGRAM")
+_whatsapp_init, _whatsapp_setup = _messengers_platform("WHATSAPP")
+
+INTEGRATIONS: dict[str, IntegrationSpec] = {
+    "flexus_policy_document": IntegrationSpec(
+        "fi_pdoc", ("POLICY_DOCUMENT_TOOL",),
+        init=lambda mod, rcx, setup, bl: mod.IntegrationPdoc(rcx, rcx.persona.ws_root_group_id),
+        prompt="POLICY_DOCUMENT_PROMPT", fake_in_scenario=False),
+    "print_widget": IntegrationSpec(
+        "fi_widget", ("PRINT_WIDGET_TOOL",), init=_init_nothing,
+        setup=lambda mod, obj, rcx: rcx.on_tool_call("print_widget")(mod.handle_print_widget)),
+    "gmail": IntegrationSpec(
+        "fi_gmail", ("GMAIL_TOOL",), init=_construct("IntegrationGmail"),
+        provider="gmail", scopes="GMAIL_SCOPES", prompt="GMAIL_PROMPT"),
+    "google_calendar": IntegrationSpec(
+        "fi_google_calendar", ("GOOGLE_CALENDAR_TOOL",), init=_construct("IntegrationGoogleCalendar"),
+        provider="google_calendar", scopes="REQUIRED_SCOPES"),
+    "google_business": IntegrationSpec(
+        "fi_google_business", ("GOOGLE_BUSINESS_TOOL",), init=_construct("IntegrationGoogleBusiness"),
+        provider="google_business", scopes="GOOGLE_BUSINESS_SCOPES", prompt="GOOGLE_BUSINESS_PROMPT"),
+    "google_ads": IntegrationSpec(
+        "fi_google_ads", ("GOOGLE_ADS_TOOL",), init=_init_google_ads,
+        provider="google_ads", scopes="GOOGLE_ADS_SCOPES"),
+    "google_sheets": IntegrationSpec(
+        "fi_google_sheets", ("GOOGLE_SHEETS_TOOL",), init=_construct("IntegrationGoogleSheets"),
+        provider="google_sheets", scopes="REQUIRED_SCOPES"),
+    "google_docs": IntegrationSpec(
+        "fi_google_docs", ("GOOGLE_DOCS_TOOL",), init=_construct("IntegrationGoogleDocs"),
+        provider="google_docs", scopes="REQUIRED_SCOPES"),
+    "jira": IntegrationSpec(
+        "fi_jira", ("JIRA_TOOL",), init=_init_jira,
+        provider="atlassian", scopes="REQUIRED_SCOPES"),
+    "x": IntegrationSpec(
+        "fi_x", ("X_TOOL",), init=_construct("IntegrationX"),
+        provider="x", scopes="REQUIRED_SCOPES"),
+    "facebook": IntegrationSpec(   # "facebook[account, adset]"
+        "fi_facebook2", make_tools=_facebook_tools, init=_init_facebook,
+        integr_name="facebook", provider="facebook"),
+    "linkedin": IntegrationSpec(
+        "fi_linkedin", ("LINKEDIN_TOOL",), init=_construct("IntegrationLinkedIn", with_fclient=False),
+        provider="linkedin", scopes=("openid", "profile", "email", "w_member_social")),
+    "linkedin_b2b": IntegrationSpec(
+        "fi_linkedin_b2b", ("LINKEDIN_B2B_TOOL",), init=_init_linkedin_b2b,
+        provider="linkedin", scopes=(
+            "r_ads",
+            "rw_ads",
+            "r_ads_reporting",
+            "r_organization_admin",
+            "rw_organization_admin",
+            "r_organization_social",
+            "w_organization_social",
+            "r_organization_social_feed",
+            "w_organization_social_feed",
+            "r_organization_followers",
+            "r_events",
+            "rw_events",
+            "r_marketing_leadgen_automation",
+            "rw_conversions",
+            "r_member_profileAnalytics",
+            "r_member_postAnalytics",
+            "rw_dmp_segments",
+        )),
+    "github": IntegrationSpec(
+        "fi_github", ("GITHUB_TOOL",), init=_construct("IntegrationGitHub"), provider="github"),
+    "slack": IntegrationSpec(
+        "fi_slack", ("SLACK_TOOL",), init=_init_slack, provider="slack", is_messenger=True,
+        scopes=("channels:read", "chat:write", "chat:write.customize", "files:read", "users:read", "im:read"),
+        prompt="fi_messenger.MESSENGER_PROMPT"),
+    "telegram": IntegrationSpec(
+        "fi_messengers", ("FLEXUS_MESSENGER_TOOL",), init=_telegram_init, setup=_telegram_setup,
+        provider="telegram", prompt="fi_messenger.MESSENGER_PROMPT"),
+    "whatsapp": IntegrationSpec(
+        "fi_messengers", ("FLEXUS_MESSENGER_TOOL",), init=_whatsapp_init, setup=_whatsapp_setup,
+        provider="whatsapp", prompt="fi_messenger.MESSENGER_PROMPT"),
+    "discord": IntegrationSpec(
+        "fi_discord2", ("DISCORD_TOOL",), init=_init_discord, provider="discord_manual", is_messenger=True,
+        prompt="fi_messenger.MESSENGER_PROMPT"),
+    "magic_desk": IntegrationSpec(
+        "fi_magic_desk", ("MAGIC_DESK_TOOL",), init=_construct("IntegrationMagicDesk"), is_messenger=True,
+        fake_in_scenario=False),
+    "resend": IntegrationSpec(
+        "fi_resend", ("RESEND_SEND_TOOL", "RESEND_REPLY_TOOL", "RESEND_SETUP_TOOL"),
+        methods=("send_called_by_model", "reply_called_by_model", "setup_called_by_model"),
+        init=_init_resend, provider="resend"),
+    "erp": IntegrationSpec(   # "erp[meta, data]" or "erp[meta, data, crud, csv_import]"
+        "fi_erp", init=_construct("IntegrationErp", with_fclient=False), integr_name="erp", need_mongo=True, subsets={
+            "meta": ("ERP_TABLE_META_TOOL", "handle_erp_meta"),
+            "data": ("ERP_TABLE_DATA_TOOL", "handle_erp_data"),
+            "crud": ("ERP_TABLE_CRUD_TOOL", "handle_erp_crud"),
+            "csv_import": ("ERP_CSV_IMPORT_TOOL", "handle_csv_import"),
+        }),
+    "crm": IntegrationSpec(   # "crm[contact_info, manage_deal, verify_email]"
+        "fi_crm", init=_construct("IntegrationCrm", with_fclient=False), integr_name="crm", subsets={
+            "contact_info": ("CRM_CONTACT_INFO_TOOL", "handle_crm_contact_info"),
+            "manage_deal": ("MANAGE_CRM_DEAL_TOOL", "handle_manage_crm_deal"),
+            "verify_email": ("VERIFY_EMAIL_TOOL", "handle_verify_email"),
+        }),
+    "hubspot": IntegrationSpec(
+        "fi_hubspot", ("HUBSPOT_TOOL",), init=_construct("IntegrationHubSpot", with_fclient=False), prompt="HUBSPOT_PROMPT"),
+    "twilio": IntegrationSpec(
+        "fi_twilio", ("TWILIO_TOOL",), init=_construct("IntegrationTwilio", with_fclient=False),
+        provider="twilio_manual", prompt="TWILIO_PROMPT"),
+}
+
+
+def integration_spec(name: str) -> IntegrationSpec:
+    # Anything not declared above is fi_{name}.py speaking the generic op=help|status|list_methods|call protocol
+    # (e.g. "reddit" -> fi_reddit.py), its object is only reachable through the tool, so it's built on the first call
+    base = name.split("[", 1)[0].strip()
+    return INTEGRATIONS.get(base) or IntegrationSpec(f"fi_{base}", make_tools=_generic_tools, init=_init_generic, fake_in_scenario=False, lazy=True)
+
+
+# ---- imports ----
+
+import_stats: dict[str, tuple[float, float]] = {}   # module -> (seconds, MB of RSS) it took to import, for the profiler
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1e6 if sys.platform == "darwin" else 1e3)
+
+
+def _import(module: str):
+    full = "flexus_client_kit.integrations." + module
+    if (mod := sys.modules.get(full)) is not None:
+        return mod
+    rss0, t0 = _rss_mb(), time.perf_counter()
+    mod = importlib.import_module(full)
+    import_stats[module] = (time.perf_counter() - t0, _rss_mb() - rss0)
+    logger.info("imported %s in %0.0fms +%0.1fMB", module, import_stats[module][0] * 1000, import_stats[module][1])
+    return mod
+
+
+async def _import_async(module: str):
+    if (mod := sys.modules.get("flexus_client_kit.integrations." + module)) is not None:
+        return mod
+    return await asyncio.to_thread(_import, module)
+
+
+def _module_attr(mod, ref: str) -> Any:
+    if "." in ref:
+        other, attr = ref.split(".", 1)
+        return getattr(_import(other), attr)
+    return getattr(mod, ref)
+
+
+# ---- schema cache ----
+
+@dataclass(frozen=True)
+class _Static:
+    # Everything static_integrations_load() needs from a module, shared read-only by every record made from it
+    integr_name: str
+    tools: tuple[ckit_cloudtool.CloudTool, ...]
+    methods: tuple[str, ...]
+    provider: str
+    scopes: tuple[str, ...]
+    prompt: str
+    need_mongo: bool
+
+    def to_json(self) -> dict:
+        d = dataclasses.asdict(self)
+        d["tools"] = [dataclasses.asdict(t) for t in self.tools]
+        return d
+
+    @staticmethod
+    def from_json(d: dict) -> "_Static":
+        return _Static(**{**d, "tools": tuple(ckit_cloudtool.CloudTool(**t) for t in d["tools"]), "methods": tuple(d["methods"]), "scopes": tuple(d["scopes"])})
+
+
+def _static_from_module(name: str, spec: IntegrationSpec, mod) -> _Static:
+    bracket_list = _parse_bracket_list(name)
+    if spec.subsets:
+        keys = bracket_list if bracket_list is not None else list(spec.subsets)
+        tools = [getattr(mod, spec.subsets[k][0]) for k in keys]
+        methods = [spec.subsets[k][1] for k in keys]
+    else:
+        tools = spec.make_tools(mod, bracket_list) if spec.make_tools else [getattr(mod, a) for a in spec.tools]
+        methods = list(spec.methods)
+    return _Static(
+        integr_name=spec.integr_name or getattr(mod, "PROVIDER_NAME", name),
+        tools=tuple(tools),
+        methods=tuple(methods),
+        provider=spec.provider,
+        scopes=tuple(getattr(mod, spec.scopes) if isinstance(spec.scopes, str) else spec.scopes),
+        prompt=_module_attr(mod, spec.prompt) if spec.prompt else "",
+        need_mongo=spec.need_mongo or getattr(mod, "NEED_MONGO", False),
+    )
+
+
+def _sources_fingerprint() -> str:
+    h = hashlib.sha1()
+    here = Path(__file__).parent
+    for p in sorted([*(here / "integrations").rglob("*.py"), Path(__file__), here / "ckit_cloudtool.py"]):
+        st = p.stat()
+        h.update(b"%s %d %d\n" % (str(p.relative_to(here)).encode(), st.st_mtime_ns, st.st_size))
+    return h.hexdigest()
+
+
+_statics: dict[str, _Static] = {}   # allowlist name -> static part, in memory
+_cache_file: dict | None = None     # {"fingerprint": ..., "entries": {name: _Static.to_json()}}
+_cache_dirty = False
+
+
+def _cache_entries() -> dict:
+    global _cache_file
+    if _cache_file is None:
+        _cache_file = {"fingerprint": _sources_fingerprint(), "entries": {}}
+        if SCHEMA_CACHE_PATH:
+            try:
+                with open(SCHEMA_CACHE_PATH) as f:
+                    on_disk = json.load(f)
+                if on_disk.get("fingerprint") == _cache_file["fingerprint"]:
+                    _cache_file["entries"] = on_disk["entries"]
+            except (OSError, ValueError):
+                pass
+    return _cache_file["entries"]
+
+
+def _cache_save() -> None:
+    # Another process may have written entries meanwhile, merge them; a write that fails only costs the next start
+    global _cache_dirty
+    if not _cache_dirty or not SCHEMA_CACHE_PATH:
+        return
+    _cache_dirty = False
+    try:
+        with open(SCHEMA_CACHE_PATH) as f:
+            on_disk = json.load(f)
+        if on_disk.get("fingerprint") == _cache_file["fingerprint"]:
+            _cache_file["entries"] = {**on_disk["entries"], **_cache_file["entries"]}
+    except (OSError, ValueError):
+        pass
+    try:
+        os.makedirs(os.path.dirname(SCHEMA_CACHE_PATH) or ".", exist_ok=True)
+        tmp = "%s.%d.tmp" % (SCHEMA_CACHE_PATH, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump(_cache_file, f)
+        os.replace(tmp, SCHEMA_CACHE_PATH)
+    except OSError:
+        pass
+
+
+def _static_for(name: str, spec: IntegrationSpec) -> _Static:
+    global _cache_dirty
+    if (st := _statics.get(name)) is not None:
+        return st
+    if EAGER:
+        st = _static_from_module(name, spec, _import(spec.module))
+    elif (d := _cache_entries().get(name)) is not None:
+        st = _Static.from_json(d)
+    else:
+        st = _static_from_module(name, spec, _import(spec.module))
+        _cache_entries()[name] = st.to_json()
+        _cache_dirty = True
+    _statics[name] = st
+    return st
+
+
+# ---- records ----
+
+def _make_record(name: str, spec: IntegrationSpec, st: _Static) -> IntegrationRecord:
+    bracket_list = _parse_bracket_list(name)
+
+    async def _init(rcx, setup):
+        mod = await _import_async(spec.module)
+        obj = spec.init(mod, rcx, setup, bracket_list)
+        return await obj if inspect.isawaitable(obj) else obj
+
+    def _setup_handlers(obj, rcx):
+        if spec.setup:
+            return spec.setup(_import(spec.module), obj, rcx)
+        return [_register_tool_handler(rcx, t.name, getattr(obj, m), fake_in_scenario=spec.fake_in_scenario) for t, m in zip(st.tools, st.methods)]
+
+    return IntegrationRecord(
+        integr_name=st.integr_name,
+        integr_tools=list(st.tools),
+        integr_init=_init,
+        integr_setup_handlers=_setup_handlers,
+        integr_provider=st.provider,
+        integr_scopes=list(st.scopes),
+        integr_prompt=st.prompt,
+        integr_is_messenger=spec.is_messenger,
+        integr_need_mongo=st.need_mongo,
+        integr_lazy=spec.lazy and not EAGER,
+        integr_module=spec.module,
+    )
 
 
 def static_integrations_load(bot_dir: Path, allowlist: list[str], builtin_skills: list[str]) -> list[IntegrationRecord]:
@@ -63,486 +517,10 @@ def static_integrations_load(bot_dir: Path, allowlist: list[str], builtin_skills
                         rcx.on_tool_call("flexus_fetch_skill")(lambda tc, args: ckit_skills.called_by_model(tc, args, _d, _s))
                     ],
                 ))
-
-        elif name == "flexus_policy_document":
-            from flexus_client_kit.integrations import fi_pdoc
-            async def _init_pdoc(rcx, setup):
-                return fi_pdoc.IntegrationPdoc(rcx, rcx.persona.ws_root_group_id)
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_pdoc.POLICY_DOCUMENT_TOOL],
-                integr_init=_init_pdoc,
-                integr_setup_handlers=lambda obj, rcx: [rcx.on_tool_call("flexus_policy_document")(obj.called_by_model)],
-                integr_prompt=fi_pdoc.POLICY_DOCUMENT_PROMPT,
-            ))
-
-        elif name == "print_widget":
-            from flexus_client_kit.integrations import fi_widget
-            async def _init_widget(rcx, setup):
-                return None
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_widget.PRINT_WIDGET_TOOL],
-                integr_init=_init_widget,
-                integr_setup_handlers=lambda obj, rcx: [rcx.on_tool_call("print_widget")(fi_widget.handle_print_widget)],
-                integr_prompt="",
-            ))
-
-        elif name == "gmail":
-            from flexus_client_kit.integrations import fi_gmail
-            async def _init_gmail(rcx, setup):
-                return fi_gmail.IntegrationGmail(rcx.fclient, rcx)
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_gmail.GMAIL_TOOL],
-                integr_init=_init_gmail,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "gmail", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="gmail",
-                integr_scopes=fi_gmail.GMAIL_SCOPES,
-                integr_prompt=fi_gmail.GMAIL_PROMPT,
-            ))
-
-        elif name == "google_calendar":
-            from flexus_client_kit.integrations import fi_google_calendar
-            async def _init_gcal(rcx, setup):
-                return fi_google_calendar.IntegrationGoogleCalendar(rcx.fclient, rcx)
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_google_calendar.GOOGLE_CALENDAR_TOOL],
-                integr_init=_init_gcal,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "google_calendar", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="google_calendar",
-                integr_scopes=fi_google_calendar.REQUIRED_SCOPES,
-                integr_prompt="",
-            ))
-
-        elif name == "google_business":
-            from flexus_client_kit.integrations import fi_google_business
-            async def _init_gb(rcx, setup):
-                return fi_google_business.IntegrationGoogleBusiness(rcx.fclient, rcx)
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_google_business.GOOGLE_BUSINESS_TOOL],
-                integr_init=_init_gb,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "google_business", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="google_business",
-                integr_scopes=fi_google_business.GOOGLE_BUSINESS_SCOPES,
-                integr_prompt=fi_google_business.GOOGLE_BUSINESS_PROMPT,
-            ))
-
-        elif name == "google_ads":
-            from flexus_client_kit.integrations import fi_google_ads
-            async def _init_gads(rcx, setup):
-                auth = rcx.external_auth.get("google_ads") or {}
-                cf = auth.get("connect_fields") or {}
-                return fi_google_ads.IntegrationGoogleAds(
-                    rcx.fclient, rcx,
-                    developer_token=cf.get("developer_token", ""),
-                    customer_id=cf.get("customer_id", ""),
-                    login_customer_id=cf.get("login_customer_id", ""),
-                )
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_google_ads.GOOGLE_ADS_TOOL],
-                integr_init=_init_gads,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "google_ads", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="google_ads",
-                integr_scopes=fi_google_ads.GOOGLE_ADS_SCOPES,
-            ))
-
-        elif name == "google_sheets":
-            from flexus_client_kit.integrations import fi_google_sheets
-            async def _init_gsheets(rcx, setup):
-                return fi_google_sheets.IntegrationGoogleSheets(rcx.fclient, rcx)
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_google_sheets.GOOGLE_SHEETS_TOOL],
-                integr_init=_init_gsheets,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "google_sheets", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="google_sheets",
-                integr_scopes=fi_google_sheets.REQUIRED_SCOPES,
-            ))
-
-        elif name == "google_docs":
-            from flexus_client_kit.integrations import fi_google_docs
-            async def _init_gdocs(rcx, setup):
-                return fi_google_docs.IntegrationGoogleDocs(rcx.fclient, rcx)
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_google_docs.GOOGLE_DOCS_TOOL],
-                integr_init=_init_gdocs,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "google_docs", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="google_docs",
-                integr_scopes=fi_google_docs.REQUIRED_SCOPES,
-            ))
-
-        elif name == "jira":
-            from flexus_client_kit.integrations import fi_jira
-            async def _init_jira(rcx, setup):
-                url = (setup or {}).get("jira_instance_url", "")
-                return fi_jira.IntegrationJira(rcx.fclient, rcx, jira_instance_url=url)
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_jira.JIRA_TOOL],
-                integr_init=_init_jira,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "jira", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="atlassian",
-                integr_scopes=fi_jira.REQUIRED_SCOPES,
-                integr_prompt="",
-            ))
-
-        elif name == "x":
-            from flexus_client_kit.integrations import fi_x
-            async def _init_x(rcx, setup):
-                return fi_x.IntegrationX(rcx.fclient, rcx)
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_x.X_TOOL],
-                integr_init=_init_x,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "x", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="x",
-                integr_scopes=fi_x.REQUIRED_SCOPES,
-                integr_prompt="",
-            ))
-
-        elif name.startswith("facebook"):   # "facebook[account, adset]"
-            # In manifest.json, it's not possible to write [] brackets (according to the json schema), but in a
-            # bot defined by code, you can
-            from flexus_client_kit.integrations import fi_facebook2
-            fb_bunch = fi_facebook2.make_facebook_bunch(_parse_bracket_list(name))
-            fb_tool = fb_bunch.make_tool()
-            fb_tool.auth_required = "facebook"
-            async def _init_facebook(rcx, setup, _bunch=fb_bunch):
-                return fi_facebook2.IntegrationFacebook2(rcx.fclient, rcx, _bunch)
-            result.append(IntegrationRecord(
-                integr_name="facebook",
-                integr_tools=[fb_tool],
-                integr_init=_init_facebook,
-                integr_setup_handlers=lambda obj, rcx, _t=fb_tool: [_register_tool_handler(rcx, _t.name, obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="facebook",
-                integr_prompt="",
-            ))
-
-        elif name == "linkedin":
-            from flexus_client_kit.integrations import fi_linkedin
-            async def _init_linkedin(rcx, setup):
-                return fi_linkedin.IntegrationLinkedIn(rcx)
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_linkedin.LINKEDIN_TOOL],
-                integr_init=_init_linkedin,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "linkedin", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="linkedin",
-                integr_scopes=[
-                    "openid",
-                    "profile",
-                    "email",
-                    "w_member_social",
-                ],
-                integr_prompt="",
-            ))
-
-        elif name == "linkedin_b2b":
-            from flexus_client_kit.integrations import fi_linkedin_b2b
-            async def _init_linkedin_b2b(rcx, setup):
-                return fi_linkedin_b2b.IntegrationLinkedinB2B(
-                    rcx,
-                    ad_account_id=(setup or {}).get("ad_account_id", ""),
-                    organization_id=(setup or {}).get("organization_id", ""),
-                    linkedin_api_version=(setup or {}).get("linkedin_api_version", "202509"),
-                )
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_linkedin_b2b.LINKEDIN_B2B_TOOL],
-                integr_init=_init_linkedin_b2b,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "linkedin_b2b", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="linkedin",
-                integr_scopes=[
-                    "r_ads",
-                    "rw_ads",
-                    "r_ads_reporting",
-                    "r_organization_admin",
-                    "rw_organization_admin",
-                    "r_organization_social",
-                    "w_organization_social",
-                    "r_organization_social_feed",
-                    "w_organization_social_feed",
-                    "r_organization_followers",
-                    "r_events",
-                    "rw_events",
-                    "r_marketing_leadgen_automation",
-                    "rw_conversions",
-                    "r_member_profileAnalytics",
-                    "r_member_postAnalytics",
-                    "rw_dmp_segments",
-                ],
-            ))
-
-        elif name == "github":
-            from flexus_client_kit.integrations import fi_github
-            async def _init_github(rcx, setup):
-                return fi_github.IntegrationGitHub(rcx.fclient, rcx)
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_github.GITHUB_TOOL],
-                integr_init=_init_github,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "github", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="github",
-                integr_prompt="",
-            ))
-
-        elif name == "slack":
-            from flexus_client_kit.integrations import fi_slack, fi_messenger
-            async def _init_slack(rcx, setup):
-                bot_name = (setup or {}).get("slack_bot_name", "") or rcx.persona.persona_name
-                bot_icon_url = (setup or {}).get("slack_bot_icon_url", "")
-                if not bot_icon_url:
-                    # Auto-fill from marketplace avatar, must be public URL (Slack fetches it server-side)
-                    # Also must be PNG via ?format=png — Slack doesn't support WebP
-                    pub_url = os.environ.get("FLEXUS_WEB_URL", rcx.fclient.base_url_http).rstrip("/")
-                    bot_icon_url = "%s/v1/marketplace/%s/%s/small.webp?format=png" % (
-                        pub_url, rcx.persona.persona_marketable_name, rcx.persona.persona_marketable_version)
-                obj = fi_slack.IntegrationSlack(rcx.fclient, rcx, bot_name=bot_name, bot_icon_url=bot_icon_url)
-                await obj.load_workspace_maps()
-                return obj
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_slack.SLACK_TOOL],
-                integr_init=_init_slack,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "slack", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="slack",
-                integr_is_messenger=True,
-                integr_scopes=[
-                    "channels:read",
-                    "chat:write",
-                    "chat:write.customize",
-                    "files:read",
-                    "users:read",
-                    "im:read",
-                ],
-                integr_prompt=fi_messenger.MESSENGER_PROMPT,
-            ))
-
-        elif name == "telegram":
-            from flexus_client_kit.integrations import fi_messenger, fi_messengers
-            async def _init_telegram(rcx, setup):
-                return {"platform": "telegram", "connected": True}
-            def _telegram_setup(obj, rcx):
-                _register_tool_handler(rcx, fi_messengers.FLEXUS_MESSENGER_TOOL.name, lambda toolcall, args: fi_messengers.flexus_messenger_called_by_model(rcx, toolcall, args), fake_in_scenario=True)
-                rcx.on_emessage("TELEGRAM")(lambda emsg: fi_messengers.default_handle_emessage(rcx, emsg))
-                return []
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_messengers.FLEXUS_MESSENGER_TOOL],
-                integr_init=_init_telegram,
-                integr_setup_handlers=_telegram_setup,
-                integr_provider="telegram",
-                integr_prompt=fi_messenger.MESSENGER_PROMPT,
-            ))
-
-        elif name == "whatsapp":
-            from flexus_client_kit.integrations import fi_messenger, fi_messengers
-            async def _init_whatsapp(rcx, setup):
-                return {"platform": "whatsapp", "connected": True}
-            def _whatsapp_setup(obj, rcx):
-                _register_tool_handler(rcx, fi_messengers.FLEXUS_MESSENGER_TOOL.name, lambda toolcall, args: fi_messengers.flexus_messenger_called_by_model(rcx, toolcall, args), fake_in_scenario=True)
-                rcx.on_emessage("WHATSAPP")(lambda emsg: fi_messengers.default_handle_emessage(rcx, emsg))
-                return []
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_messengers.FLEXUS_MESSENGER_TOOL],
-                integr_init=_init_whatsapp,
-                integr_setup_handlers=_whatsapp_setup,
-                integr_provider="whatsapp",
-                integr_prompt=fi_messenger.MESSENGER_PROMPT,
-            ))
-
-        elif name == "discord":
-            from flexus_client_kit.integrations import fi_discord2, fi_messenger
-            async def _init_discord(rcx, setup):
-                obj = fi_discord2.IntegrationDiscord(
-                    rcx.fclient, rcx,
-                    watch_channels=(setup or {}).get("discord_watch_channels", ""),
-                )
-                await obj.start_reactive()
-                return obj
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_discord2.DISCORD_TOOL],
-                integr_init=_init_discord,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "discord", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="discord_manual",
-                integr_is_messenger=True,
-                integr_prompt=fi_messenger.MESSENGER_PROMPT,
-            ))
-
-        elif name == "magic_desk":
-            from flexus_client_kit.integrations import fi_magic_desk
-            async def _init_magic_desk(rcx, setup):
-                return fi_magic_desk.IntegrationMagicDesk(rcx.fclient, rcx)
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_magic_desk.MAGIC_DESK_TOOL],
-                integr_init=_init_magic_desk,
-                integr_setup_handlers=lambda obj, rcx: [rcx.on_tool_call("magic_desk")(obj.called_by_model)],
-                integr_is_messenger=True,
-                integr_prompt="",
-            ))
-
-        elif name == "resend":
-            from flexus_client_kit.integrations import fi_resend
-            async def _init_resend(rcx, setup):
-                domains = (rcx.persona.persona_setup or {}).get("DOMAINS", {})
-                return fi_resend.IntegrationResend(rcx.fclient, rcx, domains)
-            result.append(IntegrationRecord(
-                integr_name=name,
-                integr_tools=[fi_resend.RESEND_SEND_TOOL, fi_resend.RESEND_REPLY_TOOL, fi_resend.RESEND_SETUP_TOOL],
-                integr_init=_init_resend,
-                integr_setup_handlers=lambda obj, rcx: [
-                    _register_tool_handler(rcx, "email_send", obj.send_called_by_model, fake_in_scenario=True),
-                    _register_tool_handler(rcx, "email_reply", obj.reply_called_by_model, fake_in_scenario=True),
-                    _register_tool_handler(rcx, "email_setup_domain", obj.setup_called_by_model, fake_in_scenario=True),
-                ],
-                integr_provider="resend",
-                integr_prompt="",
-            ))
-
-        elif name.startswith("erp"):   # "erp[meta, data]" or "erp[meta, data, crud, csv_import]"
-            from flexus_client_kit.integrations import fi_erp
-            subset = _parse_bracket_list(name)
-            tool_map = {
-                "meta": (fi_erp.ERP_TABLE_META_TOOL, "handle_erp_meta"),
-                "data": (fi_erp.ERP_TABLE_DATA_TOOL, "handle_erp_data"),
-                "crud": (fi_erp.ERP_TABLE_CRUD_TOOL, "handle_erp_crud"),
-                "csv_import": (fi_erp.ERP_CSV_IMPORT_TOOL, "handle_csv_import"),
-            }
-            if subset is None:
-                subset = list(tool_map.keys())
-            tools_and_methods = [(tool_map[s][0], tool_map[s][1]) for s in subset]
-            async def _init_erp(rcx, setup):
-                return fi_erp.IntegrationErp(rcx)
-            def _setup_erp(obj, rcx, _tam=tools_and_methods):
-                for tool, method_name in _tam:
-                    _register_tool_handler(rcx, tool.name, getattr(obj, method_name), fake_in_scenario=True)
-            result.append(IntegrationRecord(
-                integr_name="erp",
-                integr_tools=[t for t, _ in tools_and_methods],
-                integr_init=_init_erp,
-                integr_setup_handlers=_setup_erp,
-                integr_need_mongo=True,
-            ))
-
-        elif name.startswith("crm"):   # "crm[contact_info, manage_deal, verify_email]"
-            from flexus_client_kit.integrations import fi_crm
-            subset = _parse_bracket_list(name)
-            tool_map = {
-                "contact_info": (fi_crm.CRM_CONTACT_INFO_TOOL, "handle_crm_contact_info"),
-                "manage_deal": (fi_crm.MANAGE_CRM_DEAL_TOOL, "handle_manage_crm_deal"),
-                "verify_email": (fi_crm.VERIFY_EMAIL_TOOL, "handle_verify_email"),
-            }
-            if subset is None:
-                subset = list(tool_map.keys())
-            tools_and_methods = [(tool_map[s][0], tool_map[s][1]) for s in subset]
-            async def _init_crm(rcx, setup):
-                return fi_crm.IntegrationCrm(rcx)
-            def _setup_crm(obj, rcx, _tam=tools_and_methods):
-                for tool, method_name in _tam:
-                    _register_tool_handler(rcx, tool.name, getattr(obj, method_name), fake_in_scenario=True)
-            result.append(IntegrationRecord(
-                integr_name="crm",
-                integr_tools=[t for t, _ in tools_and_methods],
-                integr_init=_init_crm,
-                integr_setup_handlers=_setup_crm,
-                integr_prompt="",
-            ))
-
-        elif name == "hubspot":
-            from flexus_client_kit.integrations import fi_hubspot
-            async def _init_hubspot(rcx, setup):
-                return fi_hubspot.IntegrationHubSpot(rcx)
-            result.append(IntegrationRecord(
-                integr_name="hubspot",
-                integr_tools=[fi_hubspot.HUBSPOT_TOOL],
-                integr_init=_init_hubspot,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "hubspot", obj.called_by_model, fake_in_scenario=True)],
-                integr_prompt=fi_hubspot.HUBSPOT_PROMPT,
-            ))
-
-        elif name == "twilio":
-            from flexus_client_kit.integrations import fi_twilio
-            async def _init_twilio(rcx, setup):
-                return fi_twilio.IntegrationTwilio(rcx)
-            result.append(IntegrationRecord(
-                integr_name="twilio",
-                integr_tools=[fi_twilio.TWILIO_TOOL],
-                integr_init=_init_twilio,
-                integr_setup_handlers=lambda obj, rcx: [_register_tool_handler(rcx, "twilio", obj.called_by_model, fake_in_scenario=True)],
-                integr_provider="twilio_manual",
-                integr_prompt=fi_twilio.TWILIO_PROMPT,
-            ))
-
-        else:
-            # Import fi_{name}.py at runtime by name (e.g. "reddit" -> fi_reddit.py).
-            # We can't do this at the top of the file because the name is only known at call time.
-            mod = importlib.import_module(f"flexus_client_kit.integrations.fi_{name}")
-
-            # The c.__module__ == mod.__name__ guard skips classes that were *imported into* the
-            # module from elsewhere (e.g. base classes), keeping only the one defined there.
-            integration_class = next(
-                (c for _, c in inspect.getmembers(mod, inspect.isclass)
-                 if c.__name__.startswith("Integration") and c.__module__ == mod.__name__),
-                None,
-            )
-            if integration_class is None:
-                raise ValueError(f"No Integration* class found in fi_{name}.py")
-
-            # fi_*.py defines PROVIDER_NAME = "reddit" (may differ from the file name fi_x.py -> "x").
-            provider_name = getattr(mod, "PROVIDER_NAME", name)
-
-            # All fi_*.py integrations speak the same op=help|status|list_methods|call protocol,
-            # so one tool schema covers all of them.
-            generic_tool = ckit_cloudtool.CloudTool(
-                strict=True,
-                name=provider_name,
-                description=f"{provider_name}: data provider. op=help|status|list_methods|call",
-                parameters={
-                    "type": "object",
-                    "properties": {
-                        "op": {"type": "string", "enum": ["help", "status", "list_methods", "call"]},
-                        "args": {
-                            "anyOf": [
-                                {"type": "object", "additionalProperties": False},
-                                {"type": "null"},
-                            ],
-                        },
-                    },
-                    "required": ["op", "args"],
-                    "additionalProperties": False,
-                },
-            )
-
-            # Avoid a classic Python loop-capture bug: without it, every closure would share the last
-            # iteration's integration_class after the loop completes.
-            def _make_generic_init(klass):
-                async def _init(rcx, setup, _cls=klass):
-                    # XXX: fi_*.py constructors are inconsistent: some accept (rcx), some accept
-                    # nothing. Try the more common (rcx) first; fall back to () on TypeError.
-                    try:
-                        return _cls(rcx)
-                    except TypeError:
-                        return _cls()
-                return _init
-
-            result.append(IntegrationRecord(
-                integr_name=provider_name,
-                integr_tools=[generic_tool],
-                integr_init=_make_generic_init(integration_class),
-                # _t=generic_tool captures the current tool into the lambda for the same reason
-                # as _make_generic_init above: without it all lambdas would share the last tool.
-                integr_setup_handlers=lambda obj, rcx, _t=generic_tool, _f=_should_fake_in_scenario(provider_name): [
-                    _register_tool_handler(rcx, _t.name, obj.called_by_model, fake_in_scenario=_f)
-                ],
-            ))
+            continue
+        spec = integration_spec(name)
+        result.append(_make_record(name, spec, _static_for(name, spec)))
+    _cache_save()
     seen: set[str] = set()
     for rec in result:
         rec.integr_tools = [t for t in rec.integr_tools if not (t.name in seen or seen.add(t.name))]
@@ -555,6 +533,28 @@ def _parse_bracket_list(name: str) -> list[str] | None:
     return [g.strip() for g in name.split("[", 1)[1].rstrip("]").split(",")]
 
 
+class _LazyIntegration:
+    # Stands in for the integration object of a lazy record, every method is a coroutine that builds the real one first
+    def __init__(self, rec: IntegrationRecord, rcx, setup: dict | None):
+        self._rec, self._rcx, self._setup = rec, rcx, setup
+        self._obj = None
+        self._lock = asyncio.Lock()
+
+    async def get(self):
+        async with self._lock:
+            if self._obj is None:
+                self._obj = await self._rec.integr_init(self._rcx, self._setup)
+                logger.info("%s integration %s ready on first call", self._rcx.persona.persona_id, self._rec.integr_name)
+        return self._obj
+
+    def __getattr__(self, method: str):
+        async def _call(*args, **kwargs):
+            return await getattr(await self.get(), method)(*args, **kwargs)
+        spec = importlib.util.find_spec("flexus_client_kit.integrations." + self._rec.integr_module)
+        _call.source_path = spec.origin if spec else None   # for scenario faking, see _register_tool_handler
+        return _call
+
+
 async def main_loop_integrations_init(records: list[IntegrationRecord], rcx: ckit_bot_exec.RobotContext, setup: dict | None = None, need_mongo: bool = False) -> dict[str, Any]:
     from flexus_client_kit.integrations import fi_messenger
     rcx.messengers.clear()
@@ -575,7 +575,7 @@ async def main_loop_integrations_init(records: list[IntegrationRecord], rcx: cki
                 else:
                     logger.info("%s integration %s skipped (not connected)", rcx.persona.persona_id, rec.integr_name)
                     continue
-        obj = await rec.integr_init(rcx, setup)
+        obj = _LazyIntegration(rec, rcx, setup) if rec.integr_lazy else await rec.integr_init(rcx, setup)
         rec.integr_setup_handlers(obj, rcx)
         result[rec.integr_name] = obj
         if rec.integr_is_messenger:
@@ -596,3 +596,126 @@ async def main_loop_integrations_init(records: list[IntegrationRecord], rcx: cki
             await fi_messengers.messenger_outbound(rcx, msg)
 
     return result
+
+
+# ---- startup profiler ----
+
+def _bot_allowlists(bot: str) -> list[str]:
+    # Import the bot like its process does, catching what it hands to static_integrations_load()
+    this = sys.modules[__name__]
+    seen: list[str] = []
+    real = this.static_integrations_load
+    def _spy(bot_dir, allowlist, builtin_skills):
+        seen.extend(n for n in allowlist if n not in seen)
+        return real(bot_dir, allowlist, builtin_skills)
+    this.static_integrations_load = _spy
+    try:
+        bot_dir = Path(__file__).parent.parent / "flexus_simple_bots" / bot
+        if (bot_dir / f"{bot}_bot.py").exists():
+            importlib.import_module(f"flexus_simple_bots.{bot}.{bot}_bot")
+        else:
+            _spy(bot_dir, json.loads((bot_dir / "manifest.json").read_text())["integrations"], [])
+    finally:
+        this.static_integrations_load = real
+    return seen
+
+
+def _profile_one(bot: str) -> dict:
+    rss0, t0 = _rss_mb(), time.perf_counter()
+    allowlist = _bot_allowlists(bot)
+    r = {"bot": bot, "eager": EAGER, "startup_ms": (time.perf_counter() - t0) * 1000, "rss_mb": _rss_mb() - rss0, "integrations": {}}
+    # What starting a persona with every integration connected adds on top, in allowlist order
+    for name in allowlist:
+        if name == "skills":
+            continue
+        module = integration_spec(name).module
+        t1, rss1 = time.perf_counter(), _rss_mb()
+        try:
+            _import(module)
+        except Exception as e:
+            r["integrations"][name] = {"error": "%s: %s" % (type(e).__name__, e)}
+            continue
+        r["integrations"][name] = {"import_ms": (time.perf_counter() - t1) * 1000, "rss_mb": _rss_mb() - rss1}
+    return r
+
+
+def profile_bots(bots: list[str], eager: bool) -> dict[str, dict]:
+    import subprocess
+    env = {**os.environ, "FLEXUS_INTEGRATIONS_EAGER": "1" if eager else "0"}
+    results = {}
+    for bot in bots:
+        p = subprocess.run([sys.executable, "-m", "flexus_client_kit.ckit_integrations_db", "--profile-one", bot], env=env, capture_output=True, text=True, timeout=600)
+        lines = p.stdout.strip().splitlines()
+        results[bot] = json.loads(lines[-1]) if p.returncode == 0 and lines else {"bot": bot, "error": (p.stderr.strip().splitlines() or ["exit %d" % p.returncode])[-1]}
+    return results
+
+
+def build_cache() -> int:
+    # Every declared integration and every fi_*.py that imports here; bracket subsets are cached as bots ask for them
+    names = [n for n in INTEGRATIONS if n not in ("erp", "crm", "facebook")] + ["erp", "crm"]
+    declared = {s.module for s in INTEGRATIONS.values()}
+    names += sorted(p.stem[3:] for p in (Path(__file__).parent / "integrations").glob("fi_*.py") if p.stem not in declared)
+    n = 0
+    for name in dict.fromkeys(names):
+        try:
+            _static_for(name, integration_spec(name))
+            n += 1
+        except Exception:
+            pass
+    _cache_save()
+    return n
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Integration schema cache and per bot startup profile")
+    parser.add_argument("--build-cache", action="store_true", help=f"fill {SCHEMA_CACHE_PATH or 'the cache (FLEXUS_INTEGRATIONS_CACHE is empty)'}")
+    parser.add_argument("--profile", action="store_true", help="import time and RSS of each bot in flexus_simple_bots, lazy vs eager")
+    parser.add_argument("--bots", default="", help="comma separated, default all")
+    parser.add_argument("--out", default="", help="append the profile to this JSON lines file and compare with the previous run there")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="with --out, exit 1 if a bot starts this much slower or bigger than last time")
+    parser.add_argument("--profile-one", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile_one:
+        from flexus_client_kit import ckit_integrations_db   # the module bots see, not __main__
+        print(json.dumps(ckit_integrations_db._profile_one(args.profile_one)))
+        sys.exit(0)
+    if args.build_cache:
+        print("cached %d integrations in %s" % (build_cache(), SCHEMA_CACHE_PATH))
+    if args.profile:
+        bots_dir = Path(__file__).parent.parent / "flexus_simple_bots"
+        bots = [b for b in args.bots.split(",") if b] or sorted(
+            d.name for d in bots_dir.iterdir() if (d / f"{d.name}_bot.py").exists() or (d / "manifest.json").exists())
+        profile_bots(bots, eager=False)   # warms the schema cache
+        lazy, eager = profile_bots(bots, eager=False), profile_bots(bots, eager=True)
+        print("%-20s %22s %22s" % ("bot", "eager ms / MB", "lazy ms / MB"))
+        for bot in bots:
+            e, l = eager[bot], lazy[bot]
+            if "error" in l or "error" in e:
+                print("%-20s %s" % (bot, l.get("error") or e.get("error")))
+                continue
+            print("%-20s %13.0f / %6.1f %13.0f / %6.1f" % (bot, e["startup_ms"], e["rss_mb"], l["startup_ms"], l["rss_mb"]))
+            heavy = sorted(((v["import_ms"], v["rss_mb"], k) for k, v in l["integrations"].items() if "import_ms" in v), reverse=True)
+            for ms, mb, name in heavy[:5]:
+                if ms >= 50:
+                    print("%-20s   deferred %-24s %6.0f ms %6.1f MB" % ("", name, ms, mb))
+        if args.out:
+            regressed = []
+            prev = None
+            if os.path.exists(args.out):
+                with open(args.out) as f:
+                    lines = [x for x in f if x.strip()]
+                prev = json.loads(lines[-1])["lazy"] if lines else None
+            for bot, l in lazy.items():
+                p = (prev or {}).get(bot)
+                if not p or "error" in p or "error" in l:
+                    continue
+                for k in ("startup_ms", "rss_mb"):
+                    if p[k] > 0 and l[k] > p[k] * (1 + args.tolerance) and l[k] - p[k] > (50 if k == "startup_ms" else 5):
+                        regressed.append("%s %s %.0f -> %.0f" % (bot, k, p[k], l[k]))
+            with open(args.out, "a") as f:
+                f.write(json.dumps({"ts": time.time(), "python": sys.version.split()[0], "lazy": lazy, "eager": eager}) + "\n")
+            for x in regressed:
+                print("REGRESSION", x)
+            sys.exit(1 if regressed else 0)
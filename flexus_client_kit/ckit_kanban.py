@@ -1,11 +1,17 @@
+import asyncio
 import json
+import logging
+import time
 from dataclasses import dataclass
-from typing import List, Optional, Any
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 import gql
+import gql.transport.exceptions
 from typing_extensions import deprecated
 
-from flexus_client_kit import ckit_client, gql_utils
+from flexus_client_kit import ckit_client, ckit_shutdown, gql_utils
+
+logger = logging.getLogger("kanban")
 
 
 @dataclass
@@ -46,6 +52,9 @@ class FPersonaKanbanTaskOutput:
         return 'inbox'
 
 
+TASK_FIELDS = gql_utils.gql_fields(FPersonaKanbanTaskOutput, depth=5).strip()
+
+
 async def bot_kanban_post_into_inprogress(
     http: gql.Client,
     persona_id: str,
@@ -107,28 +116,11 @@ async def get_tasks_by_thread(
 ) -> List[FPersonaKanbanTaskOutput]:
     async with http as h:
         result = await h.execute(
-            gql.gql("""query GetTasksForThread($ft_id: String!) {
-                persona_kanban_tasks_by_thread(ft_id: $ft_id) {
-                    persona_id
-                    ktask_id
-                    ktask_title
-                    ktask_human_id
-                    ktask_fexp_name
-                    ktask_inbox_ts
-                    ktask_inbox_provenance
-                    ktask_daily_timekey
-                    ktask_coins
-                    ktask_budget
-                    ktask_todo_ts
-                    ktask_inprogress_ts
-                    ktask_inprogress_ft_id
-                    ktask_inprogress_activity_ts
-                    ktask_done_ts
-                    ktask_resolution_code
-                    ktask_resolution_summary
-                    ktask_details
-                }
-            }"""),
+            gql.gql(f"""query GetTasksForThread($ft_id: String!) {{
+                persona_kanban_tasks_by_thread(ft_id: $ft_id) {{
+                    {TASK_FIELDS}
+                }}
+            }}"""),
             variable_values={"ft_id": ft_id}
         )
 
@@ -156,6 +148,225 @@ async def bot_kanban_update_details(
     return result.get("kanban_task_update_details", False)
 
 
+# Batched variants. Many posts or detail updates go out as one GraphQL document with aliased fields,
+#
+#   mutation KanbanBatch($k0_pid: String!, ..., $k1_ktask_id: String!, ...) {
+#       k0: bot_kanban_post_into_inbox(persona_id: $k0_pid, ...)
+#       k1: kanban_task_update_details(ktask_id: $k1_ktask_id, ktask_details: $k1_details)
+#   }
+#
+# one field failing doesn't fail the others, every op gets its own FKanbanBatchResult.
+
+
+KANBAN_BATCH_MAX = 50           # fields per request
+KANBAN_BATCH_WINDOW = 0.1       # KanbanBatcher waits this long for more ops before sending
+
+
+@dataclass
+class FKanbanPost:
+    title: str
+    details_json: str
+    provenance_message: str
+    fexp_name: str = ""
+    human_id: str = ""
+    comingup_ts: float = 0.0
+    into_inprogress: bool = False
+
+
+@dataclass
+class FKanbanBatchResult:
+    ok: bool
+    ktask_id: Optional[str] = None      # only bot_kanban_post_into_inprogress reports it
+    error: Optional[str] = None
+
+
+_POST_ARGS = {
+    False: ("bot_kanban_post_into_inbox", "", [
+        ("persona_id", "pid", "String!"), ("title", "title", "String!"), ("human_id", "human_id", "String!"),
+        ("details_json", "details", "String!"), ("provenance_message", "prov", "String!"), ("fexp_name", "fexp", "String!"),
+        ("comingup_ts", "comingup", "Float!"),
+    ]),
+    True: ("bot_kanban_post_into_inprogress", " { ktask_id }", [
+        ("persona_id", "pid", "String!"), ("title", "title", "String!"), ("human_id", "human_id", "String!"),
+        ("details_json", "details", "String!"), ("provenance_message", "prov", "String!"), ("fexp_name", "fexp", "String!"),
+    ]),
+}
+
+
+def _post_field(n: int, persona_id: str, p: FKanbanPost) -> Tuple[List[str], str, Dict[str, Any]]:
+    mutation, selection, arg_specs = _POST_ARGS[p.into_inprogress]
+    values = {"persona_id": persona_id, "title": p.title, "human_id": p.human_id, "details_json": p.details_json,
+        "provenance_message": p.provenance_message, "fexp_name": p.fexp_name, "comingup_ts": p.comingup_ts}
+    decls, call_args, variables = [], [], {}
+    for arg, var, gql_type in arg_specs:
+        decls.append(f"$k{n}_{var}: {gql_type}")
+        call_args.append(f"{arg}: $k{n}_{var}")
+        variables[f"k{n}_{var}"] = values[arg]
+    return decls, f"k{n}: {mutation}({', '.join(call_args)}){selection}", variables
+
+
+def _details_field(n: int, ktask_id: str, details: Any) -> Tuple[List[str], str, Dict[str, Any]]:
+    return (
+        [f"$k{n}_ktask_id: String!", f"$k{n}_details: String!"],
+        f"k{n}: kanban_task_update_details(ktask_id: $k{n}_ktask_id, ktask_details: $k{n}_details)",
+        {f"k{n}_ktask_id": ktask_id, f"k{n}_details": json.dumps(details) if isinstance(details, dict) else details},
+    )
+
+
+async def _execute_batch(http: gql.Client, fields: List[Tuple[List[str], str, Dict[str, Any]]]) -> List[FKanbanBatchResult]:
+    results: List[FKanbanBatchResult] = []
+    async with http as h:
+        for i in range(0, len(fields), KANBAN_BATCH_MAX):
+            chunk = fields[i:i + KANBAN_BATCH_MAX]
+            decls, lines, variables = [], [], {}
+            for d, line, v in chunk:
+                decls.extend(d)
+                lines.append(line)
+                variables.update(v)
+            doc = "mutation KanbanBatch(%s) {\n    %s\n}" % (", ".join(decls), "\n    ".join(lines))
+            errors: Dict[str, str] = {}
+            try:
+                data = await h.execute(gql.gql(doc), variable_values=variables)
+            except gql.transport.exceptions.TransportQueryError as e:
+                # partial success: data has the fields that worked, errors point at the aliases that didn't
+                data = e.data or {}
+                for err in e.errors or []:
+                    if not isinstance(err, dict):
+                        err = {"message": str(err)}
+                    path = err.get("path") or []
+                    msg = err.get("message", str(err))
+                    if path:
+                        errors[str(path[0])] = msg
+                    else:
+                        errors = {f"k{i + n}": msg for n in range(len(chunk))}
+            for n in range(len(chunk)):
+                alias = f"k{i + n}"
+                if alias in errors:
+                    results.append(FKanbanBatchResult(ok=False, error=errors[alias]))
+                    continue
+                v = data.get(alias)
+                if isinstance(v, dict):
+                    results.append(FKanbanBatchResult(ok=True, ktask_id=v.get("ktask_id")))
+                else:
+                    results.append(FKanbanBatchResult(ok=v is not None and v is not False, error=None if v else "no result"))
+    return results
+
+
+async def bot_kanban_post_many(
+    http: gql.Client,
+    persona_id: str,
+    posts: List[FKanbanPost],
+) -> List[FKanbanBatchResult]:
+    return await _execute_batch(http, [_post_field(n, persona_id, p) for n, p in enumerate(posts)])
+
+
+async def bot_kanban_update_details_many(
+    http: gql.Client,
+    updates: Dict[str, Any],
+) -> Dict[str, FKanbanBatchResult]:
+    ids = list(updates.keys())
+    results = await _execute_batch(http, [_details_field(n, k, updates[k]) for n, k in enumerate(ids)])
+    return dict(zip(ids, results))
+
+
+class KanbanBatcher:
+    """
+    Collects posts and detail updates for a persona for KANBAN_BATCH_WINDOW and sends them in one request.
+    Updates to the same ktask_id within a window collapse into one, the last details win, every caller
+    gets the result of the update that was sent.
+    """
+    def __init__(
+        self,
+        http_factory: Callable[[], Awaitable[gql.Client]],
+        persona_id: str,
+        window: float = KANBAN_BATCH_WINDOW,
+    ):
+        self.http_factory = http_factory
+        self.persona_id = persona_id
+        self.window = window
+        self.requests_sent = 0
+        self.ops_sent = 0
+        self.ops_coalesced = 0
+        self._posts: List[Tuple[FKanbanPost, asyncio.Future]] = []
+        self._details: Dict[str, Tuple[Any, asyncio.Future]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def post(self, p: FKanbanPost) -> FKanbanBatchResult:
+        fut = asyncio.get_running_loop().create_future()
+        self._posts.append((p, fut))
+        self._schedule()
+        return await asyncio.shield(fut)
+
+    async def update_details(self, ktask_id: str, details: Any) -> FKanbanBatchResult:
+        prev = self._details.get(ktask_id)
+        if prev is not None:
+            fut = prev[1]
+            self.ops_coalesced += 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+        self._details[ktask_id] = (details, fut)
+        self._schedule()
+        return await asyncio.shield(fut)
+
+    def _schedule(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        await self.flush()
+
+    async def flush(self) -> None:
+        while self._posts or self._details:
+            posts, self._posts = self._posts, []
+            details, self._details = self._details, {}
+            fields = [_post_field(n, self.persona_id, p) for n, (p, _) in enumerate(posts)]
+            fields += [_details_field(len(posts) + n, k, d) for n, (k, (d, _)) in enumerate(details.items())]
+            futs = [f for _, f in posts] + [f for _, f in details.values()]
+            t0 = time.monotonic()
+            try:
+                results = await _execute_batch(await self.http_factory(), fields)
+            except asyncio.CancelledError:
+                # these are off the queue already, their callers must not wait forever
+                for f in futs:
+                    if not f.done():
+                        f.set_exception(RuntimeError("kanban batch cancelled while in flight, it may or may not have been applied"))
+                raise
+            except Exception as e:
+                logger.warning("kanban batch of %d failed: %s %s", len(fields), type(e).__name__, e)
+                for f in futs:
+                    if not f.done():
+                        f.set_exception(e)
+                continue
+            self.requests_sent += (len(fields) + KANBAN_BATCH_MAX - 1) // KANBAN_BATCH_MAX
+            self.ops_sent += len(fields)
+            logger.debug("kanban batch %d posts %d updates in %.0fms", len(posts), len(details), (time.monotonic() - t0) * 1000)
+            for f, r in zip(futs, results):
+                if not f.done():
+                    f.set_result(r)
+
+    async def close(self) -> None:
+        # let a flush that's already sending finish, then send whatever is left
+        if self._flush_task is not None and not self._flush_task.done():
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+
+
+_batchers: Dict[Tuple[int, str], Tuple[asyncio.AbstractEventLoop, KanbanBatcher]] = {}
+
+
+def get_batcher(fclient: ckit_client.FlexusClient, persona_id: str) -> KanbanBatcher:
+    loop = asyncio.get_running_loop()
+    key = (id(fclient), persona_id)
+    hit = _batchers.get(key)
+    if hit and hit[0] is loop:
+        return hit[1]
+    b = KanbanBatcher(lambda: fclient.use_http_on_behalf(persona_id, ""), persona_id)
+    _batchers[key] = (loop, b)
+    ckit_shutdown.give_flush_on_exit(f"kanban {persona_id}", b.close)
+    return b
+
+
 @deprecated("bot subscription already sends the tasks")
 async def bot_get_all_tasks(
         http: gql.Client,
@@ -163,28 +374,11 @@ async def bot_get_all_tasks(
 ) -> List[FPersonaKanbanTaskOutput]:
     async with http as h:
         result = await h.execute(
-            gql.gql("""query GetAllTasks($persona_id: String!) {
-                bot_get_all_tasks(persona_id: $persona_id) {
-                    persona_id
-                    ktask_id
-                    ktask_title
-                    ktask_human_id
-                    ktask_fexp_name
-                    ktask_inbox_ts
-                    ktask_inbox_provenance
-                    ktask_daily_timekey
-                    ktask_coins
-                    ktask_budget
-                    ktask_todo_ts
-                    ktask_inprogress_ts
-                    ktask_inprogress_ft_id
-                    ktask_inprogress_activity_ts
-                    ktask_done_ts
-                    ktask_resolution_code
-                    ktask_resolution_summary
-                    ktask_details
-                }
-            }"""),
+            gql.gql(f"""query GetAllTasks($persona_id: String!) {{
+                bot_get_all_tasks(persona_id: $persona_id) {{
+                    {TASK_FIELDS}
+                }}
+            }}"""),
             variable_values={"persona_id": persona_id}
         )
 
@@ -192,3 +386,91 @@ async def bot_get_all_tasks(
     for task_data in result.get("bot_get_all_tasks", []):
         tasks.append(gql_utils.dataclass_from_dict(task_data, FPersonaKanbanTaskOutput))
     return tasks
+
+
+if __name__ == "__main__":
+    import re
+    from aiohttp import web
+
+    STUB_LATENCY = 0.02
+
+    async def stub_backend_bench():
+        seen: List[int] = []
+
+        async def graphql(request):
+            body = await request.json()
+            await asyncio.sleep(STUB_LATENCY)
+            fields = re.findall(r"^\s*(\w+: )?(bot_kanban_post_into_\w+|kanban_task_update_details)\(", body["query"], re.M)
+            seen.append(len(fields))
+            data, errors = {}, []
+            for n, (alias, mutation) in enumerate(fields):
+                alias = alias[:-2] if alias else mutation
+                title = body["variables"].get(f"{alias}_title") or body["variables"].get("title", "")
+                if title == "poison":
+                    data[alias] = None
+                    errors.append({"message": "title rejected", "path": [alias]})
+                elif mutation == "bot_kanban_post_into_inprogress":
+                    data[alias] = {"ktask_id": f"kt{len(seen)}_{n}"}
+                else:
+                    data[alias] = True
+            return web.json_response({"data": data, "errors": errors} if errors else {"data": data})
+
+        app = web.Application()
+        app.router.add_post("/v1/graphql", graphql)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        fclient = ckit_client.FlexusClient("kanban_bench", api_key="fx-bench", base_url=f"http://127.0.0.1:{port}", skip_logger_init=True)
+        N = 200
+
+        t0 = time.monotonic()
+        for i in range(N):
+            await bot_kanban_post_into_inbox(await fclient.use_http_on_behalf("p1", ""), "p1", f"t{i}", "{}", "bench")
+        t_single = time.monotonic() - t0
+        print(f"{N} posts one by one: {len(seen)} requests, {t_single:.2f}s")
+
+        seen.clear()
+        b = get_batcher(fclient, "p1")
+        t0 = time.monotonic()
+        posts = [FKanbanPost(title=f"t{i}", details_json="{}", provenance_message="bench", into_inprogress=(i % 2 == 0)) for i in range(N)]
+        posts[7].title = "poison"
+        results = await asyncio.gather(*[b.post(p) for p in posts])
+        t_batch = time.monotonic() - t0
+        print(f"{N} concurrent posts via KanbanBatcher: {len(seen)} requests {seen}, {t_batch:.2f}s, {t_single / t_batch:.0f}x")
+        assert len(seen) == (N + KANBAN_BATCH_MAX - 1) // KANBAN_BATCH_MAX
+        assert not results[7].ok and results[7].error == "title rejected", results[7]
+        assert all(r.ok for i, r in enumerate(results) if i != 7)
+        assert results[0].ktask_id and results[1].ktask_id is None
+
+        seen.clear()
+        t0 = time.monotonic()
+        results = await asyncio.gather(*[b.update_details(f"kt{i % 10}", {"progress": i}) for i in range(N)])
+        print(f"{N} detail updates to 10 tasks: {len(seen)} requests, {seen[0]} fields, {b.ops_coalesced} coalesced, {time.monotonic() - t0:.2f}s")
+        assert seen == [10] and all(r.ok for r in results)
+
+        seen.clear()
+        r = await bot_kanban_update_details_many(await fclient.use_http_on_behalf("p1", ""), {f"kt{i}": {"x": i} for i in range(120)})
+        print(f"bot_kanban_update_details_many(120): {len(seen)} requests")
+        assert len(r) == 120 and all(x.ok for x in r.values()) and len(seen) == 3
+
+        # close() while a batch is in flight waits for it instead of cancelling it
+        seen.clear()
+        pending = [asyncio.create_task(b.update_details(f"kt{i}", {"closing": i})) for i in range(3)]
+        await asyncio.sleep(b.window + STUB_LATENCY / 2)
+        await b.close()
+        assert seen == [3] and all(t.result().ok for t in pending)
+
+        # the flush task cancelled from outside mid-request: callers get an error, not a hang
+        pending = [asyncio.create_task(b.update_details(f"kt{i}", {"cancelled": i})) for i in range(3)]
+        await asyncio.sleep(b.window + STUB_LATENCY / 2)
+        b._flush_task.cancel()
+        done = await asyncio.wait_for(asyncio.gather(*pending, return_exceptions=True), 1.0)
+        print("flush cancelled in flight ->", type(done[0]).__name__, done[0])
+        assert all(isinstance(x, RuntimeError) for x in done)
+
+        await ckit_shutdown.flush_all()
+        await runner.cleanup()
+
+    asyncio.run(stub_backend_bench())
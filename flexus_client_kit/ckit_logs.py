@@ -1,39 +1,302 @@
+import os
 import sys
+import json
+import time
+import queue
+import atexit
 import logging
+import threading
+import contextlib
+import contextvars
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Records are stamped and rendered to a plain message on the calling thread (cheap), then handed to a writer thread
+# that formats them and writes to stderr in batches, one flush per batch. The event loop never waits on the pipe.
+#
+#   FLEXUS_LOG_JSON=1          one JSON object per line, with persona_id / ft_id / fcall_id from log_context()
+#   FLEXUS_LOG_SYNC=1          write and flush on the calling thread, like before (debugging hard crashes)
+#   FLEXUS_LOG_SAMPLE_RATE=N   lines per second per call site below WARNING, the rest counted and dropped; off by default
+#
+# Context is per asyncio task (contextvars), set it once where the work starts:
+#   with ckit_logs.log_context(ft_id=toolcall.fcall_ft_id, fcall_id=toolcall.fcall_id):
+#       await handler(...)
 
 
 FLEXUS_CUSTOM_LEVEL = logging.CRITICAL + 1
 FLEXUS_CUSTOM_LEVEL_NAME = "FLEXUS_CUSTOM"
 
+LOG_JSON = os.getenv("FLEXUS_LOG_JSON", "") not in ("", "0")
+LOG_SYNC = os.getenv("FLEXUS_LOG_SYNC", "") not in ("", "0")
+SAMPLE_RATE = float(os.getenv("FLEXUS_LOG_SAMPLE_RATE", "0"))
+SAMPLE_BURST = 1000
+QUEUE_MAX = 100000        # records waiting for the writer, beyond that INFO and below are dropped and counted
+BATCH_MAX = 2000          # records per write+flush
+SAMPLE_KEYS_MAX = 10000   # call sites / throttle keys remembered, least recently used forgotten first
+
+persona_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("log_persona_id", default="")
+ft_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("log_ft_id", default="")
+fcall_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("log_fcall_id", default="")
+_CONTEXT_VARS = {"persona_id": persona_id_var, "ft_id": ft_id_var, "fcall_id": fcall_id_var}
+
 
 def flexus_alert(self, message, *args, **kwargs):
     if self.isEnabledFor(FLEXUS_CUSTOM_LEVEL):
         self._log(FLEXUS_CUSTOM_LEVEL, message, args, **kwargs)
 
 
+def set_log_context(**kwargs: str) -> None:
+    # For the rest of the current task, e.g. once at the top of a persona's main loop
+    for k, v in kwargs.items():
+        _CONTEXT_VARS[k].set(v or "")
+
+
+@contextlib.contextmanager
+def log_context(**kwargs: str):
+    tokens = [(_CONTEXT_VARS[k], _CONTEXT_VARS[k].set(v or "")) for k, v in kwargs.items()]
+    try:
+        yield
+    finally:
+        for var, tok in reversed(tokens):
+            var.reset(tok)
+
+
+class KeyedRateLimiter:
+    # Token bucket per key, keys kept in LRU order so a flood of distinct keys can't grow it without bound.
+    # Called from the loop and from ckit_blocking pool threads, hence the lock.
+    def __init__(self, max_keys: int = SAMPLE_KEYS_MAX):
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[Any, List[float]]" = OrderedDict()   # key -> [tokens, updated, suppressed]
+        self._lock = threading.Lock()
+
+    def admit(self, key: Any, rate: float, burst: float, now: Optional[float] = None) -> Tuple[bool, int]:
+        # (allowed, how many were suppressed since the last allowed one)
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            b = self.buckets.get(key)
+            if b is None:
+                b = self.buckets[key] = [burst, now, 0]
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+                b[0] = min(burst, b[0] + (now - b[1]) * rate)
+                b[1] = now
+            if b[0] >= 1.0:
+                b[0] -= 1.0
+                suppressed, b[2] = int(b[2]), 0
+                return True, suppressed
+            b[2] += 1
+            return False, 0
+
+
+class LogStats:
+    def __init__(self):
+        self.queued = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0        # queue full
+        self.suppressed = 0     # sampling
+        self.write_s = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+
+stats = LogStats()
+_sampler = KeyedRateLimiter()
+
+
+class _SamplingFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if SAMPLE_RATE <= 0 or record.levelno >= logging.WARNING:
+            return True
+        ok, suppressed = _sampler.admit((record.pathname, record.lineno), SAMPLE_RATE, SAMPLE_BURST)
+        if not ok:
+            stats.suppressed += 1
+            return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s.%(msecs)03d %(name)s !!LEVEL!! %(message)s', datefmt='%Y%m%d %H:%M:%S')
+
+    def format(self, record: logging.LogRecord) -> str:
+        level = "[INFO]"
+        if record.levelno == logging.WARNING:
+            level = "[WARN] ⚠️ "
+        elif record.levelno in [logging.ERROR, logging.CRITICAL]:
+            level = "[ERROR] 🛑"
+        elif record.levelno == FLEXUS_CUSTOM_LEVEL:
+            level = "[FLEXUS] 🚀 "
+        s = super().format(record).replace("!!LEVEL!!", level, 1)
+        if n := getattr(record, "suppressed", 0):
+            s += " (+%d similar suppressed)" % n
+        return s
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        d = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k in _CONTEXT_VARS:
+            if v := getattr(record, k, ""):
+                d[k] = v
+        if n := getattr(record, "suppressed", 0):
+            d["suppressed"] = n
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            d["exc"] = record.exc_text
+        if record.stack_info:
+            d["stack"] = record.stack_info
+        return json.dumps(d, ensure_ascii=False, default=str)
+
+
+def _stamp(record: logging.LogRecord) -> None:
+    # Must run on the thread that logged: the context belongs to it
+    for k, var in _CONTEXT_VARS.items():
+        setattr(record, k, var.get())
+
+
+class SyncHandler(logging.Handler):
+    def __init__(self, stream=None):
+        super().__init__()
+        self.stream = stream
+
+    def emit(self, record):
+        try:
+            _stamp(record)
+            stream = self.stream or sys.stderr
+            stream.write(self.format(record))
+            stream.write("\n")
+            stream.flush()
+            stats.written += 1
+        except Exception:
+            self.handleError(record)
+
+
+class QueuedHandler(logging.Handler):
+    def __init__(self, stream=None, queue_max: int = QUEUE_MAX, batch_max: int = BATCH_MAX):
+        super().__init__()
+        self.stream = stream   # None means whatever sys.stderr is at write time
+        self.batch_max = batch_max
+        self.q: "queue.SimpleQueue[Optional[logging.LogRecord]]" = queue.SimpleQueue()
+        self.queue_max = queue_max
+        self.writer = threading.Thread(target=self._writer, name="flexus-log-writer", daemon=True)
+        self.writer.start()
+
+    def emit(self, record):
+        try:
+            _stamp(record)
+            # Arguments can be mutated by the time the writer gets to them, render now. Tracebacks too, the frames
+            # would otherwise stay alive in the queue.
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = (self.formatter or logging.Formatter()).formatException(record.exc_info)
+                record.exc_info = None
+            if self.q.qsize() >= self.queue_max and record.levelno < logging.WARNING:
+                stats.dropped += 1
+                return
+            self.q.put(record)
+            stats.queued += 1
+        except Exception:
+            self.handleError(record)
+
+    def handle(self, record):
+        # Handler.handle() takes self.lock around emit(), nothing here needs it: SimpleQueue is thread safe
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+    def _writer(self) -> None:
+        reported_dropped = 0
+        while True:
+            batch = [self.q.get()]
+            while len(batch) < self.batch_max:
+                try:
+                    batch.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            stop = False
+            for r in batch:
+                if r is None:
+                    stop = True
+                    continue
+                try:
+                    lines.append(self.format(r))
+                except Exception:
+                    self.handleError(r)
+            if stats.dropped != reported_dropped:
+                lines.append("ckit_logs: %d lines dropped, writer could not keep up" % (stats.dropped - reported_dropped))
+                reported_dropped = stats.dropped
+            if lines:
+                t0 = time.perf_counter()
+                try:
+                    stream = self.stream or sys.stderr
+                    stream.write("\n".join(lines) + "\n")
+                    stream.flush()
+                except Exception:
+                    pass   # stderr closed at interpreter exit, nothing left to tell
+                stats.write_s += time.perf_counter() - t0
+                stats.written += len(lines)
+                stats.batches += 1
+            if stop:
+                return
+
+    def close(self, timeout: float = 5.0) -> None:
+        # Drains what's queued, safe to call more than once
+        if self.writer.is_alive():
+            self.q.put(None)
+            self.writer.join(timeout)
+        super().close()
+
+
+def make_handler(stream=None, *, use_json: bool = LOG_JSON, sync: bool = LOG_SYNC) -> logging.Handler:
+    handler = SyncHandler(stream) if sync else QueuedHandler(stream)
+    handler.setFormatter(JsonFormatter() if use_json else TextFormatter())
+    handler.addFilter(_SamplingFilter())
+    return handler
+
+
+_handler: Optional[logging.Handler] = None
+
+
+def shutdown_logging() -> None:
+    global _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler.close()
+        _handler = None
+
+
+def metrics_snapshot() -> Dict[str, Any]:
+    d = stats.as_dict()
+    d["pending"] = _handler.q.qsize() if isinstance(_handler, QueuedHandler) else 0
+    return d
+
+
 def setup_logger():
+    global _handler
     if getattr(logging.Logger, "falert", None):
         return
     logging.addLevelName(FLEXUS_CUSTOM_LEVEL, FLEXUS_CUSTOM_LEVEL_NAME)
     logging.Logger.falert = flexus_alert
 
-    class CustomHandler(logging.Handler):
-        def emit(self, record):
-            level = "[INFO]"
-            if record.levelno == logging.WARNING:
-                level = "[WARN] ⚠️ "
-            elif record.levelno in [logging.ERROR, logging.CRITICAL]:
-                level = "[ERROR] 🛑"
-            elif record.levelno == FLEXUS_CUSTOM_LEVEL:
-                level = "[FLEXUS] 🚀 "
-            log_entry = self.format(record)
-            log_entry = log_entry.replace("!!LEVEL!!", level, 1)
-            sys.stderr.write(log_entry)
-            sys.stderr.write("\n")
-            sys.stderr.flush()
-
-    handler = CustomHandler()
-    handler.setFormatter(logging.Formatter('%(asctime)s.%(msecs)03d %(name)s !!LEVEL!! %(message)s', datefmt='%Y%m%d %H:%M:%S'))
+    _handler = make_handler()
+    atexit.register(shutdown_logging)
 
     for name in logging.Logger.manager.loggerDict.keys():
         logging.getLogger(name).handlers = []
@@ -41,7 +304,7 @@ def setup_logger():
 
     root = logging.getLogger()
     root.handlers = []
-    root.addHandler(handler)
+    root.addHandler(_handler)
     root.setLevel(logging.INFO)
 
     gql_ws_logger = logging.getLogger("gql.transport.websockets")
@@ -53,3 +316,95 @@ def setup_logger():
     gql_ws_logger.handlers = []
     gql_ws_logger.propagate = False
     gql_ws_logger.setLevel(logging.WARNING)
+
+
+if __name__ == "__main__":
+    import asyncio
+    import statistics
+
+    class SlowPipe:
+        # stderr going to a log collector over a pipe: when the reader falls behind a write blocks until it catches up
+        def __init__(self, stall_every: int, stall_s: float):
+            self.stall_every = stall_every
+            self.stall_s = stall_s
+            self.flushes = 0
+
+        def write(self, s: str) -> None:
+            pass
+
+        def flush(self) -> None:
+            self.flushes += 1
+            if self.stall_every and self.flushes % self.stall_every == 0:
+                time.sleep(self.stall_s)
+
+    async def run(handler: logging.Handler, lines_per_s: int, seconds: float) -> Dict[str, float]:
+        log = logging.getLogger("bench")
+        log.handlers = [handler]
+        log.propagate = False
+        log.setLevel(logging.INFO)
+        lags: List[float] = []
+        stop = asyncio.Event()
+
+        async def meter():
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - t0 - 0.001)
+
+        async def producer():
+            # Lines go out on schedule in slices of 50, the loop gets control back between slices
+            sent = 0
+            spent = 0.0
+            t_start = time.perf_counter()
+            while (now := time.perf_counter()) - t_start < seconds:
+                due = min(int((now - t_start) * lines_per_s) - sent, 50)
+                t0 = time.perf_counter()
+                for _ in range(due):
+                    with log_context(persona_id="p%d" % (sent % 7), fcall_id="call%d" % sent):
+                        log.info("persona %s msg %d of the burst, payload %r", "p%d" % (sent % 7), sent, {"k": sent})
+                    sent += 1
+                spent += time.perf_counter() - t0
+                await asyncio.sleep(0)
+            return sent / (time.perf_counter() - t_start), spent / max(sent, 1)
+
+        m = asyncio.create_task(meter())
+        rate, per_line = await producer()
+        stop.set()
+        await m
+        t0 = time.perf_counter()
+        handler.close()
+        drain = time.perf_counter() - t0
+        lags.sort()
+        return {
+            "rate": rate,
+            "per_line_us": per_line * 1e6,
+            "lag_p50_ms": statistics.median(lags) * 1000,
+            "lag_p99_ms": lags[int(len(lags) * 0.99)] * 1000,
+            "lag_max_ms": lags[-1] * 1000,
+            "drain_s": drain,
+        }
+
+    def bench():
+        global SAMPLE_RATE
+        SAMPLE_RATE = 0   # measure the pipeline itself
+        for pipe_name, stall_every, stall_s in [("fast pipe", 0, 0.0), ("pipe stalls 20ms every 2000 flushes", 2000, 0.020)]:
+            print(pipe_name)
+            for name, sync in [("sync", True), ("queued", False)]:
+                for use_json in [False, True]:
+                    before = stats.written
+                    r = asyncio.run(run(make_handler(SlowPipe(stall_every, stall_s), use_json=use_json, sync=sync), 50000, 2.0))
+                    print("  %-6s %-4s  achieved %6.0f lines/s  %5.1fus per line on the loop  loop lag p50 %5.2fms  p99 %6.2fms  max %6.2fms  written %d, drain %.2fs" % (
+                        name, "json" if use_json else "text", r["rate"], r["per_line_us"], r["lag_p50_ms"], r["lag_p99_ms"], r["lag_max_ms"], stats.written - before, r["drain_s"]))
+
+        SAMPLE_RATE = 200
+        before_w, before_s = stats.written, stats.suppressed
+        r = asyncio.run(run(make_handler(SlowPipe(0, 0.0)), 50000, 2.0))
+        print("sampling at %d/s per call site: written %d, suppressed %d, loop lag p99 %.2fms" % (SAMPLE_RATE, stats.written - before_w, stats.suppressed - before_s, r["lag_p99_ms"]))
+
+        lim = KeyedRateLimiter(max_keys=1000)
+        for i in range(100000):
+            lim.admit("key%d" % i, 1.0, 1.0)
+        assert len(lim.buckets) == 1000
+        print("KeyedRateLimiter after 100000 distinct keys holds", len(lim.buckets))
+
+    bench()
@@ -0,0 +1,448 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import bisect
+import hashlib
+import logging
+import functools
+import contextvars
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("ckit_metrics")
+
+
+# In-process counters, histograms and trace spans for the hot paths of bots and cloudtools.
+#
+#   FLEXUS_METRICS_PORT=9464        Prometheus text on http://0.0.0.0:9464/metrics
+#   FLEXUS_TRACE_FILE=spans.jsonl   OTLP/JSON, one ExportTraceServiceRequest per line, appended every few seconds
+#   FLEXUS_TRACE=1                  keep spans in memory without writing them (tests, ckit_metrics.finished_spans)
+#
+# Metrics are always on. Tracing is off unless one of the last two is set, then every tool call becomes a trace
+# (trace id derived from fcall_id, so the backend can find it) with GraphQL, mongo and ckit_http calls as child spans.
+#
+# Overhead budget, checked by `python -m flexus_client_kit.ckit_metrics`: an observation under 2us, a timed block
+# under 4us, a timed block with a span under 15us. Observations from threads are not locked, a lost increment under
+# contention is an acceptable error for monitoring.
+
+
+METRICS_PORT = int(os.getenv("FLEXUS_METRICS_PORT", "0") or 0)
+TRACE_FILE = os.getenv("FLEXUS_TRACE_FILE", "")
+TRACE_ENABLED = bool(TRACE_FILE) or os.getenv("FLEXUS_TRACE", "") not in ("", "0")
+TRACE_FLUSH_INTERVAL = 5.0
+SPANS_MAX = 20000          # finished spans waiting for export, oldest dropped first
+SERIES_MAX = 500           # label combinations per metric, the rest folded into "other"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEPTH_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.series: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Tuple[str, ...]) -> Tuple[str, ...]:
+        if labels in self.series or len(self.series) < SERIES_MAX:
+            return labels
+        return ("other",) * len(self.labelnames)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, n: float = 1) -> None:
+        k = labels if labels in self.series else self._key(labels)
+        self.series[k] = self.series.get(k, 0) + n
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        self.series[labels if labels in self.series else self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...], buckets: Tuple[float, ...]):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels: str) -> None:
+        s = self.series.get(labels)
+        if s is None:
+            k = self._key(labels)
+            s = self.series.get(k)
+            if s is None:
+                s = self.series[k] = [0] * (len(self.buckets) + 1) + [0.0]   # per-bucket counts, +Inf, sum
+        s[bisect.bisect_left(self.buckets, value)] += 1
+        s[-1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+
+    def __init__(self, hist: Histogram, labels: Tuple[str, ...]):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.hist.observe(time.perf_counter() - self.t0, *self.labels)
+
+
+_registry: Dict[str, _Metric] = {}
+
+
+def _register(m: _Metric) -> Any:
+    old = _registry.get(m.name)
+    if old is not None:
+        assert type(old) is type(m) and old.labelnames == m.labelnames, "metric %s registered twice with a different shape" % m.name
+        return old
+    _registry[m.name] = m
+    return m
+
+
+def counter(name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return _register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+    return _register(Gauge(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help, labelnames, buckets))
+
+
+TOOL_CALL_SECONDS = histogram("flexus_tool_call_seconds", "Tool call from arrival to result posted", ("kind", "tool", "outcome"))
+HANDLER_SECONDS = histogram("flexus_bot_handler_seconds", "Bot event handler duration", ("handler",))
+PARKED_EVENTS = histogram("flexus_bot_parked_events", "Events waiting when a bot unparks them", (), DEPTH_BUCKETS)
+SUBS_DECODE_SECONDS = histogram("flexus_subscription_decode_seconds", "Subscription update to dataclass", ("about",))
+GRAPHQL_SECONDS = histogram("flexus_graphql_seconds", "GraphQL round trip over HTTP", ("operation", "outcome"))
+MONGO_SECONDS = histogram("flexus_mongo_seconds", "ckit_mongo operation", ("op", "outcome"))
+CLOUDTOOL_WORKSET = gauge("flexus_cloudtool_workset", "Cloudtool calls in progress", ("service",))
+
+
+# ---- tracing ----
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attrs", "error")
+
+    def __init__(self, trace_id: str, parent_id: str, name: str, attrs: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error = ""
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("metrics_current_span", default=None)
+finished_spans: Deque[Span] = deque(maxlen=SPANS_MAX)
+
+
+def trace_id_for(key: str) -> str:
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class _SpanScope:
+    __slots__ = ("name", "trace_id", "attrs", "span", "token")
+
+    def __init__(self, name: str, trace_id: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.attrs = attrs
+        self.span = None
+
+    def __enter__(self) -> Optional[Span]:
+        if not TRACE_ENABLED:
+            return None
+        parent = _current_span.get()
+        if self.trace_id:
+            trace_id, parent_id = self.trace_id, ""   # a new root, like a tool call arriving
+        elif parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            return None   # downstream call outside of any trace, not worth a trace of its own
+        self.span = Span(trace_id, parent_id, self.name, self.attrs)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.span is None:
+            return
+        self.span.end_ns = time.time_ns()
+        if exc_type is not None and not issubclass(exc_type, asyncio.CancelledError):
+            self.span.error = "%s: %s" % (exc_type.__name__, exc)
+        _current_span.reset(self.token)
+        finished_spans.append(self.span)
+
+
+def span(name: str, trace_id: str = "", **attrs: Any) -> _SpanScope:
+    # with ckit_metrics.span("mongo.find", path=p): ...
+    return _SpanScope(name, trace_id, attrs)
+
+
+class _MeteredScope:
+    # Histogram + span in one, outcome label "ok" / "error"
+    __slots__ = ("hist", "labels", "scope", "t0", "failed")
+
+    def __init__(self, hist: Histogram, labels: Tuple[str, ...], scope: _SpanScope):
+        self.hist = hist
+        self.labels = labels
+        self.scope = scope
+        self.failed = ""
+
+    def __enter__(self) -> "_MeteredScope":
+        self.t0 = time.perf_counter()
+        self.scope.__enter__()
+        return self
+
+    def fail(self, reason: str) -> None:
+        # For errors that come back as a value, not an exception
+        self.failed = reason
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.scope.__exit__(exc_type, exc, tb)
+        if self.failed and self.scope.span is not None and not self.scope.span.error:
+            self.scope.span.error = self.failed
+        self.hist.observe(time.perf_counter() - self.t0, *self.labels, "ok" if exc_type is None and not self.failed else "error")
+
+
+def tool_call(kind: str, tool: str, fcall_id: str, ft_id: str) -> _MeteredScope:
+    # Root of a trace: everything the tool does downstream on this task (and tasks it starts) hangs under it
+    return _MeteredScope(TOOL_CALL_SECONDS, (kind, tool), _SpanScope("tool_call " + tool, trace_id_for(fcall_id), {"fcall_id": fcall_id, "ft_id": ft_id, "kind": kind}))
+
+
+def graphql_call(operation: str) -> _MeteredScope:
+    return _MeteredScope(GRAPHQL_SECONDS, (operation,), _SpanScope("graphql " + operation, "", {}))
+
+
+def metered(hist: Histogram, prefix: str):
+    # Decorator for async functions, labelled by function name: @ckit_metrics.metered(MONGO_SECONDS, "mongo")
+    def deco(fn):
+        op = fn.__name__
+        name = f"{prefix}.{op}"
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with _MeteredScope(hist, (op,), _SpanScope(name, "", {})):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ---- export ----
+
+# Other modules keep their own metrics_snapshot(), rendered as gauges if they are loaded in this process
+SNAPSHOT_MODULES = {
+    "http": "flexus_client_kit.ckit_http",
+    "blocking": "flexus_client_kit.ckit_blocking",
+    "logs": "flexus_client_kit.ckit_logs",
+    "langchain": "flexus_client_kit.integrations.langchain_adapter",
+}
+
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = ['%s="%s"' % (n, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{%s}" % ",".join(parts) if parts else ""
+
+
+def render_prometheus() -> str:
+    out: List[str] = []
+    for m in list(_registry.values()):
+        out.append(f"# HELP {m.name} {m.help}")
+        out.append(f"# TYPE {m.name} {m.kind}")
+        for labels, v in list(m.series.items()):
+            if m.kind != "histogram":
+                out.append(f"{m.name}{_fmt_labels(m.labelnames, labels)} {v}")
+                continue
+            acc = 0
+            for le, n in zip(m.buckets, v):
+                acc += n
+                out.append("%s_bucket%s %d" % (m.name, _fmt_labels(m.labelnames, labels, 'le="%s"' % le), acc))
+            acc += v[len(m.buckets)]
+            out.append("%s_bucket%s %d" % (m.name, _fmt_labels(m.labelnames, labels, 'le="+Inf"'), acc))
+            out.append(f"{m.name}_sum{_fmt_labels(m.labelnames, labels)} {v[-1]}")
+            out.append(f"{m.name}_count{_fmt_labels(m.labelnames, labels)} {acc}")
+    for prefix, modname in SNAPSHOT_MODULES.items():
+        mod = sys.modules.get(modname)
+        if mod is None:
+            continue
+        try:
+            snap = mod.metrics_snapshot()
+        except Exception as e:
+            logger.warning("%s.metrics_snapshot() failed: %s", modname, e)
+            continue
+        rows: Dict[str, List[str]] = {}
+        for key, d in snap.items():
+            if isinstance(d, dict):
+                for field, v in d.items():
+                    if isinstance(v, (int, float)):
+                        rows.setdefault(field, []).append(f"flexus_{prefix}_{field}{_fmt_labels(('key',), (key,))} {float(v)}")
+            elif isinstance(d, (int, float)):
+                rows.setdefault(key, []).append(f"flexus_{prefix}_{key} {float(d)}")
+        for field, lines in rows.items():
+            out.append(f"# TYPE flexus_{prefix}_{field} gauge")
+            out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+def _otlp_value(v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def otlp_json(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{
+            "scope": {"name": "flexus_client_kit"},
+            "spans": [{
+                "traceId": s.trace_id,
+                "spanId": s.span_id,
+                "parentSpanId": s.parent_id,
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attrs.items()],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            } for s in spans],
+        }],
+    }]}
+
+
+def drain_spans() -> List[Span]:
+    out = []
+    while finished_spans:
+        out.append(finished_spans.popleft())
+    return out
+
+
+def write_spans(path: str, service_name: str) -> int:
+    spans = drain_spans()
+    if spans:
+        with open(path, "a") as f:
+            f.write(json.dumps(otlp_json(spans, service_name)) + "\n")
+    return len(spans)
+
+
+async def serve_prometheus(port: int):
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(body=render_prometheus().encode("utf-8"), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "0.0.0.0", port)
+    await site.start()
+    logger.info("prometheus metrics on :%d/metrics", site._server.sockets[0].getsockname()[1])
+    return runner
+
+
+async def export_forever(service_name: str) -> None:
+    # Start next to the other background tasks of a service, returns at once if nothing is configured
+    if not METRICS_PORT and not TRACE_FILE:
+        return
+    runner = await serve_prometheus(METRICS_PORT) if METRICS_PORT else None
+    try:
+        while True:
+            await asyncio.sleep(TRACE_FLUSH_INTERVAL)
+            if TRACE_FILE:
+                await asyncio.to_thread(write_spans, TRACE_FILE, service_name)
+    finally:
+        if TRACE_FILE:
+            write_spans(TRACE_FILE, service_name)
+        if runner:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    def per_call_us(fn, n: int = 200000) -> float:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return (time.perf_counter() - t0) / n * 1e6
+
+    def bench():
+        global TRACE_ENABLED
+        h = histogram("bench_seconds", "bench", ("op",))
+
+        def nothing():
+            pass
+
+        def observe():
+            h.observe(0.003, "find")
+
+        def timed():
+            with h.time("find"):
+                pass
+
+        def timed_with_span():
+            with graphql_call("BenchOp"):
+                pass
+
+        def traced_tool_call():
+            with tool_call("bot", "bench_tool", "call1", "ft1"):
+                with graphql_call("BenchOp"):
+                    pass
+
+        base = per_call_us(nothing)
+        TRACE_ENABLED = False
+        r = {
+            "observe": per_call_us(observe) - base,
+            "timed": per_call_us(timed) - base,
+            "timed, tracing off": per_call_us(timed_with_span) - base,
+        }
+        TRACE_ENABLED = True
+        with tool_call("bot", "bench_tool", "call0", "ft0"):
+            r["timed, inside a trace"] = per_call_us(timed_with_span) - base
+        r["tool call with one child, traced"] = per_call_us(traced_tool_call, 50000) - base
+        for k, v in r.items():
+            print("%-36s %6.2fus" % (k, v))
+        budget = {"observe": 2.0, "timed": 4.0, "timed, tracing off": 4.0, "timed, inside a trace": 15.0, "tool call with one child, traced": 30.0}
+        over = [k for k, limit in budget.items() if r[k] > limit]
+        print("spans buffered: %d (capped at %d)" % (len(finished_spans), SPANS_MAX))
+
+        # a 5ms handler doing 3 GraphQL calls and 2 mongo ops, what instrumentation adds on top
+        added = r["tool call with one child, traced"] + 4 * r["timed, inside a trace"]
+        print("overhead on a 5ms tool call with 5 downstream calls: %.3f%%" % (added / 5000 * 100))
+        text = render_prometheus()
+        print("prometheus text: %d lines, %d bytes" % (text.count("\n"), len(text)))
+        assert not over, "over budget: %s" % over
+        assert added / 5000 < 0.01
+
+    bench()
@@ -1,14 +1,20 @@
+import asyncio
 import json
+import logging
 import gql
 import time
-from typing import Dict, Any, List, Optional
+import uuid
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
 from bson import Binary
 from pymongo.collection import Collection
 
-from flexus_client_kit import ckit_client
+from flexus_client_kit import ckit_client, ckit_metrics
 
+logger = logging.getLogger("mongo")
 
 MAX_FILE_SIZE = 2 * 1024 * 1024
+SPILL_THRESHOLD_BYTES = 20_000     # a list bigger than this as JSON goes to mongo instead of the tool result
+SPILL_PREVIEW_ITEMS = 10
 
 
 # XXX delete, should send automatically via subscription
@@ -29,12 +35,21 @@ async def mongo_fetch_creds(
         return r["bot_mongodb_creds"]
 
 
+# Metered functions call each other through the undecorated _store_file() / _overwrite(), so one call is one
+# MONGO_SECONDS observation and one span, not one per layer.
+
+
+@ckit_metrics.metered(ckit_metrics.MONGO_SECONDS, "mongo")
 async def mongo_store_file(
     mongo_collection: Collection,
     file_path: str,
     file_data: bytes,
     ttl: int = 30 * 86400,
 ) -> str:
+    return await _store_file(mongo_collection, file_path, file_data, ttl)
+
+
+async def _store_file(mongo_collection: Collection, file_path: str, file_data: bytes, ttl: int) -> str:
     assert ttl > 0
     if len(file_data) > MAX_FILE_SIZE:
         raise ValueError(f"File size {len(file_data)} exceeds maximum {MAX_FILE_SIZE}")
@@ -60,12 +75,17 @@ async def mongo_store_file(
     return str(result.inserted_id)
 
 
+@ckit_metrics.metered(ckit_metrics.MONGO_SECONDS, "mongo")
 async def mongo_overwrite(
     mongo_collection: Collection,
     file_path: str,
     file_data: bytes,
     ttl: int = 30 * 86400,
 ) -> str:
+    return await _overwrite(mongo_collection, file_path, file_data, ttl)
+
+
+async def _overwrite(mongo_collection: Collection, file_path: str, file_data: bytes, ttl: int) -> str:
     if len(file_data) > MAX_FILE_SIZE:
         raise ValueError(f"File size {len(file_data)} exceeds maximum {MAX_FILE_SIZE}")
     t = time.time()
@@ -88,25 +108,98 @@ async def mongo_overwrite(
             update_doc["$unset"] = {"json": ""}
         await mongo_collection.update_one({"_id": doc_id}, update_doc)
         return str(doc_id)
-    return await mongo_store_file(mongo_collection, file_path, file_data, ttl)
+    return await _store_file(mongo_collection, file_path, file_data, ttl)
+
+
+def spill_path_prefix(prefix: str) -> str:
+    # Two searches in the same second must not overwrite each other's spill
+    return "%s_%d_%s" % (prefix, int(time.time()), uuid.uuid4().hex[:8])
 
 
+async def personal_mongo_lazy(rcx: Any) -> Optional[Collection]:
+    # For integrations that need mongo only now and then, instead of NEED_MONGO: credentials are fetched on first
+    # use, not at bot start. None without a persona or if that fails.
+    if rcx is None:
+        return None
+    if getattr(rcx, "personal_mongo", None) is not None:
+        return rcx.personal_mongo
+    lock = rcx.__dict__.setdefault("_personal_mongo_lock", asyncio.Lock())
+    async with lock:
+        if getattr(rcx, "personal_mongo", None) is None:
+            try:
+                from pymongo import AsyncMongoClient
+                mongo_conn_str = await mongo_fetch_creds(rcx.fclient, rcx.persona.persona_id)
+                rcx.personal_mongo = AsyncMongoClient(mongo_conn_str)[rcx.persona.persona_id + "_db"]["personal_mongo"]
+            except Exception as e:
+                logger.warning("personal mongo for %s not available: %s: %s", getattr(getattr(rcx, "persona", None), "persona_id", "?"), type(e).__name__, e)
+                return None
+    return rcx.personal_mongo
+
+
+@ckit_metrics.metered(ckit_metrics.MONGO_SECONDS, "mongo")
+async def mongo_spill_list(
+    mongo_collection: Optional[Collection],
+    path_prefix: str,
+    items: List[Any],
+    ttl: int = 7 * 86400,
+    get_collection: Optional[Callable[[], Awaitable[Optional[Collection]]]] = None,
+) -> Tuple[List[Any], Dict[str, Any]]:
+    # For integrations that collect many pages server-side: returns (items to put into the tool result, extra fields).
+    # Small lists come back unchanged with no extra fields. Big ones are written as path_prefix/part-NNN.json files,
+    # each under MAX_FILE_SIZE, and only a preview stays in the result. get_collection is called only for a big list,
+    # see personal_mongo_lazy().
+    encoded = [json.dumps(x, ensure_ascii=False) for x in items]
+    if sum(len(e) for e in encoded) <= SPILL_THRESHOLD_BYTES:
+        return items, {}
+    preview = items[:SPILL_PREVIEW_ITEMS]
+    if mongo_collection is None and get_collection is not None:
+        mongo_collection = await get_collection()
+    if mongo_collection is None:
+        return preview, {
+            "items_total": len(items),
+            "items_shown": len(preview),
+            "spill_note": "Result too big for the context and no mongo store is available, narrow the query to see the rest.",
+        }
+    parts: List[List[str]] = [[]]
+    part_size = 0
+    for e in encoded:
+        n = len(e.encode("utf-8")) + 2
+        if parts[-1] and part_size + n > MAX_FILE_SIZE - 1024:
+            parts.append([])
+            part_size = 0
+        parts[-1].append(e)
+        part_size += n
+    paths = []
+    for i, part in enumerate(parts):
+        path = "%s/part-%03d.json" % (path_prefix, i)
+        await _overwrite(mongo_collection, path, ("[" + ",".join(part) + "]").encode("utf-8"), ttl)
+        paths.append(path)
+    return preview, {
+        "items_total": len(items),
+        "items_shown": len(preview),
+        "stored_at": paths,
+        "spill_note": "Full result is a JSON array split across stored_at, read it with mongo_store(op=\"cat\", args={\"path\": ...}).",
+    }
+
+
+@ckit_metrics.metered(ckit_metrics.MONGO_SECONDS, "mongo")
 async def mongo_retrieve_file(
     mongo_collection: Collection,
     file_path: str,
     best_effort_to_find: bool = False,
 ) -> Optional[Dict[str, Any]]:
     document = await mongo_collection.find_one({"path": file_path})
+    while document and "mon_new_location" in document:
+        if not best_effort_to_find:
+            return None
+        document = await mongo_collection.find_one({"path": document["mon_new_location"]})
     if not document:
         return None
-    if "mon_new_location" in document:
-        if best_effort_to_find:
-            return await mongo_retrieve_file(mongo_collection, document["mon_new_location"], best_effort_to_find)
-        return None
     document["_id"] = str(document["_id"])
     return document
 
 
+@ckit_metrics.metered(ckit_metrics.MONGO_SECONDS, "mongo")
 async def mongo_ls(
     mongo_collection: Collection,
     path_prefix: Optional[str] = None,
@@ -125,6 +218,7 @@ async def mongo_ls(
     return documents
 
 
+@ckit_metrics.metered(ckit_metrics.MONGO_SECONDS, "mongo")
 async def mongo_mv(
     mongo_collection: Collection,
     old_path: str,
@@ -153,6 +247,7 @@ async def mongo_mv(
     return True
 
 
+@ckit_metrics.metered(ckit_metrics.MONGO_SECONDS, "mongo")
 async def mongo_rm(
     mongo_collection: Collection,
     file_path: str,
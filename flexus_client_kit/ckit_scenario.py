@@ -1,11 +1,13 @@
+import asyncio
 import importlib
 import re
 import uuid
 import logging
 import argparse
 import dataclasses
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 import gql
 
@@ -171,63 +173,161 @@ async def scenario_generate_tool_result_via_model(
     raise ckit_cloudtool.AlreadyFakedResult()
 
 
-async def scenario_print_threads(fclient: ckit_client.FlexusClient, fgroup_id: str) -> str:
-    async with (await fclient.use_http_on_behalf("", "")) as http:
-        threads = await http.execute(gql.gql(f"""
-            query GetGroupThreads($fgroup_id: String!) {{
-                thread_list(located_fgroup_id: $fgroup_id, skip: 0, limit: 100) {{
-                    {gql_utils.gql_fields(ckit_ask_model.FThreadOutput)}
-                }}
-            }}"""), variable_values={"fgroup_id": fgroup_id})
-
-        lines = []
-        for thread_dict in threads["thread_list"]:
-            thread = gql_utils.dataclass_from_dict(thread_dict, ckit_ask_model.FThreadOutput)
-
-            a, t, u = thread.ft_need_assistant, thread.ft_need_tool_calls, thread.ft_need_user
-            need_str = f"need_assistant={a}" if a != -1 else f"ended_with need_tool_calls={t}" if t != -1 else f"ended_with need_user={u}"
-            persona_id = thread.ft_persona_id or "N/A"
-            tool_names = ",".join([tool['function']['name'] for tool in thread.ft_toolset])
-            lines.append(f"    📝{thread.ft_id} title={thread.ft_title!r} persona={persona_id} exp={thread.ft_fexp_id} budget={thread.ft_budget} coins={thread.ft_coins}")
-            lines.append(f"    searchable={thread.ft_app_searchable!r} capture={thread.ft_app_capture!r} {need_str}")
-            lines.append(f"    toolset={tool_names}")
-            if thread.ft_error:
-                lines.append(f"    ft_error=\033[91m{thread.ft_error}\033[0m")
-
-            messages = await http.execute(gql.gql(f"""
-                query ThreadMessages($ft_id: String!) {{
-                    thread_messages_list(ft_id: $ft_id) {{ {gql_utils.gql_fields(ckit_ask_model.FThreadMessageOutput)} }}
-                }}"""), variable_values={"ft_id": thread.ft_id})
-
-            colors = {
-                "user": "\033[93m",      # Bright Yellow
-                "assistant": "\033[92m", # Bright Green
-                "system": "\033[95m",
-                "cd_instruction": "\033[95m",
-                "tool": "\033[95m",      # Bright Magenta
-                "kernel": "\033[96m"     # Bright Cyan
+# Thread dumps. One query lists the threads, then messages for many threads go out as aliased fields of one query,
+#
+#   query ThreadDump($m0_ft_id: String!, $m1_ft_id: String!, ...) {
+#       m0: thread_messages_list(ft_id: $m0_ft_id) { ... }
+#       m1: thread_messages_list(ft_id: $m1_ft_id) { ... }
+#   }
+#
+# THREADS_PER_QUERY threads per query, up to DUMP_CONCURRENCY queries in flight. ThreadDumper remembers what it
+# fetched. A thread it has seen before is first probed for (ftm_alt, ftm_num) only, and fetched in full again
+# only if its message count or last message changed, so a repeated dump of a group (every model in a scenario
+# run, a debugging loop) pays full price only for threads that moved. ft_updated_ts is not trusted for that,
+# nothing says appending a message bumps it.
+
+
+THREADS_PER_QUERY = 20
+DUMP_CONCURRENCY = 4
+SEEN_THREADS_MAX = 1000     # per dumper, least recently dumped threads are forgotten
+DUMPERS_MAX = 8
+THREAD_FIELDS = gql_utils.gql_fields(ckit_ask_model.FThreadOutput)
+THREAD_MESSAGE_FIELDS = gql_utils.gql_fields(ckit_ask_model.FThreadMessageOutput)
+
+
+@dataclass
+class ThreadDump:
+    thread: ckit_ask_model.FThreadOutput
+    messages: List[ckit_ask_model.FThreadMessageOutput]
+    new_messages: int           # not seen by the previous fetch() of the same dumper
+
+
+class ThreadDumper:
+    def __init__(self, fclient: ckit_client.FlexusClient):
+        self.fclient = fclient
+        self.queries_sent = 0
+        self.threads_fetched = 0
+        self._seen: "OrderedDict[str, Tuple[Tuple[int, int, int], List[ckit_ask_model.FThreadMessageOutput]]]" = OrderedDict()   # ft_id -> (messages key, messages)
+
+    @staticmethod
+    def _messages_key(alt_nums: List[Tuple[int, int]]) -> Tuple[int, int, int]:
+        last = max(alt_nums, default=(-1, -1))
+        return (len(alt_nums), last[0], last[1])
+
+    async def fetch(self, fgroup_id: str, limit: int = 100) -> List[ThreadDump]:
+        async with (await self.fclient.use_http_on_behalf("", "")) as http:
+            r = await http.execute(gql.gql(f"""
+                query GetGroupThreads($fgroup_id: String!, $limit: Int!) {{
+                    thread_list(located_fgroup_id: $fgroup_id, skip: 0, limit: $limit) {{
+                        {THREAD_FIELDS}
+                    }}
+                }}"""), variable_values={"fgroup_id": fgroup_id, "limit": limit})
+            self.queries_sent += 1
+            threads = [gql_utils.dataclass_from_dict(d, ckit_ask_model.FThreadOutput) for d in r["thread_list"]]
+
+            sem = asyncio.Semaphore(DUMP_CONCURRENCY)
+
+            async def query_chunk(ft_ids: List[str], fields: str) -> Dict[str, List[Dict]]:
+                decls = ", ".join(f"$m{n}_ft_id: String!" for n in range(len(ft_ids)))
+                aliased = "\n".join(f"m{n}: thread_messages_list(ft_id: $m{n}_ft_id) {{ {fields} }}" for n in range(len(ft_ids)))
+                async with sem:
+                    r = await http.execute(
+                        gql.gql("query ThreadDump(%s) {\n%s\n}" % (decls, aliased)),
+                        variable_values={f"m{n}_ft_id": ft_id for n, ft_id in enumerate(ft_ids)},
+                    )
+                self.queries_sent += 1
+                return {ft_id: r[f"m{n}"] for n, ft_id in enumerate(ft_ids)}
+
+            async def query_all(ft_ids: List[str], fields: str) -> Dict[str, List[Dict]]:
+                out: Dict[str, List[Dict]] = {}
+                for part in await asyncio.gather(*[query_chunk(ft_ids[i:i + THREADS_PER_QUERY], fields) for i in range(0, len(ft_ids), THREADS_PER_QUERY)]):
+                    out.update(part)
+                return out
+
+            known = [t.ft_id for t in threads if t.ft_id in self._seen]
+            probed = await query_all(known, "ftm_alt ftm_num")
+            stale = [t.ft_id for t in threads if t.ft_id not in probed or self._seen[t.ft_id][0] != self._messages_key([(m["ftm_alt"], m["ftm_num"]) for m in probed[t.ft_id]])]
+            fetched = {
+                ft_id: [gql_utils.dataclass_from_dict(m, ckit_ask_model.FThreadMessageOutput) for m in msgs]
+                for ft_id, msgs in (await query_all(stale, THREAD_MESSAGE_FIELDS)).items()
             }
+            self.threads_fetched += len(fetched)
+
+        result = []
+        for t in threads:
+            if t.ft_id in fetched:
+                prev = {(m.ftm_alt, m.ftm_num) for m in self._seen.get(t.ft_id, ((), []))[1]}
+                msgs = fetched[t.ft_id]
+                self._seen[t.ft_id] = (self._messages_key([(m.ftm_alt, m.ftm_num) for m in msgs]), msgs)
+                result.append(ThreadDump(t, msgs, sum(1 for m in msgs if (m.ftm_alt, m.ftm_num) not in prev)))
+            else:
+                result.append(ThreadDump(t, self._seen[t.ft_id][1], 0))
+            self._seen.move_to_end(t.ft_id)
+        while len(self._seen) > SEEN_THREADS_MAX:
+            self._seen.popitem(last=False)
+        return result
+
+
+_dumpers: "OrderedDict[int, ThreadDumper]" = OrderedDict()
+
+
+def get_dumper(fclient: ckit_client.FlexusClient) -> ThreadDumper:
+    d = _dumpers.get(id(fclient))
+    if d is None or d.fclient is not fclient:
+        d = _dumpers[id(fclient)] = ThreadDumper(fclient)
+    _dumpers.move_to_end(id(fclient))
+    while len(_dumpers) > DUMPERS_MAX:
+        _dumpers.popitem(last=False)
+    return d
+
+
+_ROLE_COLORS = {
+    "user": "\033[93m",      # Bright Yellow
+    "assistant": "\033[92m", # Bright Green
+    "system": "\033[95m",
+    "cd_instruction": "\033[95m",
+    "tool": "\033[95m",      # Bright Magenta
+    "kernel": "\033[96m"     # Bright Cyan
+}
+
+
+def format_thread_dump(dump: ThreadDump, lines: List[str]) -> None:
+    thread = dump.thread
+    a, t, u = thread.ft_need_assistant, thread.ft_need_tool_calls, thread.ft_need_user
+    need_str = f"need_assistant={a}" if a != -1 else f"ended_with need_tool_calls={t}" if t != -1 else f"ended_with need_user={u}"
+    persona_id = thread.ft_persona_id or "N/A"
+    tool_names = ",".join([tool['function']['name'] for tool in thread.ft_toolset])
+    lines.append(f"    📝{thread.ft_id} title={thread.ft_title!r} persona={persona_id} exp={thread.ft_fexp_id} budget={thread.ft_budget} coins={thread.ft_coins}")
+    lines.append(f"    searchable={thread.ft_app_searchable!r} capture={thread.ft_app_capture!r} {need_str}")
+    lines.append(f"    toolset={tool_names}")
+    if thread.ft_error:
+        lines.append(f"    ft_error=\033[91m{thread.ft_error}\033[0m")
+
+    for msg in dump.messages:
+        if msg.ftm_alt == 100:
+            content = str(msg.ftm_content).replace('\n', '\\n')[:120]
+            if len(str(msg.ftm_content)) > 120:
+                content += "..."
+            color = _ROLE_COLORS.get(msg.ftm_role, "\033[0m")
+            msg_key = "%03d:%03d" % (msg.ftm_alt, msg.ftm_num)
+            lines.append(f"        {msg_key} {color}{msg.ftm_role}\033[0m: {content}")
+            if msg.ftm_role == 'assistant' and msg.ftm_tool_calls:
+                for tool_call in msg.ftm_tool_calls:
+                    tool_name = tool_call.get('function', {}).get('name', 'unknown')
+                    tool_args = str(tool_call.get('function', {}).get('arguments', ''))[:60]
+                    if len(str(tool_call.get('function', {}).get('arguments', ''))) > 60:
+                        tool_args += "..."
+                    lines.append(f"            🔧 {tool_name}: {tool_args}")
+            if msg.ftm_role == 'assistant' and msg.ftm_usage:
+                lines.append(f"            ⏳ {'%0.3f' % msg.ftm_usage['llm_lag']}s")
 
-            for msg_dict in messages["thread_messages_list"]:
-                msg = gql_utils.dataclass_from_dict(msg_dict, ckit_ask_model.FThreadMessageOutput)
-                if msg.ftm_alt == 100:
-                    content = str(msg.ftm_content).replace('\n', '\\n')[:120]
-                    if len(str(msg.ftm_content)) > 120:
-                        content += "..."
-                    color = colors.get(msg.ftm_role, "\033[0m")
-                    msg_key = "%03d:%03d" % (msg.ftm_alt, msg.ftm_num)
-                    lines.append(f"        {msg_key} {color}{msg.ftm_role}\033[0m: {content}")
-                    if msg.ftm_role == 'assistant' and msg.ftm_tool_calls:
-                        for tool_call in msg.ftm_tool_calls:
-                            tool_name = tool_call.get('function', {}).get('name', 'unknown')
-                            tool_args = str(tool_call.get('function', {}).get('arguments', ''))[:60]
-                            if len(str(tool_call.get('function', {}).get('arguments', ''))) > 60:
-                                tool_args += "..."
-                            lines.append(f"            🔧 {tool_name}: {tool_args}")
-                    if msg.ftm_role == 'assistant' and msg.ftm_usage:
-                        lines.append(f"            ⏳ {'%0.3f' % msg.ftm_usage['llm_lag']}s")
-        if len(lines) == 0:
-            lines.append("    No threads")
+
+async def scenario_print_threads(fclient: ckit_client.FlexusClient, fgroup_id: str) -> str:
+    lines: List[str] = []
+    for dump in await get_dumper(fclient).fetch(fgroup_id):
+        format_thread_dump(dump, lines)
+    if len(lines) == 0:
+        lines.append("    No threads")
     return "\n".join(lines)
 
 
@@ -339,3 +439,97 @@ async def bot_scenario_result_upsert(
             }
         )
     return result["bot_scenario_result_upsert"]
+
+
+if __name__ == "__main__":
+    import re
+    import time
+    from aiohttp import web
+
+    STUB_LATENCY = 0.01
+    N_THREADS, N_MESSAGES = 60, 30
+
+    def fake_thread(i: int, updated_ts: float) -> dict:
+        return {
+            "owner_fuser_id": "u1", "ft_id": f"ft{i}", "ft_fexp_id": "default", "ft_title": f"thread {i}", "ft_btest_name": "",
+            "ft_toolset": [{"function": {"name": "web"}}], "ft_error": None, "ft_need_assistant": -1, "ft_need_tool_calls": -1,
+            "ft_need_user": 100, "ft_app_capture": "", "ft_app_searchable": "", "ft_app_specific": None, "ft_persona_id": "p1",
+            "ft_created_ts": 1.0, "ft_updated_ts": updated_ts, "ft_budget": 1000, "ft_coins": 10,
+        }
+
+    def fake_message(ft_id: str, n: int) -> dict:
+        return {
+            "ftm_belongs_to_ft_id": ft_id, "ftm_role": "user" if n % 2 else "assistant", "ftm_content": f"message {n} " * 20,
+            "ftm_num": n, "ftm_alt": 100, "ftm_prev_alt": 100, "ftm_usage": None, "ftm_tool_calls": None, "ftm_call_id": "",
+            "ftm_author_label1": "", "ftm_app_specific": None, "ftm_created_ts": 1.0 + n, "ftm_provenance": {},
+        }
+
+    async def stub_backend_bench():
+        updated = {f"ft{i}": 1.0 for i in range(N_THREADS)}
+        counts = {f"ft{i}": N_MESSAGES for i in range(N_THREADS)}
+        requests = []
+
+        async def graphql(request):
+            body = await request.json()
+            requests.append(body["query"])
+            await asyncio.sleep(STUB_LATENCY)
+            v = body["variables"]
+            if "thread_list(" in body["query"]:
+                return web.json_response({"data": {"thread_list": [fake_thread(i, updated[f"ft{i}"]) for i in range(N_THREADS)]}})
+            data = {}
+            for alias in re.findall(r"(?:(\w+): )?thread_messages_list\(", body["query"]):
+                ft_id = v[f"{alias}_ft_id"] if alias else v["ft_id"]
+                data[alias or "thread_messages_list"] = [fake_message(ft_id, n) for n in range(counts[ft_id])]
+            return web.json_response({"data": data})
+
+        app = web.Application()
+        app.router.add_post("/v1/graphql", graphql)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        fclient = ckit_client.FlexusClient("scenario_bench", api_key="fx-bench", base_url=f"http://127.0.0.1:{port}", skip_logger_init=True)
+
+        # the way it worked before: list, then one query per thread, one after another
+        t0 = time.monotonic()
+        async with (await fclient.use_http_on_behalf("", "")) as http:
+            threads = await http.execute(gql.gql(f"query T($g: String!) {{ thread_list(located_fgroup_id: $g, skip: 0, limit: 100) {{ {THREAD_FIELDS} }} }}"), variable_values={"g": "g1"})
+            for t in threads["thread_list"]:
+                await http.execute(gql.gql(f"query M($ft_id: String!) {{ thread_messages_list(ft_id: $ft_id) {{ {THREAD_MESSAGE_FIELDS} }} }}"), variable_values={"ft_id": t["ft_id"]})
+        t_old = time.monotonic() - t0
+        print(f"{N_THREADS} threads x {N_MESSAGES} messages, query per thread: {len(requests)} requests, {t_old:.2f}s")
+
+        requests.clear()
+        t0 = time.monotonic()
+        out = await scenario_print_threads(fclient, "g1")
+        t_new = time.monotonic() - t0
+        print(f"scenario_print_threads, aliased: {len(requests)} requests, {t_new:.2f}s, {t_old / t_new:.1f}x, {len(out.splitlines())} lines")
+        assert len(requests) == 1 + (N_THREADS + THREADS_PER_QUERY - 1) // THREADS_PER_QUERY
+        assert out.count("📝") == N_THREADS and out.count("100:029 ") == N_THREADS
+
+        # two threads moved on since the last dump, one of them without a new ft_updated_ts
+        requests.clear()
+        updated["ft3"] = 2.0
+        for ft_id in ("ft3", "ft40"):
+            counts[ft_id] += 2
+        t0 = time.monotonic()
+        dumps = await get_dumper(fclient).fetch("g1")
+        print(f"second dump, 2 threads changed: {len(requests)} requests, {time.monotonic() - t0:.2f}s, new messages {[(d.thread.ft_id, d.new_messages) for d in dumps if d.new_messages]}")
+        n_probes = (N_THREADS + THREADS_PER_QUERY - 1) // THREADS_PER_QUERY
+        assert len(requests) == 1 + n_probes + 1 and requests[-1].count("thread_messages_list(") == 2
+        assert [d.new_messages for d in dumps if d.new_messages] == [2, 2] and len(dumps[40].messages) == N_MESSAGES + 2
+
+        # nothing changed: probes only
+        requests.clear()
+        dumps = await get_dumper(fclient).fetch("g1")
+        assert len(requests) == 1 + n_probes and not any(d.new_messages for d in dumps)
+
+        global SEEN_THREADS_MAX
+        SEEN_THREADS_MAX = 10
+        dumps = await get_dumper(fclient).fetch("g1")
+        assert len(dumps) == N_THREADS and len(get_dumper(fclient)._seen) == SEEN_THREADS_MAX
+
+        await runner.cleanup()
+
+    asyncio.run(stub_backend_bench())
@@ -1,7 +1,14 @@
+import calendar
+import functools
+import logging
 import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Tuple
 from zoneinfo import ZoneInfo
 
+from flexus_client_kit import ckit_utils
+
 
 def parse_sched_when(s: str):
     if s.startswith("EVERY:"):
@@ -29,61 +36,121 @@ def parse_sched_when(s: str):
     raise ValueError("bad sched_when")
 
 
-def calculate_next_run(sched_when: str, last_run_ts: float, ws_timezone: str, random_seed: str) -> float:
-    tz = ZoneInfo(ws_timezone)
+# The engine: each sched_when string is compiled once (CompiledSched, cached), the next run is computed without
+# stepping through days or building a timezone-aware datetime per candidate. Wall-clock semantics are the same as
+# before: a time that doesn't exist on a spring-forward day resolves like datetime(..., tzinfo=tz) does (an hour
+# later), a time that happens twice on a fall-back day fires on the first pass. What's new is the guarantee that the
+# result is strictly after last_run_ts, the old stepping could return an earlier instant inside the repeated hour.
+#
+#   next_ts = calculate_next_run("WEEKDAYS:MO:FR/09:00", last_run_ts, "Europe/Berlin", persona_id)
+#   next_list = calculate_next_runs([(sched_when, last_run_ts, ws_timezone, seed), ...])
+
+
+NEVER = datetime.max.replace(tzinfo=timezone.utc).timestamp()
+_MONTH_DAYS = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+logger = logging.getLogger("sched")
+
+
+@dataclass(frozen=True)
+class CompiledSched:
+    kind: str                       # EVERY, WEEKDAYS, MONTHDAY
+    period: int = 0                 # EVERY, seconds
+    ahead: Tuple[int, ...] = ()     # WEEKDAYS, for each weekday the number of days to the next allowed one, 1..7
+    days_mask: int = 0              # WEEKDAYS, bit 0 is Monday
+    monthday: int = 0               # MONTHDAY, 1..31, or -1 for the last day of the month
+    hour: int = 0
+    minute: int = 0
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_sched_when(sched_when: str) -> CompiledSched:
     kind, *p = parse_sched_when(sched_when)
     if kind == "EVERY":
-        period = p[0]
-        raw = 0
-        for ch in random_seed:
-            raw = (raw * 131 + ord(ch)) & 0xFFFFFFFF
-        shift = (raw / 2**32) * period
-        delta = (period - (last_run_ts - shift) % period) % period
+        if p[0] <= 0:
+            raise ValueError("EVERY period must be positive")
+        return CompiledSched(kind="EVERY", period=p[0])
+    days, h, m = p if kind == "WEEKDAYS" else (None, p[1], p[2])
+    if not (0 <= h <= 23 and 0 <= m <= 59):
+        raise ValueError("bad time %02d:%02d" % (h, m))
+    if kind == "WEEKDAYS":
+        mask = 0
+        for d in days:
+            mask |= 1 << d
+        ahead = tuple(next(k for k in range(1, 8) if mask >> ((w + k) % 7) & 1) for w in range(7))
+        return CompiledSched(kind="WEEKDAYS", ahead=ahead, days_mask=mask, hour=h, minute=m)
+    day = p[0]
+    if not (1 <= day <= 31 or day == -1):
+        raise ValueError("MONTHDAY day must be 1..31 or -1, %d never happens" % day)
+    return CompiledSched(kind="MONTHDAY", monthday=day, hour=h, minute=m)
+
+
+@functools.lru_cache(maxsize=4096)
+def _seed_fraction(random_seed: str) -> float:
+    raw = 0
+    for ch in random_seed:
+        raw = (raw * 131 + ord(ch)) & 0xFFFFFFFF
+    return raw / 2**32
+
+
+def next_run(c: CompiledSched, last_run_ts: float, tz: ZoneInfo, random_seed: str) -> float:
+    if c.kind == "EVERY":
+        shift = _seed_fraction(random_seed) * c.period
+        delta = (c.period - (last_run_ts - shift) % c.period) % c.period
         if delta == 0:
-            delta = period
-        next_t = last_run_ts + delta
-        return next_t
-
-    elif kind == "WEEKDAYS":
-        last_dt = datetime.fromtimestamp(last_run_ts, tz=tz)
-        days, h, m = p
-        day = last_dt.date()
-        while True:
-            candidate = (
-                datetime.combine(day, datetime.min.time(), tz)
-                .replace(hour=h, minute=m)
-            )
-            if candidate > last_dt and candidate.weekday() in days:
-                dt = candidate
-                break
-            day += timedelta(days=1)
-
-    elif kind == "MONTHDAY":
-        last_dt = datetime.fromtimestamp(last_run_ts, tz=tz)
-        day_num, h, m = p
-        y = last_dt.year
-        mo = last_dt.month
+            delta = c.period
+        return last_run_ts + delta
+
+    last_wall = datetime.fromtimestamp(last_run_ts, tz=tz).replace(tzinfo=None)
+    later_today = (last_wall.hour, last_wall.minute, last_wall.second, last_wall.microsecond) < (c.hour, c.minute, 0, 0)
+
+    if c.kind == "WEEKDAYS":
+        day = last_wall.date()
+        if not (later_today and c.days_mask >> day.weekday() & 1):
+            day += timedelta(days=c.ahead[day.weekday()])
         while True:
-            if day_num == -1:
-                nm = datetime(y, mo, 28, tzinfo=tz) + timedelta(days=4)
-                d = (nm - timedelta(days=nm.day)).day
-            else:
-                d = day_num
-            try:
-                candidate = datetime(y, mo, d, h, m, tzinfo=tz)
-            except ValueError:
-                candidate = None
-            if candidate and candidate > last_dt:
-                dt = candidate
-                break
-            if mo == 12:
-                y += 1
-                mo = 1
-            else:
-                mo += 1
-    else:
-        return datetime.max.timestamp()
-    return dt.timestamp()
+            ts = datetime(day.year, day.month, day.day, c.hour, c.minute, tzinfo=tz).timestamp()
+            if ts > last_run_ts:
+                return ts
+            # the wall time came around a second time in a fall-back hour, the instant is already in the past
+            day += timedelta(days=c.ahead[day.weekday()])
+
+    if c.kind == "MONTHDAY":
+        y, mo = last_wall.year, last_wall.month
+        this_month = True
+        while True:   # at most a few months: day 31 skips the 30-day months, day 29..30 skip February
+            ndays = 29 if mo == 2 and calendar.isleap(y) else _MONTH_DAYS[mo]
+            d = ndays if c.monthday == -1 else c.monthday
+            if d <= ndays and (not this_month or (d, later_today) > (last_wall.day, False)):
+                ts = datetime(y, mo, d, c.hour, c.minute, tzinfo=tz).timestamp()
+                if ts > last_run_ts:
+                    return ts
+            this_month = False
+            y, mo = (y + 1, 1) if mo == 12 else (y, mo + 1)
+
+    return NEVER
+
+
+def calculate_next_run(sched_when: str, last_run_ts: float, ws_timezone: str, random_seed: str) -> float:
+    return next_run(compile_sched_when(sched_when), last_run_ts, ZoneInfo(ws_timezone), random_seed)
+
+
+def calculate_next_runs(rows: Iterable[Tuple[str, float, str, str]]) -> List[float]:
+    # (sched_when, last_run_ts, ws_timezone, random_seed) -> next run, NEVER for a schedule that doesn't parse
+    zones: Dict[str, ZoneInfo] = {}
+    result = []
+    for sched_when, last_run_ts, ws_timezone, random_seed in rows:
+        try:
+            c = compile_sched_when(sched_when)
+            tz = zones.get(ws_timezone)
+            if tz is None:
+                tz = zones[ws_timezone] = ZoneInfo(ws_timezone)
+        except (ValueError, IndexError, KeyError) as e:
+            ckit_utils.log_with_throttle(logger.warning, "bad schedule %r: %s", sched_when, e, interval_seconds=600)
+            result.append(NEVER)
+            continue
+        result.append(next_run(c, last_run_ts, tz, random_seed))
+    return result
 
 
 def tests():
@@ -134,5 +201,23 @@ def tests():
     test("MONTHDAY:-1/12:00")
 
 
+def bench():
+    import random
+    rnd = random.Random(1)
+    zones = ["UTC", "Europe/Berlin", "America/New_York", "Asia/Kolkata", "Australia/Sydney"]
+    whens = ["EVERY:5m", "EVERY:2h", "WEEKDAYS:MO:TU:WE:TH:FR/09:00", "WEEKDAYS:SU/21:30", "MONTHDAY:1/12:00", "MONTHDAY:-1/23:59", "MONTHDAY:31/08:00"]
+    now = time.time()
+    rows = [(rnd.choice(whens), now - rnd.uniform(0, 30 * 86400), rnd.choice(zones), "persona%d" % i) for i in range(50000)]
+    t0 = time.perf_counter()
+    result = calculate_next_runs(rows)
+    dt = time.perf_counter() - t0
+    print("calculate_next_runs: %d schedules in %.3fs, %.0f/s" % (len(rows), dt, len(rows) / dt))
+    assert all(r > row[1] for r, row in zip(result, rows))
+
+
 if __name__ == "__main__":
-    tests()
+    import sys
+    if "--bench" in sys.argv:
+        bench()
+    else:
+        tests()
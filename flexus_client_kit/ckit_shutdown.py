@@ -2,7 +2,7 @@ import asyncio
 import logging
 import signal
 import sys
-from typing import Dict
+from typing import Awaitable, Callable, Dict
 
 import gql
 
@@ -29,6 +29,30 @@ def take_away_task_to_cancel(under_name: str) -> asyncio.Task:
     return tasks_to_cancel.pop(under_name)
 
 
+# Batchers that hold queued writes (outbound messages, kanban updates) get a chance to send them after the bots
+# are stopped, otherwise whatever was queued in the last moments is lost
+flush_on_exit: Dict[str, Callable[[], Awaitable[None]]] = {}
+
+def give_flush_on_exit(under_name: str, flush: Callable[[], Awaitable[None]]):
+    flush_on_exit[under_name] = flush
+
+async def flush_all(timeout: float = 10.0):
+    names, flushes = list(flush_on_exit.keys()), list(flush_on_exit.values())
+    flush_on_exit.clear()
+    if not flushes:
+        return
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*[f() for f in flushes], return_exceptions=True), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning("flush on exit didn't finish in %0.0fs: %s", timeout, ", ".join(names))
+        return
+    for k, r in zip(names, results):
+        if isinstance(r, BaseException):
+            logger.warning("flush %r failed: %s %s" % (k, type(r).__name__, r))
+        else:
+            logger.info("flush %r" % k)
+
+
 def spiral_down_now(loop, enable_exit1):
     if shutdown_event.is_set() and enable_exit1:
         logger.info("exit(1)")
@@ -1,9 +1,13 @@
 import fnmatch
+import hashlib
 import json
 import logging
+import os
 import re
+import time
+from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from flexus_client_kit import ckit_cloudtool
 
@@ -54,6 +58,11 @@ def _extract_json_blocks(text: str) -> List[str]:
     return re.findall(r"```json\s*\n(.*?)```", text, re.DOTALL)
 
 
+def _warn_early(msg: str) -> None:
+    # static_skills_find() runs when a bot module is imported, logger is not yet initilized there
+    print("WARNING %s" % msg)
+
+
 def _validate_skill(path: Path, text: str) -> Dict[str, str]:
     front = _parse_frontmatter(text)
     if not front:
@@ -73,12 +82,120 @@ def _validate_skill(path: Path, text: str) -> Dict[str, str]:
         except json.JSONDecodeError as e:
             raise ValueError("%s: json block #%d: %s" % (path, i + 1, e))
         if isinstance(obj, dict) and ("type" in obj or "properties" in obj):
-            print(5555)
             logger.info("%s: json block #%d looks like a json-schema", path, i + 1)
     return front
 
 
 _INTEGRATION_SKILLS_DIR = Path(__file__).parent / "integrations" / "skills"
+SKILLS_COMPILED = "skills.compiled.json"
+
+
+# Process-wide registry: every SKILL.md is read, validated and split into frontmatter and body once, then bots,
+# experts and flexus_fetch_skill calls share the result. An entry is re-read when the file's (mtime, size) change,
+# a directory listing when the directory's mtime changes.
+#
+# At install time precompile() can snapshot the skills into bot_dir/skills.compiled.json (a build output, it's in
+# .gitignore), static_skills_find() picks it up, and a skill whose content hash matches the snapshot skips
+# validation. A snapshot older than any of its SKILL.md sources is ignored as a whole.
+
+
+@dataclass
+class Skill:
+    name: str
+    path: str
+    stat_key: Tuple[int, int]       # (st_mtime_ns, st_size)
+    sha1: str
+    front: Dict[str, str]
+    body: str                       # frontmatter stripped, what flexus_fetch_skill returns
+
+
+class SkillRegistry:
+    def __init__(self):
+        self.skills: Dict[str, Skill] = {}                          # SKILL.md path -> Skill
+        self.compiled: Dict[str, Skill] = {}                        # sha1 -> Skill from a precompiled artifact
+        self._dirs: Dict[Path, Tuple[int, List[str]]] = {}          # skills dir -> (st_mtime_ns, subdir names)
+        self._resolved: Dict[Tuple[Path, str], str] = {}            # (bot_root_dir, name) -> SKILL.md path
+        self.parsed = 0                                             # files actually read and validated
+
+    def skill_at(self, p: Path | str) -> Optional[Skill]:
+        k = str(p)   # str keys, building Path objects costs more than the stat on the hot path
+        try:
+            st = os.stat(k)
+        except FileNotFoundError:
+            self.skills.pop(k, None)
+            return None
+        stat_key = (st.st_mtime_ns, st.st_size)
+        hit = self.skills.get(k)
+        if hit is not None and hit.stat_key == stat_key:
+            return hit
+        with open(k, encoding="utf-8") as f:
+            text = f.read()
+        sha1 = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        name = os.path.basename(os.path.dirname(k))
+        pre = self.compiled.get(sha1)
+        if pre is not None and pre.name == name:
+            sk = Skill(name=name, path=k, stat_key=stat_key, sha1=sha1, front=pre.front, body=pre.body)
+        else:
+            front = _validate_skill(Path(k), text)
+            sk = Skill(name=name, path=k, stat_key=stat_key, sha1=sha1, front=front, body=_strip_frontmatter(text))
+            self.parsed += 1
+        self.skills[k] = sk
+        return sk
+
+    def names_in(self, d: Path) -> List[str]:
+        # Names of skills in d, sorted. The listing is cached by the directory's mtime, which only changes when
+        # subdirs come and go, so SKILL.md presence is still checked each time (a stat, no read).
+        try:
+            mtime = os.stat(d).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        hit = self._dirs.get(d)
+        if hit is None or hit[0] != mtime:
+            hit = self._dirs[d] = (mtime, sorted(e.name for e in os.scandir(d) if e.is_dir()))
+        ds = str(d)
+        return [n for n in hit[1] if os.path.isfile(os.path.join(ds, n, "SKILL.md"))]
+
+    def find(self, bot_root_dir: Path, name: str) -> Optional[Skill]:
+        k = self._resolved.get((bot_root_dir, name))
+        if k is not None and (sk := self.skill_at(k)) is not None:
+            return sk
+        for d in _skill_dirs(bot_root_dir):
+            sk = self.skill_at(d / name / "SKILL.md")
+            if sk is not None:
+                self._resolved[(bot_root_dir, name)] = sk.path
+                return sk
+        return None
+
+    def load_compiled(self, artifact: Path) -> int:
+        try:
+            artifact_mtime = artifact.stat().st_mtime_ns
+            doc = json.loads(artifact.read_text())
+        except (OSError, json.JSONDecodeError) as e:
+            _warn_early("cannot load %s: %s" % (artifact, e))
+            return 0
+        skills = [Skill(**{**d, "stat_key": tuple(d["stat_key"])}) for d in doc.get("skills", [])]
+        for sk in skills:
+            try:
+                stale = os.stat(sk.path).st_mtime_ns > artifact_mtime
+            except FileNotFoundError:
+                stale = True
+            if stale:
+                _warn_early("%s is older than %s, ignored, install the bot again to refresh it" % (artifact, sk.path))
+                return 0
+        for sk in skills:
+            self.compiled[sk.sha1] = sk
+            if sk.path not in self.skills:
+                self.skills[sk.path] = sk
+        return len(skills)
+
+    def dump(self, artifact: Path, skills: List[Skill]) -> None:
+        tmp = artifact.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"version": 1, "skills": [asdict(sk) for sk in skills]}, ensure_ascii=False))
+        tmp.replace(artifact)
+
+
+registry = SkillRegistry()
+_compiled_loaded: set[Path] = set()
 
 
 def _skill_dirs(bot_root_dir: Path) -> List[Path]:
@@ -97,59 +214,69 @@ def _match_allowlist(name: str, allowlist: str) -> bool:
     return False
 
 
+def _maybe_load_compiled(bot_root_dir: Path) -> None:
+    if bot_root_dir in _compiled_loaded:
+        return
+    _compiled_loaded.add(bot_root_dir)
+    artifact = bot_root_dir / SKILLS_COMPILED
+    if artifact.is_file():
+        registry.load_compiled(artifact)
+
+
 def static_skills_find(bot_root_dir: Path, shared_skills_allowlist: str, integration_skills_allowlist: str) -> List[str]:
     # static means designed to save into constant on top level of a bot file
     # logger is not yet initilized here, no logs possible
+    _maybe_load_compiled(bot_root_dir)
     found = []
     local_dir = bot_root_dir / "skills"
     shared_dir = bot_root_dir.parents[0] / "shared_skills"
     allowlists = {shared_dir: shared_skills_allowlist, _INTEGRATION_SKILLS_DIR: integration_skills_allowlist}
     for d in [local_dir, shared_dir, _INTEGRATION_SKILLS_DIR]:
-        if not d.is_dir():
-            continue
         al = allowlists.get(d)
-        for p in d.glob("*/SKILL.md"):
-            name = p.parent.name
+        for name in registry.names_in(d):
             if al is not None and not _match_allowlist(name, al):
                 continue
-            _validate_skill(p, p.read_text())
+            registry.skill_at(os.path.join(d, name, "SKILL.md"))   # validates, once per file version
             found.append(name)
     found = sorted(set(found))
     for label, d, al in [("shared", shared_dir, shared_skills_allowlist), ("integration", _INTEGRATION_SKILLS_DIR, integration_skills_allowlist)]:
-        names = {p.parent.name for p in d.glob("*/SKILL.md")} if d.is_dir() else set()
+        names = registry.names_in(d)
         for pat in al.split(","):
             pat = pat.strip()
             if pat and not any(fnmatch.fnmatch(n, pat) for n in names):
-                print("WARNING %s skill %r not found in %s" % (label, pat, d))
+                _warn_early("%s skill %r not found in %s" % (label, pat, d))
     return found
 
 
 def read_name_description(bot_root_dir: Path, skills: List[str]) -> str:
     result = []
     for name in skills:
-        for d in _skill_dirs(bot_root_dir):
-            p = d / name / "SKILL.md"
-            if p.is_file():
-                front = _parse_frontmatter(p.read_text())
-                assert name == front["name"], "Ooops name inside SKILL.md does not match parent dir name in %s" % p
-                result.append({
-                    "name": name,
-                    "description": front["description"],
-                })
-                break
-        else:
+        sk = registry.find(bot_root_dir, name)
+        if sk is None:
             raise FileNotFoundError("skill %r not found in %s" % (name, [str(d) for d in _skill_dirs(bot_root_dir)]))
+        assert name == sk.front["name"], "Ooops name inside SKILL.md does not match parent dir name in %s" % sk.path
+        result.append({
+            "name": name,
+            "description": sk.front["description"],
+        })
     return json.dumps(result)
 
 
 def fetch_skill_md(name: str, bot_root_dir: Path, allowlist: List[str]) -> str:
     if name not in allowlist:
         return "Skill %r not available. Available: %s" % (name, ", ".join(allowlist))
-    for d in _skill_dirs(bot_root_dir):
-        p = d / name / "SKILL.md"
-        if p.is_file():
-            return _strip_frontmatter(p.read_text())
-    return "Skill %r not found on disk." % name
+    sk = registry.find(bot_root_dir, name)
+    if sk is None:
+        return "Skill %r not found on disk." % name
+    return sk.body
+
+
+def precompile(bot_root_dir: Path, skills: List[str]) -> Path:
+    # Snapshot of the skills a bot uses, written next to the bot at install time to skip validation at startup
+    artifact = bot_root_dir / SKILLS_COMPILED
+    found = [registry.find(bot_root_dir, name) for name in skills]
+    registry.dump(artifact, [sk for sk in found if sk is not None])
+    return artifact
 
 
 async def called_by_model(toolcall: ckit_cloudtool.FCloudtoolCall, model_produced_args: Dict[str, Any], bot_root_dir: Path, allowlist: List[str]) -> str:
@@ -181,3 +308,75 @@ async def called_by_model(toolcall: ckit_cloudtool.FCloudtoolCall, model_produce
 # kubectl delete pod tmp-job
 #
 
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    N_SKILLS, N_EXPERTS, N_FETCHES = 200, 8, 2000
+
+    def make_tree(root: Path) -> Path:
+        bot_dir = root / "benchbot"
+        for i in range(N_SKILLS):
+            d = (bot_dir / "skills" if i % 2 else root / "shared_skills") / ("skill-%03d" % i)
+            d.mkdir(parents=True)
+            blocks = "".join("```json\n%s\n```\n" % json.dumps({"type": "object", "properties": {"f%d" % j: {"type": "string"} for j in range(20)}}) for _ in range(3))
+            (d / "SKILL.md").write_text("---\nname: skill-%03d\ndescription: Benchmark skill %d\n---\n\n# Skill %d\n\n%s%s" % (i, i, i, "Some instructions. " * 300, blocks))
+        return bot_dir
+
+    def startup(bot_dir: Path, uncached: bool) -> List[str]:
+        def maybe_reset():
+            if uncached:
+                registry.__init__()
+        maybe_reset()
+        skills = static_skills_find(bot_dir, shared_skills_allowlist="*", integration_skills_allowlist="")
+        for _ in range(N_EXPERTS):
+            maybe_reset()
+            read_name_description(bot_dir, skills)
+        return skills
+
+    def fetches(bot_dir: Path, skills: List[str], uncached: bool) -> None:
+        for i in range(N_FETCHES):
+            if uncached:
+                registry.__init__()
+            assert fetch_skill_md(skills[i % len(skills)], bot_dir, skills).startswith("# Skill")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logging.basicConfig(level=logging.WARNING)
+        bot_dir = make_tree(Path(tmp))
+        results = {}
+        for label, uncached in [("re-read every call (old behaviour)", True), ("registry", False)]:
+            registry.__init__()
+            t0 = time.perf_counter()
+            skills = startup(bot_dir, uncached)
+            t1 = time.perf_counter()
+            fetches(bot_dir, skills, uncached)
+            t2 = time.perf_counter()
+            results[label] = (t1 - t0, t2 - t1)
+            print("%-36s startup %d skills x %d experts %7.1fms, %d fetches %7.1fms (%.1fus each), files parsed %s" % (
+                label, len(skills), N_EXPERTS, (t1 - t0) * 1000, N_FETCHES, (t2 - t1) * 1000, (t2 - t1) / N_FETCHES * 1e6, "every call" if uncached else registry.parsed))
+        assert len(skills) == N_SKILLS
+
+        # edit a skill: picked up through the mtime check
+        p = bot_dir / "skills" / "skill-001" / "SKILL.md"
+        p.write_text(p.read_text().replace("# Skill 1\n", "# Skill 1 edited\n"))
+        assert "edited" in fetch_skill_md("skill-001", bot_dir, skills)
+
+        # precompiled artifact: nothing is re-validated
+        precompile(bot_dir, skills)
+        registry.__init__()
+        _compiled_loaded.clear()
+        t0 = time.perf_counter()
+        startup(bot_dir, False)
+        print("%-36s startup %7.1fms, files parsed %d (artifact %d KB)" % (
+            "precompiled", (time.perf_counter() - t0) * 1000, registry.parsed, (bot_dir / SKILLS_COMPILED).stat().st_size // 1024))
+        assert registry.parsed == 0
+
+        # a skill edited after the snapshot: the snapshot is ignored, the edit is served
+        time.sleep(0.01)
+        p.write_text(p.read_text().replace("# Skill 1 edited\n", "# Skill 1 edited again\n"))
+        registry.__init__()
+        _compiled_loaded.clear()
+        startup(bot_dir, False)
+        assert registry.parsed == N_SKILLS and not registry.compiled
+        assert "edited again" in fetch_skill_md("skill-001", bot_dir, skills)
@@ -1,7 +1,11 @@
 import asyncio
+import json
 import logging
+import os
 import time
-from typing import Dict, Any, Callable
+from typing import Any, Callable, Dict, Optional
+
+from flexus_client_kit import ckit_logs
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +22,7 @@ def report_crash(t, logger):
     logger.error("crashed %s: %s", type(exc).__name__, exc, exc_info=(type(exc), exc, exc.__traceback__))
 
 
-_throttle_dict: Dict[str, float] = {}
+_throttle = ckit_logs.KeyedRateLimiter()   # bounded, callers that throttle f-strings would otherwise leak keys
 
 
 def log_with_throttle(
@@ -27,9 +31,8 @@ def log_with_throttle(
     *args: Any,
     interval_seconds: float = 30.0
 ) -> None:
-    now = time.time()
-    if message not in _throttle_dict or now - _throttle_dict[message] > interval_seconds:
-        _throttle_dict[message] = now
+    allowed, _ = _throttle.admit(message, 1.0 / max(interval_seconds, 1e-6), 1.0)
+    if allowed:
         log_func(message, *args)
 
 
@@ -38,3 +41,36 @@ def truncate_middle(text: str, max_length: int = 5000) -> str:
         return text
     keep_chars = max_length // 2
     return text[:keep_chars] + "\n...\n" + text[-keep_chars:]
+
+
+# Subscription recording, replayed by ckit_fake_backend.FakeFlexusBackend.replay()
+
+class SubscriptionRecorder:
+    # One line per event: {"t": seconds since the first one, "field": ..., "event": ...}
+    def __init__(self, path: str):
+        self.f = open(path, "a")
+        self.t0: Optional[float] = None
+
+    def write(self, result: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        if self.t0 is None:
+            self.t0 = now
+        for k, v in result.items():
+            self.f.write(json.dumps({"t": round(now - self.t0, 4), "field": k, "event": v}, default=str) + "\n")
+        self.f.flush()
+
+    def close(self) -> None:
+        self.f.close()
+
+
+RECORD_PATH = os.getenv("FLEXUS_RECORD_SUBSCRIPTIONS", "")   # the stream contains tokens and user data, keep it local
+_recorder: Optional[SubscriptionRecorder] = None
+
+
+def record(result: Dict[str, Any]) -> None:
+    # Called by the bot and cloudtool subscription loops for every event when RECORD_PATH is set
+    global _recorder
+    if _recorder is None:
+        logger.warning("recording subscription events to %s", RECORD_PATH)
+        _recorder = SubscriptionRecorder(RECORD_PATH)
+    _recorder.write(result)
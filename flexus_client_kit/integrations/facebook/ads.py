@@ -1,10 +1,9 @@
 from __future__ import annotations
 import logging
 from pathlib import Path
-from typing import Any, Dict, Optional, TYPE_CHECKING
-import httpx
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
 from flexus_client_kit.integrations.facebook.models import AdFormat, CallToActionType
-from flexus_client_kit.integrations.facebook.utils import validate_ad_account_id
+from flexus_client_kit.integrations.facebook.utils import validate_ad_account_id, bulk_update_objects
 from flexus_client_kit.integrations.facebook.exceptions import FacebookValidationError
 if TYPE_CHECKING:
     from flexus_client_kit.integrations.facebook.client import FacebookAdsClient
@@ -43,19 +42,14 @@ You can now use this image hash in create_creative()
         image_file = Path(image_path)
         if not image_file.exists():
             return f"ERROR: Image file not found: {image_path}"
-        await client.ensure_auth()
         with open(image_file, 'rb') as f:
             image_bytes = f.read()
-        from flexus_client_kit.integrations.facebook.client import API_BASE, API_VERSION
         files = {"filename": (image_file.name, image_bytes, "image/jpeg")}
-        form_data = {"access_token": client.access_token}
-        url = f"{API_BASE}/{API_VERSION}/{endpoint}"
-        logger.info(f"Uploading image file to {url}")
-        async with httpx.AsyncClient() as http_client:
-            response = await http_client.post(url, data=form_data, files=files, timeout=60.0)
-            if response.status_code != 200:
-                return f"ERROR: Failed to upload image: {response.text}"
-            result = response.json()
+        logger.info(f"Uploading image file to {endpoint}")
+        await client.ensure_auth()
+        result = await client.request("POST", endpoint, form_data={"access_token": client.access_token}, files=files, timeout=60.0)
+        if "error" in result:
+            return f"ERROR: Failed to upload image: {result['error'].get('message', result['error'])}"
     images = result.get("images", {})
     if images:
         image_hash = list(images.values())[0].get("hash", "unknown")
@@ -215,6 +209,18 @@ Preview your ad:
 """
 
 
+async def bulk_update_ads(client: "FacebookAdsClient", ads: List[Dict[str, Any]]) -> str:
+    if not ads:
+        return "ERROR: ads parameter is required (list of {id, name and/or status})"
+    if not isinstance(ads, list):
+        return "ERROR: ads must be a list"
+    if len(ads) > 50:
+        return "ERROR: Maximum 50 ads can be updated at once"
+    if client.is_test_mode:
+        return f"Bulk update completed for {len(ads)} ads:\n" + "\n".join(f"   {a.get('id', 'unknown')} -> {a.get('status', 'unchanged')}" for a in ads)
+    return await bulk_update_objects(client, ads, ["ACTIVE", "PAUSED", "ARCHIVED"], budget_field=False)
+
+
 async def preview_ad(client: "FacebookAdsClient", ad_id: str, ad_format: str = "DESKTOP_FEED_STANDARD") -> str:
     if not ad_id:
         return "ERROR: ad_id is required"
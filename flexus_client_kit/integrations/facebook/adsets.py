@@ -1,8 +1,8 @@
 from __future__ import annotations
 import json
 import logging
-from typing import Any, Dict, Optional, TYPE_CHECKING
-from flexus_client_kit.integrations.facebook.utils import format_currency, validate_budget, validate_targeting_spec
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+from flexus_client_kit.integrations.facebook.utils import format_currency, validate_budget, validate_targeting_spec, bulk_update_objects
 from flexus_client_kit.integrations.facebook.exceptions import FacebookValidationError
 if TYPE_CHECKING:
     from flexus_client_kit.integrations.facebook.client import FacebookAdsClient
@@ -184,6 +184,18 @@ async def update_adset(
         return f"Failed to update ad set. Response: {result}"
 
 
+async def bulk_update_adsets(client: "FacebookAdsClient", adsets: List[Dict[str, Any]]) -> str:
+    if not adsets:
+        return "ERROR: adsets parameter is required (list of {id, ...fields})"
+    if not isinstance(adsets, list):
+        return "ERROR: adsets must be a list"
+    if len(adsets) > 50:
+        return "ERROR: Maximum 50 ad sets can be updated at once"
+    if client.is_test_mode:
+        return f"Bulk update completed for {len(adsets)} ad sets:\n" + "\n".join(f"   {a.get('id', 'unknown')} -> {a.get('status', 'unchanged')}" for a in adsets)
+    return await bulk_update_objects(client, adsets, ["ACTIVE", "PAUSED", "ARCHIVED"])
+
+
 async def validate_targeting(
     client: "FacebookAdsClient",
     targeting_spec: Dict[str, Any],
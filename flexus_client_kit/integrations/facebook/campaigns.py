@@ -2,7 +2,7 @@ from __future__ import annotations
 import logging
 from typing import Any, Dict, List, Optional, TYPE_CHECKING
 from flexus_client_kit.integrations.facebook.models import CampaignObjective
-from flexus_client_kit.integrations.facebook.utils import format_currency, validate_budget, normalize_insights_data
+from flexus_client_kit.integrations.facebook.utils import format_currency, validate_budget, normalize_insights_data, bulk_update_objects
 from flexus_client_kit.integrations.facebook.exceptions import FacebookAPIError, FacebookValidationError
 if TYPE_CHECKING:
     from flexus_client_kit.integrations.facebook.client import FacebookAdsClient
@@ -209,49 +209,15 @@ async def bulk_update_campaigns(client: "FacebookAdsClient", campaigns: List[Dic
             status = camp.get("status", "unchanged")
             results.append(f"   {campaign_id} -> {status}")
         return f"Bulk update completed for {len(campaigns)} campaigns:\n" + "\n".join(results)
-    results = []
-    errors = []
-    for camp in campaigns:
-        campaign_id = camp.get("id")
-        if not campaign_id:
-            errors.append("Missing campaign ID in one of the campaigns")
-            continue
-        data: Dict[str, Any] = {}
-        if "name" in camp:
-            data["name"] = camp["name"]
-        if "status" in camp:
-            if camp["status"] not in ["ACTIVE", "PAUSED", "ARCHIVED"]:
-                errors.append(f"{campaign_id}: Invalid status")
-                continue
-            data["status"] = camp["status"]
-        if "daily_budget" in camp:
-            try:
-                data["daily_budget"] = validate_budget(camp["daily_budget"])
-            except FacebookValidationError as e:
-                errors.append(f"{campaign_id}: {e.message}")
-                continue
-        if not data:
-            errors.append(f"{campaign_id}: No fields to update")
-            continue
-        try:
-            result = await client.request("POST", campaign_id, data=data)
-            if result.get("success"):
-                updates = ", ".join([f"{k}={v}" for k, v in data.items()])
-                results.append(f"   {campaign_id}: {updates}")
-            else:
-                errors.append(f"{campaign_id}: Update failed")
-        except FacebookAPIError as e:
-            errors.append(f"{campaign_id}: {e.message}")
-        except Exception as e:
-            errors.append(f"{campaign_id}: {str(e)}")
-    output = f"Bulk update completed:\n\n"
-    output += f"Success: {len(results)}\n"
-    output += f"Errors: {len(errors)}\n\n"
-    if results:
-        output += "Successful updates:\n" + "\n".join(results) + "\n\n"
-    if errors:
-        output += "Errors:\n" + "\n".join(f"   {e}" for e in errors)
-    return output
+    return await bulk_update_objects(client, campaigns, ["ACTIVE", "PAUSED", "ARCHIVED"])
+
+
+INSIGHTS_FIELDS = "impressions,clicks,spend,cpc,ctr,reach,frequency"
+INSIGHTS_MULTI_MAX_IDS = 50   # Graph API limit for ?ids= lookups
+
+
+def _insights_date_preset(days: int) -> str:
+    return "last_30d" if days == 30 else "maximum"
 
 
 async def get_insights(client: "FacebookAdsClient", campaign_id: str, days: int = 30) -> str:
@@ -260,13 +226,36 @@ async def get_insights(client: "FacebookAdsClient", campaign_id: str, days: int
     if client.is_test_mode:
         return _mock_get_insights(campaign_id, days)
     params = {
-        "fields": "impressions,clicks,spend,cpc,ctr,reach,frequency",
-        "date_preset": "last_30d" if days == 30 else "maximum",
+        "fields": INSIGHTS_FIELDS,
+        "date_preset": _insights_date_preset(days),
     }
     data = await client.request("GET", f"{campaign_id}/insights", params=params)
     if not data.get("data"):
         return f"No insights data found for campaign {campaign_id}"
-    raw = data["data"][0]
+    return _format_insights(campaign_id, days, data["data"][0])
+
+
+async def get_insights_multi(client: "FacebookAdsClient", campaign_ids: List[str], days: int = 30) -> Dict[str, str]:
+    """
+    Same result as get_insights() for each campaign, one Graph request per 50 ids (?ids=a,b,c with insights
+    as a nested field) instead of one per campaign.
+    """
+    if client.is_test_mode:
+        return {cid: _mock_get_insights(cid, days) for cid in campaign_ids}
+    result: Dict[str, str] = {}
+    nested = f"insights.date_preset({_insights_date_preset(days)}){{{INSIGHTS_FIELDS}}}"
+    for i in range(0, len(campaign_ids), INSIGHTS_MULTI_MAX_IDS):
+        chunk = campaign_ids[i:i + INSIGHTS_MULTI_MAX_IDS]
+        data = await client.request("GET", "", params={"ids": ",".join(chunk), "fields": nested})
+        if "error" in data:
+            raise FacebookAPIError(data["error"].get("code", 500), data["error"].get("message", str(data["error"])))
+        for cid in chunk:
+            rows = ((data.get(cid) or {}).get("insights") or {}).get("data") or []
+            result[cid] = _format_insights(cid, days, rows[0]) if rows else f"No insights data found for campaign {cid}"
+    return result
+
+
+def _format_insights(campaign_id: str, days: int, raw: Dict[str, Any]) -> str:
     insights = normalize_insights_data(raw)
     return f"""Insights for Campaign {campaign_id} (Last {days} days):
   Impressions: {insights.impressions:,}
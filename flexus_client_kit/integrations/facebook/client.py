@@ -1,12 +1,16 @@
 from __future__ import annotations
 import asyncio
+import json
 import logging
-import os
+import random
 import time
-from typing import Any, Dict, Optional, TYPE_CHECKING
+import urllib.parse
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
 
 import httpx
 
+from flexus_client_kit import ckit_http
 from flexus_client_kit.integrations.facebook.exceptions import (
     FacebookAPIError,
     FacebookAuthError,
@@ -25,6 +29,101 @@ API_VERSION = "v19.0"
 DEFAULT_TIMEOUT = 30.0
 MAX_RETRIES = 3
 INITIAL_RETRY_DELAY = 1.0
+BATCH_MAX = 50                  # Graph API limit of sub-requests per batch call
+THROTTLE_SLOW_PCT = 75.0        # above this usage requests get spaced out
+THROTTLE_MAX_SPACING = 5.0      # seconds between requests at 100% usage
+THROTTLE_BLOCKED_WAIT = 60.0    # rate limited, and the headers don't say for how long
+
+
+# Facebook throttles per app, per ad account and per business, and reports how close we are in response headers
+# instead of a token count, so the client paces itself from those (one UsageThrottle per token):
+#
+#   X-App-Usage:                 {"call_count": 28, "total_time": 25, "total_cputime": 25}            percent
+#   X-Ad-Account-Usage:          {"acc_id_util_pct": 9.67, "reset_time_duration": 0}
+#   X-Business-Use-Case-Usage:   {"<business_id>": [{"type": "ads_management", "call_count": 95, ...,
+#                                                    "estimated_time_to_regain_access": 0}]}           minutes
+#
+# Connections are pooled by ckit_http (one client for graph.facebook.com), many objects can go in one batch() call.
+
+
+class UsageThrottle:
+    def __init__(self):
+        self.usage_pct = 0.0
+        self.blocked_until = 0.0
+        self.next_ts = 0.0
+        self._lock = asyncio.Lock()
+
+    def observe(self, headers: httpx.Headers) -> None:
+        pcts: List[float] = []
+        regain_s = 0.0
+        for name in ("x-app-usage", "x-ad-account-usage", "x-business-use-case-usage"):
+            raw = headers.get(name)
+            if not raw:
+                continue
+            try:
+                usage = json.loads(raw)
+            except ValueError:
+                continue
+            entries = [usage] if name != "x-business-use-case-usage" else [e for lst in usage.values() for e in lst]
+            for e in entries:
+                pcts += [float(e[k]) for k in ("call_count", "total_time", "total_cputime", "acc_id_util_pct") if k in e]
+                regain_s = max(regain_s, float(e.get("estimated_time_to_regain_access", 0)) * 60)
+                if float(e.get("acc_id_util_pct", 0)) >= 100:
+                    regain_s = max(regain_s, float(e.get("reset_time_duration", 0)))
+        if not pcts:
+            return
+        self.usage_pct = max(pcts)
+        if regain_s > 0 or self.usage_pct >= 100:
+            self.block(regain_s or THROTTLE_BLOCKED_WAIT)
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def spacing(self) -> float:
+        if self.usage_pct < THROTTLE_SLOW_PCT:
+            return 0.0
+        return THROTTLE_MAX_SPACING * min(1.0, (self.usage_pct - THROTTLE_SLOW_PCT) / (100.0 - THROTTLE_SLOW_PCT))
+
+    async def wait(self) -> float:
+        async with self._lock:
+            now = time.monotonic()
+            wait = max(self.blocked_until, self.next_ts) - now
+            if wait > 0:
+                logger.info("facebook usage at %.0f%%, waiting %.1fs", self.usage_pct, wait)
+                await asyncio.sleep(wait)
+            self.next_ts = time.monotonic() + self.spacing()
+            return max(wait, 0.0)
+
+
+_throttles: Dict[str, UsageThrottle] = {}
+
+
+def get_throttle(access_token: str) -> UsageThrottle:
+    t = _throttles.get(access_token)
+    if t is None:
+        t = _throttles[access_token] = UsageThrottle()
+    return t
+
+
+def _is_rate_limit_body(body: Any) -> bool:
+    return isinstance(body, dict) and isinstance(body.get("error"), dict) and body["error"].get("code") in FacebookAPIError.RATE_LIMIT_CODES
+
+
+@dataclass
+class BatchOp:
+    method: str
+    endpoint: str
+    params: Optional[Dict[str, Any]] = None
+    data: Optional[Dict[str, Any]] = None
+
+    def to_graph(self) -> Dict[str, Any]:
+        url = f"{API_VERSION}/{self.endpoint}"
+        if self.params:
+            url += "?" + urllib.parse.urlencode(self.params)
+        op: Dict[str, Any] = {"method": self.method, "relative_url": url}
+        if self.data:
+            op["body"] = urllib.parse.urlencode({k: v if isinstance(v, str) else json.dumps(v) for k, v in self.data.items()})
+        return op
 
 
 class FacebookAdsClient:
@@ -33,9 +132,11 @@ class FacebookAdsClient:
         fclient: "ckit_client.FlexusClient",
         rcx: "ckit_bot_exec.RobotContext",
         ad_account_id: str = "",
+        api_base: str = API_BASE,
     ):
         self.fclient = fclient
         self.rcx = rcx
+        self.api_base = api_base
         self._ad_account_id = ""
         if ad_account_id:
             self._ad_account_id = validate_ad_account_id(ad_account_id)
@@ -76,6 +177,11 @@ class FacebookAdsClient:
             logger.info(f"Failed to get Facebook token: {e}")
             return await self._prompt_oauth_connection()
 
+    def _http(self) -> ckit_http.RateLimitedClient:
+        # pacing is done by UsageThrottle, ckit_http only pools connections, retries 5xx on GET and keeps a circuit
+        # breaker per token: Graph answers 500 for a broken ad account, that must not cut off other customers
+        return ckit_http.get_client(self.api_base, timeout=DEFAULT_TIMEOUT, breaker_per_credential=True)
+
     async def request(
         self,
         method: str,
@@ -84,60 +190,86 @@ class FacebookAdsClient:
         data: Optional[Dict[str, Any]] = None,
         form_data: Optional[Dict[str, Any]] = None,
         timeout: float = DEFAULT_TIMEOUT,
-    ) -> Dict[str, Any]:
+        files: Optional[Dict[str, Any]] = None,
+    ) -> Any:
         auth_error = await self.ensure_auth()
         if auth_error:
             raise FacebookAuthError(auth_error)
-        url = f"{API_BASE}/{API_VERSION}/{endpoint}"
-
-        async def make_request() -> Dict[str, Any]:
-            async with httpx.AsyncClient() as client:
-                if method == "GET":
-                    response = await client.get(url, params=params, headers=self._headers, timeout=timeout)
-                elif method == "POST":
-                    if form_data:
-                        response = await client.post(url, data=form_data, timeout=timeout)
-                    else:
-                        response = await client.post(url, json=data, headers=self._headers, timeout=timeout)
-                elif method == "DELETE":
-                    response = await client.delete(url, json=data, headers=self._headers, timeout=timeout)
-                else:
-                    raise ValueError(f"Unsupported method: {method}")
-                return response.json()
-
-        return await self._retry_with_backoff(make_request)
-
-    async def _retry_with_backoff(
-        self,
-        func,
-        max_retries: int = MAX_RETRIES,
-        initial_delay: float = INITIAL_RETRY_DELAY,
-    ) -> Dict[str, Any]:
-        last_exception = None
-        for attempt in range(max_retries):
+        url = f"/{API_VERSION}/{endpoint}"
+        if method == "GET":
+            kwargs: Dict[str, Any] = {"params": params, "headers": self._headers}
+        elif method == "POST" and (form_data or files):
+            kwargs = {"data": form_data, "files": files}
+        elif method in ("POST", "DELETE"):
+            kwargs = {"json": data, "headers": self._headers}
+        else:
+            raise ValueError(f"Unsupported method: {method}")
+        throttle = get_throttle(self._access_token)
+        attempt = 0
+        while True:
+            await throttle.wait()
             try:
-                return await func()
-            except (httpx.HTTPError, httpx.TimeoutException) as e:
-                last_exception = e
-                if attempt == max_retries - 1:
-                    raise FacebookTimeoutError(DEFAULT_TIMEOUT)
-                delay = initial_delay * (2 ** attempt)
-                logger.warning(f"Retry {attempt + 1}/{max_retries} after {delay}s due to: {e}")
+                response = await self._http().request(method, url, credential_key=self._access_token, timeout=timeout, **kwargs)
+            except httpx.TransportError as e:
+                if attempt >= MAX_RETRIES - 1:
+                    raise FacebookTimeoutError(timeout)
+                delay = INITIAL_RETRY_DELAY * (2 ** attempt) * (0.5 + random.random() / 2)
+                logger.warning(f"Retry {attempt + 1}/{MAX_RETRIES} after {delay:.1f}s due to: {type(e).__name__} {e}")
                 await asyncio.sleep(delay)
-            except FacebookAPIError as e:
-                if e.is_rate_limit:
-                    last_exception = e
-                    if attempt == max_retries - 1:
-                        raise
-                    delay = initial_delay * (2 ** attempt) * 2
-                    logger.warning(f"Rate limit hit, retry {attempt + 1}/{max_retries} after {delay}s")
-                    await asyncio.sleep(delay)
-                else:
-                    raise
-        if last_exception:
-            raise last_exception
-        raise FacebookAPIError(500, "Unexpected retry loop exit")
+                attempt += 1
+                continue
+            throttle.observe(response.headers)
+            try:
+                body = response.json()
+            except ValueError:
+                raise await parse_api_error(response)
+            if not _is_rate_limit_body(body):
+                return body
+            if attempt >= MAX_RETRIES - 1:
+                raise await parse_api_error(response)
+            # the headers usually carried the wait already, if not back off exponentially
+            throttle.block(0 if throttle.blocked_until > time.monotonic() else INITIAL_RETRY_DELAY * (2 ** attempt) * 2)
+            logger.warning(f"Rate limit hit ({body['error'].get('code')}), retry {attempt + 1}/{MAX_RETRIES}")
+            attempt += 1
 
+    async def batch(self, ops: List[BatchOp]) -> List[Dict[str, Any]]:
+        """
+        Runs ops as Graph API batch calls, BATCH_MAX per HTTP request, and returns one parsed body per op in the
+        same order, the way request() would have returned it ({"error": ...} for failed ones). Sub-requests that
+        were rate limited or timed out inside the batch are sent again in the next round.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(ops)
+        pending = list(range(len(ops)))
+        for attempt in range(MAX_RETRIES):
+            retry = []
+            for i in range(0, len(pending), BATCH_MAX):
+                chunk = pending[i:i + BATCH_MAX]
+                resp = await self.request("POST", "", form_data={
+                    "access_token": self._access_token,
+                    "batch": json.dumps([ops[n].to_graph() for n in chunk]),
+                    "include_headers": "false",
+                })
+                if isinstance(resp, dict) and "error" in resp:
+                    err = resp["error"]
+                    raise FacebookAPIError(err.get("code", 500), err.get("message", str(err)), err.get("type", ""))
+                for n, item in zip(chunk, resp):
+                    if item is None:
+                        retry.append(n)   # Facebook gave up on this one within the batch timeout
+                        continue
+                    try:
+                        body = json.loads(item.get("body") or "{}")
+                    except ValueError:
+                        body = {"error": {"code": item.get("code", 500), "message": str(item.get("body"))[:500]}}
+                    if _is_rate_limit_body(body):
+                        retry.append(n)
+                    results[n] = body
+            if not retry:
+                break
+            pending = retry
+            if attempt < MAX_RETRIES - 1:
+                logger.warning(f"{len(retry)} of {len(ops)} batch sub-requests throttled or timed out, retry {attempt + 1}/{MAX_RETRIES}")
+                get_throttle(self._access_token).block(INITIAL_RETRY_DELAY * (2 ** attempt))
+        return [r if r is not None else {"error": {"code": 504, "message": "Timed out inside a batch request"}} for r in results]
 
     async def _fetch_token(self) -> str:
         facebook_auth = self.rcx.external_auth.get("facebook") or {}
@@ -184,3 +316,92 @@ Requirements:
 - Facebook Business Manager account
 - Access to an Ad Account (starts with act_...)
 """
+
+
+if __name__ == "__main__":
+    import types
+    from aiohttp import web
+    from flexus_client_kit.integrations.facebook import campaigns
+
+    async def stub_graph_test():
+        hits = {"single": 0, "batch": 0, "usage": 10, "batch_down": False}
+
+        def usage_headers():
+            return {"X-App-Usage": json.dumps({"call_count": hits["usage"], "total_time": 5, "total_cputime": 5})}
+
+        async def graph(request):
+            form = await request.post() if request.method == "POST" else {}
+            if request.headers.get("Authorization") == "Bearer fb-broken-token":
+                return web.json_response({"error": {"code": 1, "message": "An unknown error occurred"}}, status=500)
+            if "batch" in form and hits["batch_down"]:
+                return web.json_response({"error": {"code": 2, "message": "Service temporarily unavailable"}}, status=500)
+            if request.path.endswith("/bad-id"):
+                return web.json_response({"error": {"code": 100, "message": "Unsupported post request"}}, status=400)
+            if "batch" in form:
+                hits["batch"] += 1
+                ops = json.loads(form["batch"])
+                out = [{"code": 200, "body": json.dumps({"success": True})} for _ in ops]
+                if hits["batch"] == 1:   # first call: Facebook drops one sub-request and throttles another
+                    out[3] = None
+                    out[7] = {"code": 400, "body": json.dumps({"error": {"code": 613, "message": "Calls within one hour exceeded"}})}
+                return web.json_response(out, headers=usage_headers())
+            hits["single"] += 1
+            await asyncio.sleep(0.02)   # graph.facebook.com round trip
+            return web.json_response({"success": True}, headers=usage_headers())
+
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", graph)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        rcx = types.SimpleNamespace(running_test_scenario=False)
+        c = FacebookAdsClient(None, rcx, api_base=f"http://127.0.0.1:{port}")
+        c._access_token = "fb-test-token"
+        global INITIAL_RETRY_DELAY, THROTTLE_MAX_SPACING
+        INITIAL_RETRY_DELAY, THROTTLE_MAX_SPACING = 0.05, 1.0
+
+        updates = [{"id": f"120000{i}", "status": "PAUSED"} for i in range(40)]
+        t0 = time.monotonic()
+        for u in updates:
+            await c.request("POST", u["id"], data={"status": u["status"]})
+        seq = time.monotonic() - t0
+        t0 = time.monotonic()
+        out = await campaigns.bulk_update_campaigns(c, updates)
+        bat = time.monotonic() - t0
+        print(f"40 campaign updates: one by one {seq*1000:.0f}ms / {hits['single']} requests, batched {bat*1000:.0f}ms / {hits['batch']} requests")
+        assert "Success: 40" in out and hits["batch"] == 2, out
+
+        # usage headers at 90% space requests out, well before Facebook starts rejecting them
+        hits["usage"] = 90
+        await c.request("GET", "me")
+        t0 = time.monotonic()
+        for _ in range(3):
+            await c.request("GET", "me")
+        print(f"3 requests at 90% app usage: {time.monotonic() - t0:.2f}s (spacing {get_throttle('fb-test-token').spacing():.1f}s)")
+        assert time.monotonic() - t0 >= 2 * get_throttle("fb-test-token").spacing() * 0.9
+
+        # the batch request itself failing: every item still gets its own answer, a bad one doesn't take the rest down
+        hits["usage"], hits["batch_down"] = 10, True
+        out = await campaigns.bulk_update_campaigns(c, updates[:3] + [{"id": "bad-id", "status": "PAUSED"}])
+        print("batch request down, items one by one:", out.splitlines()[2:4])
+        assert "Success: 3" in out and "Errors: 1" in out and "bad-id: Unsupported post request" in out
+
+        # a customer whose token makes Graph answer 500 opens only their own circuit
+        broken = FacebookAdsClient(None, rcx, api_base=f"http://127.0.0.1:{port}")
+        broken._access_token = "fb-broken-token"
+        for _ in range(8):
+            try:
+                await broken.request("GET", "me")
+            except (FacebookAPIError, FacebookTimeoutError):
+                pass
+        assert c._http().breakers["fb-broken-token"].failures >= 5
+        assert (await c.request("GET", "me")).get("success"), "other tokens are not affected"
+        print("broken token opened its own circuit, others still work")
+
+        await ckit_http.close_all()
+        await runner.cleanup()
+
+    asyncio.run(stub_graph_test())
@@ -25,10 +25,12 @@ class FacebookAPIError(FacebookError):
     CODE_RATE_LIMIT_1 = 4
     CODE_RATE_LIMIT_2 = 17
     CODE_RATE_LIMIT_3 = 32
+    CODE_RATE_LIMIT_4 = 613
     CODE_INSUFFICIENT_PERMISSIONS = 80004
     CODE_AD_ACCOUNT_DISABLED = 2635
     CODE_BUDGET_TOO_LOW = 1487387
-    RATE_LIMIT_CODES = {CODE_RATE_LIMIT_1, CODE_RATE_LIMIT_2, CODE_RATE_LIMIT_3}
+    CODES_BUSINESS_USE_CASE_LIMIT = {80000, 80001, 80002, 80003, 80005, 80006, 80008, 80009, 80014}
+    RATE_LIMIT_CODES = {CODE_RATE_LIMIT_1, CODE_RATE_LIMIT_2, CODE_RATE_LIMIT_3, CODE_RATE_LIMIT_4} | CODES_BUSINESS_USE_CASE_LIMIT
 
     def __init__(
         self,
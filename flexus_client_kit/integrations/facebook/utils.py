@@ -1,10 +1,12 @@
 from __future__ import annotations
 import hashlib
 import logging
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
 
-from flexus_client_kit.integrations.facebook.exceptions import FacebookValidationError
+from flexus_client_kit.integrations.facebook.exceptions import FacebookAPIError, FacebookValidationError
 from flexus_client_kit.integrations.facebook.models import Insights
+if TYPE_CHECKING:
+    from flexus_client_kit.integrations.facebook.client import FacebookAdsClient
 
 logger = logging.getLogger("facebook.utils")
 
@@ -131,6 +133,74 @@ def normalize_insights_data(raw_data: Dict[str, Any]) -> Insights:
         return Insights()
 
 
+async def bulk_update_objects(
+    client: "FacebookAdsClient",
+    items: List[Dict[str, Any]],
+    valid_statuses: List[str],
+    budget_field: bool = True,
+) -> str:
+    # Shared by bulk_update_campaigns/adsets/ads: validate each {id, ...fields}, send all updates as one batch.
+    # Errors are collected per item, a bad item is reported and the rest still go through.
+    from flexus_client_kit.integrations.facebook.client import BatchOp
+    updates: List[Tuple[str, Dict[str, Any]]] = []
+    results = []
+    errors = []
+    for item in items:
+        object_id = item.get("id")
+        if not object_id:
+            errors.append("Missing ID in one of the items")
+            continue
+        data: Dict[str, Any] = {}
+        if "name" in item:
+            data["name"] = item["name"]
+        if "status" in item:
+            if item["status"] not in valid_statuses:
+                errors.append(f"{object_id}: Invalid status")
+                continue
+            data["status"] = item["status"]
+        if budget_field and "daily_budget" in item:
+            try:
+                data["daily_budget"] = validate_budget(item["daily_budget"])
+            except FacebookValidationError as e:
+                errors.append(f"{object_id}: {e.message}")
+                continue
+        if not data:
+            errors.append(f"{object_id}: No fields to update")
+            continue
+        updates.append((object_id, data))
+    if updates:
+        try:
+            bodies = await client.batch([BatchOp("POST", object_id, data=data) for object_id, data in updates])
+        except Exception as e:
+            # The batch request itself failed, send them one by one so each item gets its own answer
+            logger.warning(f"Batch update of {len(updates)} objects failed, updating one by one: {type(e).__name__} {e}")
+            bodies = []
+            for object_id, data in updates:
+                try:
+                    bodies.append(await client.request("POST", object_id, data=data))
+                except FacebookAPIError as e:
+                    bodies.append({"error": {"message": e.message}})
+                except Exception as e:
+                    bodies.append({"error": {"message": str(e)}})
+        for (object_id, data), body in zip(updates, bodies):
+            if not isinstance(body, dict):
+                errors.append(f"{object_id}: Update failed")
+            elif body.get("success"):
+                results.append(f"   {object_id}: " + ", ".join([f"{k}={v}" for k, v in data.items()]))
+            elif isinstance(body.get("error"), dict):
+                errors.append(f"{object_id}: {body['error'].get('message', 'Update failed')}")
+            else:
+                errors.append(f"{object_id}: Update failed")
+    output = f"Bulk update completed:\n\n"
+    output += f"Success: {len(results)}\n"
+    output += f"Errors: {len(errors)}\n\n"
+    if results:
+        output += "Successful updates:\n" + "\n".join(results) + "\n\n"
+    if errors:
+        output += "Errors:\n" + "\n".join(f"   {e}" for e in errors)
+    return output
+
+
 def hash_for_audience(value: str, field_type: str) -> str:
     value = value.strip().lower()
     if field_type == "PHONE":
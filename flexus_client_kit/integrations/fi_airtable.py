@@ -1,12 +1,11 @@
-import asyncio
 import json
 import logging
 import os
-from typing import Any, Dict
-
-import httpx
+from typing import Any, Dict, Tuple
 
 from flexus_client_kit import ckit_cloudtool
+from flexus_client_kit import ckit_http
+from flexus_client_kit import ckit_mongo
 
 
 logger = logging.getLogger("airtable")
@@ -16,6 +15,19 @@ AUTH_PROVIDER_NAME = "airtable"
 AIRTABLE_BASE = "https://api.airtable.com/v0"
 AIRTABLE_CONTENT_BASE = "https://content.airtable.com/v0"
 
+# https://airtable.com/developers/web/api/rate-limits 5 requests per second per base, a 429 costs 30 seconds
+AIRTABLE_RATE_LIMIT = ckit_http.RateLimit(rate=5, burst=1)   # evenly spaced, a burst would overshoot the 1s window
+AUTO_PAGINATE_DEFAULT = 1000
+AUTO_PAGINATE_MAX = 10000
+
+# method_id -> list key in the response; these follow the "offset" cursor when called with auto_paginate=true
+PAGINATED_METHODS = {
+    "airtable.bases.list.v1": "bases",
+    "airtable.records.list.v1": "records",
+    "airtable.records.list_post.v1": "records",
+    "airtable.comments.list.v1": "comments",
+}
+
 METHOD_SPECS = {
     "airtable.bases.list.v1": {
         "method": "GET",
@@ -283,6 +295,8 @@ class IntegrationAirtable:
             '  op="call", args={"method_id":"airtable.records.list.v1","base_id":"appXXX","table_id_or_name":"tblYYY"}\n'
             '  op="call", args={"method_id":"airtable.records.create.v1","base_id":"appXXX","table_id_or_name":"tblYYY","fields":{"Name":"Alice"}}\n'
             '  op="call", args={"method_id":"airtable.bases.schema.get.v1","base_id":"appXXX"}\n'
+            "list methods (records.list, records.list_post, comments.list, bases.list) accept auto_paginate=true and\n"
+            f"max_records (default {AUTO_PAGINATE_DEFAULT}, max {AUTO_PAGINATE_MAX}) to collect all pages in one call, big results are stored in mongo\n"
             "auth: use setup field airtable_api_key or external_auth['airtable']['api_key']\n"
             "readiness: do not use status as a full capability check; call the actual base/table/record method you need"
         )
@@ -392,6 +406,8 @@ class IntegrationAirtable:
             if not isinstance(pu, dict) or not isinstance(pu.get("fieldsToMergeOn"), list) or len(pu["fieldsToMergeOn"]) == 0:
                 return self._error("INVALID_ARGS", "performUpsert.fieldsToMergeOn must be a non-empty array.", method_id=method_id)
 
+        if method_id in PAGINATED_METHODS and args.get("auto_paginate"):
+            return await self._paginate(method_id, spec["method"], path, q, b, args)
         host = spec.get("host", "api")
         return await self._request_json(method_id, spec["method"], path, q, b, host=host)
 
@@ -528,6 +544,44 @@ class IntegrationAirtable:
                 path = path.replace(token, str(args.get(key, "")).strip())
         return path
 
+    def _rate_key(self, path: str) -> str:
+        # "/appXXX/tblYYY", "/meta/bases/appXXX/tables", "/meta/bases"
+        parts = path.strip("/").split("/")
+        if parts[0] == "meta":
+            return parts[2] if len(parts) > 2 else "meta"
+        return parts[0]
+
+    async def _send(
+        self,
+        tok: str,
+        method: str,
+        path: str,
+        query: Dict[str, Any],
+        body: Dict[str, Any] | None,
+        host: str,
+    ) -> Tuple[int, Any]:
+        base = AIRTABLE_CONTENT_BASE if host == "content" else AIRTABLE_BASE
+        http = ckit_http.get_client(base, rate_limit=AIRTABLE_RATE_LIMIT, max_retries=5)
+        response = await http.request(
+            method,
+            path,
+            credential_key=self._rate_key(path),
+            headers={
+                "Authorization": f"Bearer {tok}",
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            },
+            params=query or None,
+            json=body if method in {"POST", "PATCH", "PUT"} else None,
+        )
+        data: Any = {}
+        if response.text:
+            try:
+                data = response.json()
+            except json.JSONDecodeError:
+                data = response.text
+        return response.status_code, data
+
     async def _request_json(
         self,
         method_id: str,
@@ -541,72 +595,19 @@ class IntegrationAirtable:
         tok = self._get_token()
         if not tok:
             return self._error("AUTH_MISSING", "Set airtable api_key in external auth or AIRTABLE_API_KEY env var.", method_id=method_id)
-
-        headers = {
-            "Authorization": f"Bearer {tok}",
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-        }
-        base = AIRTABLE_CONTENT_BASE if host == "content" else AIRTABLE_BASE
-        url = base + path
-
         try:
-            async with httpx.AsyncClient(timeout=30.0) as cli:
-                response = None
-                for attempt in range(5):
-                    response = await cli.request(
-                        method,
-                        url,
-                        headers=headers,
-                        params=query or None,
-                        json=body if method in {"POST", "PATCH", "PUT"} else None,
-                    )
-                    if response.status_code != 429:
-                        break
-                    wait_s = min(2 ** attempt, 30)
-                    logger.warning("airtable rate limited method=%s wait=%ss attempt=%s", method_id, wait_s, attempt + 1)
-                    await asyncio.sleep(wait_s)
-                assert response is not None
+            status, data = await self._send(tok, method, path, query, body, host)
         except Exception as e:
             logger.exception("airtable request failed: %s", method_id)
             return self._error("REQUEST_FAILED", str(e), method_id=method_id)
-
-        data: Any = {}
-        if response.text:
-            try:
-                data = response.json()
-            except json.JSONDecodeError:
-                data = response.text
-
-        if response.status_code >= 400:
-            error_code = "PROVIDER_ERROR"
-            message = "Airtable request failed."
-            if response.status_code == 401:
-                error_code = "AUTH_REJECTED"
-                message = "Airtable rejected the token. This usually means the PAT is invalid, expired, or missing required scopes/resources."
-            elif response.status_code == 403:
-                error_code = "INSUFFICIENT_PERMISSIONS"
-                message = "Airtable accepted the token but denied this operation due to missing permissions or scopes."
-            elif response.status_code == 404:
-                error_code = "NOT_FOUND_OR_UNAVAILABLE"
-                message = "The Airtable endpoint or requested resource is unavailable to this token. For base metadata, this is often missing data.bases scope or resource access."
-            return json.dumps({
-                "ok": False,
-                "provider": PROVIDER_NAME,
-                "method_id": method_id,
-                "status": response.status_code,
-                "error_code": error_code,
-                "message": message,
-                "setup_required": False,
-                "has_api_key": bool(tok),
-                "error": data,
-            }, indent=2, ensure_ascii=False)
+        if status >= 400:
+            return self._provider_error(method_id, status, data, tok)
 
         result = {
             "ok": True,
             "provider": PROVIDER_NAME,
             "method_id": method_id,
-            "status": response.status_code,
+            "status": status,
             "result": data,
         }
         if isinstance(data, dict):
@@ -619,6 +620,98 @@ class IntegrationAirtable:
             }
         return json.dumps(result, indent=2, ensure_ascii=False)
 
+    async def _paginate(
+        self,
+        method_id: str,
+        method: str,
+        path: str,
+        query: Dict[str, Any],
+        body: Dict[str, Any] | None,
+        args: Dict[str, Any],
+    ) -> str:
+        # Airtable's offset is an opaque cursor, pages of one listing can only be fetched one after another,
+        # the per-base bucket in ckit_http keeps this and any parallel calls on the same base under 5 req/s.
+        tok = self._get_token()
+        if not tok:
+            return self._error("AUTH_MISSING", "Set airtable api_key in external auth or AIRTABLE_API_KEY env var.", method_id=method_id)
+        try:
+            limit = max(1, min(int(args.get("max_records") or AUTO_PAGINATE_DEFAULT), AUTO_PAGINATE_MAX))
+        except (TypeError, ValueError):
+            return self._error("INVALID_ARGS", "max_records must be an integer.", method_id=method_id)
+        key = PAGINATED_METHODS[method_id]
+        query = dict(query)
+        body = dict(body) if isinstance(body, dict) else None
+        page_args = body if method == "POST" and body is not None else query
+        if key != "bases":
+            page_args["pageSize"] = 100
+        if key == "records":
+            page_args["maxRecords"] = min(int(page_args.get("maxRecords") or limit), limit)
+
+        items: list = []
+        pages = 0
+        offset = page_args.get("offset")
+        status = 200
+        while True:
+            if offset:
+                page_args["offset"] = offset
+            try:
+                status, data = await self._send(tok, method, path, query, body, "api")
+            except Exception as e:
+                logger.exception("airtable request failed: %s", method_id)
+                return self._error("REQUEST_FAILED", str(e), method_id=method_id, pages_fetched=pages)
+            if status >= 400:
+                return self._provider_error(method_id, status, data, tok)
+            pages += 1
+            data = data if isinstance(data, dict) else {}
+            items.extend(data.get(key) or [])
+            offset = data.get("offset")
+            if not offset or len(items) >= limit:
+                break
+
+        items = items[:limit]
+        shown, spill = await ckit_mongo.mongo_spill_list(None, ckit_mongo.spill_path_prefix(f"airtable/{key}"), items, get_collection=self._mongo)
+        result = {
+            "ok": True,
+            "provider": PROVIDER_NAME,
+            "method_id": method_id,
+            "status": status,
+            "pages_fetched": pages,
+            "items_count": len(items),
+            "has_more": bool(offset),
+            "result": {key: shown},
+        }
+        if offset:
+            result["next_offset"] = offset
+        result.update(spill)
+        return json.dumps(result, indent=2, ensure_ascii=False)
+
+    async def _mongo(self):
+        return await ckit_mongo.personal_mongo_lazy(self.rcx)
+
+    def _provider_error(self, method_id: str, status: int, data: Any, tok: str) -> str:
+        error_code = "PROVIDER_ERROR"
+        message = "Airtable request failed."
+        if status == 401:
+            error_code = "AUTH_REJECTED"
+            message = "Airtable rejected the token. This usually means the PAT is invalid, expired, or missing required scopes/resources."
+        elif status == 403:
+            error_code = "INSUFFICIENT_PERMISSIONS"
+            message = "Airtable accepted the token but denied this operation due to missing permissions or scopes."
+        elif status == 404:
+            error_code = "NOT_FOUND_OR_UNAVAILABLE"
+            message = "The Airtable endpoint or requested resource is unavailable to this token. For base metadata, this is often missing data.bases scope or resource access."
+        return json.dumps({
+            "ok": False,
+            "provider": PROVIDER_NAME,
+            "method_id": method_id,
+            "status": status,
+            "error_code": error_code,
+            "message": message,
+            "setup_required": False,
+            "has_api_key": bool(tok),
+            "error": data,
+        }, indent=2, ensure_ascii=False)
+
     def _error(self, code: str, message: str, **extra) -> str:
         payload = {
             "ok": False,
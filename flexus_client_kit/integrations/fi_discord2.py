@@ -5,12 +5,13 @@ import json
 import logging
 import os
 import random
+import re
 import tempfile
 import time
-from collections import deque
+from collections import OrderedDict, deque
 import dataclasses
 from dataclasses import dataclass, field
-from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 
 import discord
 import gql
@@ -139,6 +140,274 @@ def discord_bot_api_key_from_external_auth(ext: Dict[str, Any]) -> str:
     return ""
 
 
+# Nothing is downloaded up front: no guild member lists, no channel sweep. Names are resolved when something refers
+# to them (an incoming message, a mention, a post target) and kept in bounded LRU caches. Member lookups that miss go
+# out as gateway Request Guild Members ops for exactly those ids (or that name prefix), not as a full guild chunk.
+#
+# Personas using the same bot token share one DiscordGateway (one AutoShardedClient, one websocket per shard),
+# every attached persona sees every message and filters by its own watch list, as with separate connections.
+# FLEXUS_DISCORD_SHARE_GATEWAY=0 gives each persona its own connection.
+
+
+DISCORD_READY_TIMEOUT = 30.0
+DISCORD_RESTART_BASE = 5.0       # seconds before reconnecting a crashed gateway, doubles per crash in a row
+DISCORD_RESTART_MAX = 300.0
+DISCORD_MEMBER_CACHE_MAX = 5000
+DISCORD_CHANNEL_CACHE_MAX = 2000
+DISCORD_CHUNK_MAX_IDS = 100      # gateway limit for user_ids in one Request Guild Members
+DISCORD_SHARE_GATEWAY = os.getenv("FLEXUS_DISCORD_SHARE_GATEWAY", "1") != "0"
+
+_MENTION_RE = re.compile(r"<@!?(\d+)>")
+
+
+class _NameCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.id2name: OrderedDict[int, str] = OrderedDict()
+        self.name2id: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.id2name)
+
+    def put(self, obj_id: int, name: str) -> str:
+        old = self.id2name.pop(obj_id, None)
+        if old is not None and self.name2id.get(old.lower()) == obj_id:
+            del self.name2id[old.lower()]
+        self.id2name[obj_id] = name
+        self.name2id[name.lower()] = obj_id
+        while len(self.id2name) > self.max_size:
+            evicted_id, evicted_name = self.id2name.popitem(last=False)
+            if self.name2id.get(evicted_name.lower()) == evicted_id:
+                del self.name2id[evicted_name.lower()]
+        return name
+
+    def name(self, obj_id: int) -> Optional[str]:
+        name = self.id2name.get(obj_id)
+        if name is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.id2name.move_to_end(obj_id)
+        return name
+
+    def id(self, name: str) -> Optional[int]:
+        obj_id = self.name2id.get(name.lower())
+        if obj_id is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.id2name.move_to_end(obj_id)
+        return obj_id
+
+
+class DiscordGateway:
+    def __init__(self, token: str, sharded: bool):
+        self.token = token
+        intents = discord.Intents.default()
+        intents.message_content = True
+        intents.members = True    # query_members() needs it, the member list itself is never requested
+        intents.guilds = True
+        intents.dm_messages = True
+        intents.guild_messages = True
+        client_cls = discord.AutoShardedClient if sharded else discord.Client
+        self.client: discord.Client = client_cls(
+            intents=intents,
+            chunk_guilds_at_startup=False,
+            member_cache_flags=discord.MemberCacheFlags.none(),
+        )
+        self.ready = asyncio.Event()
+        self.failure: Optional[BaseException] = None
+        self.listeners: List["IntegrationDiscord"] = []
+        self.members = _NameCache(DISCORD_MEMBER_CACHE_MAX)
+        self.channels = _NameCache(DISCORD_CHANNEL_CACHE_MAX)
+        self.chunk_requests = 0
+        self.crashes_in_a_row = 0
+        self.task: Optional[asyncio.Task] = None
+        self._restart: Optional[asyncio.TimerHandle] = None
+        self._pending: Dict[Tuple[int, int], asyncio.Future] = {}
+        self._setup_event_handlers()
+
+    def _setup_event_handlers(self) -> None:
+        @self.client.event  # type: ignore[misc]
+        async def on_ready():
+            logger.info("Logged in to Discord as %s, %d guilds, %d personas on this connection", self.client.user, len(self.client.guilds), len(self.listeners))
+            self.crashes_in_a_row = 0
+            self.ready.set()
+
+        @self.client.event  # type: ignore[misc]
+        async def on_message(message: discord.Message):
+            listeners = list(self.listeners)
+            results = await asyncio.gather(*[x._handle_incoming_message(message) for x in listeners], return_exceptions=True)
+            for x, r in zip(listeners, results):
+                if isinstance(r, Exception):
+                    logger.error("%s discord message handler crashed: %s", x.rcx.persona.persona_id, r, exc_info=r)
+
+    def attach(self, integr: "IntegrationDiscord") -> None:
+        if integr not in self.listeners:
+            self.listeners.append(integr)
+        if self.failure is not None:
+            integr.gateway_failed(self.failure)
+
+    def start(self) -> None:
+        if self.task is not None:
+            return
+        self.ready.clear()
+        self.task = asyncio.create_task(self.client.start(self.token))
+        self.task.add_done_callback(self._on_done)
+
+    def _on_done(self, t: asyncio.Task) -> None:
+        try:
+            exc = t.exception()
+        except asyncio.CancelledError:
+            return
+        self.ready.set()   # whoever waits in wait_ready() wakes up and sees is_ready() is False
+        if exc is None:
+            return
+        if isinstance(exc, (discord.errors.LoginFailure, discord.errors.PrivilegedIntentsRequired)):
+            self.failure = exc
+            self._unregister()
+            for x in list(self.listeners):
+                x.gateway_failed(exc)
+            return
+        ckit_utils.report_crash(t, logger)
+        # Any other crash: every persona on this token depends on the connection, reconnect it after a pause
+        self.task = None
+        self.crashes_in_a_row += 1
+        if not self.listeners:
+            self._unregister()
+            return
+        delay = min(DISCORD_RESTART_MAX, DISCORD_RESTART_BASE * 2 ** (self.crashes_in_a_row - 1))
+        logger.info("discord gateway for %d personas reconnects in %.0fs", len(self.listeners), delay)
+        self._restart = asyncio.get_running_loop().call_later(delay, self._restart_now)
+
+    def _restart_now(self) -> None:
+        self._restart = None
+        if not self.listeners or self.task is not None:
+            return
+        if self.client.is_closed():
+            self.client.clear()
+        self.start()
+
+    async def detach(self, integr: "IntegrationDiscord") -> None:
+        if integr in self.listeners:
+            self.listeners.remove(integr)
+        if self.listeners:
+            return
+        self._unregister()
+        if self._restart is not None:
+            self._restart.cancel()
+            self._restart = None
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        if not self.client.is_closed():
+            await self.client.close()
+        self.task = None
+
+    def _unregister(self) -> None:
+        hit = _gateways.get(self.token)
+        if hit and hit[1] is self:
+            del _gateways[self.token]
+
+    async def wait_ready(self, timeout: float = DISCORD_READY_TIMEOUT) -> bool:
+        if not self.ready.is_set():
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.failure is None and self.client.is_ready()
+
+    async def member_names(self, guild: discord.Guild, user_ids: Iterable[int]) -> Dict[int, str]:
+        # Cache first, the rest in one Request Guild Members per 100 ids; concurrent askers for an id share a request
+        result: Dict[int, str] = {}
+        missing: List[int] = []
+        waiting: List[Tuple[int, asyncio.Future]] = []
+        for uid in set(user_ids):
+            name = self.members.name(uid)
+            if name is not None:
+                result[uid] = name
+            elif (fut := self._pending.get((guild.id, uid))) is not None:
+                waiting.append((uid, fut))
+            else:
+                missing.append(uid)
+        loop = asyncio.get_running_loop()
+        mine = {uid: loop.create_future() for uid in missing}
+        for uid, fut in mine.items():
+            self._pending[(guild.id, uid)] = fut
+        try:
+            for i in range(0, len(missing), DISCORD_CHUNK_MAX_IDS):
+                batch = missing[i:i + DISCORD_CHUNK_MAX_IDS]
+                self.chunk_requests += 1
+                try:
+                    found = await guild.query_members(user_ids=batch, cache=False)
+                except (DiscordException, asyncio.TimeoutError) as e:
+                    logger.warning("Member chunk request for %d ids in guild %s failed: %s", len(batch), guild.id, e)
+                    continue
+                for m in found:
+                    result[m.id] = self.members.put(m.id, m.display_name)
+        finally:
+            for uid, fut in mine.items():
+                self._pending.pop((guild.id, uid), None)
+                if not fut.done():
+                    fut.set_result(result.get(uid))
+        for uid, fut in waiting:
+            name = await fut
+            if name is not None:
+                result[uid] = name
+        return result
+
+    async def find_member(self, name: str) -> Optional[int]:
+        uid = self.members.id(name)
+        if uid is not None:
+            return uid
+        lname = name.lower()
+        for guild in self.client.guilds:
+            self.chunk_requests += 1
+            try:
+                found = await guild.query_members(query=name, limit=10, cache=False)
+            except (DiscordException, asyncio.TimeoutError) as e:
+                logger.warning("Member search for %r in guild %s failed: %s", name, guild.id, e)
+                continue
+            for m in found:
+                self.members.put(m.id, m.display_name)
+                if lname in (m.display_name.lower(), m.name.lower()):
+                    return m.id
+        return None
+
+    def find_channel(self, name: str) -> Optional[int]:
+        # discord.py keeps guild channels from GUILD_CREATE anyway, a miss is a scan of that, not a request
+        cid = self.channels.id(name)
+        if cid is not None:
+            return cid
+        lname = name.lower()
+        for guild in self.client.guilds:
+            for ch in [*guild.text_channels, *guild.threads]:
+                if ch.name.lower() == lname:
+                    self.channels.put(ch.id, ch.name)
+                    return ch.id
+        return None
+
+
+_gateways: Dict[str, Tuple[asyncio.AbstractEventLoop, DiscordGateway]] = {}
+
+
+def get_gateway(token: str, share: bool = DISCORD_SHARE_GATEWAY) -> DiscordGateway:
+    if not share:
+        return DiscordGateway(token, sharded=False)
+    loop = asyncio.get_running_loop()
+    hit = _gateways.get(token)
+    if hit and hit[0] is loop:
+        return hit[1]
+    gw = DiscordGateway(token, sharded=True)
+    _gateways[token] = (loop, gw)
+    return gw
+
+
 class IntegrationDiscord(fi_messenger.FlexusMessenger):
     platform_name = "discord"
     emessage_type = "DISCORD"
@@ -149,6 +418,7 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
         rcx: ckit_bot_exec.RobotContext,
         watch_channels: str,
         mongo_collection: Optional[Any] = None,
+        share_gateway: bool = DISCORD_SHARE_GATEWAY,
     ):
         super().__init__(fclient, rcx)
         self.is_fake = rcx.running_test_scenario
@@ -156,10 +426,8 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
 
         self.mongo_collection = mongo_collection
         self.activity_callback: Callable[[ActivityDiscord, bool], Awaitable[None]] = self.inbound_activity_to_task
-        self.user_id2name: Dict[int, str] = {}
-        self.user_name2id: Dict[str, int] = {}
-        self.channel_id2name: Dict[int, str] = {}
-        self.channel_name2id: Dict[str, int] = {}
+        self.members = _NameCache(DISCORD_MEMBER_CACHE_MAX)
+        self.channels = _NameCache(DISCORD_CHANNEL_CACHE_MAX)
         self.problems_other: List[str] = []
         self._from_discord_dedup = deque(maxlen=50000)
         self._from_discord_dedup_set: set[str] = set()
@@ -167,7 +435,7 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
         self._to_discord_dedup_set: set[str] = set()
         self.watch_channel_ids: set[str] = set()
         self.watch_channel_names: set[str] = set()
-        self.reactive_task: Optional[asyncio.Task] = None
+        self.gateway: Optional[DiscordGateway] = None
         self.client: Optional[discord.Client] = None
 
         for item in [x.strip() for x in watch_channels.split(",") if x.strip()]:
@@ -180,15 +448,10 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
             self.oops_a_problem("Discord not configured: connect Discord in bot Integrations", dont_print=True)
             return
 
-        intents = discord.Intents.default()
-        intents.message_content = True
-        intents.members = True
-        intents.guilds = True
-        intents.dm_messages = True
-        intents.guild_messages = True
-
-        self.client = discord.Client(intents=intents)
-        self._setup_event_handlers()
+        self.gateway = get_gateway(self.bot_token, share_gateway)
+        self.client = self.gateway.client
+        self.members = self.gateway.members
+        self.channels = self.gateway.channels
 
     def oops_a_problem(self, text: str, dont_print: bool = False) -> None:
         if not dont_print:
@@ -232,33 +495,19 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
         pass  # Discord uses persistent websocket, not webhook emessages
 
     async def start_reactive(self) -> None:
-        if not self.client or self.reactive_task:
+        if not self.client or not self.gateway or self in self.gateway.listeners:
             return
-        def _on_done(t):
-            try:
-                exc = t.exception()
-            except asyncio.CancelledError:
-                return
-            if exc is None:
-                return
-            if isinstance(exc, (discord.errors.LoginFailure, discord.errors.PrivilegedIntentsRequired)):
-                self.oops_a_problem(f"{type(exc).__name__}: {exc}")
-                self.client = None
-                return
-            ckit_utils.report_crash(t, logger)
-        self.reactive_task = asyncio.create_task(self.client.start(self.bot_token))
-        self.reactive_task.add_done_callback(_on_done)
+        self.gateway.attach(self)
+        self.gateway.start()
+
+    def gateway_failed(self, exc: BaseException) -> None:
+        self.oops_a_problem(f"{type(exc).__name__}: {exc}")
+        self.client = None
 
     async def close(self) -> None:
-        if self.reactive_task and not self.reactive_task.done():
-            self.reactive_task.cancel()
-            try:
-                await self.reactive_task
-            except asyncio.CancelledError:
-                pass
-        if self.client and not self.client.is_closed():
-            await self.client.close()
-        self.reactive_task = None
+        if self.gateway:
+            await self.gateway.detach(self)
+        self.gateway = None
         self.client = None
 
     async def join_channels(self) -> None:
@@ -294,7 +543,9 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
             result += "Discord client: %s\n" % ("connected" if ready else "connecting")
             if self.watch_channel_ids or self.watch_channel_names:
                 result += "Watching channels: %s\n" % ", ".join(sorted(self.watch_channel_ids | self.watch_channel_names))
-            result += "Known guild channels: %d\n" % len(self.channel_id2name)
+            result += "Cached channels: %d, cached members: %d\n" % (len(self.channels), len(self.members))
+            if self.gateway and len(self.gateway.listeners) > 1:
+                result += "Connection shared with %d other personas using this bot token\n" % (len(self.gateway.listeners) - 1)
             if self.problems_other:
                 result += "Problems:\n"
                 for problem in self.problems_other:
@@ -408,13 +659,9 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
         return "Unknown operation %r, try \"help\"\n" % op
 
     async def _ensure_ready(self) -> bool:
-        if not self.client:
+        if not self.client or not self.gateway:
             return False
-        for _ in range(30):
-            if self.client.is_ready():
-                return True
-            await asyncio.sleep(1)
-        return self.client.is_ready()
+        return await self.gateway.wait_ready()
 
 
     async def _resolve_destination(self, channel_ref: str):
@@ -434,9 +681,11 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
 
         if channel_token.startswith("@"):
             username = channel_token[1:]
-            user_id = self.user_name2id.get(username.lower())
+            user_id = self.members.id(username)
             if not user_id and username.isdigit():
                 user_id = int(username)
+            if not user_id and self.gateway:
+                user_id = await self.gateway.find_member(username)
             if not user_id:
                 return Destination(None, None, None, "", f"Unknown Discord user {username!r}\n")
             user = self.client.get_user(user_id) if self.client else None
@@ -461,8 +710,7 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
                     logger.warning("%s Cannot fetch channel %s: %s", self.rcx.persona.persona_id, channel_token, e)
                     return Destination(None, None, None, "", f"Cannot fetch channel: {e}\n")
         if not channel_obj and self.client:
-            lookup = channel_token.lower()
-            channel_id = self.channel_name2id.get(lookup)
+            channel_id = self.gateway.find_channel(channel_token) if self.gateway else self.channels.id(channel_token)
             if channel_id:
                 channel_obj = self.client.get_channel(channel_id)
         if not channel_obj:
@@ -624,52 +872,30 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
             logger.exception("Failed to process image")
             return None
 
-    def _setup_event_handlers(self) -> None:
-        if not self.client:
-            return
-
-        @self.client.event  # type: ignore[misc]
-        async def on_ready():
-            logger.info("Logged in to Discord as %s", self.client.user)
-            await self._populate_caches()
-
-        @self.client.event  # type: ignore[misc]
-        async def on_message(message: discord.Message):
-            await self._handle_incoming_message(message)
-
-    async def _populate_caches(self) -> None:
-        if not self.client:
-            return
-        for guild in self.client.guilds:
-            for channel in guild.text_channels:
-                self._record_channel(channel)
-            for thread in guild.threads:
-                self._record_thread(thread)
-            try:
-                async for member in guild.fetch_members(limit=None):
-                    self._record_user(member)
-            except DiscordException:
-                logger.warning("%s Unable to prefetch all members for guild %s", self.rcx.persona.persona_id, guild.id)
-                logger.info("Unable to prefetch all members for guild %s", guild.id)
-
     def _record_channel(self, channel: discord.abc.GuildChannel) -> None:
-        self.channel_id2name[channel.id] = getattr(channel, "name", str(channel.id))
-        if hasattr(channel, "name"):
-            self.channel_name2id[channel.name.lower()] = channel.id
+        self.channels.put(channel.id, getattr(channel, "name", None) or str(channel.id))
 
     def _record_thread(self, thread: discord.Thread) -> None:
-        self.channel_id2name[thread.id] = thread.name
-        self.channel_name2id[thread.name.lower()] = thread.id
+        self.channels.put(thread.id, thread.name)
 
     def _record_user(self, member: discord.abc.User) -> str:
         display = member.display_name if hasattr(member, "display_name") else member.name
-        self.user_id2name[member.id] = display
-        self.user_name2id[display.lower()] = member.id
-        return display
+        return self.members.put(member.id, display)
+
+    async def _resolve_mentions(self, message: discord.Message, text: str) -> Tuple[str, Dict[str, str]]:
+        ids = {int(x) for x in _MENTION_RE.findall(text)}
+        if not ids:
+            return text, {}
+        names = {u.id: self._record_user(u) for u in message.mentions if u.id in ids}
+        if message.guild and self.gateway and ids - names.keys():
+            names.update(await self.gateway.member_names(message.guild, ids - names.keys()))
+        text = _MENTION_RE.sub(lambda m: "@" + names[int(m.group(1))] if int(m.group(1)) in names else m.group(0), text)
+        return text, {str(uid): name for uid, name in names.items()}
 
     async def _get_channel_name(self, channel_id: int) -> str:
-        if channel_id in self.channel_id2name:
-            return self.channel_id2name[channel_id]
+        name = self.channels.name(channel_id)
+        if name is not None:
+            return name
 
         if self.client:
             channel = self.client.get_channel(channel_id)
@@ -683,7 +909,7 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
 
             if channel:
                 self._record_channel(channel)
-                return self.channel_id2name[channel_id]
+                return self.channels.id2name[channel_id]
 
         return str(channel_id)
 
@@ -716,7 +942,7 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
         self._from_discord_dedup_set.add(dedup_key)
 
         author_name = self._record_user(message.author)
-        text = message.content or ""
+        text, mention_looked_up = await self._resolve_mentions(message, message.content or "")
         attachments = await self._extract_attachments(message)
 
         activity = ActivityDiscord(
@@ -730,6 +956,7 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
             is_dm=isinstance(message.channel, discord.DMChannel),
             bot_mentioned=self.client.user in message.mentions,
             attachments=attachments,
+            mention_looked_up=mention_looked_up,
         )
 
         posted = await self.post_into_captured_thread_as_user(activity)
@@ -887,3 +1114,95 @@ class IntegrationDiscord(fi_messenger.FlexusMessenger):
         if isinstance(parsed, dict):
             return parsed.get("m_content", str(parsed))
         return str(parsed)
+
+
+if __name__ == "__main__":
+    from types import SimpleNamespace
+
+    class _FakeListener:
+        def __init__(self, persona_id: str):
+            self.rcx = SimpleNamespace(persona=SimpleNamespace(persona_id=persona_id))
+            self.seen: List[Any] = []
+
+        async def _handle_incoming_message(self, message: Any) -> None:
+            self.seen.append(message)
+
+        def gateway_failed(self, exc: BaseException) -> None:
+            raise exc
+
+    def _fake_guild(guild_id: int, counter: Dict[str, int]):
+        async def query_members(query=None, *, limit=5, user_ids=None, presences=False, cache=True):
+            counter["requests"] += 1
+            await asyncio.sleep(0.02)
+            return [SimpleNamespace(id=uid, name=f"user{uid}", display_name=f"User {uid}") for uid in user_ids or []]
+        return SimpleNamespace(id=guild_id, query_members=query_members)
+
+    async def gateway_test():
+        gw = get_gateway("fake-token")
+        assert gw is get_gateway("fake-token") and isinstance(gw.client, discord.AutoShardedClient)
+        a, b = _FakeListener("p1"), _FakeListener("p2")
+        gw.attach(a)
+        gw.attach(b)
+
+        async def fake_start(token: str) -> None:
+            await asyncio.sleep(0.15)
+            await gw.client.on_ready()              # type: ignore[attr-defined]
+            await asyncio.sleep(3600)
+        gw.client.start = fake_start                # type: ignore[method-assign]
+        gw.client.is_ready = gw.ready.is_set        # type: ignore[method-assign]
+        closed: List[bool] = []
+
+        async def fake_close() -> None:
+            closed.append(True)
+        gw.client.close = fake_close                # type: ignore[method-assign]
+        gw.start()
+        t0 = time.monotonic()
+        assert await gw.wait_ready() and not gw.task.done()
+        print(f"ready after {time.monotonic() - t0:.2f}s (polling would have taken 1s)")
+
+        await gw.client.on_message("hello")        # type: ignore[attr-defined]
+        print("one connection, two personas ->", a.seen, b.seen)
+        assert a.seen == b.seen == ["hello"]
+
+        counter = {"requests": 0}
+        guild = _fake_guild(1, counter)
+        r1, r2 = await asyncio.gather(gw.member_names(guild, range(1, 151)), gw.member_names(guild, range(100, 201)))
+        print(f"200 distinct ids referenced by two concurrent messages -> {counter['requests']} chunk requests")
+        assert len(r1) == 150 and len(r2) == 101 and counter["requests"] == 3 and r2[120] == "User 120"
+        await gw.member_names(guild, range(1, 201))
+        assert counter["requests"] == 3
+
+        for i in range(DISCORD_MEMBER_CACHE_MAX + 1000):
+            gw.members.put(10_000 + i, f"Member {i}")
+        assert len(gw.members) == DISCORD_MEMBER_CACHE_MAX and len(gw.members.name2id) == DISCORD_MEMBER_CACHE_MAX
+        assert gw.members.name(10_000) is None and gw.members.id("member 5999") == 10_000 + 5999
+        print(f"member cache after {DISCORD_MEMBER_CACHE_MAX + 1200} names: {len(gw.members)} entries")
+
+        # the connection crashes with something that isn't bad credentials: all personas on it get it back
+        global DISCORD_RESTART_BASE
+        DISCORD_RESTART_BASE = 0.05
+        gw.task.cancel()
+        await asyncio.gather(gw.task, return_exceptions=True)
+        gw.task = None
+        crashes = {"n": 1}
+
+        async def crashing_start(token: str) -> None:
+            if crashes["n"]:
+                crashes["n"] -= 1
+                raise RuntimeError("websocket went away in a way discord.py doesn't retry")
+            await fake_start(token)
+        gw.client.start = crashing_start           # type: ignore[method-assign]
+        gw.start()
+        await asyncio.sleep(0.01)
+        assert gw.task is None and gw._restart is not None and _gateways["fake-token"][1] is gw
+        await asyncio.sleep(DISCORD_RESTART_BASE)
+        assert gw.task is not None and await gw.wait_ready() and gw.crashes_in_a_row == 0
+        print("crashed connection reconnected for", [x.rcx.persona.persona_id for x in gw.listeners])
+
+        await gw.detach(a)
+        assert gw.task and not gw.task.done()
+        await gw.detach(b)
+        assert gw.task is None and closed and "fake-token" not in _gateways
+        print("last persona detached -> connection closed")
+
+    asyncio.run(gateway_test())
@@ -23,10 +23,10 @@ def make_facebook_bunch(groups: list[str] | None = None) -> BunchOfPythonFunctio
             b.add("campaign.", [campaigns.list_campaigns, campaigns.create_campaign, campaigns.update_campaign, campaigns.duplicate_campaign, campaigns.archive_campaign, campaigns.bulk_update_campaigns, campaigns.get_insights])
         elif g == "adset":
             from flexus_client_kit.integrations.facebook import adsets
-            b.add("adset.", [adsets.list_adsets, adsets.create_adset, adsets.update_adset, adsets.validate_targeting])
+            b.add("adset.", [adsets.list_adsets, adsets.create_adset, adsets.update_adset, adsets.validate_targeting, adsets.bulk_update_adsets])
         elif g == "ad":
             from flexus_client_kit.integrations.facebook import ads
-            b.add("ad.", [ads.upload_image, ads.create_creative, ads.create_ad, ads.preview_ad])
+            b.add("ad.", [ads.upload_image, ads.create_creative, ads.create_ad, ads.preview_ad, ads.bulk_update_ads])
         else:
             raise ValueError(f"Unknown facebook group {g!r}")
     return b
@@ -1,28 +1,44 @@
 # Inspired from: https://github.com/n8n-io/n8n/blob/master/packages/nodes-base/nodes/Google/Gmail/V2/GmailV2.node.ts
 
+import asyncio
 import base64
+import json
 import logging
 import time
+import uuid
 from dataclasses import dataclass
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email import message_from_string
 from email.policy import default
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
 import html2text
-import google.oauth2.credentials
-import googleapiclient.discovery
-import googleapiclient.errors
+import httpx
 
 from flexus_client_kit import ckit_cloudtool
 from flexus_client_kit import ckit_client
+from flexus_client_kit import ckit_http
 from flexus_client_kit import ckit_erp
 from flexus_client_kit import ckit_integrations_db
 from flexus_client_kit import erp_schema
 
 logger = logging.getLogger("gmail")
 
+GMAIL_API_BASE = "https://gmail.googleapis.com"
+# Gmail meters per-user quota units, not requests: 250 units/s per user, a get costs 5, a send 100
+# https://developers.google.com/gmail/api/reference/quota
+GMAIL_QUOTA = ckit_http.RateLimit(rate=250, burst=250)
+GMAIL_UNITS = {
+    "messages.send": 100, "messages.list": 5, "messages.get": 5, "messages.delete": 10, "messages.modify": 5,
+    "labels.list": 1, "labels.create": 5, "labels.delete": 5,
+    "drafts.create": 10, "drafts.list": 5, "drafts.get": 5, "drafts.delete": 10,
+    "threads.list": 10, "threads.get": 10, "threads.delete": 20,
+}
+GMAIL_BATCH_MAX = 50   # batch endpoint takes 100, Google recommends staying at 50 or below
+GMAIL_BATCH_RETRY_STATUSES = (429, 500, 503)
+METADATA_HEADERS = ["From", "To", "Subject", "Date"]
+
 GMAIL_PROMPT = """
 ## Gmail Integration
 
@@ -133,33 +149,133 @@ class GmailMessage:
     has_attachments: bool
 
 
+class GmailApiError(Exception):
+    def __init__(self, status: int, error_details: str):
+        self.status = status
+        self.error_details = error_details
+        super().__init__(f"{status} - {error_details}")
+
+
+def _api_error(status: int, body: bytes) -> GmailApiError:
+    try:
+        err = json.loads(body).get("error", {})
+        details = err.get("message") or err.get("status") or str(err)
+    except (ValueError, AttributeError):
+        details = body[:200].decode("utf-8", errors="replace")
+    return GmailApiError(status, details)
+
+
+def _batch_body(boundary: str, paths: List[str]) -> bytes:
+    parts = []
+    for i, path in enumerate(paths):
+        parts.append(
+            f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <item{i}>\r\n\r\n"
+            f"GET {path}\r\n\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n")
+    return "".join(parts).encode("utf-8")
+
+
+def _batch_parse(content_type: str, body: bytes, n: int) -> List[Tuple[int, bytes]]:
+    # multipart/mixed, each part is "Content-ID: <response-itemN>" + a full HTTP response
+    boundary = content_type.split("boundary=", 1)[1].split(";", 1)[0].strip().strip('"')
+    results: List[Tuple[int, bytes]] = [(0, b"")] * n
+    for part in body.split(b"--" + boundary.encode()):
+        head, sep, rest = part.partition(b"\r\n\r\n")
+        if not sep:
+            continue
+        idx = -1
+        for line in head.split(b"\r\n"):
+            if line.lower().startswith(b"content-id:"):
+                cid = line.split(b":", 1)[1].strip().strip(b"<>")
+                idx = int(cid.rsplit(b"item", 1)[1])
+        status_line, _, http_rest = rest.partition(b"\r\n")
+        if idx < 0 or idx >= n or not status_line.startswith(b"HTTP/"):
+            continue
+        _, _, payload = http_rest.partition(b"\r\n\r\n")
+        results[idx] = (int(status_line.split()[1]), payload.strip())
+    return results
+
+
 class IntegrationGmail:
 
     def __init__(
         self,
         fclient: ckit_client.FlexusClient,
         rcx,  # ckit_bot_exec.RobotContext
+        api_base: str = GMAIL_API_BASE,
     ):
         self.fclient = fclient
         self.rcx = rcx
+        self.api_base = api_base
         self._last_access_token = None
-        self.service = None
 
     def _ensure_service(self) -> bool:
         auth = self.rcx.external_auth.get("gmail") or {}
         access_token = (auth.get("token") or {}).get("access_token", "")
         if not access_token:
-            self.service = None
             self._last_access_token = None
             return False
-        if access_token == self._last_access_token and self.service:
-            return True
-        creds = google.oauth2.credentials.Credentials(token=access_token)
-        self.service = googleapiclient.discovery.build('gmail', 'v1', credentials=creds)
+        if access_token != self._last_access_token:
+            logger.info("Gmail service initialized for user %s", self.rcx.persona.owner_fuser_id)
         self._last_access_token = access_token
-        logger.info("Gmail service initialized for user %s", self.rcx.persona.owner_fuser_id)
         return True
 
+    def _http(self) -> ckit_http.RateLimitedClient:
+        return ckit_http.get_client(self.api_base, rate_limit=GMAIL_QUOTA)
+
+    async def _api(self, method: str, op: str, path: str, params: Optional[Dict[str, Any]] = None, body: Optional[dict] = None) -> dict:
+        # The token bucket is keyed by access token, so quota is paced per connected account
+        r = await self._http().request(
+            method, f"/gmail/v1/users/me/{path}",
+            credential_key=self._last_access_token,
+            cost=GMAIL_UNITS[op],
+            params=params,
+            json=body,
+            headers={"Authorization": f"Bearer {self._last_access_token}"},
+        )
+        if r.status_code >= 400:
+            raise _api_error(r.status_code, r.content)
+        return r.json() if r.content else {}
+
+    async def _batch_get(self, op: str, paths: List[str]) -> List[dict]:
+        # One HTTP round trip per GMAIL_BATCH_MAX gets instead of one per item. Quota is still charged
+        # per inner call, items throttled inside the batch are retried once in a follow-up batch.
+        results: List[dict] = [{}] * len(paths)
+        todo = list(range(len(paths)))
+        for attempt in range(2):
+            retry = []
+            for chunk_start in range(0, len(todo), GMAIL_BATCH_MAX):
+                chunk = todo[chunk_start:chunk_start + GMAIL_BATCH_MAX]
+                boundary = "batch_" + uuid.uuid4().hex
+                r = await self._http().request(
+                    "POST", "/batch/gmail/v1",
+                    credential_key=self._last_access_token,
+                    cost=GMAIL_UNITS[op] * len(chunk),
+                    content=_batch_body(boundary, [f"/gmail/v1/users/me/{paths[i]}" for i in chunk]),
+                    headers={
+                        "Authorization": f"Bearer {self._last_access_token}",
+                        "Content-Type": f"multipart/mixed; boundary={boundary}",
+                    },
+                )
+                if r.status_code >= 400:
+                    raise _api_error(r.status_code, r.content)
+                for i, (status, payload) in zip(chunk, _batch_parse(r.headers.get("content-type", ""), r.content, len(chunk))):
+                    if status == 200:
+                        results[i] = json.loads(payload)
+                    elif status in (401, 403):
+                        raise _api_error(status, payload)
+                    else:
+                        if status in GMAIL_BATCH_RETRY_STATUSES and attempt == 0:
+                            retry.append(i)
+                        results[i] = {"_error": status}
+            if not retry:
+                break
+            logger.info("gmail batch: %d of %d items throttled, retrying", len(retry), len(paths))
+            await asyncio.sleep(1.0)
+            todo = retry
+        return results
+
     async def called_by_model(
         self,
         toolcall: ckit_cloudtool.FCloudtoolCall,
@@ -231,14 +347,16 @@ class IntegrationGmail:
             else:
                 return f"❌ Unknown operation: {op}\n\nTry gmail(op='help') for usage."
 
-        except googleapiclient.errors.HttpError as e:
-            if e.resp.status in (401, 403):
-                self.service = None
+        except GmailApiError as e:
+            if e.status in (401, 403):
                 self._last_access_token = None
-                return f"❌ Gmail authentication error: {e.resp.status} - {e.error_details}\n\nPlease reconnect Gmail in bot Integrations tab."
-            error_msg = f"Gmail API error: {e.resp.status} - {e.error_details}"
+                return f"❌ Gmail authentication error: {e.status} - {e.error_details}\n\nPlease reconnect Gmail in bot Integrations tab."
+            error_msg = f"Gmail API error: {e.status} - {e.error_details}"
             logger.error(error_msg)
             return f"❌ {error_msg}"
+        except httpx.TransportError as e:
+            logger.error("Gmail transport error: %s %s", type(e).__name__, e)
+            return f"❌ Gmail is unreachable: {type(e).__name__} {e}"
 
     async def _send_message(self, args: Dict[str, Any], ft_id: str) -> str:
         to = args.get("to", "")
@@ -273,10 +391,7 @@ class IntegrationGmail:
 
         raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode("utf-8")
 
-        result = self.service.users().messages().send(
-            userId="me",
-            body={"raw": raw_message}
-        ).execute()
+        result = await self._api("POST", "messages.send", "messages/send", body={"raw": raw_message})
 
         message_id = result.get("id")
         thread_id = result.get("threadId")
@@ -320,7 +435,7 @@ class IntegrationGmail:
         max_results = args.get("maxResults", 10)
         label_ids = args.get("labelIds", [])
 
-        params = {"userId": "me", "maxResults": min(max_results, 100)}
+        params = {"maxResults": min(max_results, 100)}
 
         if query:
             params["q"] = query
@@ -328,7 +443,7 @@ class IntegrationGmail:
         if label_ids:
             params["labelIds"] = label_ids
 
-        results = self.service.users().messages().list(**params).execute()
+        results = await self._api("GET", "messages.list", "messages", params=params)
         messages = results.get("messages", [])
 
         if not messages:
@@ -336,14 +451,16 @@ class IntegrationGmail:
 
         output_lines = [f"📬 Found {len(messages)} message(s):\n"]
 
-        for i, msg in enumerate(messages[:max_results], 1):
+        shown = messages[:max_results]
+        qs = str(httpx.QueryParams({"format": "metadata", "metadataHeaders": METADATA_HEADERS}))
+        details = await self._batch_get("messages.get", [f"messages/{m['id']}?{qs}" for m in shown])
+        for i, (msg, msg_detail) in enumerate(zip(shown, details), 1):
             msg_id = msg["id"]
-            msg_detail = self.service.users().messages().get(
-                userId="me",
-                id=msg_id,
-                format="metadata",
-                metadataHeaders=["From", "To", "Subject", "Date"]
-            ).execute()
+            if "_error" in msg_detail:
+                output_lines.append(f"{i}. ID: {msg_id}")
+                output_lines.append(f"   (metadata unavailable: HTTP {msg_detail['_error']})")
+                output_lines.append("")
+                continue
 
             headers = {h["name"]: h["value"] for h in msg_detail["payload"]["headers"]}
             snippet = msg_detail.get("snippet", "")
@@ -364,32 +481,10 @@ class IntegrationGmail:
         if not message_id:
             return "❌ Missing required parameter: 'messageId'"
 
-        message = self.service.users().messages().get(
-            userId="me",
-            id=message_id,
-            format="raw"
-        ).execute()
-
-        raw_email = base64.urlsafe_b64decode(message["raw"]).decode("utf-8", errors="replace")
-        parsed_email = message_from_string(raw_email, policy=default)
-
-        body_plain = parsed_email.get_body(preferencelist=('plain',))
-        body_html = parsed_email.get_body(preferencelist=('html',))
-
-        if body_plain:
-            body_content = body_plain.get_content()
-            body_type = "plain text"
-        elif body_html:
-            html_content = body_html.get_content()
-            h = html2text.HTML2Text()
-            h.ignore_links = False
-            h.ignore_images = False
-            h.ignore_emphasis = False
-            body_content = h.handle(html_content)
-            body_type = "converted from HTML"
-        else:
-            body_content = "(no body content)"
-            body_type = "none"
+        message = await self._api("GET", "messages.get", f"messages/{message_id}", params={"format": "raw"})
+
+        # MIME parsing and html2text on a multi-megabyte message take long enough to be felt by other personas
+        parsed_email, body_content, body_type = await asyncio.to_thread(_parse_raw_email, message["raw"])
 
         max_preview = 5000
         output = [
@@ -425,7 +520,7 @@ class IntegrationGmail:
                 confirm_explanation="This will permanently delete the message",
             )
 
-        self.service.users().messages().delete(userId="me", id=message_id).execute()
+        await self._api("DELETE", "messages.delete", f"messages/{message_id}")
 
         return f"✅ Message {message_id} deleted successfully"
 
@@ -435,11 +530,7 @@ class IntegrationGmail:
         if not message_id:
             return "❌ Missing required parameter: 'messageId'"
 
-        self.service.users().messages().modify(
-            userId="me",
-            id=message_id,
-            body={"removeLabelIds": ["UNREAD"]}
-        ).execute()
+        await self._api("POST", "messages.modify", f"messages/{message_id}/modify", body={"removeLabelIds": ["UNREAD"]})
 
         return f"✅ Message {message_id} marked as read"
 
@@ -449,11 +540,7 @@ class IntegrationGmail:
         if not message_id:
             return "❌ Missing required parameter: 'messageId'"
 
-        self.service.users().messages().modify(
-            userId="me",
-            id=message_id,
-            body={"addLabelIds": ["UNREAD"]}
-        ).execute()
+        await self._api("POST", "messages.modify", f"messages/{message_id}/modify", body={"addLabelIds": ["UNREAD"]})
 
         return f"✅ Message {message_id} marked as unread"
 
@@ -464,11 +551,7 @@ class IntegrationGmail:
         if not message_id or not label_ids:
             return "❌ Missing required parameters: 'messageId' and 'labelIds'"
 
-        self.service.users().messages().modify(
-            userId="me",
-            id=message_id,
-            body={"addLabelIds": label_ids}
-        ).execute()
+        await self._api("POST", "messages.modify", f"messages/{message_id}/modify", body={"addLabelIds": label_ids})
 
         return f"✅ Added {len(label_ids)} label(s) to message {message_id}"
 
@@ -479,16 +562,12 @@ class IntegrationGmail:
         if not message_id or not label_ids:
             return "❌ Missing required parameters: 'messageId' and 'labelIds'"
 
-        self.service.users().messages().modify(
-            userId="me",
-            id=message_id,
-            body={"removeLabelIds": label_ids}
-        ).execute()
+        await self._api("POST", "messages.modify", f"messages/{message_id}/modify", body={"removeLabelIds": label_ids})
 
         return f"✅ Removed {len(label_ids)} label(s) from message {message_id}"
 
     async def _list_labels(self, args: Dict[str, Any]) -> str:
-        results = self.service.users().labels().list(userId="me").execute()
+        results = await self._api("GET", "labels.list", "labels")
         labels = results.get("labels", [])
 
         if not labels:
@@ -515,7 +594,7 @@ class IntegrationGmail:
             "messageListVisibility": "show"
         }
 
-        result = self.service.users().labels().create(userId="me", body=body).execute()
+        result = await self._api("POST", "labels.create", "labels", body=body)
 
         return f"✅ Label '{name}' created successfully (ID: {result['id']})"
 
@@ -532,7 +611,7 @@ class IntegrationGmail:
                 confirm_explanation="This will permanently delete the label",
             )
 
-        self.service.users().labels().delete(userId="me", id=label_id).execute()
+        await self._api("DELETE", "labels.delete", f"labels/{label_id}")
 
         return f"✅ Label {label_id} deleted successfully"
 
@@ -550,10 +629,7 @@ class IntegrationGmail:
 
         raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode("utf-8")
 
-        result = self.service.users().drafts().create(
-            userId="me",
-            body={"message": {"raw": raw_message}}
-        ).execute()
+        result = await self._api("POST", "drafts.create", "drafts", body={"message": {"raw": raw_message}})
 
         draft_id = result.get("id")
 
@@ -562,10 +638,7 @@ class IntegrationGmail:
     async def _list_drafts(self, args: Dict[str, Any]) -> str:
         max_results = args.get("maxResults", 10)
 
-        results = self.service.users().drafts().list(
-            userId="me",
-            maxResults=max_results
-        ).execute()
+        results = await self._api("GET", "drafts.list", "drafts", params={"maxResults": max_results})
 
         drafts = results.get("drafts", [])
 
@@ -574,14 +647,14 @@ class IntegrationGmail:
 
         output = [f"📝 Found {len(drafts)} draft(s):\n"]
 
-        for i, draft in enumerate(drafts, 1):
+        details = await self._batch_get("drafts.get", [f"drafts/{d['id']}?format=metadata" for d in drafts])
+        for i, (draft, draft_detail) in enumerate(zip(drafts, details), 1):
             draft_id = draft["id"]
-
-            draft_detail = self.service.users().drafts().get(
-                userId="me",
-                id=draft_id,
-                format="metadata"
-            ).execute()
+            if "_error" in draft_detail:
+                output.append(f"{i}. ID: {draft_id}")
+                output.append(f"   (metadata unavailable: HTTP {draft_detail['_error']})")
+                output.append("")
+                continue
 
             message = draft_detail.get("message", {})
             headers = {h["name"]: h["value"] for h in message.get("payload", {}).get("headers", [])}
@@ -608,7 +681,7 @@ class IntegrationGmail:
                 confirm_explanation="This will permanently delete the draft",
             )
 
-        self.service.users().drafts().delete(userId="me", id=draft_id).execute()
+        await self._api("DELETE", "drafts.delete", f"drafts/{draft_id}")
 
         return f"✅ Draft {draft_id} deleted successfully"
 
@@ -618,12 +691,7 @@ class IntegrationGmail:
         if not thread_id:
             return "❌ Missing required parameter: 'threadId'"
 
-        thread = self.service.users().threads().get(
-            userId="me",
-            id=thread_id,
-            format="metadata",
-            metadataHeaders=["From", "To", "Subject", "Date"]
-        ).execute()
+        thread = await self._api("GET", "threads.get", f"threads/{thread_id}", params={"format": "metadata", "metadataHeaders": METADATA_HEADERS})
 
         messages = thread.get("messages", [])
 
@@ -646,11 +714,7 @@ class IntegrationGmail:
         query = args.get("query", "")
         max_results = args.get("maxResults", 10)
 
-        results = self.service.users().threads().list(
-            userId="me",
-            q=query,
-            maxResults=max_results
-        ).execute()
+        results = await self._api("GET", "threads.list", "threads", params={"q": query, "maxResults": max_results})
 
         threads = results.get("threads", [])
 
@@ -681,9 +745,175 @@ class IntegrationGmail:
                 confirm_explanation="This will permanently delete the entire thread",
             )
 
-        self.service.users().threads().delete(userId="me", id=thread_id).execute()
+        await self._api("DELETE", "threads.delete", f"threads/{thread_id}")
 
         return f"✅ Thread {thread_id} deleted successfully"
 
 
+def _parse_raw_email(raw: str):
+    raw_email = base64.urlsafe_b64decode(raw).decode("utf-8", errors="replace")
+    parsed_email = message_from_string(raw_email, policy=default)
+
+    body_plain = parsed_email.get_body(preferencelist=('plain',))
+    body_html = parsed_email.get_body(preferencelist=('html',))
+
+    if body_plain:
+        body_content = body_plain.get_content()
+        body_type = "plain text"
+    elif body_html:
+        html_content = body_html.get_content()
+        h = html2text.HTML2Text()
+        h.ignore_links = False
+        h.ignore_images = False
+        h.ignore_emphasis = False
+        body_content = h.handle(html_content)
+        body_type = "converted from HTML"
+    else:
+        body_content = "(no body content)"
+        body_type = "none"
+    return parsed_email, body_content, body_type
+
+
 GMAIL_SCOPES = ckit_integrations_db.GOOGLE_OAUTH_BASE_SCOPES + ["https://www.googleapis.com/auth/gmail.modify"]
+
+
+if __name__ == "__main__":
+    # Harness against a local fake Gmail API: the fake runs on its own thread and loop with per-request latency,
+    # a ticker on the main loop records the worst stall while search/listDrafts/get run.
+    import threading
+    import types
+    from aiohttp import web
+
+    LATENCY = 0.03
+    N = 40
+
+    def fake_message(i: int) -> dict:
+        return {
+            "id": f"m{i}", "threadId": f"t{i}", "snippet": f"snippet {i}",
+            "payload": {"headers": [{"name": "From", "value": f"a{i}@example.com"}, {"name": "Subject", "value": f"hello {i}"}]},
+        }
+
+    def run_fake_gmail(ready: dict) -> None:
+        stats = ready["stats"]
+
+        async def list_messages(request):
+            await asyncio.sleep(LATENCY)
+            stats["requests"] += 1
+            return web.json_response({"messages": [{"id": f"m{i}", "threadId": f"t{i}"} for i in range(int(request.query.get("maxResults", 10)))]})
+
+        async def get_message(request):
+            await asyncio.sleep(LATENCY)
+            stats["requests"] += 1
+            i = int(request.match_info["id"][1:])
+            if request.query.get("format") == "raw":
+                raw = base64.urlsafe_b64encode(f"From: a{i}@example.com\r\nSubject: hello\r\n\r\n{'body ' * 20000}".encode()).decode()
+                return web.json_response({"id": f"m{i}", "threadId": f"t{i}", "raw": raw})
+            return web.json_response(fake_message(i))
+
+        async def list_drafts(request):
+            await asyncio.sleep(LATENCY)
+            stats["requests"] += 1
+            return web.json_response({"drafts": [{"id": f"d{i}"} for i in range(int(request.query.get("maxResults", 10)))]})
+
+        async def batch(request):
+            await asyncio.sleep(LATENCY)
+            stats["requests"] += 1
+            body = await request.read()
+            boundary = request.headers["Content-Type"].split("boundary=")[1]
+            out = []
+            for part in body.split(b"--" + boundary.encode())[1:-1]:
+                head, _, inner = part.partition(b"\r\n\r\n")
+                cid = [l for l in head.split(b"\r\n") if l.lower().startswith(b"content-id:")][0].split(b"<")[1].rstrip(b">")
+                path = inner.split()[1].decode()
+                item = path.split("?")[0].rsplit("/", 1)[1]
+                stats["batched_items"] += 1
+                if item.startswith("d"):
+                    payload = {"id": item, "message": fake_message(int(item[1:]))}
+                else:
+                    payload = fake_message(int(item[1:]))
+                out.append(
+                    f"--resp\r\nContent-Type: application/http\r\nContent-ID: <response-{cid.decode()}>\r\n\r\n"
+                    f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n"
+                )
+            out.append("--resp--\r\n")
+            return web.Response(body="".join(out).encode(), headers={"Content-Type": "multipart/mixed; boundary=resp"})
+
+        async def main():
+            app = web.Application()
+            app.router.add_get("/gmail/v1/users/me/messages", list_messages)
+            app.router.add_get("/gmail/v1/users/me/messages/{id}", get_message)
+            app.router.add_get("/gmail/v1/users/me/drafts", list_drafts)
+            app.router.add_post("/batch/gmail/v1", batch)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            ready["port"] = site._server.sockets[0].getsockname()[1]
+            ready["event"].set()
+            await asyncio.Event().wait()
+
+        asyncio.run(main())
+
+    async def stall_meter(stop: asyncio.Event, out: dict) -> None:
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(0.005)
+            out["max"] = max(out["max"], time.perf_counter() - t0 - 0.005)
+
+    async def measured(label: str, coro_fn, stats: dict) -> None:
+        stop, stall = asyncio.Event(), {"max": 0.0}
+        meter = asyncio.create_task(stall_meter(stop, stall))
+        stats["requests"] = stats["batched_items"] = 0
+        await asyncio.sleep(0.01)   # let the meter start ticking
+        t0 = time.perf_counter()
+        await coro_fn()
+        dt = time.perf_counter() - t0
+        stop.set()
+        await meter
+        print(f"{label:42s} {dt*1000:7.1f}ms  requests {stats['requests']:3d}  worst loop stall {stall['max']*1000:6.1f}ms")
+
+    async def harness():
+        ready = {"event": threading.Event(), "stats": {"requests": 0, "batched_items": 0}}
+        threading.Thread(target=run_fake_gmail, args=(ready,), daemon=True).start()
+        ready["event"].wait()
+        base = f"http://127.0.0.1:{ready['port']}"
+        stats = ready["stats"]
+
+        rcx = types.SimpleNamespace(
+            external_auth={"gmail": {"token": {"access_token": "fake-token"}}},
+            persona=types.SimpleNamespace(owner_fuser_id="u1", ws_id="ws1", persona_id="p1"),
+        )
+        gm = IntegrationGmail(None, rcx, api_base=base)
+        call = types.SimpleNamespace(fcall_ft_id="ft1", confirmed_by_human=False)
+
+        async def blocking_n_plus_1():
+            # what the googleapiclient version did: synchronous list + one synchronous get per message
+            with httpx.Client(base_url=base) as c:
+                for m in c.get("/gmail/v1/users/me/messages", params={"maxResults": N}).json()["messages"]:
+                    c.get(f"/gmail/v1/users/me/messages/{m['id']}", params={"format": "metadata"}).json()
+
+        await measured(f"blocking client, search {N} (before)", blocking_n_plus_1, stats)
+
+        async def search():
+            # first call also pays for building the pooled client (ssl context), that's most of its stall
+            r = await gm.called_by_model(call, {"op": "search", "args": {"maxResults": N}})
+            assert r.count("Subject: hello") == N, r[:300]
+        await measured(f"async + batch, search {N}", search, stats)
+        assert stats["requests"] == 1 + (N + GMAIL_BATCH_MAX - 1) // GMAIL_BATCH_MAX and stats["batched_items"] == N
+
+        async def drafts():
+            r = await gm.called_by_model(call, {"op": "listDrafts", "args": {"maxResults": N}})
+            assert r.count("ID: d") == N, r[:300]
+        await measured(f"async + batch, listDrafts {N}", drafts, stats)
+
+        async def get_big():
+            r = await gm.called_by_model(call, {"op": "get", "args": {"messageId": "m1"}})
+            assert "truncated" in r, r[:300]
+        await measured("async, get 100KB message", get_big, stats)
+
+        async def parallel_personas():
+            await asyncio.gather(*[gm.called_by_model(call, {"op": "search", "args": {"maxResults": 10}}) for _ in range(10)])
+        await measured("10 concurrent searches, one account (quota)", parallel_personas, stats)
+        await ckit_http.close_all()
+
+    asyncio.run(harness())
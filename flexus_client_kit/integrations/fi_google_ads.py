@@ -1,4 +1,3 @@
-import asyncio
 import logging
 from typing import Dict, Any, Optional
 
@@ -7,6 +6,7 @@ import grpc
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
 
+from flexus_client_kit import ckit_blocking
 from flexus_client_kit import ckit_cloudtool
 from flexus_client_kit import ckit_client
 from flexus_client_kit import ckit_integrations_db
@@ -226,7 +226,7 @@ class IntegrationGoogleAds:
         def _search():
             service = self._client.get_service("GoogleAdsService")
             return list(service.search(customer_id=self.customer_id, query=query))
-        return await asyncio.to_thread(_search)
+        return await ckit_blocking.run("google_ads", _search)
 
     async def _gaql_query(self, args: Dict[str, Any]) -> str:
         query = args.get("query", "")
@@ -311,7 +311,7 @@ class IntegrationGoogleAds:
             operation.update_mask.CopyFrom(field_mask)
             return service.mutate_campaigns(customer_id=self.customer_id, operations=[operation])
 
-        await asyncio.to_thread(_mutate)
+        await ckit_blocking.run("google_ads", _mutate)
         return f"✅ Campaign {campaign_id} set to {target_status}"
     
     async def _list_ad_groups(self, args: Dict[str, Any]) -> str:
@@ -374,7 +374,7 @@ class IntegrationGoogleAds:
             criterion.status = self._client.enums.AdGroupCriterionStatusEnum.ENABLED.value
             return service.mutate_ad_group_criteria(customer_id=self.customer_id, operations=[operation])
 
-        await asyncio.to_thread(_mutate)
+        await ckit_blocking.run("google_ads", _mutate)
         return f"✅ Keyword '{text}' ({match_type}) added to ad group {ad_group_id}"
     
     async def _pause_keyword(self, args: Dict[str, Any], toolcall: ckit_cloudtool.FCloudtoolCall) -> str:
@@ -400,7 +400,7 @@ class IntegrationGoogleAds:
             operation.update_mask.CopyFrom(field_mask)
             return service.mutate_ad_group_criteria(customer_id=self.customer_id, operations=[operation])
 
-        await asyncio.to_thread(_mutate)
+        await ckit_blocking.run("google_ads", _mutate)
         return f"✅ Keyword {criterion_id} paused in ad group {ad_group_id}"
     
     async def _update_keyword_bid(self, args: Dict[str, Any], toolcall: ckit_cloudtool.FCloudtoolCall) -> str:
@@ -427,7 +427,7 @@ class IntegrationGoogleAds:
             operation.update_mask.CopyFrom(field_mask)
             return service.mutate_ad_group_criteria(customer_id=self.customer_id, operations=[operation])
 
-        await asyncio.to_thread(_mutate)
+        await ckit_blocking.run("google_ads", _mutate)
         return f"✅ Keyword {criterion_id} bid updated to {_format_micros(bid_micros)}"
     
     async def _list_budgets(self, args: Dict[str, Any]) -> str:
@@ -470,7 +470,7 @@ class IntegrationGoogleAds:
             operation.update_mask.CopyFrom(field_mask)
             return service.mutate_campaign_budgets(customer_id=self.customer_id, operations=[operation])
 
-        await asyncio.to_thread(_mutate)
+        await ckit_blocking.run("google_ads", _mutate)
         return f"✅ Budget {budget_id} updated to {_format_micros(amount_micros)}/day"
     
     async def _get_performance(self, args: Dict[str, Any]) -> str:
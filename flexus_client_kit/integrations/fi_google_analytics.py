@@ -10,6 +10,7 @@ import google.oauth2.credentials
 import googleapiclient.discovery
 import googleapiclient.errors
 
+from flexus_client_kit import ckit_blocking
 from flexus_client_kit import ckit_cloudtool
 from flexus_client_kit import ckit_client
 
@@ -159,9 +160,12 @@ class IntegrationGoogleAnalytics:
         if access_token == self._last_access_token and self.service_data:
             return True
         creds = google.oauth2.credentials.Credentials(token=access_token)
-        self.service_data = googleapiclient.discovery.build('analyticsdata', 'v1beta', credentials=creds)
-        self.service_reporting = googleapiclient.discovery.build('analyticsreporting', 'v4', credentials=creds)
-        self.admin_service = googleapiclient.discovery.build('analyticsadmin', 'v1beta', credentials=creds)
+        # build() parses the bundled discovery documents, that's CPU work too
+        self.service_data, self.service_reporting, self.admin_service = await ckit_blocking.run("google_analytics", lambda: (
+            googleapiclient.discovery.build('analyticsdata', 'v1beta', credentials=creds),
+            googleapiclient.discovery.build('analyticsreporting', 'v4', credentials=creds),
+            googleapiclient.discovery.build('analyticsadmin', 'v1beta', credentials=creds),
+        ))
         self._last_access_token = access_token
 
         logger.info("Google Analytics services initialized for user %s", self.rcx.persona.owner_fuser_id)
@@ -293,10 +297,10 @@ class IntegrationGoogleAnalytics:
         body["limit"] = limit
 
         try:
-            response = self.service_data.properties().runReport(
+            response = await ckit_blocking.run("google_analytics", self.service_data.properties().runReport(
                 property=f"properties/{property_id}",
                 body=body
-            ).execute()
+            ).execute)
 
             return self._format_report_response(response)
 
@@ -337,7 +341,7 @@ class IntegrationGoogleAnalytics:
 
     async def _list_properties(self, args: Dict[str, Any]) -> str:
         try:
-            accounts = self.admin_service.accounts().list().execute()
+            accounts = await ckit_blocking.run("google_analytics", self.admin_service.accounts().list().execute)
 
             if not accounts.get("accounts"):
                 return "📊 No Google Analytics accounts found."
@@ -349,9 +353,9 @@ class IntegrationGoogleAnalytics:
                 account_id = account.get("name", "").split("/")[-1]
 
                 try:
-                    properties = self.admin_service.properties().list(
+                    properties = await ckit_blocking.run("google_analytics", self.admin_service.properties().list(
                         filter=f"parent:{account.get('name')}"
-                    ).execute()
+                    ).execute)
 
                     if properties.get("properties"):
                         output.append(f"\n🏢 Account: {account_name} (ID: {account_id})")
@@ -361,7 +365,7 @@ class IntegrationGoogleAnalytics:
                             prop_type = "GA4"
                             output.append(f"  • {prop_name} (ID: {prop_id}, Type: {prop_type})")
 
-                except HttpError as e:
+                except googleapiclient.errors.HttpError as e:
                     output.append(f"\n🏢 Account: {account_name} (ID: {account_id})")
                     output.append(f"  ⚠️  Could not list properties: {e.resp.status}")
 
@@ -380,9 +384,9 @@ class IntegrationGoogleAnalytics:
             return "❌ Missing required parameter: 'propertyId'"
 
         try:
-            prop = self.admin_service.properties().get(
+            prop = await ckit_blocking.run("google_analytics", self.admin_service.properties().get(
                 name=f"properties/{property_id}"
-            ).execute()
+            ).execute)
 
             output = [
                 "📊 Property Details:\n",
@@ -421,7 +425,7 @@ class IntegrationGoogleAnalytics:
             body["activityTypes"] = activity_types
 
         try:
-            response = self.service_reporting.userActivity().search(body=body).execute()
+            response = await ckit_blocking.run("google_analytics", self.service_reporting.userActivity().search(body=body).execute)
 
             sessions = response.get("sessions", [])
 
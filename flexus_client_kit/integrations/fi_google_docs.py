@@ -1,4 +1,3 @@
-import asyncio
 import json
 import logging
 from typing import Dict, Any, Optional
@@ -7,6 +6,7 @@ import google.oauth2.credentials
 import googleapiclient.discovery
 import googleapiclient.errors
 
+from flexus_client_kit import ckit_blocking
 from flexus_client_kit import ckit_cloudtool
 from flexus_client_kit import ckit_client
 
@@ -83,7 +83,7 @@ class IntegrationGoogleDocs:
         if access_token == self._last_access_token and self._service:
             return True
         creds = google.oauth2.credentials.Credentials(token=access_token)
-        self._service = googleapiclient.discovery.build("docs", "v1", credentials=creds)
+        self._service = await ckit_blocking.run("google_docs", googleapiclient.discovery.build, "docs", "v1", credentials=creds)
         self._last_access_token = access_token
         logger.info("Initialized Google Docs service")
         return True
@@ -163,26 +163,26 @@ class IntegrationGoogleDocs:
 
     async def _create(self, args):
         title = args.get("title", "")
-        doc = await asyncio.to_thread(
+        doc = await ckit_blocking.run("google_docs",
             lambda: self._service.documents().create(body={"title": title}).execute()
         )
         return f"Created document_id={doc['documentId']} title={doc.get('title','')}"
 
     async def _get(self, args):
-        doc = await asyncio.to_thread(
+        doc = await ckit_blocking.run("google_docs",
             lambda: self._service.documents().get(documentId=args["document_id"]).execute()
         )
         return json.dumps(doc, indent=2)
 
     async def _get_text(self, args):
-        doc = await asyncio.to_thread(
+        doc = await ckit_blocking.run("google_docs",
             lambda: self._service.documents().get(documentId=args["document_id"]).execute()
         )
         return _extract_plain_text(doc)
 
     async def _append_text(self, args):
         doc_id = args["document_id"]
-        doc = await asyncio.to_thread(
+        doc = await ckit_blocking.run("google_docs",
             lambda: self._service.documents().get(
                 documentId=doc_id,
                 fields="body(content(endIndex))",
@@ -218,7 +218,7 @@ class IntegrationGoogleDocs:
         return await self._do_batch_update(args["document_id"], args["requests"])
 
     async def _do_batch_update(self, document_id: str, requests: list) -> str:
-        resp = await asyncio.to_thread(
+        resp = await ckit_blocking.run("google_docs",
             lambda: self._service.documents().batchUpdate(
                 documentId=document_id,
                 body={"requests": requests},
@@ -1,18 +1,18 @@
-import asyncio
 import json
 import logging
 import os
 from typing import Any, Dict
 
-import httpx
-
 from flexus_client_kit import ckit_cloudtool
+from flexus_client_kit import ckit_http
 
 logger = logging.getLogger("hubspot")
 
 PROVIDER_NAME = "hubspot"
 AUTH_PROVIDER_NAME = "hubspot"
 HUBSPOT_BASE = "https://api.hubapi.com"
+# Private apps: 100 requests per 10 seconds per account (Starter), higher tiers get more
+HUBSPOT_RATE_LIMIT = ckit_http.RateLimit(rate=10, burst=100)
 
 METHOD_SPECS = {
     "hubspot.crm.objects.list.v1": {
@@ -374,25 +374,15 @@ class IntegrationHubSpot:
             "Content-Type": "application/json",
             "Accept": "application/json",
         }
-        url = HUBSPOT_BASE + path
-
         try:
-            async with httpx.AsyncClient(timeout=30.0) as cli:
-                response = None
-                for attempt in range(4):
-                    response = await cli.request(
-                        method,
-                        url,
-                        headers=headers,
-                        params=query or None,
-                        json=body if method in {"POST", "PATCH", "PUT", "DELETE"} else None,
-                    )
-                    if response.status_code != 429:
-                        break
-                    wait_s = min(2 ** attempt, 30)
-                    logger.warning("hubspot rate limited method=%s wait=%ss attempt=%s", method_id, wait_s, attempt + 1)
-                    await asyncio.sleep(wait_s)
-                assert response is not None
+            response = await ckit_http.get_client(HUBSPOT_BASE, rate_limit=HUBSPOT_RATE_LIMIT).request(
+                method,
+                path,
+                credential_key=tok,
+                headers=headers,
+                params=query or None,
+                json=body if method in {"POST", "PATCH", "PUT", "DELETE"} else None,
+            )
         except Exception as e:
             logger.exception("hubspot request failed: %s", method_id)
             return self._error("REQUEST_FAILED", str(e), method_id=method_id)
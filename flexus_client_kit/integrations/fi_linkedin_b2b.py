@@ -6,6 +6,7 @@ from urllib.parse import quote
 import httpx
 
 from flexus_client_kit import ckit_cloudtool
+from flexus_client_kit import ckit_http
 
 
 logger = logging.getLogger("linkedin_b2b")
@@ -103,6 +104,8 @@ METHOD_IDS = [
 
 _BASE_URL = "https://api.linkedin.com"
 _TIMEOUT = 30.0
+# LinkedIn enforces daily per-app/per-member quotas and answers 429 without Retry-After, keep bursts modest
+_RATE_LIMIT = ckit_http.RateLimit(rate=5, burst=20)
 
 LINKEDIN_B2B_TOOL = ckit_cloudtool.CloudTool(
     strict=False,
@@ -327,18 +330,17 @@ class IntegrationLinkedinB2B:
         restli_method: str = "",
     ) -> str:
         url = _BASE_URL + path
+        if http_method not in ("GET", "POST", "PUT", "DELETE"):
+            return json.dumps({"ok": False, "error_code": "UNSUPPORTED_HTTP_METHOD"}, indent=2, ensure_ascii=False)
+        has_body = http_method in ("POST", "PUT")
         try:
-            async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
-                if http_method == "GET":
-                    response = await client.get(url, headers=self._headers(has_body=False, restli_method=restli_method))
-                elif http_method == "POST":
-                    response = await client.post(url, headers=self._headers(has_body=True, restli_method=restli_method), json=body)
-                elif http_method == "PUT":
-                    response = await client.put(url, headers=self._headers(has_body=True, restli_method=restli_method), json=body)
-                elif http_method == "DELETE":
-                    response = await client.delete(url, headers=self._headers(has_body=False, restli_method=restli_method))
-                else:
-                    return json.dumps({"ok": False, "error_code": "UNSUPPORTED_HTTP_METHOD"}, indent=2, ensure_ascii=False)
+            response = await ckit_http.get_client(_BASE_URL, rate_limit=_RATE_LIMIT, timeout=_TIMEOUT).request(
+                http_method,
+                url,
+                credential_key=self._access_token(),
+                headers=self._headers(has_body=has_body, restli_method=restli_method),
+                json=body if has_body else None,
+            )
         except httpx.TimeoutException:
             return json.dumps({"ok": False, "provider": PROVIDER_NAME, "method_id": method_id, "error_code": "TIMEOUT"}, indent=2, ensure_ascii=False)
         except (httpx.HTTPError, ValueError) as e:
@@ -1,12 +1,16 @@
+import asyncio
 import json
 import logging
+import time
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Any, Awaitable, Callable, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
+import aiohttp
 import gql
 import gql.transport.exceptions
 
-from flexus_client_kit import ckit_ask_model, ckit_bot_exec, ckit_bot_query, ckit_cloudtool, ckit_kanban, ckit_scenario
+from flexus_client_kit import ckit_ask_model, ckit_bot_exec, ckit_bot_query, ckit_client, ckit_cloudtool, ckit_kanban, ckit_scenario, ckit_shutdown
 from flexus_client_kit.integrations import fi_messenger
 
 logger = logging.getLogger("fi_msgrs")
@@ -14,6 +18,12 @@ logger = logging.getLogger("fi_msgrs")
 
 SUPPORTED_PLATFORMS = {"telegram", "whatsapp"}   # XXX add slack, discord, magic_desk as they are migrated
 
+OUTBOUND_BATCH_WINDOW = 0.05     # messages of one assistant reply arrive within a few ms of each other
+OUTBOUND_BATCH_MAX = 20
+OUTBOUND_MAX_ATTEMPTS = 4
+OUTBOUND_RETRY_BASE = 1.0        # seconds, doubles every attempt
+OUTBOUND_KEYS_MAX = 50000
+
 
 HELP = """flexus_messenger(op="capture", args={"platform": "telegram", "chat_id": 12345})
     Capture a chat. Their messages appear here, your responses are sent back automatically.
@@ -168,6 +178,193 @@ async def default_handle_emessage(rcx: ckit_bot_exec.RobotContext, emsg: ckit_bo
     await inbound_activity_to_task(rcx, a, already_posted=bool(captured_ft_id))
 
 
+# Outbound messages don't go out from the persona's event handler anymore, messenger_outbound() only queues them.
+# One worker per external conversation (ft_app_searchable) keeps them in order, whatever piled up while the previous
+# batch was in flight goes out as one aliased mutation:
+#
+#   mutation MessengerOutboundBatch($p0_source_ft_id: String!, ..., $p1_source_ft_id: String!, ...) {
+#       p0: messenger_thread_post_from_bot(source_ft_id: $p0_source_ft_id, ...)
+#       p1: messenger_thread_post_from_bot(source_ft_id: $p1_source_ft_id, ...)
+#   }
+#
+# Top-level mutation fields run serially, so p0 is delivered before p1. Then last_posted_outbound_ts is written once
+# per batch. The dedup key is "ft_id:alt:num": a message already queued or posted is never queued again (the same
+# message comes through on_updated_message several times).
+#
+# messenger_thread_post_from_bot has no idempotency key, the backend would post a resent message twice. So a batch
+# is resent only if the backend surely didn't run it (no connection, 429, 503). Any other failure (timeout,
+# disconnect, 5xx) may come after some posts went out: nothing is resent, the keys stay, and it's logged.
+
+
+@dataclass
+class _OutboundItem:
+    key: str
+    ft_id: str
+    created_ts: float
+    variables: Dict[str, Any]
+    app_specific: Callable[[], Dict[str, Any]]   # the thread's latest ft_app_specific, read when the watermark is written
+
+
+_POST_ARGS = [
+    ("source_ft_id", "String!"),
+    ("source_ftm_alt", "Int!"),
+    ("source_ftm_num", "Int!"),
+    ("text", "String!"),
+    ("reply_to_external_id", "String!"),
+]
+
+
+async def _post_many(http: gql.Client, items: List[_OutboundItem]) -> List[Optional[str]]:
+    # None for every post that went through, error message for the ones the backend rejected
+    decls, lines, variables = [], [], {}
+    for n, it in enumerate(items):
+        call_args = []
+        for arg, gql_type in _POST_ARGS:
+            decls.append(f"$p{n}_{arg}: {gql_type}")
+            call_args.append(f"{arg}: $p{n}_{arg}")
+            variables[f"p{n}_{arg}"] = it.variables[arg]
+        lines.append(f"p{n}: messenger_thread_post_from_bot({', '.join(call_args)})")
+    doc = "mutation MessengerOutboundBatch(%s) {\n    %s\n}" % (", ".join(decls), "\n    ".join(lines))
+    errors: Dict[str, str] = {}
+    async with http as h:
+        try:
+            await h.execute(gql.gql(doc), variable_values=variables)
+        except gql.transport.exceptions.TransportQueryError as e:
+            for err in e.errors or []:
+                if not isinstance(err, dict):
+                    err = {"message": str(err)}
+                path = err.get("path") or []
+                msg = err.get("message", str(err))
+                if path:
+                    errors[str(path[0])] = msg
+                else:
+                    errors = {f"p{n}": msg for n in range(len(items))}
+    return [errors.get(f"p{n}") for n in range(len(items))]
+
+
+def _surely_not_executed(e: BaseException) -> bool:
+    if isinstance(e, gql.transport.exceptions.TransportServerError):
+        return e.code in (429, 503)
+    return isinstance(e, (gql.transport.exceptions.TransportConnectionFailed, aiohttp.ClientConnectorError, ConnectionRefusedError))
+
+
+class OutboundPipeline:
+    def __init__(self, http_factory: Callable[[], Awaitable[gql.Client]], window: float = OUTBOUND_BATCH_WINDOW):
+        self.http_factory = http_factory
+        self.window = window
+        self.requests_sent = 0
+        self.posts_sent = 0
+        self.posts_rejected = 0
+        self.posts_uncertain = 0
+        self.retries = 0
+        self._queues: Dict[str, List[_OutboundItem]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._keys = deque(maxlen=OUTBOUND_KEYS_MAX)
+        self._keys_set: set[str] = set()
+        self._posted_ts: Dict[str, float] = {}
+
+    def enqueue(self, searchable: str, item: _OutboundItem) -> bool:
+        if item.key in self._keys_set:
+            return False
+        if item.created_ts <= self._posted_ts.get(item.ft_id, float("-inf")):
+            return False
+        if len(self._keys) == self._keys.maxlen:
+            self._keys_set.discard(self._keys[0])
+        self._keys.append(item.key)
+        self._keys_set.add(item.key)
+        self._queues.setdefault(searchable, []).append(item)
+        if searchable not in self._workers:
+            self._workers[searchable] = asyncio.create_task(self._drain(searchable))
+        return True
+
+    async def _drain(self, searchable: str) -> None:
+        try:
+            while self._queues.get(searchable):
+                await asyncio.sleep(self.window)
+                q = self._queues[searchable]
+                batch, self._queues[searchable] = q[:OUTBOUND_BATCH_MAX], q[OUTBOUND_BATCH_MAX:]
+                try:
+                    await self._send_batch(searchable, batch)
+                except Exception as e:
+                    logger.error("messenger outbound %s crashed: %s", searchable, e, exc_info=e)
+                    self._forget(batch)
+        finally:
+            if not self._queues.get(searchable):
+                self._queues.pop(searchable, None)
+            self._workers.pop(searchable, None)
+
+    def _forget(self, items: List[_OutboundItem]) -> None:
+        # not posted, a later update of the same message may try again
+        for it in items:
+            self._keys_set.discard(it.key)
+
+    async def _send_batch(self, searchable: str, batch: List[_OutboundItem]) -> None:
+        for attempt in range(OUTBOUND_MAX_ATTEMPTS):
+            try:
+                results = await _post_many(await self.http_factory(), batch)
+                break
+            except (gql.transport.exceptions.TransportError, asyncio.TimeoutError, OSError) as e:
+                if not _surely_not_executed(e):
+                    # some of these may be posted already, resending would duplicate them
+                    logger.warning("messenger outbound %s: %d posts in unknown state, not resending: %s %s", searchable, len(batch), type(e).__name__, e)
+                    self.posts_uncertain += len(batch)
+                    return
+                if attempt == OUTBOUND_MAX_ATTEMPTS - 1:
+                    logger.warning("messenger outbound %s: %d posts failed after %d attempts: %s %s", searchable, len(batch), attempt + 1, type(e).__name__, e)
+                    self._forget(batch)
+                    return
+                wait = OUTBOUND_RETRY_BASE * 2 ** attempt
+                logger.info("messenger outbound %s: %s, retry in %.1fs", searchable, type(e).__name__, wait)
+                self.retries += 1
+                await asyncio.sleep(wait)
+        self.requests_sent += 1
+        watermarks: Dict[str, _OutboundItem] = {}
+        for it, err in zip(batch, results):
+            if err is not None:
+                logger.warning("messenger_outbound %s key=%s failed: %s", searchable, it.key, err)
+                self.posts_rejected += 1
+                self._forget([it])
+                continue
+            self.posts_sent += 1
+            if it.ft_id not in watermarks or it.created_ts > watermarks[it.ft_id].created_ts:
+                watermarks[it.ft_id] = it
+        for ft_id, it in watermarks.items():
+            self._posted_ts[ft_id] = max(self._posted_ts.get(ft_id, it.created_ts), it.created_ts)
+            try:
+                app_specific = it.app_specific()
+                await ckit_ask_model.thread_app_capture_patch(await self.http_factory(), ft_id, ft_app_specific=json.dumps({
+                    **app_specific, "last_posted_outbound_ts": max(it.created_ts, app_specific.get("last_posted_outbound_ts") or 0.0),
+                }))
+                self.requests_sent += 1
+            except (gql.transport.exceptions.TransportError, asyncio.TimeoutError, OSError) as e:
+                # posts went through, the keys keep this process from repeating them
+                logger.warning("messenger outbound %s: watermark for %s not saved: %s %s", searchable, ft_id, type(e).__name__, e)
+
+    async def flush(self) -> None:
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+
+
+_pipelines: Dict[Tuple[int, str], Tuple[asyncio.AbstractEventLoop, OutboundPipeline]] = {}
+
+
+def get_pipeline(fclient: ckit_client.FlexusClient, persona_id: str) -> OutboundPipeline:
+    loop = asyncio.get_running_loop()
+    key = (id(fclient), persona_id)
+    hit = _pipelines.get(key)
+    if hit and hit[0] is loop:
+        return hit[1]
+    p = OutboundPipeline(lambda: fclient.use_http_on_behalf(persona_id, ""))
+    _pipelines[key] = (loop, p)
+    ckit_shutdown.give_flush_on_exit(f"messenger outbound {persona_id}", p.flush)
+    return p
+
+
+def _thread_app_specific(rcx: ckit_bot_exec.RobotContext, ftm: ckit_ask_model.FThreadMessageOutput) -> Dict[str, Any]:
+    t = rcx.latest_threads.get(ftm.ftm_belongs_to_ft_id)
+    return (t.thread_fields.ft_app_specific if t else None) or ftm.ft_app_specific or {}
+
+
 async def messenger_outbound(rcx: ckit_bot_exec.RobotContext, ftm: ckit_ask_model.FThreadMessageOutput) -> bool:
     if ftm.ftm_role not in ("assistant", "user"):
         return False
@@ -176,7 +373,7 @@ async def messenger_outbound(rcx: ckit_bot_exec.RobotContext, ftm: ckit_ask_mode
         return False
     if "/" not in searchable:
         return False
-    platform, _, mt_external_id = searchable.partition("/")
+    platform = searchable.partition("/")[0]
     if platform not in SUPPORTED_PLATFORMS:
         return False
     if ftm.ftm_role == "user" and ((ftm.ftm_author_label1 or "").startswith(f"{platform}:") or ftm.ftm_author_label1 == "system"):
@@ -186,34 +383,24 @@ async def messenger_outbound(rcx: ckit_bot_exec.RobotContext, ftm: ckit_ask_mode
     mtm = ftm_to_mtm(platform, ftm)
     if not mtm:
         return False
-    t = rcx.latest_threads.get(ftm.ftm_belongs_to_ft_id)
-    app_specific = (t.thread_fields.ft_app_specific if t else None) or ftm.ft_app_specific or {}
-    last_posted_ts = app_specific.get("last_posted_outbound_ts")
+    last_posted_ts = _thread_app_specific(rcx, ftm).get("last_posted_outbound_ts")
     if last_posted_ts is not None and ftm.ftm_created_ts <= last_posted_ts:
         return False
-    http = await rcx.fclient.use_http_on_behalf(rcx.persona.persona_id, "")
-    try:
-        async with http as h:
-            await h.execute(gql.gql("""
-                mutation MessengerOutboundFromBot($source_ft_id: String!, $source_ftm_alt: Int!, $source_ftm_num: Int!, $text: String!, $reply_to_external_id: String!) {
-                    messenger_thread_post_from_bot(source_ft_id: $source_ft_id, source_ftm_alt: $source_ftm_alt, source_ftm_num: $source_ftm_num, text: $text, reply_to_external_id: $reply_to_external_id)
-                }"""),
-                variable_values={
-                    "source_ft_id": ftm.ftm_belongs_to_ft_id,
-                    "source_ftm_alt": ftm.ftm_alt,
-                    "source_ftm_num": ftm.ftm_num,
-                    # for user, empty text -> backend resolves from source ftm
-                    "text": "" if ftm.ftm_role == "user" else mtm.get("text", ""),
-                    "reply_to_external_id": mtm.get("reply_to", ""),
-                },
-            )
-    except gql.transport.exceptions.TransportQueryError as e:
-        logger.warning("messenger_outbound %s mt_external_id=%s failed: %s", platform, mt_external_id, e)
-        return False
-    await ckit_ask_model.thread_app_capture_patch(http, ftm.ftm_belongs_to_ft_id, ft_app_specific=json.dumps({
-        **app_specific, "last_posted_outbound_ts": ftm.ftm_created_ts,
-    }))
-    return True
+    # True means queued, see OutboundPipeline
+    return get_pipeline(rcx.fclient, rcx.persona.persona_id).enqueue(searchable, _OutboundItem(
+        key="%s:%03d:%03d" % (ftm.ftm_belongs_to_ft_id, ftm.ftm_alt, ftm.ftm_num),
+        ft_id=ftm.ftm_belongs_to_ft_id,
+        created_ts=ftm.ftm_created_ts,
+        variables={
+            "source_ft_id": ftm.ftm_belongs_to_ft_id,
+            "source_ftm_alt": ftm.ftm_alt,
+            "source_ftm_num": ftm.ftm_num,
+            # for user, empty text -> backend resolves from source ftm
+            "text": "" if ftm.ftm_role == "user" else mtm.get("text", ""),
+            "reply_to_external_id": mtm.get("reply_to", ""),
+        },
+        app_specific=lambda: _thread_app_specific(rcx, ftm),
+    ))
 
 
 async def flexus_messenger_called_by_model(
@@ -305,3 +492,90 @@ async def flexus_messenger_called_by_model(
         return f"posted to {platform} chat_id={chat_id}\n"
 
     return fi_messenger.UNKNOWN_OPERATION_MSG % op
+
+
+if __name__ == "__main__":
+    import re
+    from aiohttp import web
+
+    STUB_LATENCY = 0.02
+
+    async def stub_backend_bench():
+        requests: List[str] = []
+        delivered: List[Tuple[str, int]] = []
+        watermarks: Dict[str, float] = {}
+        fail_next = {"n": 1, "status": 503, "after_delivery": False}
+
+        async def graphql(request):
+            body = await request.json()
+            await asyncio.sleep(STUB_LATENCY)
+            requests.append(body["query"])
+            v = body.get("variables") or {}
+            if "ThreadAppCapturePatch" in body["query"]:
+                watermarks[v["ft_id"]] = json.loads(v["ft_app_specific"])["last_posted_outbound_ts"]
+                return web.json_response({"data": {"thread_app_capture_patch": True}})
+            if fail_next["n"] and not fail_next["after_delivery"]:
+                fail_next["n"] -= 1
+                return web.json_response({"error": "unavailable"}, status=fail_next["status"])
+            aliases = re.findall(r"(p\d+): messenger_thread_post_from_bot", body["query"])
+            for a in aliases:
+                delivered.append((v[f"{a}_source_ft_id"], v[f"{a}_source_ftm_num"]))
+            if fail_next["n"]:
+                fail_next["n"] -= 1
+                return web.json_response({"error": "oops"}, status=fail_next["status"])
+            return web.json_response({"data": {a: True for a in aliases}})
+
+        app = web.Application()
+        app.router.add_post("/v1/graphql", graphql)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        fclient = ckit_client.FlexusClient("msgrs_bench", api_key="fx-bench", base_url=f"http://127.0.0.1:{port}", skip_logger_init=True)
+
+        global OUTBOUND_RETRY_BASE
+        OUTBOUND_RETRY_BASE = 0.05
+        pipe = get_pipeline(fclient, "persona1")
+
+        def item(ft_id: str, num: int) -> _OutboundItem:
+            return _OutboundItem(
+                key="%s:%03d:%03d" % (ft_id, 100, num), ft_id=ft_id, created_ts=1000.0 + num,
+                variables={"source_ft_id": ft_id, "source_ftm_alt": 100, "source_ftm_num": num, "text": f"part {num}", "reply_to_external_id": ""},
+                app_specific=lambda: {},
+            )
+
+        # two long replies going to two chats, every message shows up twice as it's updated, the first request gets a 503
+        t0 = time.monotonic()
+        queued = 0
+        for num in range(1, 16):
+            for ft_id, searchable in (("ftA", "telegram/111"), ("ftB", "whatsapp/222")):
+                queued += pipe.enqueue(searchable, item(ft_id, num))
+                pipe.enqueue(searchable, item(ft_id, num))
+            await asyncio.sleep(0.005)
+        await pipe.flush()
+        dt = time.monotonic() - t0
+        print(f"30 messages (60 events) -> {len(requests)} requests in {dt:.2f}s, post + watermark per message would be {2 * 30}, retries {pipe.retries}")
+        assert queued == 30 and pipe.posts_sent == 30 and pipe.retries == 1
+        for ft_id in ("ftA", "ftB"):
+            nums = [n for f, n in delivered if f == ft_id]
+            assert nums == list(range(1, 16)), nums
+            assert watermarks[ft_id] == 1015.0
+        assert len(requests) <= 10
+
+        # already posted -> not queued again, even before the thread's ft_app_specific catches up
+        assert not pipe.enqueue("telegram/111", item("ftA", 7))
+
+        # the backend posted the batch and then failed with 500: nothing is resent, and the same messages coming
+        # through on_updated_message again are not queued either
+        delivered.clear()
+        fail_next.update(n=1, status=500, after_delivery=True)
+        for num in (20, 21):
+            pipe.enqueue("telegram/111", item("ftA", num))
+        await pipe.flush()
+        assert [not pipe.enqueue("telegram/111", item("ftA", num)) for num in (20, 21)] == [True, True]
+        print(f"500 after delivery -> delivered {delivered}, uncertain {pipe.posts_uncertain}, retries {pipe.retries}")
+        assert delivered == [("ftA", 20), ("ftA", 21)] and pipe.posts_uncertain == 2 and pipe.retries == 1
+        await runner.cleanup()
+
+    asyncio.run(stub_backend_bench())
@@ -1,19 +1,28 @@
+import asyncio
 import json
 import logging
+import math
 import os
 import re
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 import httpx
 
 from flexus_client_kit import ckit_cloudtool
+from flexus_client_kit import ckit_http
+from flexus_client_kit import ckit_mongo
 
 logger = logging.getLogger("newsapi")
 
 PROVIDER_NAME = "newsapi"
 _BASE_URL = "https://newsapi.org/v2"
 
+NEWSAPI_RATE_LIMIT = ckit_http.RateLimit(rate=2, burst=5)   # per api key
+AUTO_PAGINATE_DEFAULT = 300
+AUTO_PAGINATE_MAX = 1000
+PAGE_SIZE_MAX = 100
+
 _METHOD_SPECS = {
     "newsapi.everything.v1": {
         "kind": "everything",
@@ -99,6 +108,7 @@ class IntegrationNewsapi:
             "op=help | status | list_methods | call\n"
             "call args: method_id plus the documented NewsAPI query params for that method\n"
             "aliases: query->q, limit->pageSize, geo.country->country, time_window/start_date/end_date->from/to for everything\n"
+            f"everything/top_headlines accept auto_paginate=true and max_records (default {AUTO_PAGINATE_DEFAULT}, max {AUTO_PAGINATE_MAX}) to fetch pages in parallel, big results are stored in mongo\n"
             f"methods={len(METHOD_IDS)}"
         )
 
@@ -106,7 +116,7 @@ class IntegrationNewsapi:
         return {
             key: value
             for key, value in args.items()
-            if key not in {"method_id", "include_raw"}
+            if key not in {"method_id", "include_raw", "auto_paginate", "max_records"}
             and value is not None
             and (not isinstance(value, str) or value.strip() != "")
         }
@@ -219,6 +229,48 @@ class IntegrationNewsapi:
             "method_id": method_id,
         }, indent=2, ensure_ascii=False)
 
+    async def _get(self, api_key: str, path: str, params: Dict[str, Any]) -> Tuple[int, Any, str]:
+        http = ckit_http.get_client(_BASE_URL, rate_limit=NEWSAPI_RATE_LIMIT, timeout=20.0)
+        response = await http.request(
+            "GET",
+            path,
+            credential_key=api_key,
+            params=params,
+            headers={"X-Api-Key": api_key, "Accept": "application/json"},
+        )
+        if response.status_code >= 400:
+            return response.status_code, None, response.text
+        return response.status_code, response.json(), ""
+
+    def _provider_error(self, path: str, status: int, text: str) -> str:
+        logger.info("%s GET %s HTTP %s: %s", PROVIDER_NAME, path, status, text[:200])
+        return json.dumps({
+            "ok": False,
+            "error_code": "PROVIDER_ERROR",
+            "status": status,
+            "detail": text[:300],
+        }, indent=2, ensure_ascii=False)
+
+    def _missing_key(self) -> str:
+        return json.dumps({
+            "ok": False,
+            "error_code": "AUTH_MISSING",
+            "message": "Set api_key in newsapi auth or NEWSAPI_API_KEY env var.",
+        }, indent=2, ensure_ascii=False)
+
+    def _transport_error(self, e: Exception) -> str:
+        if isinstance(e, httpx.TimeoutException):
+            return json.dumps({
+                "ok": False,
+                "error_code": "TIMEOUT",
+                "provider": PROVIDER_NAME,
+            }, indent=2, ensure_ascii=False)
+        return json.dumps({
+            "ok": False,
+            "error_code": "HTTP_ERROR",
+            "detail": f"{type(e).__name__}: {e}",
+        }, indent=2, ensure_ascii=False)
+
     async def _request_json(
         self,
         method_id: str,
@@ -227,53 +279,94 @@ class IntegrationNewsapi:
     ) -> str:
         api_key = self._get_api_key()
         if not api_key:
-            return json.dumps({
-                "ok": False,
-                "error_code": "AUTH_MISSING",
-                "message": "Set api_key in newsapi auth or NEWSAPI_API_KEY env var.",
-            }, indent=2, ensure_ascii=False)
+            return self._missing_key()
         spec = _METHOD_SPECS[method_id]
         try:
-            async with httpx.AsyncClient(timeout=20.0) as client:
-                response = await client.get(
-                    _BASE_URL + spec["path"],
-                    params=params,
-                    headers={"X-Api-Key": api_key, "Accept": "application/json"},
-                )
-            if response.status_code >= 400:
-                logger.info("%s GET %s HTTP %s: %s", PROVIDER_NAME, spec["path"], response.status_code, response.text[:200])
-                return json.dumps({
-                    "ok": False,
-                    "error_code": "PROVIDER_ERROR",
-                    "status": response.status_code,
-                    "detail": response.text[:300],
-                }, indent=2, ensure_ascii=False)
-            data = response.json()
-            result_key = spec["result_key"]
-            items = data.get(result_key, [])
-            result = {
-                "ok": True,
-                "provider": PROVIDER_NAME,
-                "method_id": method_id,
-                "docs_url": spec["docs_url"],
-                "total": data.get("totalResults", len(items)),
-                result_key: items,
-            }
-            if include_raw:
-                result["raw"] = data
-            return json.dumps(result, indent=2, ensure_ascii=False)
-        except httpx.TimeoutException:
-            return json.dumps({
-                "ok": False,
-                "error_code": "TIMEOUT",
-                "provider": PROVIDER_NAME,
-            }, indent=2, ensure_ascii=False)
+            status, data, text = await self._get(api_key, spec["path"], params)
         except (httpx.HTTPError, json.JSONDecodeError) as e:
-            return json.dumps({
-                "ok": False,
-                "error_code": "HTTP_ERROR",
-                "detail": f"{type(e).__name__}: {e}",
-            }, indent=2, ensure_ascii=False)
+            return self._transport_error(e)
+        if status >= 400:
+            return self._provider_error(spec["path"], status, text)
+        result_key = spec["result_key"]
+        items = data.get(result_key, [])
+        result = {
+            "ok": True,
+            "provider": PROVIDER_NAME,
+            "method_id": method_id,
+            "docs_url": spec["docs_url"],
+            "total": data.get("totalResults", len(items)),
+            result_key: items,
+        }
+        if include_raw:
+            result["raw"] = data
+        return json.dumps(result, indent=2, ensure_ascii=False)
+
+    async def _paginate(self, method_id: str, params: Dict[str, Any], max_records: Any) -> str:
+        # Pages are numbered, so after the first one tells totalResults the rest go out at once,
+        # ckit_http's bucket for this key spaces them out.
+        api_key = self._get_api_key()
+        if not api_key:
+            return self._missing_key()
+        try:
+            limit = max(1, min(int(max_records or AUTO_PAGINATE_DEFAULT), AUTO_PAGINATE_MAX))
+        except (TypeError, ValueError):
+            raise ValueError("max_records must be an integer.") from None
+        spec = _METHOD_SPECS[method_id]
+        result_key = spec["result_key"]
+        page_size = min(PAGE_SIZE_MAX, limit)
+        first_page = int(params.get("page", 1))
+
+        def page_params(n: int) -> Dict[str, Any]:
+            return {**params, "pageSize": page_size, "page": n}
+
+        try:
+            status, data, text = await self._get(api_key, spec["path"], page_params(first_page))
+            if status >= 400:
+                return self._provider_error(spec["path"], status, text)
+            total = int(data.get("totalResults") or 0)
+            items = list(data.get(result_key, []))
+            want = min(limit, max(total - (first_page - 1) * page_size, 0))
+            more_pages = range(first_page + 1, first_page + math.ceil(want / page_size))
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            return self._transport_error(e)
+        pages = await asyncio.gather(*[self._get(api_key, spec["path"], page_params(n)) for n in more_pages], return_exceptions=True)
+
+        # A 429 or 5xx on one page doesn't throw away the others. Developer plan returns 426 maximumResultsReached
+        # past the first 100 results, that lands here too.
+        failed_pages = {}
+        pages_fetched = 1
+        for n, page in zip(more_pages, pages):
+            if isinstance(page, (httpx.HTTPError, json.JSONDecodeError)):
+                failed_pages[n] = f"{type(page).__name__}: {page}"
+                continue
+            if isinstance(page, BaseException):
+                raise page
+            status, data, text = page
+            if status >= 400:
+                failed_pages[n] = f"HTTP {status}: {text[:200]}"
+                continue
+            items.extend(data.get(result_key, []))
+            pages_fetched += 1
+        items = items[:limit]
+        shown, spill = await ckit_mongo.mongo_spill_list(None, ckit_mongo.spill_path_prefix(f"newsapi/{result_key}"), items, get_collection=self._mongo)
+        result = {
+            "ok": True,
+            "provider": PROVIDER_NAME,
+            "method_id": method_id,
+            "docs_url": spec["docs_url"],
+            "total": total,
+            "pages_fetched": pages_fetched,
+            "items_count": len(items),
+            result_key: shown,
+        }
+        if failed_pages:
+            result["partial"] = "Result is partial, %d of %d pages failed, the rest are included" % (len(failed_pages), 1 + len(pages))
+            result["failed_pages"] = failed_pages
+        result.update(spill)
+        return json.dumps(result, indent=2, ensure_ascii=False)
+
+    async def _mongo(self):
+        return await ckit_mongo.personal_mongo_lazy(self.rcx)
 
     async def _everything(self, method_id: str, args: Dict[str, Any]) -> str:
         try:
@@ -287,6 +380,8 @@ class IntegrationNewsapi:
                     "error_code": "MISSING_ARGS",
                     "message": "Provide at least one of q, sources, or domains.",
                 }, indent=2, ensure_ascii=False)
+            if args.get("auto_paginate"):
+                return await self._paginate(method_id, params, args.get("max_records"))
             return await self._request_json(method_id, params, include_raw)
         except ValueError as e:
             return json.dumps({
@@ -307,6 +402,8 @@ class IntegrationNewsapi:
                     "error_code": "INVALID_ARGS",
                     "message": "sources cannot be combined with country or category for top_headlines.",
                 }, indent=2, ensure_ascii=False)
+            if args.get("auto_paginate"):
+                return await self._paginate(method_id, params, args.get("max_records"))
             return await self._request_json(method_id, params, include_raw)
         except ValueError as e:
             return json.dumps({
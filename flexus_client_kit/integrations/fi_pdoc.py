@@ -1,10 +1,14 @@
+import asyncio
+import collections
+import copy
 import datetime
 import hashlib
 import json
 import logging
 import re
+import time
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Callable, Dict, Any, Optional, List, Tuple
 from dataclasses import dataclass
 from zoneinfo import ZoneInfo
 
@@ -74,8 +78,8 @@ flexus_policy_document(op="create_draft_from_template", args={"output_dir": "/pl
 flexus_policy_document(op="update_at_location", args={"p": "/folder/file", "expected_md5": "abc123", "updates": [["toptag.section1.field1", "my string"], ["toptag.section1.field2", "[1,2,3]"]]})
     Update fields in a document using dot notation for path. This normally updates strings, but you can try to set
     any structure or number, if schema in available in the document.
-    NEVER call this tool in parallel, backend will serialize calls and only the first will pass the md5 gate.
-    Instead use "updates" array to set multiple fields at once.
+    Use "updates" array to set multiple fields at once. Several calls for the same document with the same
+    expected_md5 are applied one after another, each returns the new md5.
 
 flexus_policy_document(op="translate_qa", args={"p": "/folder/file", "expected_md5": "abc123", "translation": [["top-tag.section01-product.question01-description.q", "Translated text"], ...]})
     Batch-update question texts in a QA document, typically for translation.
@@ -255,6 +259,155 @@ def _collect_empty_qa_questions(doc: dict, prefix: str = "") -> List[str]:
     return result
 
 
+# Bot code reads the same documents over and over (admonster loads three per experiment every tick), so reads
+# made by bot code go through a per-persona cache keyed by path, each entry remembers _pdoc_md5 of its content.
+# Writes made through IntegrationPdoc update or drop the entries. The bot subscription carries no policy document
+# news, so a write made elsewhere (UI, another bot) shows up after max_age; the model's own "cat" and "list"
+# always go to the backend and refresh the cache.
+#
+# Caching is opt-in per read (max_age > 0), the default is to ask the backend: a caller that reads, edits and
+# writes back must start from the current version, otherwise its expected_md5 is stale or its edit is.
+#
+# Writes to one path are serialized per persona. update_at_location calls waiting in the queue with the same
+# expected_md5 and credentials are merged into one backend call, as long as their json_paths don't overlap. An
+# overlapping call goes alone after them and gets the md5 mismatch it would get without the queue. A call whose
+# expected_md5 is a version this queue itself wrote over is rebased on the latest version only if every write
+# since then touched other json_paths; the md5 gate still catches anyone else writing in between.
+
+
+PDOC_CACHE_TTL = 300.0
+PDOC_CACHE_MAX = 500            # documents per persona
+PDOC_MD5_CHAIN = 8              # versions remembered per path for rebasing
+
+
+class PdocCache:
+    def __init__(self, ttl: float = PDOC_CACHE_TTL, max_docs: int = PDOC_CACHE_MAX, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_docs = max_docs
+        self.clock = clock
+        self.docs: collections.OrderedDict[str, Tuple[float, str, PdocDocument]] = collections.OrderedDict()
+        self.lists: Dict[Tuple[str, int], Tuple[float, List[PdocListItem]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, ts: float, max_age: Optional[float]) -> bool:
+        limit = self.ttl if max_age is None else max_age
+        return limit > 0 and self.clock() - ts <= limit
+
+    def get(self, p: str, max_age: Optional[float] = None) -> Optional[PdocDocument]:
+        hit = self.docs.get(p)
+        if hit is None or not self._fresh(hit[0], max_age):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.docs.move_to_end(p)
+        return copy.deepcopy(hit[2])   # callers edit pdoc_content in place before writing it back
+
+    def put(self, doc: PdocDocument) -> str:
+        md5 = _pdoc_md5(doc.pdoc_content)
+        self.docs[doc.path] = (self.clock(), md5, copy.deepcopy(doc))
+        self.docs.move_to_end(doc.path)
+        while len(self.docs) > self.max_docs:
+            self.docs.popitem(last=False)
+        return md5
+
+    def put_content(self, p: str, content: Any) -> None:
+        # after our own overwrite; without pdoc_id and timestamps from an earlier read there's nothing to put
+        hit = self.docs.get(p)
+        if hit is None:
+            return
+        doc = copy.deepcopy(hit[2])
+        doc.pdoc_content = content
+        doc.pdoc_modified_ts = time.time()
+        self.put(doc)
+
+    def md5(self, p: str) -> Optional[str]:
+        hit = self.docs.get(p)
+        return hit[1] if hit else None
+
+    def get_list(self, p: str, depth: int, max_age: Optional[float] = None) -> Optional[List[PdocListItem]]:
+        hit = self.lists.get((p, depth))
+        if hit is None or not self._fresh(hit[0], max_age):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return list(hit[1])
+
+    def put_list(self, p: str, depth: int, items: List[PdocListItem]) -> None:
+        self.lists[(p, depth)] = (self.clock(), list(items))
+
+    def invalidate(self, p: Optional[str] = None) -> None:
+        # any write can change a listing, a listing is cheap to drop entirely
+        self.lists.clear()
+        if p is None:
+            self.docs.clear()
+        else:
+            self.docs.pop(p, None)
+
+
+@dataclass
+class _QueuedUpdate:
+    updates: List[dict]
+    expected_md5: str
+    persona_id: str
+    fcall_untrusted_key: str
+    fut: asyncio.Future
+
+    def paths(self) -> List[str]:
+        return [u["json_path"] for u in self.updates]
+
+
+def _paths_overlap(a: List[str], b: List[str]) -> bool:
+    # "plan.progress" overlaps itself, "plan" and "plan.progress.done", not "plan.progress2"
+    return any(x == y or x.startswith(y + ".") or y.startswith(x + ".") for x in a for y in b)
+
+
+class _PathWriteQueue:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending: List[_QueuedUpdate] = []
+        # consecutive versions written by this queue, oldest first: (md5, json_paths changed to get there);
+        # paths is None for the first entry and for whole-document overwrites
+        self.chain: List[Tuple[str, Optional[List[str]]]] = []
+        self.writes = 0
+        self.merged = 0
+        self.rebased = 0
+
+    def effective_md5(self, expected_md5: str, paths: List[str]) -> str:
+        md5s = [m for m, _ in self.chain]
+        if not expected_md5 or expected_md5 not in md5s[:-1]:
+            return expected_md5
+        since = self.chain[md5s.index(expected_md5) + 1:]
+        if any(p is None or _paths_overlap(p, paths) for _, p in since):
+            return expected_md5
+        self.rebased += 1
+        return md5s[-1]
+
+    def advanced(self, md5_before: str, md5_after: str, paths: Optional[List[str]]) -> None:
+        if not md5_before or paths is None:
+            self.chain = []
+        elif not self.chain or self.chain[-1][0] != md5_before:
+            self.chain = [(md5_before, None)]
+        if paths is not None:
+            self.chain = (self.chain + [(md5_after, paths)])[-PDOC_MD5_CHAIN:]
+
+
+def _group_updates(batch: List[_QueuedUpdate]) -> List[List[_QueuedUpdate]]:
+    # consecutive entries with the same expected_md5 and credentials, touching disjoint json_paths, become one write
+    groups: List[List[_QueuedUpdate]] = []
+    for u in batch:
+        g = groups[-1] if groups else None
+        if (
+            g and g[0].expected_md5 == u.expected_md5 and
+            (g[0].persona_id, g[0].fcall_untrusted_key) == (u.persona_id, u.fcall_untrusted_key) and
+            not any(_paths_overlap(x.paths(), u.paths()) for x in g)
+        ):
+            g.append(u)
+        else:
+            groups.append([u])
+    return groups
+
+
 class IntegrationPdoc:
     def __init__(
         self,
@@ -266,6 +419,9 @@ class IntegrationPdoc:
         self.fclient = rcx.fclient
         self.fgroup_id = ws_root_group_id
         self.is_fake = rcx.running_test_scenario
+        self.cache = PdocCache()
+        self.round_trips = 0
+        self._write_queues: Dict[str, _PathWriteQueue] = {}
 
     async def called_by_model(self, toolcall: ckit_cloudtool.FCloudtoolCall, model_produced_args: Optional[Dict[str, Any]]) -> str:
         if not model_produced_args:
@@ -286,7 +442,7 @@ class IntegrationPdoc:
                 p = ckit_cloudtool.try_best_to_find_argument(args, model_produced_args, "p", "/")
                 if self.is_fake:
                     return await ckit_scenario.scenario_generate_tool_result_via_model(self.fclient, toolcall, open(__file__).read())
-                result = await self.pdoc_list(p, depth=5, persona_id=self.rcx.persona.persona_id, fcall_untrusted_key=toolcall.fcall_untrusted_key)
+                result = await self.pdoc_list(p, depth=5, persona_id=self.rcx.persona.persona_id, fcall_untrusted_key=toolcall.fcall_untrusted_key, max_age=0)
                 tree_text, doc_count, folder_count = _format_tree(result, p)
                 r += f"Listing {p}\n\n"
                 r += tree_text
@@ -299,7 +455,7 @@ class IntegrationPdoc:
                     return f"Error: p required\n\n{HELP}"
                 if self.is_fake:
                     return await ckit_scenario.scenario_generate_tool_result_via_model(self.fclient, toolcall, open(__file__).read())
-                result = await self.pdoc_cat(p, persona_id=self.rcx.persona.persona_id, fcall_untrusted_key=toolcall.fcall_untrusted_key)
+                result = await self.pdoc_cat(p, persona_id=self.rcx.persona.persona_id, fcall_untrusted_key=toolcall.fcall_untrusted_key, max_age=0)
                 if not result:
                     return f"Policy document not found: {p}"
                 content_str = json.dumps(result.pdoc_content, indent=2, ensure_ascii=False)
@@ -485,7 +641,7 @@ class IntegrationPdoc:
                     return f"Error: p and translation required\n\n{HELP}"
                 if self.is_fake:
                     return await ckit_scenario.scenario_generate_tool_result_via_model(self.fclient, toolcall, open(__file__).read())
-                doc_obj = await self.pdoc_cat(p, persona_id=self.rcx.persona.persona_id, fcall_untrusted_key=toolcall.fcall_untrusted_key)
+                doc_obj = await self.pdoc_cat(p, persona_id=self.rcx.persona.persona_id, fcall_untrusted_key=toolcall.fcall_untrusted_key, max_age=0)
                 if not doc_obj:
                     return f"Policy document not found: {p}"
                 content = doc_obj.pdoc_content
@@ -572,7 +728,16 @@ class IntegrationPdoc:
             return await self.fclient.use_http_on_behalf(persona_id, fcall_untrusted_key)
         return await self.fclient.use_http_on_behalf(persona_id, "")
 
-    async def pdoc_list(self, p: str, persona_id: str, fcall_untrusted_key: str, depth: int = 1) -> List[PdocListItem]:
+    def _write_queue(self, p: str) -> _PathWriteQueue:
+        q = self._write_queues.get(p)
+        if q is None:
+            q = self._write_queues[p] = _PathWriteQueue()
+        return q
+
+    async def pdoc_list(self, p: str, persona_id: str, fcall_untrusted_key: str, depth: int = 1, max_age: Optional[float] = 0) -> List[PdocListItem]:
+        cached = self.cache.get_list(p, depth, max_age)
+        if cached is not None:
+            return cached
         http = await self._http(persona_id, fcall_untrusted_key)
         async with http as h:
             result = await h.execute(
@@ -585,10 +750,16 @@ class IntegrationPdoc:
                 """),
                 variable_values={"fgroup_id": self.fgroup_id, "p": p, "depth": depth},
             )
+            self.round_trips += 1
             items = result.get("policydoc_list", [])
-            return [gql_utils.dataclass_from_dict(item, PdocListItem) for item in items]
-
-    async def pdoc_cat(self, p: str, persona_id: str, fcall_untrusted_key: str, best_effort_to_find: bool = False) -> Optional[PdocDocument]:
+            items = [gql_utils.dataclass_from_dict(item, PdocListItem) for item in items]
+        self.cache.put_list(p, depth, items)
+        return items
+
+    async def pdoc_cat(self, p: str, persona_id: str, fcall_untrusted_key: str, best_effort_to_find: bool = False, max_age: Optional[float] = 0) -> Optional[PdocDocument]:
+        # max_age=0 always asks the backend, None is the cache ttl; only pass a max_age for reads you won't write back
+        if not best_effort_to_find and (cached := self.cache.get(p, max_age)) is not None:
+            return cached
         http = await self._http(persona_id, fcall_untrusted_key)
         async with http as h:
             result = await h.execute(
@@ -601,52 +772,98 @@ class IntegrationPdoc:
                 """),
                 variable_values={"fgroup_id": self.fgroup_id, "p": p, "best_effort_to_find": best_effort_to_find},
             )
+            self.round_trips += 1
             doc = result.get("policydoc_cat")
             if not doc:
+                self.cache.invalidate(p)
                 return None
-            return gql_utils.dataclass_from_dict(doc, PdocDocument)
+            doc = gql_utils.dataclass_from_dict(doc, PdocDocument)
+        self.cache.put(doc)
+        return doc
 
     async def pdoc_create(self, p: str, text: str, persona_id: str, fcall_untrusted_key: str) -> None:
         http = await self._http(persona_id, fcall_untrusted_key)
-        async with http as h:
-            await h.execute(
-                gql.gql("""
-                    mutation PdocCreate($fgroup_id: String!, $p: String!, $text: String!) {
-                        policydoc_create(fgroup_id: $fgroup_id, p: $p, text: $text)
-                    }
-                """),
-                variable_values={"fgroup_id": self.fgroup_id, "p": p, "text": text},
-            )
+        async with self._write_queue(p).lock:
+            self.cache.invalidate(p)
+            async with http as h:
+                await h.execute(
+                    gql.gql("""
+                        mutation PdocCreate($fgroup_id: String!, $p: String!, $text: String!) {
+                            policydoc_create(fgroup_id: $fgroup_id, p: $p, text: $text)
+                        }
+                    """),
+                    variable_values={"fgroup_id": self.fgroup_id, "p": p, "text": text},
+                )
+                self.round_trips += 1
 
     async def pdoc_overwrite(self, p: str, text: str, persona_id: str, fcall_untrusted_key: str, expected_md5: str = "") -> PdocOverwriteResult:
         http = await self._http(persona_id, fcall_untrusted_key)
-        async with http as h:
-            r = await h.execute(
-                gql.gql("""
-                    mutation PdocOverwrite($fgroup_id: String!, $p: String!, $text: String!, $expected_md5: String) {
-                        policydoc_overwrite(fgroup_id: $fgroup_id, p: $p, text: $text, expected_md5: $expected_md5) {
-                            md5_before md5_after changes_saved
+        q = self._write_queue(p)
+        async with q.lock:
+            async with http as h:
+                r = await h.execute(
+                    gql.gql("""
+                        mutation PdocOverwrite($fgroup_id: String!, $p: String!, $text: String!, $expected_md5: String) {
+                            policydoc_overwrite(fgroup_id: $fgroup_id, p: $p, text: $text, expected_md5: $expected_md5) {
+                                md5_before md5_after changes_saved
+                            }
                         }
-                    }
-                """),
-                variable_values={"fgroup_id": self.fgroup_id, "p": p, "text": text, "expected_md5": expected_md5},
-            )
-            return gql_utils.dataclass_from_dict(r["policydoc_overwrite"], PdocOverwriteResult)
+                    """),
+                    variable_values={"fgroup_id": self.fgroup_id, "p": p, "text": text, "expected_md5": expected_md5},
+                )
+                self.round_trips += 1
+                q.writes += 1
+                ow = gql_utils.dataclass_from_dict(r["policydoc_overwrite"], PdocOverwriteResult)
+            if ow.changes_saved:
+                q.advanced(ow.md5_before, ow.md5_after, None)
+                self.cache.put_content(p, json.loads(text))
+                self.cache.lists.clear()
+            else:
+                self.cache.invalidate(p)
+            return ow
 
     async def pdoc_update_at_location(self, p: str, updates: list, persona_id: str, fcall_untrusted_key: str, expected_md5: str = "") -> PdocUpdateJsonTextResult:
-        http = await self._http(persona_id, fcall_untrusted_key)
-        async with http as h:
-            result = await h.execute(
-                gql.gql(f"""
-                    mutation PdocUpdateAtPath($fgroup_id: String!, $p: String!, $updates: [PolicyDocJsonUpdate!]!, $expected_md5: String) {{
-                        policydoc_update_at_location(fgroup_id: $fgroup_id, p: $p, updates: $updates, expected_md5: $expected_md5) {{
-                            {gql_utils.gql_fields(PdocUpdateJsonTextResult)}
-                        }}
-                    }}
-                """),
-                variable_values={"fgroup_id": self.fgroup_id, "p": p, "updates": updates, "expected_md5": expected_md5},
-            )
-            return gql_utils.dataclass_from_dict(result["policydoc_update_at_location"], PdocUpdateJsonTextResult)
+        q = self._write_queue(p)
+        me = _QueuedUpdate(updates=updates, expected_md5=expected_md5, persona_id=persona_id, fcall_untrusted_key=fcall_untrusted_key, fut=asyncio.get_running_loop().create_future())
+        q.pending.append(me)
+        async with q.lock:
+            if not me.fut.done():
+                batch, q.pending = q.pending, []
+                await self._flush_updates(p, q, batch)
+        return await me.fut
+
+    async def _flush_updates(self, p: str, q: _PathWriteQueue, batch: List[_QueuedUpdate]) -> None:
+        for group in _group_updates(batch):
+            paths = [x for u in group for x in u.paths()]
+            md5 = q.effective_md5(group[0].expected_md5, paths)
+            try:
+                http = await self._http(group[0].persona_id, group[0].fcall_untrusted_key)
+                async with http as h:
+                    result = await h.execute(
+                        gql.gql(f"""
+                            mutation PdocUpdateAtPath($fgroup_id: String!, $p: String!, $updates: [PolicyDocJsonUpdate!]!, $expected_md5: String) {{
+                                policydoc_update_at_location(fgroup_id: $fgroup_id, p: $p, updates: $updates, expected_md5: $expected_md5) {{
+                                    {gql_utils.gql_fields(PdocUpdateJsonTextResult)}
+                                }}
+                            }}
+                        """),
+                        variable_values={"fgroup_id": self.fgroup_id, "p": p, "updates": [x for u in group for x in u.updates], "expected_md5": md5},
+                    )
+                self.round_trips += 1
+                q.writes += 1
+                q.merged += len(group) - 1
+                upd = gql_utils.dataclass_from_dict(result["policydoc_update_at_location"], PdocUpdateJsonTextResult)
+            except Exception as e:
+                for u in group:
+                    if not u.fut.done():
+                        u.fut.set_exception(e)
+                continue
+            self.cache.invalidate(p)
+            if upd.changes_saved:
+                q.advanced(upd.md5_requested or md5, upd.md5_found, paths)
+            for u in group:
+                if not u.fut.done():
+                    u.fut.set_result(upd)
 
     async def pdoc_cp(self, p1: str, p2: str, persona_id: str, fcall_untrusted_key: str) -> None:
         http = await self._http(persona_id, fcall_untrusted_key)
@@ -659,6 +876,8 @@ class IntegrationPdoc:
                 """),
                 variable_values={"fgroup_id": self.fgroup_id, "p1": p1, "p2": p2},
             )
+            self.round_trips += 1
+        self.cache.invalidate(p2)
 
     async def pdoc_mv(self, p1: str, p2: str, persona_id: str, fcall_untrusted_key: str) -> None:
         http = await self._http(persona_id, fcall_untrusted_key)
@@ -671,6 +890,10 @@ class IntegrationPdoc:
                 """),
                 variable_values={"fgroup_id": self.fgroup_id, "p1": p1, "p2": p2},
             )
+            self.round_trips += 1
+        self.cache.invalidate(p1)
+        self.cache.invalidate(p2)
+        self._write_queues.pop(p1, None)
 
     async def pdoc_rm(self, p: str, persona_id: str, fcall_untrusted_key: str) -> None:
         http = await self._http(persona_id, fcall_untrusted_key)
@@ -683,3 +906,112 @@ class IntegrationPdoc:
                 """),
                 variable_values={"fgroup_id": self.fgroup_id, "p": p},
             )
+            self.round_trips += 1
+        self.cache.invalidate(p)
+        self._write_queues.pop(p, None)
+
+
+if __name__ == "__main__":
+    import types
+    from aiohttp import web
+    from flexus_client_kit import ckit_client
+
+    # Replays the pdoc traffic of an admonster session: 3 experiments launched (config and tactics read, runtime
+    # written, the model fills in the metrics doc with 3 update_at_location calls from one md5), then 24 hourly
+    # monitoring ticks reading runtime, metrics and tactics-tracking and writing runtime back.
+    EXPERIMENTS = ["exp-a", "exp-b", "exp-c"]
+    TICKS = 24
+
+    async def replay():
+        store: Dict[str, Any] = {"/company/ad-ops-config": {"config": {"daily_budget": 50}}}
+        for e in EXPERIMENTS:
+            store[f"/gtm/discovery/{e}/tactics"] = {"tactics": {"channels": ["fb"]}}
+            store[f"/gtm/discovery/{e}/metrics"] = {"metrics": {"ctr": "", "cpc": "", "cpa": ""}}
+            store[f"/gtm/discovery/{e}/tactics-tracking"] = {"tactics_tracking": {"iteration_guide": {}}}
+        calls: Dict[str, int] = collections.Counter()
+
+        async def graphql(request):
+            body = await request.json()
+            v = body["variables"]
+            op = re.search(r"(policydoc_\w+)\(", body["query"]).group(1)
+            calls[op] += 1
+            if op == "policydoc_cat":
+                doc = store.get(v["p"])
+                return web.json_response({"data": {op: doc and {"pdoc_id": v["p"], "path": v["p"], "pdoc_content": doc, "pdoc_created_ts": 1.0, "pdoc_modified_ts": 1.0}}})
+            if op == "policydoc_overwrite":
+                before = _pdoc_md5(store.get(v["p"]))
+                if v["expected_md5"] and v["expected_md5"] != before:
+                    return web.json_response({"data": {op: {"md5_before": before, "md5_after": before, "changes_saved": False}}})
+                store[v["p"]] = json.loads(v["text"])
+                return web.json_response({"data": {op: {"md5_before": before, "md5_after": _pdoc_md5(store[v["p"]]), "changes_saved": True}}})
+            if op == "policydoc_update_at_location":
+                doc = store[v["p"]]
+                found = _pdoc_md5(doc)
+                ok = not v["expected_md5"] or v["expected_md5"] == found
+                if ok:
+                    for u in v["updates"]:
+                        _set_by_dot_path(doc, u["json_path"], u["text"])
+                    found = _pdoc_md5(doc)
+                return web.json_response({"data": {op: {"latest_text": json.dumps(doc), "md5_requested": v["expected_md5"], "md5_found": found, "changes_saved": ok, "problem_message": ""}}})
+            return web.json_response({"data": {op: True}})
+
+        app = web.Application()
+        app.router.add_post("/v1/graphql", graphql)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        fclient = ckit_client.FlexusClient("pdoc_bench", api_key="fx-bench", base_url=f"http://127.0.0.1:{port}", skip_logger_init=True)
+        snapshot = json.loads(json.dumps(store))
+
+        async def session(legacy: bool) -> Tuple[int, int]:
+            global PDOC_MD5_CHAIN
+            store.clear()
+            store.update(json.loads(json.dumps(snapshot)))
+            calls.clear()
+            now = [0.0]
+            rcx = types.SimpleNamespace(fclient=fclient, running_test_scenario=False, persona=types.SimpleNamespace(persona_id="p1"))
+            pdoc = IntegrationPdoc(rcx, "g1")
+            pdoc.cache = PdocCache(max_docs=0 if legacy else PDOC_CACHE_MAX, clock=lambda: now[0])
+            PDOC_MD5_CHAIN = 1 if legacy else 8
+            model_retries = 0
+            for e in EXPERIMENTS:
+                base = f"/gtm/discovery/{e}"
+                await pdoc.pdoc_cat("/company/ad-ops-config", "p1", "", max_age=None)
+                await pdoc.pdoc_cat(f"{base}/tactics", "p1", "", max_age=None)
+                await pdoc.pdoc_overwrite(f"{base}/meta-runtime", json.dumps({"meta_runtime": {"day": 0}}), "p1", "")
+                metrics = await pdoc.pdoc_cat(f"{base}/metrics", "p1", "", max_age=0)
+                md5 = _pdoc_md5(metrics.pdoc_content)
+                fields = [[{"json_path": f"metrics.{k}", "text": "0.5"}] for k in ("ctr", "cpc", "cpa")]
+                if legacy:
+                    results = [await pdoc.pdoc_update_at_location(f"{base}/metrics", f, "p1", "", expected_md5=md5) for f in fields]
+                else:
+                    results = await asyncio.gather(*[pdoc.pdoc_update_at_location(f"{base}/metrics", f, "p1", "", expected_md5=md5) for f in fields])
+                for f, r in zip(fields, results):
+                    if not r.changes_saved:
+                        # the model reads the document again and retries with the md5 it got
+                        model_retries += 1
+                        fresh = await pdoc.pdoc_cat(f"{base}/metrics", "p1", "", max_age=0)
+                        assert (await pdoc.pdoc_update_at_location(f"{base}/metrics", f, "p1", "", expected_md5=_pdoc_md5(fresh.pdoc_content))).changes_saved
+                assert store[f"{base}/metrics"]["metrics"] == {"ctr": "0.5", "cpc": "0.5", "cpa": "0.5"}
+            for tick in range(TICKS):
+                now[0] += 3600.0
+                for e in EXPERIMENTS:
+                    base = f"/gtm/discovery/{e}"
+                    runtime = (await pdoc.pdoc_cat(f"{base}/meta-runtime", "p1", "", max_age=6 * 3600.0)).pdoc_content
+                    await pdoc.pdoc_cat(f"{base}/metrics", "p1", "", max_age=None)
+                    await pdoc.pdoc_cat(f"{base}/tactics-tracking", "p1", "", max_age=None)
+                    runtime["meta_runtime"]["day"] = tick + 1
+                    await pdoc.pdoc_overwrite(f"{base}/meta-runtime", json.dumps(runtime), "p1", "")
+                    assert store[f"{base}/meta-runtime"]["meta_runtime"]["day"] == tick + 1
+            print(f"{'before' if legacy else 'after '}: {sum(calls.values())} round trips {dict(calls)}, model retries after md5 mismatch {model_retries}, cache hits {pdoc.cache.hits}")
+            return sum(calls.values()), model_retries
+
+        old, old_retries = await session(legacy=True)
+        new, new_retries = await session(legacy=False)
+        print(f"saved {old - new} of {old} round trips ({(old - new) / old * 100:.0f}%)")
+        assert new < old and new_retries == 0 and old_retries == 2 * len(EXPERIMENTS)
+        await runner.cleanup()
+
+    asyncio.run(replay())
@@ -1,10 +1,12 @@
 import asyncio
+import collections
 import io
 import logging
 import re
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from pymongo.collection import Collection
+import asyncpg
 import pandas as pd
 
 from flexus_client_kit import ckit_cloudtool, ckit_mongo
@@ -40,15 +42,121 @@ _WRITE_VERBS = re.compile(r"\b(?:INSERT|UPDATE|DELETE|MERGE|CREATE|DROP|ALTER|TR
 
 _COMMAND_TAG = re.compile(r"^(INSERT|UPDATE|DELETE|SELECT|COPY|MOVE|FETCH|CREATE|DROP|ALTER|TRUNCATE|MERGE)\s+\d+", re.IGNORECASE)
 
+# Statements that refuse to run inside a transaction block. Over-matching is harmless, a single statement outside a
+# transaction just autocommits.
+_NO_TRANSACTION = re.compile(r"""^\s*(?:
+    VACUUM\b | CLUSTER\b | ALTER\s+SYSTEM\b |
+    (?:CREATE|DROP)\s+(?:DATABASE|TABLESPACE|SUBSCRIPTION)\b | ALTER\s+SUBSCRIPTION\b |
+    REINDEX\s+(?:\([^)]*\)\s*)?(?:SYSTEM|DATABASE)\b |
+    (?:CREATE|DROP|REINDEX|ALTER)\b.*\bCONCURRENTLY\b |
+    (?:BEGIN|START\s+TRANSACTION|COMMIT|END|ROLLBACK|ABORT|SAVEPOINT|RELEASE|PREPARE\s+TRANSACTION)\b
+)""", re.IGNORECASE | re.DOTALL | re.VERBOSE)
+
+# Column types the driver path prints exactly like psql --csv does: these come out of asyncpg as str/int/bool already
+_DRIVER_NATIVE_TYPES = {"bool", "int2", "int4", "int8", "oid", "text", "varchar", "bpchar", "name", "uuid", "json", "jsonb", "xml"}
+# ...and these are decoded from the server's own text output, see _init_connection()
+_DRIVER_TEXT_TYPES = ["numeric", "float4", "float8", "money", "date", "time", "timetz", "timestamp", "timestamptz", "interval", "bytea", "inet", "cidr", "macaddr", "bit", "varbit"]
+_DRIVER_TYPES = _DRIVER_NATIVE_TYPES | set(_DRIVER_TEXT_TYPES)
+
+RESULT_SIZE_LIMIT = 100_000   # bytes of CSV
+RESULT_TOO_BIG = "Error: Result size exceeds %dKB limit. Please use more specific query with LIMIT or WHERE clauses." % (RESULT_SIZE_LIMIT // 1000)
+PREVIEW_ROWS = 3
+
+
+class _NeedsPsql(Exception):
+    pass
+
+
 def _is_write_sql(query: str) -> bool:
     cleaned = _STRIP_SQL_LITERALS.sub(" ", query)
     return bool(_WRITE_VERBS.search(cleaned))
 
 
+def _is_single_statement(query: str) -> bool:
+    cleaned = _STRIP_SQL_LITERALS.sub(" ", query).strip().rstrip(";")
+    return ";" not in cleaned
+
+
+def _needs_no_transaction(query: str) -> bool:
+    cleaned = _STRIP_SQL_LITERALS.sub(" ", query)
+    return bool(_NO_TRANSACTION.match(cleaned))
+
+
+def _psql_csv_field(v: Any) -> str:
+    # Same rules as psql --csv: NULL is empty, booleans are t/f, quoted only if the field contains the separator,
+    # a quote or a line break, or is exactly \.
+    if v is None:
+        return ""
+    s = ("t" if v else "f") if isinstance(v, bool) else str(v)
+    if "," in s or '"' in s or "\n" in s or "\r" in s or s == "\\.":
+        return '"' + s.replace('"', '""') + '"'
+    return s
+
+
+def _psql_csv_line(values) -> str:
+    return ",".join(_psql_csv_field(v) for v in values) + "\n"
+
+
+def _psql_error(e: asyncpg.PostgresError) -> str:
+    msg = "ERROR:  %s" % (e.args[0] if e.args else e,)
+    if getattr(e, "detail", None):
+        msg += "\nDETAIL:  %s" % (e.detail,)
+    if getattr(e, "hint", None):
+        msg += "\nHINT:  %s" % (e.hint,)
+    return msg
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    # Take these as the text the server prints for psql, instead of datetime/Decimal/float/bytes whose str() differs
+    for t in _DRIVER_TEXT_TYPES:
+        await conn.set_type_codec(t, schema="pg_catalog", encoder=str, decoder=str, format="text")
+
+
+async def _aiter(records):
+    # a list from fetch() or an asyncpg cursor
+    if isinstance(records, list):
+        for r in records:
+            yield r
+    else:
+        async for r in records:
+            yield r
+
+
 class IntegrationPostgres:
-    def __init__(self, personal_mongo: Optional[Collection] = None, save_to_mongodb_threshold_bytes: int = 5000):
+    def __init__(
+        self,
+        personal_mongo: Optional[Collection] = None,
+        save_to_mongodb_threshold_bytes: int = 5000,
+        *,
+        use_driver: bool = True,
+        statement_timeout_s: float = 60.0,
+        pool_max_size: int = 4,
+    ):
         self.personal_mongo = personal_mongo
         self.save_to_mongodb_threshold_bytes = save_to_mongodb_threshold_bytes
+        self.use_driver = use_driver
+        self.statement_timeout_s = statement_timeout_s
+        self.pool_max_size = pool_max_size
+        self._pool: Optional[asyncpg.Pool] = None
+        self._pool_lock = asyncio.Lock()
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        # Connection parameters come from the same PGHOST/PGPORT/PGUSER/PGPASSWORD/PGDATABASE env as psql
+        async with self._pool_lock:
+            if self._pool is None:
+                self._pool = await asyncpg.create_pool(
+                    min_size=1,
+                    max_size=self.pool_max_size,
+                    max_inactive_connection_lifetime=300.0,
+                    statement_cache_size=256,   # prepared statements, per connection, reused by identical query text
+                    init=_init_connection,
+                )
+            return self._pool
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
 
     async def execute_query(self, query: str, have_human_confirmation: bool) -> str:
         if _is_write_sql(query) and not have_human_confirmation:
@@ -57,6 +165,101 @@ class IntegrationPostgres:
                 confirm_command=query,
                 confirm_explanation="Write operation, human confirmation needed.",
             )
+        if self.use_driver and _is_single_statement(query):
+            try:
+                return await self._execute_via_driver(query)
+            except asyncpg.QueryCanceledError as e:
+                return _psql_error(e)   # statement_timeout, running it again in psql would only take longer
+            except (asyncpg.PostgresError, asyncpg.InterfaceError, _NeedsPsql) as e:
+                # Result types the driver can't print like psql, statements that turned out not to like a transaction
+                # block, or a plain SQL error that psql reports in its usual form (LINE 1: ...). The driver's transaction
+                # rolled back, nothing was committed, so running the statement again is safe.
+                logger.info("postgres driver path not used, running psql: %s", e)
+            except (OSError, asyncio.TimeoutError) as e:
+                logger.warning("postgres driver connection failed, falling back to psql: %s", e)
+            except Exception:
+                logger.exception("Unexpected problem")
+                return "Internal error, more information in the bot logs :/"
+        return await self._execute_via_psql(query)
+
+    async def _execute_via_driver(self, query: str) -> str:
+        logger.info("Running %s", query[:30])   # Maybe there is user data so we cut it short
+        pool = await self._get_pool()
+        # Cancelling the tool call task (abort, shutdown) cancels this await, asyncpg then sends a cancel request
+        # to the server so the backend stops working on the query too.
+        async with pool.acquire() as conn:
+            if _needs_no_transaction(query):
+                # VACUUM, CREATE INDEX CONCURRENTLY and friends can't run in a transaction block, a session level timeout
+                # is enough because the pool runs RESET ALL when the connection goes back
+                try:
+                    await conn.execute("SET statement_timeout = %d" % int(self.statement_timeout_s * 1000))
+                    status = await conn.execute(query)
+                except asyncpg.PostgresError as e:
+                    return _psql_error(e)
+                return "Query executed successfully:\n\n" + (status or "Query returned nothing")
+
+            async with conn.transaction():
+                await conn.execute("SET LOCAL statement_timeout = %d" % int(self.statement_timeout_s * 1000))
+                stmt = await conn.prepare(query)
+                attributes = stmt.get_attributes()
+                odd_types = [a.type.name for a in attributes if a.type.schema != "pg_catalog" or a.type.name not in _DRIVER_TYPES]
+                if odd_types:
+                    raise _NeedsPsql("column types %s" % ", ".join(sorted(set(odd_types))))
+                if not attributes:
+                    status = await conn.execute(query)
+                    return "Query executed successfully:\n\n" + (status or "Query returned nothing")
+
+                # The whole CSV is kept in one buffer for the mongo spill (mongo_store_file takes one blob), but it
+                # can't grow past RESULT_SIZE_LIMIT: fetching stops there. The preview needs only the head and tail.
+                header = _psql_csv_line([a.name for a in attributes])
+                full = io.StringIO()
+                full.write(header)
+                size = len(header.encode("utf-8"))
+                head: List[str] = []
+                tail: collections.deque = collections.deque(maxlen=PREVIEW_ROWS)
+                row_count = 0
+                command_tag = None
+                if _is_write_sql(query):
+                    # INSERT/UPDATE/DELETE ... RETURNING runs to completion either way, and only fetch() reports
+                    # the command tag ("INSERT 0 5") that psql prints after the rows
+                    records = await stmt.fetch()
+                    command_tag = stmt.get_statusmsg()
+                    if command_tag and command_tag.upper().startswith("SELECT"):
+                        command_tag = None
+                else:
+                    records = stmt.cursor(prefetch=500)
+                async for record in _aiter(records):
+                    line = _psql_csv_line(record)
+                    full.write(line)
+                    size += len(line.encode("utf-8"))
+                    if len(head) < PREVIEW_ROWS:
+                        head.append(line)
+                    tail.append(line)
+                    row_count += 1
+                    if size > RESULT_SIZE_LIMIT:
+                        # Stop fetching, the server-side cursor goes away when the transaction ends. A write has
+                        # already run to completion in fetch() and is committed, so say that instead of hiding it.
+                        err = RESULT_TOO_BIG
+                        if command_tag:
+                            err += " The statement itself completed: %s" % (command_tag,)
+                        return err
+
+        result_csv = full.getvalue().rstrip("\n")
+        if len(result_csv.encode("utf-8")) > self.save_to_mongodb_threshold_bytes and self.personal_mongo is not None and row_count > 2 * PREVIEW_ROWS:
+            file_path = f"postgres/query_{int(time.time())}.csv"
+            await ckit_mongo.mongo_store_file(self.personal_mongo, file_path, result_csv.encode("utf-8"), 7 * 86400)
+            preview = (header + "".join(head)).strip() + "\n...\n" + "".join(tail).strip()
+            explanation = "Query executed successfully, in the preview below the first line is CSV headers, then first 3 lines, dot dot dot, and last 3 lines of data. There are %d lines of data total.\n" % (row_count,)
+            if command_tag:
+                explanation += "%s\n" % (command_tag,)
+            explanation += "Full CSV is accessible via mongo_store() tool using path: %s\n\n" % (file_path,)
+            return explanation + preview
+        result_to_show = result_csv
+        if command_tag:
+            result_to_show += "\n" + command_tag
+        return "Query executed successfully, first line is CSV headers, then %d lines of data:\n\n" % (row_count,) + result_to_show
+
+    async def _execute_via_psql(self, query: str) -> str:
         try:
             # psql -c "SET default_transaction_read_only = on;" -c "INSERT INTO hello_world (a, b) VALUES (1, 2);"
             cmd = ["psql", "--csv", "-c", query]
@@ -68,7 +271,11 @@ class IntegrationPostgres:
                 stderr=asyncio.subprocess.PIPE,
             )
 
-            stdout, stderr = await proc.communicate()
+            try:
+                stdout, stderr = await proc.communicate()
+            except asyncio.CancelledError:
+                proc.kill()   # psql cancels the running statement when its connection drops
+                raise
 
             if proc.returncode != 0:
                 error_msg = stderr.decode('utf-8', errors='replace').strip()
@@ -79,8 +286,8 @@ class IntegrationPostgres:
                 return "Query executed successfully"
 
             result_bytes = result.encode('utf-8')
-            if len(result_bytes) > 100_000:
-                return "Error: Result size exceeds 2MB limit. Please use more specific query with LIMIT or WHERE clauses."
+            if len(result_bytes) > RESULT_SIZE_LIMIT:
+                return RESULT_TOO_BIG
 
             # Strip command tag from end if present (e.g., "UPDATE 1", "INSERT 0 5")
             # This happens with RETURNING clauses
@@ -169,5 +376,22 @@ if __name__ == "__main__":
         postgres = IntegrationPostgres()
         result = await postgres.execute_query("SELECT 2*2;", have_human_confirmation=False)
         print("Test result:", result)
+        await postgres.close()
+
+    async def bench(n: int = 200):
+        # Against a throwaway server, for example:
+        #   docker run --rm -e POSTGRES_PASSWORD=x -p 5432:5432 postgres:16
+        #   PGHOST=localhost PGUSER=postgres PGPASSWORD=x python -m flexus_client_kit.integrations.fi_postgres bench
+        regexp_test()
+        for name, pg in [("psql", IntegrationPostgres(use_driver=False)), ("driver", IntegrationPostgres())]:
+            for q in ["SELECT 2*2;", "SELECT g, md5(g::text) FROM generate_series(1, 1000) g;"]:
+                t0 = time.perf_counter()
+                for _ in range(n):
+                    r = await pg.execute_query(q, have_human_confirmation=False)
+                dt = time.perf_counter() - t0
+                assert r.startswith("Query executed successfully"), r
+                print(f"{name:6s} {q[:40]:40s} {dt / n * 1000:7.2f}ms/query")
+            await pg.close()
 
-    asyncio.run(test())
+    import sys
+    asyncio.run(bench() if sys.argv[1:] == ["bench"] else test())
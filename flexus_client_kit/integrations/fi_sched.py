@@ -6,7 +6,7 @@ from zoneinfo import ZoneInfo
 import gql
 import gql.transport.exceptions
 
-from flexus_client_kit import ckit_bot_exec, ckit_cloudtool
+from flexus_client_kit import ckit_bot_exec, ckit_cloudtool, ckit_schedule
 
 logger = logging.getLogger("sched")
 
@@ -108,6 +108,10 @@ class IntegrationSched:
         _VALID_TYPES = {"SCHED_TODO", "SCHED_TASK_SORT", "SCHED_PICK_ONE", "SCHED_ANY"}
         if required["sched_type"] not in _VALID_TYPES:
             return f"Error: sched_type must be one of {', '.join(sorted(_VALID_TYPES))}"
+        try:
+            ckit_schedule.compile_sched_when(required["sched_when"])
+        except ValueError as e:
+            return f"Error: bad sched_when {required['sched_when']!r}: {e}"
 
         inp = {
             **required,
@@ -1,4 +1,3 @@
-import contextlib
 import logging
 import os
 import re
@@ -14,6 +13,7 @@ from flexus_client_kit import ckit_bot_exec
 from flexus_client_kit import ckit_cloudtool
 from flexus_client_kit import ckit_client
 from flexus_client_kit import ckit_external_auth
+from flexus_client_kit import ckit_http
 from flexus_client_kit import ckit_erp
 from flexus_client_kit import ckit_scenario
 from flexus_client_kit import erp_schema
@@ -35,6 +35,8 @@ logger = logging.getLogger("shopify")
 # export WEBHOOK_BASE_URL="https://xxx.ngrok-free.app"
 
 API_VER = "2026-01"
+# REST Admin API leaky bucket: 40 requests, drains at 2/s per app per store (Plus stores get 10x)
+SHOPIFY_RATE_LIMIT = ckit_http.RateLimit(rate=2, burst=40)
 
 SHOPIFY_SCOPES = [
     "read_customers", "read_discounts", "write_discounts", "read_price_rules", "write_price_rules",
@@ -226,43 +228,46 @@ query FetchOrderTransactions($cursor: String, $query: String) {
 async def _fetch_order_transactions(domain: str, token: str, cutoff_iso: str) -> dict:
     txn_map = {}
     cursor = None
-    async with httpx.AsyncClient(timeout=30) as c:
-        while True:
-            r = await c.post(
-                f"https://{domain}/admin/api/{API_VER}/graphql.json",
-                headers={"X-Shopify-Access-Token": token, "Content-Type": "application/json"},
-                json={"query": _GQL_ORDER_TRANSACTIONS, "variables": {"cursor": cursor, "query": f"created_at:>={cutoff_iso[:10]}"}},
-            )
-            r.raise_for_status()
-            data = r.json()
-            if data.get("errors"):
-                raise Exception(f"Shopify GQL errors: {data['errors']}")
-            orders = data["data"]["orders"]
-            for node in orders["nodes"]:
-                txn_map[node["legacyResourceId"]] = [
-                    {
-                        "id": tx["id"].split("/")[-1],
-                        "amount": tx["amountSet"]["shopMoney"]["amount"],
-                        "currency": tx["amountSet"]["shopMoney"]["currencyCode"],
-                        "kind": tx["kind"].lower(),
-                        "status": tx["status"].lower(),
-                        "gateway": tx.get("gateway") or "",
-                        "created_at": tx.get("processedAt") or "",
-                    }
-                    for tx in node.get("transactions") or []
-                ]
-            if not orders["pageInfo"]["hasNextPage"]:
-                break
-            cursor = orders["pageInfo"]["endCursor"]
+    while True:
+        r = await _shop_http(domain).request(
+            "POST",
+            f"/admin/api/{API_VER}/graphql.json",
+            credential_key=token,
+            headers={"X-Shopify-Access-Token": token, "Content-Type": "application/json"},
+            json={"query": _GQL_ORDER_TRANSACTIONS, "variables": {"cursor": cursor, "query": f"created_at:>={cutoff_iso[:10]}"}},
+        )
+        r.raise_for_status()
+        data = r.json()
+        if data.get("errors"):
+            raise Exception(f"Shopify GQL errors: {data['errors']}")
+        orders = data["data"]["orders"]
+        for node in orders["nodes"]:
+            txn_map[node["legacyResourceId"]] = [
+                {
+                    "id": tx["id"].split("/")[-1],
+                    "amount": tx["amountSet"]["shopMoney"]["amount"],
+                    "currency": tx["amountSet"]["shopMoney"]["currencyCode"],
+                    "kind": tx["kind"].lower(),
+                    "status": tx["status"].lower(),
+                    "gateway": tx.get("gateway") or "",
+                    "created_at": tx.get("processedAt") or "",
+                }
+                for tx in node.get("transactions") or []
+            ]
+        if not orders["pageInfo"]["hasNextPage"]:
+            break
+        cursor = orders["pageInfo"]["endCursor"]
     return txn_map
 
 
-async def _shop_req(domain: str, token: str, method: str, path: str, body: Optional[dict] = None, c: Optional[httpx.AsyncClient] = None) -> httpx.Response:
-    url = f"https://{domain}/admin/api/{API_VER}/{path}"
-    async with (contextlib.nullcontext(c) if c else httpx.AsyncClient(timeout=30)) as client:
-        r = await client.request(method, url, headers={"X-Shopify-Access-Token": token}, json=body)
-        r.raise_for_status()
-        return r
+def _shop_http(domain: str) -> ckit_http.RateLimitedClient:
+    return ckit_http.get_client(f"https://{domain}", rate_limit=SHOPIFY_RATE_LIMIT)
+
+
+async def _shop_req(domain: str, token: str, method: str, path: str, body: Optional[dict] = None) -> httpx.Response:
+    r = await _shop_http(domain).request(method, f"/admin/api/{API_VER}/{path}", credential_key=token, headers={"X-Shopify-Access-Token": token}, json=body)
+    r.raise_for_status()
+    return r
 
 
 def _next_link(hdr: Optional[str]) -> Optional[str]:
@@ -280,13 +285,12 @@ async def _paginate(domain: str, token: str, path: str, key: str, params: Option
     url = f"https://{domain}/admin/api/{API_VER}/{path}"
     hdrs = {"X-Shopify-Access-Token": token}
     p = dict(params or {}, limit=250)
-    async with httpx.AsyncClient(timeout=30) as c:
-        while url:
-            r = await c.get(url, headers=hdrs, params=p)
-            r.raise_for_status()
-            result.extend(r.json().get(key, []))
-            url = _next_link(r.headers.get("link"))
-            p = {}  # only first request uses explicit params
+    while url:
+        r = await _shop_http(domain).request("GET", url, credential_key=token, headers=hdrs, params=p)
+        r.raise_for_status()
+        result.extend(r.json().get(key, []))
+        url = _next_link(r.headers.get("link"))
+        p = {}  # only first request uses explicit params
     return result
 
 
@@ -492,33 +496,31 @@ class IntegrationShopify:
         address_base = f"{base}/v1/webhook/shopify/{self.shop.shop_id}"
         existing = await _paginate(self.shop.shop_domain, token, "webhooks.json", "webhooks")
         ours = {w["topic"]: w for w in existing if w["topic"] in WEBHOOK_TOPICS}
-        async with httpx.AsyncClient(timeout=30) as c:
-            for topic, w in list(ours.items()):
-                if w.get("address") != address_base:
-                    try:
-                        await _shop_req(self.shop.shop_domain, token, "DELETE", f"webhooks/{w['id']}.json", c=c)
-                    except httpx.HTTPStatusError as e:
-                        if e.response.status_code != 404:
-                            logger.warning("failed to delete webhook %s: %s", w['id'], e)
-                    except Exception as e:
-                        logger.warning("failed to delete webhook %s: %s", w['id'], e)
-                    del ours[topic]
-        failed = []
-        async with httpx.AsyncClient(timeout=30) as c:
-            for topic in WEBHOOK_TOPICS:
-                if topic in ours:
-                    continue
+        for topic, w in list(ours.items()):
+            if w.get("address") != address_base:
                 try:
-                    await _shop_req(self.shop.shop_domain, token, "POST", "webhooks.json", {
-                        "webhook": {"topic": topic, "address": address_base, "format": "json"},
-                    }, c=c)
+                    await _shop_req(self.shop.shop_domain, token, "DELETE", f"webhooks/{w['id']}.json")
                 except httpx.HTTPStatusError as e:
-                    body = e.response.text[:200] if e.response else ""
-                    logger.warning("webhook %s failed for %s: %s %s", topic, self.shop.shop_domain, e.response.status_code, body)
-                    failed.append(f"{topic} ({body})" if body else topic)
+                    if e.response.status_code != 404:
+                        logger.warning("failed to delete webhook %s: %s", w['id'], e)
                 except Exception as e:
-                    logger.warning("webhook %s failed for %s: %s", topic, self.shop.shop_domain, e)
-                    failed.append(topic)
+                    logger.warning("failed to delete webhook %s: %s", w['id'], e)
+                del ours[topic]
+        failed = []
+        for topic in WEBHOOK_TOPICS:
+            if topic in ours:
+                continue
+            try:
+                await _shop_req(self.shop.shop_domain, token, "POST", "webhooks.json", {
+                    "webhook": {"topic": topic, "address": address_base, "format": "json"},
+                })
+            except httpx.HTTPStatusError as e:
+                body = e.response.text[:200] if e.response else ""
+                logger.warning("webhook %s failed for %s: %s %s", topic, self.shop.shop_domain, e.response.status_code, body)
+                failed.append(f"{topic} ({body})" if body else topic)
+            except Exception as e:
+                logger.warning("webhook %s failed for %s: %s", topic, self.shop.shop_domain, e)
+                failed.append(topic)
         if failed:
             return "Failed to register webhooks: %s" % ", ".join(failed)
         return ""
@@ -906,22 +908,23 @@ class IntegrationShopify:
         if not self.shop or not (token := self._get_token()):
             return "No shop connected."
         colls, cursor = [], None
-        async with httpx.AsyncClient(timeout=30) as c:
-            while True:
-                r = await c.post(
-                    f"https://{self.shop.shop_domain}/admin/api/{API_VER}/graphql.json",
-                    headers={"X-Shopify-Access-Token": token, "Content-Type": "application/json"},
-                    json={"query": _GQL_COLLECTIONS, "variables": {"cursor": cursor}},
-                )
-                r.raise_for_status()
-                data = r.json()
-                if data.get("errors"):
-                    return f"Shopify GQL errors: {data['errors']}"
-                page = data["data"]["collections"]
-                colls.extend(page["nodes"])
-                if not page["pageInfo"]["hasNextPage"]:
-                    break
-                cursor = page["pageInfo"]["endCursor"]
+        while True:
+            r = await _shop_http(self.shop.shop_domain).request(
+                "POST",
+                f"/admin/api/{API_VER}/graphql.json",
+                credential_key=token,
+                headers={"X-Shopify-Access-Token": token, "Content-Type": "application/json"},
+                json={"query": _GQL_COLLECTIONS, "variables": {"cursor": cursor}},
+            )
+            r.raise_for_status()
+            data = r.json()
+            if data.get("errors"):
+                return f"Shopify GQL errors: {data['errors']}"
+            page = data["data"]["collections"]
+            colls.extend(page["nodes"])
+            if not page["pageInfo"]["hasNextPage"]:
+                break
+            cursor = page["pageInfo"]["endCursor"]
         if not colls:
             return "No collections found."
         lines = []
@@ -1066,10 +1069,9 @@ class IntegrationShopify:
         cleanup_err = None
         try:
             if token := self._get_token():
-                async with httpx.AsyncClient(timeout=30) as c:
-                    for w in await _paginate(self.shop.shop_domain, token, "webhooks.json", "webhooks"):
-                        if w["topic"] in WEBHOOK_TOPICS:
-                            await _shop_req(self.shop.shop_domain, token, "DELETE", f"webhooks/{w['id']}.json", c=c)
+                for w in await _paginate(self.shop.shop_domain, token, "webhooks.json", "webhooks"):
+                    if w["topic"] in WEBHOOK_TOPICS:
+                        await _shop_req(self.shop.shop_domain, token, "DELETE", f"webhooks/{w['id']}.json")
             if auth:
                 await ckit_external_auth.external_auth_disconnect(self.fclient, self.rcx.persona.ws_id, self.rcx.persona.persona_id, "shopify")
         except Exception as e:
@@ -1129,20 +1131,19 @@ class IntegrationShopify:
         if not line_items:
             return "Missing 'line_items': [{variant_id, quantity}]"
         try:
-            async with httpx.AsyncClient(timeout=30) as c:
-                r = await _shop_req(self.shop.shop_domain, token, "GET", f"draft_orders/{doid}.json", c=c)
-                existing = r.json()["draft_order"]["line_items"]
-                # Merge: bump quantity for existing variants, append new ones
-                by_vid = {str(li["variant_id"]): li for li in existing}
-                for item in line_items:
-                    vid = str(item["variant_id"])
-                    if vid in by_vid:
-                        by_vid[vid]["quantity"] += item.get("quantity", 1)
-                    else:
-                        by_vid[vid] = {"variant_id": int(vid), "quantity": item.get("quantity", 1)}
-                r = await _shop_req(self.shop.shop_domain, token, "PUT", f"draft_orders/{doid}.json", {
-                    "draft_order": {"line_items": list(by_vid.values())},
-                }, c=c)
+            r = await _shop_req(self.shop.shop_domain, token, "GET", f"draft_orders/{doid}.json")
+            existing = r.json()["draft_order"]["line_items"]
+            # Merge: bump quantity for existing variants, append new ones
+            by_vid = {str(li["variant_id"]): li for li in existing}
+            for item in line_items:
+                vid = str(item["variant_id"])
+                if vid in by_vid:
+                    by_vid[vid]["quantity"] += item.get("quantity", 1)
+                else:
+                    by_vid[vid] = {"variant_id": int(vid), "quantity": item.get("quantity", 1)}
+            r = await _shop_req(self.shop.shop_domain, token, "PUT", f"draft_orders/{doid}.json", {
+                "draft_order": {"line_items": list(by_vid.values())},
+            })
             return self._fmt_cart(r.json()["draft_order"])
         except httpx.HTTPStatusError as e:
             return f"Failed: {e.response.text[:300]}"
@@ -1151,15 +1152,14 @@ class IntegrationShopify:
         if not variant_id:
             return "Missing 'variant_id'."
         try:
-            async with httpx.AsyncClient(timeout=30) as c:
-                r = await _shop_req(self.shop.shop_domain, token, "GET", f"draft_orders/{doid}.json", c=c)
-                existing = r.json()["draft_order"]["line_items"]
-                updated = [li for li in existing if str(li["variant_id"]) != str(variant_id)]
-                if len(updated) == len(existing):
-                    return f"Variant {variant_id} not found in cart."
-                r = await _shop_req(self.shop.shop_domain, token, "PUT", f"draft_orders/{doid}.json", {
-                    "draft_order": {"line_items": updated},
-                }, c=c)
+            r = await _shop_req(self.shop.shop_domain, token, "GET", f"draft_orders/{doid}.json")
+            existing = r.json()["draft_order"]["line_items"]
+            updated = [li for li in existing if str(li["variant_id"]) != str(variant_id)]
+            if len(updated) == len(existing):
+                return f"Variant {variant_id} not found in cart."
+            r = await _shop_req(self.shop.shop_domain, token, "PUT", f"draft_orders/{doid}.json", {
+                "draft_order": {"line_items": updated},
+            })
             return self._fmt_cart(r.json()["draft_order"])
         except httpx.HTTPStatusError as e:
             return f"Failed: {e.response.text[:300]}"
@@ -9,18 +9,20 @@ import base64
 import io
 from collections import deque
 from dataclasses import asdict, dataclass, field
-from typing import Dict, Any, Optional, Callable, Awaitable, List
-import httpx
+from typing import Dict, Any, Optional, Callable, Awaitable, List, Tuple
 from PIL import Image
 import gql
+import httpx
 
 from flexus_client_kit import ckit_cloudtool
 from flexus_client_kit import ckit_client
+from flexus_client_kit import ckit_http
 from flexus_client_kit import ckit_ask_model
 from flexus_client_kit import ckit_bot_exec
 from flexus_client_kit import ckit_bot_query
 from flexus_client_kit import ckit_scenario
 from flexus_client_kit import ckit_kanban
+from flexus_client_kit import ckit_utils
 from flexus_client_kit.format_utils import format_cat_output
 from flexus_client_kit.integrations import fi_messenger
 
@@ -40,6 +42,9 @@ logger = logging.getLogger("slack")
 # Apps unsuitable for Slack Marketplace:
 # https://api.slack.com/slack-marketplace/guidelines
 
+SLACK_FILES_BASE = "https://files.slack.com"
+SLACK_FILES_RATE_LIMIT = ckit_http.RateLimit(rate=5, burst=20)
+
 
 SLACK_TOOL = ckit_cloudtool.CloudTool(
     strict=False,
@@ -121,6 +126,228 @@ SLACK_SETUP_SCHEMA = [
 ]
 
 
+# Every Web API call goes through a SlackScheduler, one per bot token (Slack limits are per app per workspace):
+# a token bucket per method tier, chat.postMessage limited per channel, and a 429 pauses the bucket for
+# Retry-After and retries. Tiers: https://api.slack.com/apis/rate-limits
+#
+# Users and public channels live in a SlackDirectory, one per team, shared by every persona connected to it.
+# The first persona to start loads it page by page in the background, user_change / team_join / channel_*
+# events keep it current, DMs stay per persona because they belong to the app.
+
+SLACK_TIER_LIMITS = {
+    1: ckit_http.RateLimit(rate=1 / 60, burst=1),
+    2: ckit_http.RateLimit(rate=20 / 60, burst=3),
+    3: ckit_http.RateLimit(rate=50 / 60, burst=5),
+    4: ckit_http.RateLimit(rate=100 / 60, burst=10),
+}
+SLACK_METHOD_TIERS = {
+    "auth.test": 4,
+    "users.list": 2,
+    "users.info": 4,
+    "conversations.list": 2,
+    "conversations.open": 3,
+    "conversations.history": 3,
+    "conversations.replies": 3,
+    "files.getUploadURLExternal": 4,
+    "files.completeUploadExternal": 4,
+}
+SLACK_DEFAULT_TIER = 3
+SLACK_POST_RATE_LIMIT = ckit_http.RateLimit(rate=1, burst=3)     # chat.postMessage, per channel
+SLACK_MAX_RETRIES = 3
+SLACK_DEFAULT_RETRY_AFTER = 30.0
+SLACK_PAGE_SIZE = 200             # Slack recommends no more than 200 per page
+SLACK_DIRECTORY_MAX = 50000
+SLACK_DIRECTORY_WAIT = 3.0        # name lookups wait this long for the first load, once per load; after that users.info
+SLACK_DIRECTORY_REFRESH = 24 * 3600.0
+SLACK_DIRECTORY_RETRY = 300.0     # a load that failed is tried again by the next call that needs names after this long
+
+
+class SlackScheduler:
+    def __init__(self):
+        self.buckets: Dict[str, ckit_http.TokenBucket] = {}
+        self.calls: Dict[str, int] = {}
+        self.throttled = 0
+        self.bucket_wait_s = 0.0
+
+    def _bucket(self, api_method: str, channel: str) -> ckit_http.TokenBucket:
+        if api_method == "chat.postMessage":
+            key, rl = "post:" + channel, SLACK_POST_RATE_LIMIT
+        else:
+            tier = SLACK_METHOD_TIERS.get(api_method, SLACK_DEFAULT_TIER)
+            key, rl = "tier%d" % tier, SLACK_TIER_LIMITS[tier]
+        b = self.buckets.get(key)
+        if b is None:
+            b = self.buckets[key] = ckit_http.TokenBucket(rl)
+        return b
+
+    async def call(self, api_method: str, channel: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        bucket = self._bucket(api_method, channel)
+        attempt = 0
+        while True:
+            self.bucket_wait_s += await bucket.acquire()
+            self.calls[api_method] = self.calls.get(api_method, 0) + 1
+            try:
+                return await fn()
+            except SlackApiError as e:
+                if e.response is None or e.response.status_code != 429 or attempt >= SLACK_MAX_RETRIES:
+                    raise
+                wait = ckit_http.retry_after_seconds(httpx.Headers(e.response.headers or {}))
+                wait = SLACK_DEFAULT_RETRY_AFTER if wait is None else wait
+                self.throttled += 1
+                logger.info("slack %s ratelimited, retry in %.1fs (attempt %d)", api_method, wait, attempt + 1)
+                bucket.pause(wait)
+                attempt += 1
+
+
+class ScheduledWebClient(AsyncWebClient):
+    def __init__(self, token: str, scheduler: SlackScheduler, **kwargs):
+        super().__init__(token=token, **kwargs)
+        self.scheduler = scheduler
+
+    async def api_call(self, api_method: str, **kwargs) -> Any:
+        channel = ""
+        if api_method == "chat.postMessage":
+            body = kwargs.get("json") or kwargs.get("data") or kwargs.get("params") or {}
+            channel = body.get("channel", "") if isinstance(body, dict) else ""
+        return await self.scheduler.call(api_method, channel, lambda: AsyncWebClient.api_call(self, api_method, **kwargs))
+
+
+class SlackDirectory:
+    def __init__(self, team_id: str):
+        self.team_id = team_id
+        self.users_id2name: Dict[str, str] = {}
+        self.users_name2id: Dict[str, str] = {}
+        self.channels_id2name: Dict[str, str] = {}
+        self.channels_name2id: Dict[str, str] = {}
+        self.loaded = asyncio.Event()
+        self.loaded_ts = 0.0
+        self.problems: List[str] = []
+        self.failed = False
+        self._task: Optional[asyncio.Task] = None
+        self._wait_deadline: Optional[float] = None
+
+    def ensure_loading(self, web_client: AsyncWebClient) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        if self.loaded.is_set() and time.time() - self.loaded_ts < (SLACK_DIRECTORY_RETRY if self.failed else SLACK_DIRECTORY_REFRESH):
+            return
+        self._wait_deadline = None
+        self._task = asyncio.create_task(self._load(web_client))
+        self._task.add_done_callback(lambda t: ckit_utils.report_crash(t, logger))
+
+    async def wait_loaded(self, timeout: float = SLACK_DIRECTORY_WAIT) -> bool:
+        # The first caller starts the clock, everyone else waits until the same deadline: paging users.list in a big
+        # workspace takes minutes, tool calls and messages from new users can't stall for the whole load one by one
+        if self.loaded.is_set():
+            return True
+        if self._wait_deadline is None:
+            self._wait_deadline = time.monotonic() + timeout
+        left = self._wait_deadline - time.monotonic()
+        if left <= 0:
+            return False
+        try:
+            await asyncio.wait_for(self.loaded.wait(), timeout=left)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _pages(self, fn: Callable[..., Awaitable[Any]], key: str, **kwargs):
+        cursor, n = None, 0
+        while n < SLACK_DIRECTORY_MAX:
+            r = await fn(limit=SLACK_PAGE_SIZE, cursor=cursor, **kwargs)
+            for item in r[key]:
+                n += 1
+                yield item
+            cursor = (r.get("response_metadata") or {}).get("next_cursor")
+            if not cursor:
+                break
+
+    async def _load(self, web_client: AsyncWebClient) -> None:
+        # Whatever happens, waiters are released: a failed load is retried by ensure_loading() later, not waited for
+        t0 = time.monotonic()
+        problems = []
+        try:
+            try:
+                async for user in self._pages(web_client.users_list, "members"):
+                    self.put_user(user)
+            except Exception as e:
+                logger.exception("Failed to list users")
+                problems.append(f"Failed to list users: {type(e).__name__} {e}")
+            try:
+                async for channel in self._pages(web_client.conversations_list, "channels", types="public_channel", exclude_archived=True):
+                    self.put_channel(channel)
+            except Exception as e:
+                logger.exception("Failed to list channels")
+                problems.append(f"Failed to list channels: {type(e).__name__} {e}")
+        finally:
+            self.problems = problems
+            self.failed = bool(problems) or not self.users_id2name
+            self.loaded_ts = time.time()
+            self.loaded.set()
+        logger.info("slack team %s directory: %d users, %d channels in %.1fs", self.team_id, len(self.users_id2name), len(self.channels_id2name), time.monotonic() - t0)
+
+    def put_user(self, user: dict) -> None:
+        old_name = self.users_id2name.get(user["id"])
+        if old_name is not None and self.users_name2id.get(old_name) == user["id"]:
+            del self.users_name2id[old_name]
+        if user.get("deleted") or user.get("is_bot"):
+            self.users_id2name.pop(user["id"], None)
+            return
+        self.users_id2name[user["id"]] = user["name"]
+        self.users_name2id[user["name"]] = user["id"]
+
+    def put_channel(self, channel: dict) -> None:
+        self.drop_channel(channel["id"])
+        if channel.get("is_archived"):
+            return
+        self.channels_id2name[channel["id"]] = channel["name"]
+        self.channels_name2id[channel["name"]] = channel["id"]
+
+    def drop_channel(self, channel_id: str) -> None:
+        old_name = self.channels_id2name.pop(channel_id, None)
+        if old_name is not None and self.channels_name2id.get(old_name) == channel_id:
+            del self.channels_name2id[old_name]
+
+    def apply_event(self, event: dict) -> bool:
+        # True if the event was a directory change and there's nothing else to do with it
+        t = event.get("type")
+        if t in ("user_change", "team_join") and isinstance(event.get("user"), dict):
+            self.put_user(event["user"])
+        elif t in ("channel_created", "channel_rename") and isinstance(event.get("channel"), dict):
+            self.put_channel(event["channel"])
+        elif t in ("channel_deleted", "channel_archive"):
+            self.drop_channel(event.get("channel", ""))
+        elif t == "channel_unarchive":
+            return False   # name comes with the next conversations_list, nothing to go on here
+        else:
+            return False
+        return True
+
+
+_schedulers: Dict[str, Tuple[asyncio.AbstractEventLoop, SlackScheduler]] = {}
+_directories: Dict[str, Tuple[asyncio.AbstractEventLoop, SlackDirectory]] = {}
+
+
+def get_scheduler(token: str) -> SlackScheduler:
+    loop = asyncio.get_running_loop()
+    hit = _schedulers.get(token)
+    if hit and hit[0] is loop:
+        return hit[1]
+    s = SlackScheduler()
+    _schedulers[token] = (loop, s)
+    return s
+
+
+def get_directory(team_id: str) -> SlackDirectory:
+    loop = asyncio.get_running_loop()
+    hit = _directories.get(team_id)
+    if hit and hit[0] is loop:
+        return hit[1]
+    d = SlackDirectory(team_id)
+    _directories[team_id] = (loop, d)
+    return d
+
+
 @dataclass
 class ActivitySlack:
     what_happened: str
@@ -159,13 +386,15 @@ class IntegrationSlack(fi_messenger.FlexusMessenger):
             self.web_client = None
             self.oops_a_problem("Slack is not connected, ask user to connect it in bot Integrations", dont_print=True)
         else:
-            self.web_client = AsyncWebClient(token=token)
+            self.web_client = ScheduledWebClient(token=token, scheduler=get_scheduler(token))
+        self.directory: Optional[SlackDirectory] = None
         self.activity_callback: Callable[[ActivitySlack, bool], Awaitable[None]] = self.inbound_activity_to_task
+        # replaced by the shared SlackDirectory dicts in load_workspace_maps()
         self.channels_id2name = {}
         self.channels_name2id = {}
         self.users_id2name = {}
         self.users_name2id = {}
-        self.users_name2dm = {}
+        self.users_id2dm = {}
         # Both inbound and outbound deduplicated.
         # Inbound dedup needed: bot receives emessages starting up, handled_emsg_ids delete fails for whatever reason, bot starts up again
         # Outbound dedup needed: bot receives a stray update on existing message (via news mechanism) before it can get an updated last_posted_assistant_ts
@@ -226,6 +455,9 @@ class IntegrationSlack(fi_messenger.FlexusMessenger):
         # backend may send full event_callback or just the inner event
         event = payload.get("event", payload)
 
+        if self.directory and self.directory.apply_event(event):
+            return
+
         user_id = event.get("user")
         if not user_id:
             logger.info("handle_emessage: no user field, skipping event type=%r subtype=%r keys=%s", event.get("type"), event.get("subtype"), list(event.keys()))
@@ -334,14 +566,20 @@ class IntegrationSlack(fi_messenger.FlexusMessenger):
         print_help = not op or "help" in op
         print_status = not op or "status" in op
 
+        if self.directory and not print_help and not print_status:
+            self.directory.ensure_loading(self.web_client)
+            if not await self.directory.wait_loaded():
+                r += "Slack user and channel lists are still loading, names might not resolve yet\n"
+
         if print_status:
             if not self._get_bot_token():
                 r += "Don't have Slack token set\n"
             if self.bot_name:
                 r += "Bot name: %s\n" % self.bot_name
-            if self.problems_other:
+            problems = self.problems_other + (self.directory.problems if self.directory else [])
+            if problems:
                 r += "Other problems:\n"
-                for problem in self.problems_other:
+                for problem in problems:
                     r += "  %s\n" % problem
                 r += "\n"
 
@@ -364,11 +602,11 @@ class IntegrationSlack(fi_messenger.FlexusMessenger):
                     user_id = self.users_name2id.get(username)
                     if not user_id:
                         return f"ERROR: User {username!r} not found in users_name2id"
-                    channel_id = self.users_name2dm.get(username)
+                    channel_id = self.users_id2dm.get(user_id)
                     if not channel_id:
                         dm_resp = await self.web_client.conversations_open(users=user_id)
                         channel_id = dm_resp["channel"]["id"]
-                        self.users_name2dm[username] = channel_id
+                        self.users_id2dm[user_id] = channel_id
                 elif something_name in self.channels_name2id.values():
                     channel_id = something_name
                 else:
@@ -451,12 +689,12 @@ class IntegrationSlack(fi_messenger.FlexusMessenger):
                 user_id = self.users_name2id.get(username, None)
                 if not user_id:
                     return f"ERROR: User {username!r} not found in users_name2id"
-                something_id = self.users_name2dm.get(username, None)
+                something_id = self.users_id2dm.get(user_id, None)
                 if not something_id:
                     logger.info("Creating DM for %r" % (username,))
                     dm_response = await self.web_client.conversations_open(users=user_id)
                     something_id = dm_response["channel"]["id"]
-                    self.users_name2dm[username] = something_id
+                    self.users_id2dm[user_id] = something_id
             elif re.match(r'^[A-Z][A-Z0-9]+$', something_name or ""):
                 something_id = something_name  # direct Slack channel/DM/group ID
             elif something_name:
@@ -672,45 +910,31 @@ class IntegrationSlack(fi_messenger.FlexusMessenger):
         if not self.web_client:
             return
         my_info = await self.web_client.auth_test()
-        logger.info("Slack bot user ID: %s", my_info["user_id"])
+        logger.info("Slack bot user ID: %s team %s", my_info["user_id"], my_info.get("team_id"))
 
-        try:
-            users_response = await self.web_client.users_list(limit=5000)
-            for user in users_response["members"]:
-                if user.get("deleted") or user.get("is_bot"):
-                    continue
-                self.users_id2name[user["id"]] = user["name"]
-                self.users_name2id[user["name"]] = user["id"]
-                logger.info("user %s -> %s", user["name"], user["id"])
-        except SlackApiError as e:
-            logger.exception("Failed to list users")
-            self.oops_a_problem(f"Failed to list users: {type(e).__name__} {e}", dont_print=True)
+        self.directory = get_directory(my_info.get("team_id") or my_info["user_id"])
+        self.users_id2name = self.directory.users_id2name
+        self.users_name2id = self.directory.users_name2id
+        self.channels_id2name = self.directory.channels_id2name
+        self.channels_name2id = self.directory.channels_name2id
+        self.directory.ensure_loading(self.web_client)
 
+        # DMs belong to this app, keyed by user id so this doesn't wait for the directory
         try:
-            channels_response = await self.web_client.conversations_list(types="im", limit=5000)
-            for rec in channels_response["channels"]:
-                if not rec["is_im"]:
-                    continue
-                username = self.users_id2name.get(rec["user"])
-                if username:
-                    self.users_name2dm[username] = rec["id"]
-                    logger.info("dm %s -> %s", rec["user"], rec["id"])
-                # else: DM with a bot or deleted user, skip
+            cursor = None
+            while True:
+                channels_response = await self.web_client.conversations_list(types="im", limit=SLACK_PAGE_SIZE, cursor=cursor)
+                for rec in channels_response["channels"]:
+                    if rec["is_im"]:
+                        self.users_id2dm[rec["user"]] = rec["id"]
+                cursor = (channels_response.get("response_metadata") or {}).get("next_cursor")
+                if not cursor:
+                    break
+            logger.info("%s slack: %d DMs", self.rcx.persona.persona_id, len(self.users_id2dm))
         except SlackApiError as e:
             logger.exception("Failed to list DMs")
             self.oops_a_problem(f"Failed to list DMs: {type(e).__name__} {e}", dont_print=True)
 
-        try:
-            channels_response = await self.web_client.conversations_list(types="public_channel", limit=1000)
-            for channel in channels_response["channels"]:
-                self.channels_id2name[channel["id"]] = channel["name"]
-                self.channels_name2id[channel["name"]] = channel["id"]
-                logger.info("channel #%s -> %s", channel["name"], channel["id"])
-        except SlackApiError as e:
-            logger.exception("Failed to list channels")
-            self.oops_a_problem(f"Failed to list channels: {type(e).__name__} {e}", dont_print=True)
-
-
     async def _get_history(self, channel_name: str, thread_ts: Optional[str], long_ago: str, limit_cnt: int):
         if channel_name.startswith('@'):
             channel_id = self.users_name2id.get(channel_name.lstrip("@"))
@@ -737,10 +961,7 @@ class IntegrationSlack(fi_messenger.FlexusMessenger):
                         channel=channel_id, oldest=long_ago, limit=limit_cnt, cursor=cursor
                     )
             except SlackApiError as e:
-                if "ratelimited" in str(e):
-                    logger.info("ratelimit")
-                    await asyncio.sleep(10)
-                    continue
+                # 429 was already retried by the scheduler according to Retry-After
                 logger.exception("Slack API error in get_history")
                 raise
 
@@ -758,6 +979,12 @@ class IntegrationSlack(fi_messenger.FlexusMessenger):
             return self.users_id2name[user_id]
         if not self.web_client:
             return f"user_{user_id}"
+        if self.directory and not self.directory.loaded.is_set():
+            # one users.info per unknown user while the directory pages are still coming is what we're avoiding
+            self.directory.ensure_loading(self.web_client)
+            await self.directory.wait_loaded()
+            if user_id in self.users_id2name:
+                return self.users_id2name[user_id]
         try:
             author_info = await self.web_client.users_info(user=user_id)
             author_name = author_info["user"]["name"]
@@ -800,10 +1027,143 @@ class IntegrationSlack(fi_messenger.FlexusMessenger):
         if not url:
             logger.warning("no download URL for file %r, keys=%s", filename, list(file_info.keys()))
             return None, None
-        headers = {'Authorization': f'Bearer {self._get_bot_token()}'}
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(url, headers=headers, timeout=30.0)
+        bot_token = self._get_bot_token()
+        headers = {'Authorization': f'Bearer {bot_token}'}
+        response = await ckit_http.get_client(SLACK_FILES_BASE, rate_limit=SLACK_FILES_RATE_LIMIT, follow_redirects=True).request(
+            "GET", url, credential_key=bot_token, headers=headers,
+        )
         if response.status_code != 200:
             logger.error("download %r failed: HTTP %d", filename, response.status_code)
             return None, None
         return response.content, file_info.get('mimetype', 'application/octet-stream')
+
+
+if __name__ == "__main__":
+    import types
+    from aiohttp import web
+
+    N_USERS, N_CHANNELS = 1200, 300
+
+    async def stub_workspace_test():
+        calls: Dict[str, int] = {}
+        throttle_once = {"users.list": True}
+
+        def page(items: list, request_args: dict) -> Tuple[list, str]:
+            start = int(request_args.get("cursor") or 0)
+            limit = int(request_args.get("limit") or 100)
+            end = start + limit
+            return items[start:end], (str(end) if end < len(items) else "")
+
+        async def api(request):
+            method = request.match_info["method"]
+            calls[method] = calls.get(method, 0) + 1
+            args = dict(request.query)
+            if request.can_read_body:
+                args.update(dict(await request.post()))
+            if throttle_once.pop(method, False):
+                return web.json_response({"ok": False, "error": "ratelimited"}, status=429, headers={"Retry-After": "1"})
+            if method == "auth.test":
+                return web.json_response({"ok": True, "user_id": "UBOT", "team_id": "T1"})
+            if method == "users.list":
+                users = [{"id": f"U{i}", "name": f"user{i}", "deleted": i % 100 == 0} for i in range(N_USERS)]
+                items, nxt = page(users, args)
+                return web.json_response({"ok": True, "members": items, "response_metadata": {"next_cursor": nxt}})
+            if method == "conversations.list":
+                if args.get("types") == "im":
+                    items, nxt = [{"id": f"D{i}", "is_im": True, "user": f"U{i}"} for i in range(20)], ""
+                else:
+                    items, nxt = page([{"id": f"C{i}", "name": f"chan{i}"} for i in range(N_CHANNELS)], args)
+                return web.json_response({"ok": True, "channels": items, "response_metadata": {"next_cursor": nxt}})
+            if method == "users.info":
+                return web.json_response({"ok": True, "user": {"id": args["user"], "name": "late" + args["user"]}})
+            return web.json_response({"ok": False, "error": "unknown_method"})
+
+        app = web.Application()
+        app.router.add_route("*", "/api/{method}", api)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        # tier 2 is 20 calls a minute in production, loading 7 pages would take ~15s; fast limits for the test
+        for tier in SLACK_TIER_LIMITS:
+            SLACK_TIER_LIMITS[tier] = ckit_http.RateLimit(rate=50, burst=5)
+
+        def persona(pid: str) -> IntegrationSlack:
+            rcx = types.SimpleNamespace(
+                running_test_scenario=False,
+                external_auth={"slack": {"token": {"access_token": "xoxb-test-" + pid}}},
+                persona=types.SimpleNamespace(persona_id=pid),
+            )
+            obj = IntegrationSlack(None, rcx)
+            obj.web_client = ScheduledWebClient(token="xoxb-test-" + pid, scheduler=obj.web_client.scheduler, base_url=f"http://127.0.0.1:{port}/api/")
+            return obj
+
+        t0 = time.monotonic()
+        p1 = persona("p1")
+        await p1.load_workspace_maps()
+        t_start = time.monotonic() - t0
+        assert not p1.directory.loaded.is_set()
+        await p1.directory.wait_loaded()
+        t_loaded = time.monotonic() - t0
+        print(f"persona 1 started in {t_start:.2f}s, directory loaded in background after {t_loaded:.2f}s (429 with Retry-After: 1 on the first page): {len(p1.users_id2name)} users, {len(p1.channels_id2name)} channels")
+        assert len(p1.users_id2name) == N_USERS - N_USERS // 100 and len(p1.channels_id2name) == N_CHANNELS and t_loaded >= 1.0
+        assert p1.web_client.scheduler.throttled == 1
+
+        before = dict(calls)
+        p2 = persona("p2")
+        await p2.load_workspace_maps()
+        delta = {k: v - before.get(k, 0) for k, v in calls.items() if v != before.get(k, 0)}
+        print(f"persona 2 on the same team: {delta}, sharing the directory: {p2.directory is p1.directory}")
+        assert p2.directory is p1.directory and "users.list" not in delta
+
+        await p1.handle_emessage(types.SimpleNamespace(emsg_payload={"event": {"type": "user_change", "user": {"id": "U7", "name": "renamed7"}}}))
+        await p1.handle_emessage(types.SimpleNamespace(emsg_payload={"event": {"type": "channel_created", "channel": {"id": "CNEW", "name": "launch"}}}))
+        assert p2.users_id2name["U7"] == "renamed7" and "user7" not in p2.users_name2id and p2.channels_name2id["launch"] == "CNEW"
+        print("user_change and channel_created applied:", p2.users_id2name["U7"], p2.channels_name2id["launch"])
+
+        assert await p2._get_user_name("U5") == "user5" and await p2._get_user_name("U99999") == "lateU99999"
+        print("calls to the stub:", calls, "users.info only for the user not in the directory")
+        assert calls["users.info"] == 1
+
+        # a slow first load: callers wait once, together, then go straight to users.info
+        class SlowPages:
+            async def users_list(self, **kwargs):
+                await asyncio.sleep(60)
+            conversations_list = users_list
+
+        d = SlackDirectory("T_SLOW")
+        d.ensure_loading(SlowPages())
+        t0 = time.monotonic()
+        assert await asyncio.gather(d.wait_loaded(timeout=0.3), d.wait_loaded(timeout=0.3)) == [False, False]
+        t_first = time.monotonic() - t0
+        t0 = time.monotonic()
+        assert not await d.wait_loaded(timeout=0.3)
+        t_second = time.monotonic() - t0
+        print(f"slow directory load: first waiters released after {t_first:.2f}s, later ones after {t_second:.3f}s")
+        assert t_first < 0.5 and t_second < 0.05
+        d._task.cancel()
+
+        # a network error while loading: nobody waits SLACK_DIRECTORY_WAIT for it, the next call after the retry
+        # interval loads again
+        class Unreachable:
+            async def users_list(self, **kwargs):
+                raise ConnectionResetError("connection reset by peer")
+            conversations_list = users_list
+
+        d = SlackDirectory("T_BROKEN")
+        d.ensure_loading(Unreachable())
+        t0 = time.monotonic()
+        assert await d.wait_loaded(timeout=1.0) and d.failed and len(d.problems) == 2
+        t_released = time.monotonic() - t0
+        d.ensure_loading(p1.web_client)
+        assert d._task.done(), "retries after SLACK_DIRECTORY_RETRY, not on every call"
+        d.loaded_ts -= SLACK_DIRECTORY_RETRY
+        d.ensure_loading(p1.web_client)
+        await d._task
+        print(f"directory after a network error: released waiters in {t_released:.3f}s; retry loaded {len(d.users_id2name)} users")
+        assert not d.failed and not d.problems and len(d.users_id2name) == N_USERS - N_USERS // 100
+        await runner.cleanup()
+
+    asyncio.run(stub_workspace_test())
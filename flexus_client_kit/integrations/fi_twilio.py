@@ -1,12 +1,10 @@
-import asyncio
 import json
 import logging
 import os
 from typing import Any, Dict
 
-import httpx
-
 from flexus_client_kit import ckit_cloudtool
+from flexus_client_kit import ckit_http
 
 logger = logging.getLogger("twilio")
 
@@ -17,6 +15,8 @@ AUTH_PROVIDER_NAME = "twilio_manual"
 API_BASE = "https://api.twilio.com"
 VERIFY_BASE = "https://verify.twilio.com"
 LOOKUP_BASE = "https://lookups.twilio.com"
+# Twilio limits concurrency per account rather than publishing a rate, 429 (code 20429) means too many in flight
+TWILIO_RATE_LIMIT = ckit_http.RateLimit(rate=25, burst=50)
 
 METHOD_SPECS = {
     # -- Messaging API --
@@ -348,26 +348,16 @@ class IntegrationTwilio:
             "Content-Type": "application/x-www-form-urlencoded",
             "Accept": "application/json",
         }
-        url = base + path
-
         try:
-            async with httpx.AsyncClient(timeout=30.0) as cli:
-                response = None
-                for attempt in range(4):
-                    response = await cli.request(
-                        method,
-                        url,
-                        headers=headers,
-                        auth=(sid, tok),
-                        params=query or None,
-                        data=body if method in {"POST", "PUT", "PATCH", "DELETE"} else None,
-                    )
-                    if response.status_code != 429:
-                        break
-                    wait_s = min(2 ** attempt, 30)
-                    logger.warning("twilio rate limited method=%s wait=%ss attempt=%s", method_id, wait_s, attempt + 1)
-                    await asyncio.sleep(wait_s)
-                assert response is not None
+            response = await ckit_http.get_client(base, rate_limit=TWILIO_RATE_LIMIT).request(
+                method,
+                path,
+                credential_key=sid,
+                headers=headers,
+                auth=(sid, tok),
+                params=query or None,
+                data=body if method in {"POST", "PUT", "PATCH", "DELETE"} else None,
+            )
         except Exception as e:
             logger.exception("twilio request failed: %s", method_id)
             return self._error("REQUEST_FAILED", str(e), method_id=method_id)
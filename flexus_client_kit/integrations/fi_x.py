@@ -1,10 +1,12 @@
 import json
 import logging
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import httpx
 
 from flexus_client_kit import ckit_cloudtool
+from flexus_client_kit import ckit_http
+from flexus_client_kit import ckit_mongo
 
 
 logger = logging.getLogger("x")
@@ -72,6 +74,18 @@ REQUIRED_SCOPES = [
 _BASE_URL = "https://api.twitter.com/2"
 _TIMEOUT = 30.0
 
+# Per access token. The tightest user-context read limits are ~300 per 15 minutes, and x-rate-limit-remaining: 0
+# with x-rate-limit-reset pauses the bucket until the window resets (ckit_http).
+X_RATE_LIMIT = ckit_http.RateLimit(rate=0.3, burst=15)
+AUTO_PAGINATE_DEFAULT = 200   # every post read is billed, keep the default modest
+AUTO_PAGINATE_MAX = 2000
+# method_id -> query param that carries the cursor from meta.next_token
+_PAGINATED_METHODS = {
+    "x.tweets.search_recent.v1": "next_token",
+    "x.timelines.user.v1": "pagination_token",
+    "x.timelines.reverse_chronological.v1": "pagination_token",
+}
+
 X_TOOL = ckit_cloudtool.CloudTool(
     strict=False,
     name="x",
@@ -131,6 +145,7 @@ class IntegrationX:
             "- search_recent uses Twitter v2 query language; pass `query` and optional `max_results` (10-100), `next_token`.\n"
             "- timelines.user requires `user_id` (numeric) — use users.by_username first if you only have a handle.\n"
             "- follows/likes/retweets/bookmarks require source_user_id (the authenticated user's id from users.me).\n"
+            f"- search_recent and timelines accept auto_paginate=true and max_records (default {AUTO_PAGINATE_DEFAULT}, max {AUTO_PAGINATE_MAX}), each post read is billed; big results are stored in mongo.\n"
         )
 
     def _headers(self, *, has_body: bool) -> Dict[str, str]:
@@ -222,6 +237,35 @@ class IntegrationX:
             return _PER_POST_USD * n
         return _FLAT_PRICING_USD.get(method_id, 0.0)
 
+    async def _send(
+        self,
+        http_method: str,
+        path: str,
+        params: Optional[Dict[str, Any]],
+        body: Optional[Dict[str, Any]],
+    ) -> httpx.Response:
+        http = ckit_http.get_client(_BASE_URL, rate_limit=X_RATE_LIMIT, timeout=_TIMEOUT)
+        return await http.request(
+            http_method,
+            path,
+            credential_key=self._access_token(),
+            headers=self._headers(has_body=body is not None),
+            params=params,
+            json=body,
+        )
+
+    def _transport_error(self, method_id: str, e: Exception) -> str:
+        if isinstance(e, httpx.TimeoutException):
+            return json.dumps({"ok": False, "provider": PROVIDER_NAME, "method_id": method_id, "error_code": "TIMEOUT"}, indent=2, ensure_ascii=False)
+        logger.error("x request failed", exc_info=e)
+        return json.dumps({
+            "ok": False,
+            "provider": PROVIDER_NAME,
+            "method_id": method_id,
+            "error_code": "HTTP_ERROR",
+            "message": f"{type(e).__name__}: {e}",
+        }, indent=2, ensure_ascii=False)
+
     async def _request(
         self,
         method_id: str,
@@ -231,28 +275,12 @@ class IntegrationX:
         params: Optional[Dict[str, Any]] = None,
         body: Optional[Dict[str, Any]] = None,
     ) -> Tuple[str, float]:
-        url = _BASE_URL + path
+        if http_method not in ("GET", "POST", "DELETE"):
+            return json.dumps({"ok": False, "error_code": "UNSUPPORTED_HTTP_METHOD"}, indent=2, ensure_ascii=False), 0.0
         try:
-            async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
-                if http_method == "GET":
-                    response = await client.get(url, headers=self._headers(has_body=False), params=params)
-                elif http_method == "POST":
-                    response = await client.post(url, headers=self._headers(has_body=True), params=params, json=body)
-                elif http_method == "DELETE":
-                    response = await client.delete(url, headers=self._headers(has_body=False), params=params)
-                else:
-                    return json.dumps({"ok": False, "error_code": "UNSUPPORTED_HTTP_METHOD"}, indent=2, ensure_ascii=False), 0.0
-        except httpx.TimeoutException:
-            return json.dumps({"ok": False, "provider": PROVIDER_NAME, "method_id": method_id, "error_code": "TIMEOUT"}, indent=2, ensure_ascii=False), 0.0
+            response = await self._send(http_method, path, params, body)
         except (httpx.HTTPError, ValueError) as e:
-            logger.error("x request failed", exc_info=e)
-            return json.dumps({
-                "ok": False,
-                "provider": PROVIDER_NAME,
-                "method_id": method_id,
-                "error_code": "HTTP_ERROR",
-                "message": f"{type(e).__name__}: {e}",
-            }, indent=2, ensure_ascii=False), 0.0
+            return self._transport_error(method_id, e), 0.0
 
         if response.status_code >= 400:
             return self._provider_error(method_id, response.status_code, response.text), 0.0
@@ -265,6 +293,65 @@ class IntegrationX:
         except json.JSONDecodeError:
             return self._result(method_id, response.text), 0.0
 
+    async def _paginate(self, method_id: str, path: str, params: Dict[str, Any], max_records: Any) -> Tuple[str, float]:
+        # next_token is a cursor, pages go one after another; the token bucket spaces them out
+        try:
+            limit = max(1, min(int(max_records or AUTO_PAGINATE_DEFAULT), AUTO_PAGINATE_MAX))
+        except (TypeError, ValueError):
+            raise ValueError("max_records must be an integer.") from None
+        token_param = _PAGINATED_METHODS[method_id]
+        cursor = params.get(token_param)
+        items: List[Any] = []
+        includes: Dict[str, List[Any]] = {}
+        dollars = 0.0
+        pages = 0
+        stopped_early = ""
+        while True:
+            page_params = {**params, "max_results": str(max(10, min(100, limit - len(items))))}
+            if cursor:
+                page_params[token_param] = cursor
+            try:
+                response = await self._send("GET", path, page_params, None)
+                if response.status_code >= 400:
+                    if not items:
+                        return self._provider_error(method_id, response.status_code, response.text), dollars
+                    stopped_early = f"HTTP {response.status_code}: {response.text[:200]}"
+                    break
+                parsed = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                if not items:
+                    return self._transport_error(method_id, e), dollars
+                stopped_early = f"{type(e).__name__}: {e}"
+                break
+            pages += 1
+            dollars += self._calc_cost(method_id, parsed)
+            items.extend(parsed.get("data") or [])
+            for k, v in (parsed.get("includes") or {}).items():
+                includes.setdefault(k, []).extend(v)
+            cursor = (parsed.get("meta") or {}).get("next_token")
+            if not cursor or len(items) >= limit:
+                break
+
+        items = items[:limit]
+        prefix = ckit_mongo.spill_path_prefix(f"x/{method_id.split('.')[1]}")
+        shown, spill = await ckit_mongo.mongo_spill_list(None, prefix, items, get_collection=lambda: ckit_mongo.personal_mongo_lazy(self.rcx))
+        result: Dict[str, Any] = {
+            "data": shown,
+            "meta": {"result_count": len(items), "pages_fetched": pages},
+        }
+        if cursor:
+            result["meta"]["next_token"] = cursor
+        if stopped_early:
+            result["meta"]["stopped_early"] = stopped_early
+        if includes:
+            if spill.get("stored_at"):
+                await ckit_mongo.mongo_overwrite(await ckit_mongo.personal_mongo_lazy(self.rcx), f"{prefix}/includes.json", json.dumps(includes, ensure_ascii=False).encode("utf-8"), 7 * 86400)
+                spill["stored_at"].append(f"{prefix}/includes.json")
+            elif not spill:
+                result["includes"] = includes
+        result.update(spill)
+        return self._result(method_id, result), dollars
+
     def _build_create_tweet_body(self, args: Dict[str, Any]) -> Dict[str, Any]:
         text = str(args.get("text", "")).strip()
         if not text and not args.get("media_ids"):
@@ -366,6 +453,8 @@ class IntegrationX:
                     v = args.get(k)
                     if v not in (None, ""):
                         params[k] = str(v)
+                if args.get("auto_paginate"):
+                    return await self._paginate(method_id, "/tweets/search/recent", params, args.get("max_records"))
                 return await self._request(method_id, "GET", "/tweets/search/recent", params=params)
 
             if method_id == "x.timelines.user.v1":
@@ -377,6 +466,8 @@ class IntegrationX:
                     v = args.get(k)
                     if v not in (None, ""):
                         params[k] = self._csv(v) if k == "exclude" else str(v)
+                if args.get("auto_paginate"):
+                    return await self._paginate(method_id, f"/users/{user_id}/tweets", params, args.get("max_records"))
                 return await self._request(method_id, "GET", f"/users/{user_id}/tweets", params=params or None)
 
             if method_id == "x.timelines.reverse_chronological.v1":
@@ -388,6 +479,8 @@ class IntegrationX:
                     v = args.get(k)
                     if v not in (None, ""):
                         params[k] = str(v)
+                if args.get("auto_paginate"):
+                    return await self._paginate(method_id, f"/users/{user_id}/timelines/reverse_chronological", params, args.get("max_records"))
                 return await self._request(method_id, "GET", f"/users/{user_id}/timelines/reverse_chronological", params=params or None)
 
             if method_id == "x.likes.create.v1":
@@ -1,21 +1,75 @@
+import asyncio
+import copy
 import json
 import logging
-from typing import Any, Dict, List
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Tuple
 
 import langchain_core.exceptions
 import langchain_core.tools
 from langchain_core.utils.function_calling import convert_to_openai_tool
 
+from flexus_client_kit import ckit_blocking
+
 logger = logging.getLogger("langchain_adapter")
 
 
+# Many community toolkits only implement _run(). BaseTool.ainvoke() then pushes _run() into the loop's default
+# executor: unbounded as far as we're concerned, shared with everything else calling to_thread, no timeout, and
+# a stuck call holds a thread forever. Here sync-only tools run in a ckit_blocking pool per tool class instead,
+# under a per-tool timeout; on timeout a queued call never starts and a running one sees cancel_requested().
+
+
+LANGCHAIN_TOOL_TIMEOUT = 60.0
+TOOL_TIMEOUTS: Dict[str, float] = {}      # tool.name -> seconds, for the known slow ones
+SLOW_CALL_LOG = 10.0
+
+
+@dataclass
+class ToolMetrics:
+    calls: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    sync_only: bool = False
+    latency_total_s: float = 0.0
+    latency_max_s: float = 0.0
+
+
+_metrics: Dict[str, ToolMetrics] = {}
+_params_cache: Dict[Tuple[type, str, Any], dict] = {}
+
+
+def is_sync_only(tool: langchain_core.tools.BaseTool) -> bool:
+    # Tool and StructuredTool carry the async implementation as an attribute, other classes override _arun
+    if isinstance(tool, (langchain_core.tools.StructuredTool, langchain_core.tools.Tool)):
+        return getattr(tool, "coroutine", None) is None
+    return type(tool)._arun is langchain_core.tools.BaseTool._arun
+
+
+def _schema_key(tool: langchain_core.tools.BaseTool) -> Any:
+    schema = getattr(tool, "args_schema", None)
+    if isinstance(schema, dict):
+        return json.dumps(schema, sort_keys=True)
+    return schema
+
+
 def langchain_tool_to_cloudtool_params(tool: langchain_core.tools.BaseTool) -> dict:
-    openai_format = convert_to_openai_tool(tool)
-    return openai_format.get("function", {}).get("parameters", {
-        "type": "object",
-        "properties": {},
-        "required": []
-    })
+    # convert_to_openai_tool builds and walks a pydantic schema every time, instances of one class share the result
+    key = (type(tool), tool.name, _schema_key(tool))
+    params = _params_cache.get(key)
+    if params is None:
+        openai_format = convert_to_openai_tool(tool)
+        params = _params_cache[key] = openai_format.get("function", {}).get("parameters", {
+            "type": "object",
+            "properties": {},
+            "required": []
+        })
+    return copy.deepcopy(params)
+
+
+def metrics_snapshot() -> Dict[str, dict]:
+    return {name: asdict(m) for name, m in _metrics.items()}
 
 
 def format_tools_help(tools: List[langchain_core.tools.BaseTool]) -> str:
@@ -52,12 +106,23 @@ def format_tools_help(tools: List[langchain_core.tools.BaseTool]) -> str:
     return "\n".join(help_sections)
 
 
-async def run_langchain_tool(tool: langchain_core.tools.BaseTool, tool_input: Dict[str, Any]) -> tuple[str, bool]:
+async def run_langchain_tool(
+    tool: langchain_core.tools.BaseTool,
+    tool_input: Dict[str, Any],
+    timeout: Optional[float] = None,
+) -> tuple[str, bool]:
+    if timeout is None:
+        timeout = TOOL_TIMEOUTS.get(tool.name, LANGCHAIN_TOOL_TIMEOUT)
+    m = _metrics.get(tool.name)
+    if m is None:
+        m = _metrics[tool.name] = ToolMetrics(sync_only=is_sync_only(tool))
+    m.calls += 1
+    t0 = time.monotonic()
     try:
-        if hasattr(tool, 'ainvoke'):
-            result = await tool.ainvoke(tool_input)
+        if m.sync_only:
+            result = await asyncio.wait_for(ckit_blocking.run("langchain_" + type(tool).__name__, tool.invoke, tool_input), timeout)
         else:
-            result = tool.invoke(tool_input)
+            result = await asyncio.wait_for(tool.ainvoke(tool_input), timeout)
 
         if isinstance(result, str):
             return result, False
@@ -66,10 +131,16 @@ async def run_langchain_tool(tool: langchain_core.tools.BaseTool, tool_input: Di
         else:
             return str(result), False
 
+    except asyncio.TimeoutError:
+        m.timeouts += 1
+        logger.warning("Tool %s timed out after %.0fs", tool.name, timeout)
+        return f"❌ Error: {tool.name} did not finish in {timeout:.0f}s, try again later or with a smaller request", False
     except langchain_core.tools.ToolException as e:
+        m.errors += 1
         logger.info("Tool error %s: %s", tool.name, e)
         return f"❌ Error: {e}", False
     except Exception as e:
+        m.errors += 1
         logger.info("Tool error %s", tool.name, exc_info=True)
         error_msg = str(e).lower()
         is_auth_error = (
@@ -79,3 +150,9 @@ async def run_langchain_tool(tool: langchain_core.tools.BaseTool, tool_input: Di
             "insufficient permission" in error_msg
         )
         return f"❌ Error: {e}", is_auth_error
+    finally:
+        took = time.monotonic() - t0
+        m.latency_total_s += took
+        m.latency_max_s = max(m.latency_max_s, took)
+        if took > SLOW_CALL_LOG:
+            logger.info("Tool %s took %.1fs (%s)", tool.name, took, "sync, thread pool" if m.sync_only else "async")
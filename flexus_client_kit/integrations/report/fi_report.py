@@ -1,13 +1,16 @@
+import asyncio
+import hashlib
 import itertools
 import json
 import logging
 import re
 import fuzzy_json
+from collections import OrderedDict, defaultdict
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from zoneinfo import ZoneInfo
 
-from jinja2 import Template
+from jinja2 import BytecodeCache, Environment, FunctionLoader, Template
 from pymongo.collection import Collection
 
 from flexus_client_kit import ckit_cloudtool, ckit_mongo, ckit_ask_model
@@ -112,6 +115,62 @@ REPORT_TOOLS = [
 ]
 
 
+class _MemoryBytecodeCache(BytecodeCache):
+    def __init__(self):
+        self._bytecode: Dict[str, bytes] = {}
+
+    def load_bytecode(self, bucket) -> None:
+        if code := self._bytecode.get(bucket.key):
+            bucket.bytecode_from_string(code)
+
+    def dump_bytecode(self, bucket) -> None:
+        self._bytecode[bucket.key] = bucket.bytecode_to_string()
+
+    def forget(self, name: str) -> None:
+        self._bytecode.pop(self.get_cache_key(name), None)
+
+    def clear(self) -> None:
+        self._bytecode.clear()
+
+
+# Templates are registered by sha256 of their source, so the name changes whenever the source does,
+# and jinja's own LRU plus the bytecode cache never serve a stale template. Sources and bytecode are
+# kept for the same number of most recently used templates as jinja's LRU.
+TEMPLATE_CACHE_SIZE = 64
+_template_sources: "OrderedDict[str, str]" = OrderedDict()
+_bytecode_cache = _MemoryBytecodeCache()
+_jinja_env = Environment(
+    loader=FunctionLoader(lambda name: (_template_sources[name], None, lambda: True) if name in _template_sources else None),
+    bytecode_cache=_bytecode_cache,
+    cache_size=TEMPLATE_CACHE_SIZE,
+)
+
+
+def _get_compiled_template(template_html: str) -> Template:
+    template_hash = hashlib.sha256(template_html.encode("utf-8")).hexdigest()
+    _template_sources[template_hash] = template_html
+    _template_sources.move_to_end(template_hash)
+    while len(_template_sources) > TEMPLATE_CACHE_SIZE:
+        evicted, _ = _template_sources.popitem(last=False)
+        _bytecode_cache.forget(evicted)
+    return _jinja_env.get_template(template_hash)
+
+
+async def _ls_report_docs(mongo_collection: Collection, limit: int = 0) -> List[Dict[str, Any]]:
+    # Only report_*.json documents, with their json body (mongo_ls projects it away), newest first
+    cursor = mongo_collection.find(
+        {"path": {"$regex": r"^report_.*\.json$"}, "mon_archived": {"$ne": True}},
+        {"data": 0},
+    ).sort("mon_ctime", -1)
+    if limit:
+        cursor = cursor.limit(limit)
+    docs = []
+    async for doc in cursor:
+        doc["_id"] = str(doc["_id"])
+        docs.append(doc)
+    return docs
+
+
 def _extract_entity_from_section_name(section_name: str, report_params: Dict[str, Any]) -> Optional[str]:
     for param_name, param_value in report_params.items():
         if isinstance(param_value, list):
@@ -273,31 +332,8 @@ Description: {formatted_desc}"""
     return tasks
 
 
-async def _export_report_tool(
-        ws_timezone: str,
-        mongo_collection: Collection,
-        *,
-        report_id: str,
-) -> str:
-    report_id = _fix_unicode_corruption(report_id)
-
-    tz = ZoneInfo(ws_timezone)
-    current_time = datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S %Z")
+def _build_template_data(report_data: Dict[str, Any], sections_config: Dict[str, Any], tz: ZoneInfo) -> Dict[str, Any]:
     template_datetime = datetime.now(tz).strftime("%H:%M UTC")
-
-    try:
-        report_doc = await _get_report_doc_by_report_id(mongo_collection, ws_timezone, report_id)
-    except Exception as e:
-        return f"{e}"
-
-    if len(report_doc["json"]["todo_queue"]) > 0:
-        return (
-            f"Error: There are still {len(report_doc['json']['todo_queue'])} pending tasks in the report '{report_id}'. "
-            f"Please complete them first.")
-
-    report_data = report_doc["json"]
-    sections_config, template_html = load_report_config(report_doc["json"]["report_type"])
-
     template_data = {
         "analysis_date": datetime.now(tz).strftime("%B %d, %Y"),
         "datetime": template_datetime,
@@ -337,18 +373,15 @@ async def _export_report_tool(
             all_entities.update(str(item) for item in param_value)
 
     if all_entities:
-        template_data["entities_data"] = {}
-
-        for entity in all_entities:
-            template_data["entities_data"][entity] = {}
-
-            for section_name, section_info in template_data["sections"].items():
-                entity_from_name = _extract_entity_from_section_name(section_name, report_params)
-                if entity_from_name == entity:
-                    placeholder = section_info["placeholder"]
-                    # Handle null content - use empty string for template rendering
-                    content = section_info["content"] if section_info["content"] is not None else ""
-                    template_data["entities_data"][entity][placeholder] = content
+        template_data["entities_data"] = {entity: {} for entity in all_entities}
+        # One pass over sections instead of entities x sections
+        for section_name, section_info in template_data["sections"].items():
+            entity_from_name = _extract_entity_from_section_name(section_name, report_params)
+            if entity_from_name in template_data["entities_data"]:
+                placeholder = section_info["placeholder"]
+                # Handle null content - use empty string for template rendering
+                content = section_info["content"] if section_info["content"] is not None else ""
+                template_data["entities_data"][entity_from_name][placeholder] = content
 
     providers = set()
     for section_id, config in sections_config.items():
@@ -360,8 +393,35 @@ async def _export_report_tool(
     if providers:
         template_data["providers"] = sorted(list(providers))
 
-    jinja_template = Template(template_html)
-    template_html = jinja_template.render(**template_data)
+    return template_data
+
+
+async def _export_report_tool(
+        ws_timezone: str,
+        mongo_collection: Collection,
+        *,
+        report_id: str,
+) -> str:
+    report_id = _fix_unicode_corruption(report_id)
+
+    tz = ZoneInfo(ws_timezone)
+    current_time = datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S %Z")
+
+    try:
+        report_doc = await _get_report_doc_by_report_id(mongo_collection, ws_timezone, report_id)
+    except Exception as e:
+        return f"{e}"
+
+    if len(report_doc["json"]["todo_queue"]) > 0:
+        return (
+            f"Error: There are still {len(report_doc['json']['todo_queue'])} pending tasks in the report '{report_id}'. "
+            f"Please complete them first.")
+
+    report_data = report_doc["json"]
+    sections_config, template_html = load_report_config(report_doc["json"]["report_type"])
+    template_data = _build_template_data(report_data, sections_config, tz)
+    # Rendering 50+ sections is CPU-bound, keep it off the event loop
+    template_html = await asyncio.to_thread(_get_compiled_template(template_html).render, **template_data)
 
     report_name = f"report_{report_id}.html"
     await ckit_mongo.mongo_store_file(mongo_collection, report_name, template_html.encode('utf-8'), 30 * 86400)
@@ -393,8 +453,7 @@ async def _get_report_doc_by_report_id(mongo_collection: Collection, ws_timezone
 
     report_doc = await ckit_mongo.mongo_retrieve_file(mongo_collection, f"report_{report_id}.json")
     if not report_doc:
-        all_files = await ckit_mongo.mongo_ls(mongo_collection)
-        report_files = [f for f in all_files if f["path"].startswith("report_") and f["path"].endswith(".json")]
+        report_files = await _ls_report_docs(mongo_collection)
         if report_files:
             available_reports = []
             for f in report_files[:50]:
@@ -1055,6 +1114,17 @@ async def _cleanup_temporary_files(mongo_collection: Collection, report_id: str)
         return 0
 
 
+def _ready_tasks(
+        todo: List[Dict[str, Any]],
+        sections_config: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    # Phases are barriers: only the lowest pending phase runs, a later phase waits for all of it
+    phases = defaultdict(list)
+    for task in todo:
+        phases[sections_config.get(task["section_id"], {}).get("phase", 1)].append(task)
+    return phases[min(phases.keys())]
+
+
 async def handle_process_report_tool(
         ws_timezone: str,
         mongo_collection: Collection,
@@ -1064,8 +1134,6 @@ async def handle_process_report_tool(
         *,
         report_id: Optional[str] = None,
 ) -> str:
-    from collections import defaultdict
-
     if report_id is None:
         return "Error: No report_id provided"
 
@@ -1086,21 +1154,14 @@ async def handle_process_report_tool(
         return f"[{current_time} in {tz}]\n\nReport {report_id} is already complete."
 
     sections_config, _ = load_report_config(report_data["report_type"])
-    phases = defaultdict(list)
-    for task in todo:
-        section_base = task["section_id"]
-        phase_num = sections_config.get(section_base, {}).get("phase", 1)
-        phases[phase_num].append(task)
-
-    next_phase = min(phases.keys())
-    tasks_in_phase = phases[next_phase]
     completed_sections = report_data.get("sections", {})
+    ready_tasks = _ready_tasks(todo, sections_config)
 
     first_questions = []
     first_calls = []
     titles = []
 
-    for task in tasks_in_phase:
+    for task in ready_tasks:
         task_text = task["task"]
         if task.get("depends_on"):
             dependency_placeholder = f"\nDependencies: {', '.join(task['depends_on'])} (content will be provided when processing)"
@@ -1123,3 +1184,45 @@ async def handle_process_report_tool(
     )
 
     raise ckit_cloudtool.WaitForSubchats(subchats)
+
+
+if __name__ == "__main__":
+    import time
+
+    # Benchmark: export of a 50-section report, fresh Template() per export vs the compiled template cache
+    bench_sections = {}
+    for i in range(45):
+        bench_sections[f"s{i}"] = {"phase": 1, "description": f"section {i} for {{entity}}", "placeholder": f"s{i}", "is_meta_section": False, "iteration": "{entity}", "iterators": {"entity": "from_input"}}
+    for i in range(5):
+        bench_sections[f"summary{i}"] = {"phase": 2, "description": "summary", "placeholder": f"summary{i}", "is_meta_section": False, "depends_on": [f"s{i}"]}
+    bench_template = "<html>" + "".join(
+        f"{{% for e, d in entities_data.items() %}}<h2>{{{{ e }}}}</h2><div>{{{{ d.s{i} }}}}</div>{{% endfor %}}<p>{{{{ summary{i % 5} }}}}</p>"
+        for i in range(45)
+    ) + "</html>"
+    bench_params = {"entity": ["acme"]}
+    tz = ZoneInfo("UTC")
+    todo = _create_todo_queue("bench", bench_params, bench_sections)
+    assert len(todo) == 50
+    report_data = {"parameters": bench_params, "sections": {}}
+    for t in todo:
+        report_data["sections"][t["section_name"]] = {"content": f"<p>{t['section_name']}</p>" * 20, "cfg": t["section_config"], "section_id": t["section_id"]}
+
+    assert len(_ready_tasks(todo, bench_sections)) == 45
+    assert len(_ready_tasks(todo[1:], bench_sections)) == 44, "phase 2 waits for the whole of phase 1"
+    assert len(_ready_tasks(todo[45:], bench_sections)) == 5
+
+    N = 200
+    t0 = time.perf_counter()
+    for _ in range(N):
+        html_uncached = Template(bench_template).render(**_build_template_data(report_data, bench_sections, tz))
+    t1 = time.perf_counter()
+    for _ in range(N):
+        html_cached = _get_compiled_template(bench_template).render(**_build_template_data(report_data, bench_sections, tz))
+    t2 = time.perf_counter()
+    assert len(html_cached) == len(html_uncached)
+    print(f"50 sections, {N} exports: Template() {(t1 - t0) / N * 1000:.2f}ms/export, cached {(t2 - t1) / N * 1000:.2f}ms/export")
+
+    for i in range(TEMPLATE_CACHE_SIZE * 2):
+        assert _get_compiled_template(f"<p>{i} {{{{ x }}}}</p>").render(x="y") == f"<p>{i} y</p>"
+    assert len(_template_sources) == TEMPLATE_CACHE_SIZE and len(_bytecode_cache._bytecode) <= TEMPLATE_CACHE_SIZE
+    assert _get_compiled_template("<p>0 {{ x }}</p>").render(x="z") == "<p>0 z</p>", "evicted template compiles again"
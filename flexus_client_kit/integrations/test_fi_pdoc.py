@@ -0,0 +1,86 @@
+import asyncio
+import json
+import re
+import types
+
+import graphql
+import pytest
+
+from flexus_client_kit.integrations import fi_pdoc
+
+
+class FakeBackend:
+    def __init__(self, store):
+        self.store = store
+        self.keys = []
+
+    async def use_http_on_behalf(self, persona_id, fcall_untrusted_key):
+        backend = self
+
+        class Http:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def execute(self, doc, variable_values):
+                await asyncio.sleep(0)
+                op = re.search(r"(policydoc_\w+)\(", graphql.print_ast(doc.document)).group(1)
+                v = variable_values
+                backend.keys.append((op, fcall_untrusted_key))
+                if op == "policydoc_cat":
+                    return {op: {"pdoc_id": v["p"], "path": v["p"], "pdoc_content": json.loads(json.dumps(backend.store[v["p"]])), "pdoc_created_ts": 1.0, "pdoc_modified_ts": 1.0}}
+                doc = backend.store[v["p"]]
+                found = fi_pdoc._pdoc_md5(doc)
+                ok = not v["expected_md5"] or v["expected_md5"] == found
+                if ok:
+                    for u in v["updates"]:
+                        fi_pdoc._set_by_dot_path(doc, u["json_path"], u["text"])
+                    found = fi_pdoc._pdoc_md5(doc)
+                return {op: {"latest_text": json.dumps(doc), "md5_requested": v["expected_md5"], "md5_found": found, "changes_saved": ok, "problem_message": ""}}
+
+        return Http()
+
+
+def make_pdoc(store):
+    be = FakeBackend(store)
+    rcx = types.SimpleNamespace(fclient=be, running_test_scenario=False, persona=types.SimpleNamespace(persona_id="p1"))
+    return fi_pdoc.IntegrationPdoc(rcx, "g1"), be
+
+
+@pytest.mark.asyncio
+async def test_parallel_appends_to_one_field_conflict():
+    # boss_bot's plan_progress_add: read the field, append a line, write it back with the md5 it read
+    pdoc, be = make_pdoc({"/plan": {"plan": {"progress": {"done": "a"}, "notes": ""}}})
+
+    async def append(line, key):
+        doc = await pdoc.pdoc_cat("/plan", "p1", key)
+        prev = doc.pdoc_content["plan"]["progress"]["done"]
+        return await pdoc.pdoc_update_at_location("/plan", [{"json_path": "plan.progress.done", "text": prev + "\n" + line}], "p1", key, expected_md5=fi_pdoc._pdoc_md5(doc.pdoc_content))
+
+    r1, r2 = await asyncio.gather(append("b", "k1"), append("c", "k1"))
+    assert [r1.changes_saved, r2.changes_saved] == [True, False]
+    assert be.store["/plan"]["plan"]["progress"]["done"] == "a\nb"
+
+    # the model retries with a fresh read, and the rebase doesn't let its stale md5 through either
+    r3 = await append("c", "k1")
+    assert r3.changes_saved and be.store["/plan"]["plan"]["progress"]["done"] == "a\nb\nc"
+    q = pdoc._write_queues["/plan"]
+    assert q.effective_md5(r1.md5_requested, ["plan.progress.done"]) == r1.md5_requested
+    assert q.effective_md5(r1.md5_requested, ["plan.notes"]) == r3.md5_found
+
+
+@pytest.mark.asyncio
+async def test_disjoint_updates_merge_only_under_same_key():
+    pdoc, be = make_pdoc({"/m": {"metrics": {"ctr": "", "cpc": "", "cpa": "", "roas": ""}}})
+    md5 = fi_pdoc._pdoc_md5(be.store["/m"])
+    results = await asyncio.gather(*[
+        pdoc.pdoc_update_at_location("/m", [{"json_path": f"metrics.{k}", "text": "0.5"}], "p1", key, expected_md5=md5)
+        for k, key in [("ctr", "k1"), ("cpc", "k1"), ("cpa", "k1"), ("roas", "k2")]
+    ])
+    assert all(r.changes_saved for r in results), "later writes are rebased past the disjoint ones before them"
+    assert be.store["/m"]["metrics"] == {"ctr": "0.5", "cpc": "0.5", "cpa": "0.5", "roas": "0.5"}
+    # ctr goes alone (nothing queued yet), cpc+cpa merge, roas has another caller's key
+    assert [k for _, k in be.keys] == ["k1", "k1", "k2"]
+    assert pdoc._write_queues["/m"].merged == 1
@@ -0,0 +1,180 @@
+import contextlib
+import os
+
+import asyncpg
+import pytest
+from asyncpg.types import Attribute, Type
+
+from flexus_client_kit.integrations import fi_postgres
+
+
+def col(name, type_name, schema="pg_catalog"):
+    return Attribute(name, Type(0, type_name, "scalar", schema))
+
+
+class FakeStatement:
+    def __init__(self, conn, columns, rows, statusmsg):
+        self.conn, self.columns, self.rows, self.statusmsg = conn, columns, rows, statusmsg
+
+    def get_attributes(self):
+        return self.columns
+
+    async def fetch(self):
+        self.conn.log.append("fetch")
+        return list(self.rows)
+
+    def get_statusmsg(self):
+        return self.statusmsg
+
+    async def _cursor(self):
+        self.conn.log.append("cursor")
+        for r in self.rows:
+            yield r
+
+    def cursor(self, prefetch):
+        return self._cursor()
+
+
+class FakeConn:
+    def __init__(self, columns=(), rows=(), statusmsg="", error=None):
+        self.columns, self.rows, self.statusmsg, self.error = list(columns), list(rows), statusmsg, error
+        self.log = []
+        self.in_transaction = False
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        self.in_transaction = True
+        self.log.append("BEGIN")
+        try:
+            yield
+        finally:
+            self.in_transaction = False
+
+    async def execute(self, q):
+        self.log.append(("execute", q, self.in_transaction))
+        if self.error and not q.startswith("SET"):
+            raise self.error
+        return self.statusmsg
+
+    async def prepare(self, q):
+        self.log.append(("prepare", q))
+        if self.error:
+            raise self.error
+        return FakeStatement(self, self.columns, self.rows, self.statusmsg)
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+def make_pg(monkeypatch, conn, mongo=None):
+    pg = fi_postgres.IntegrationPostgres(mongo)
+    psql_calls = []
+
+    async def get_pool():
+        return FakePool(conn)
+
+    async def psql(query):
+        psql_calls.append(query)
+        return "from psql"
+
+    monkeypatch.setattr(pg, "_get_pool", get_pool)
+    monkeypatch.setattr(pg, "_execute_via_psql", psql)
+    return pg, psql_calls
+
+
+@pytest.mark.asyncio
+async def test_driver_select_prints_like_psql(monkeypatch):
+    conn = FakeConn([col("a", "int4"), col("b", "text"), col("c", "bool"), col("d", "timestamptz")], [
+        (1, "x,y", True, "2024-01-02 03:04:05+00"),
+        (2, None, False, None),
+        (3, 'say "hi"', None, "2024-01-02 03:04:05+00"),
+    ])
+    pg, psql_calls = make_pg(monkeypatch, conn)
+    r = await pg.execute_query("SELECT * FROM t", have_human_confirmation=False)
+    assert r == (
+        "Query executed successfully, first line is CSV headers, then 3 lines of data:\n\n"
+        'a,b,c,d\n1,"x,y",t,2024-01-02 03:04:05+00\n2,,f,\n3,"say ""hi""",,2024-01-02 03:04:05+00'
+    )
+    assert "cursor" in conn.log and not psql_calls
+    assert conn.log[1] == ("execute", "SET LOCAL statement_timeout = 60000", True)
+
+
+@pytest.mark.asyncio
+async def test_returning_keeps_command_tag(monkeypatch):
+    conn = FakeConn([col("id", "int8")], [(1,), (2,)], statusmsg="INSERT 0 2")
+    pg, _ = make_pg(monkeypatch, conn)
+    r = await pg.execute_query("INSERT INTO t (a) VALUES (1), (2) RETURNING id", have_human_confirmation=True)
+    assert r.endswith("id\n1\n2\nINSERT 0 2")
+    assert "fetch" in conn.log
+
+
+@pytest.mark.asyncio
+async def test_size_limit_message_matches_limit(monkeypatch):
+    conn = FakeConn([col("s", "text")], [("x" * 1000,)] * 200)
+    pg, _ = make_pg(monkeypatch, conn)
+    r = await pg.execute_query("SELECT s FROM t", have_human_confirmation=False)
+    assert r == fi_postgres.RESULT_TOO_BIG and "100KB" in r
+
+
+@pytest.mark.asyncio
+async def test_unprintable_types_and_sql_errors_fall_back_to_psql(monkeypatch):
+    for conn in [
+        FakeConn([col("tags", "_text")], [(["a", "b"],)]),
+        FakeConn([col("mood", "mood", schema="public")], [("happy",)]),
+        FakeConn(error=asyncpg.exceptions.PostgresSyntaxError("syntax error at or near \"SELEC\"")),
+        FakeConn(error=asyncpg.exceptions.ActiveSQLTransactionError("cannot run inside a transaction block")),
+    ]:
+        pg, psql_calls = make_pg(monkeypatch, conn)
+        assert await pg.execute_query("SELECT x FROM t", have_human_confirmation=False) == "from psql"
+        assert psql_calls == ["SELECT x FROM t"]
+        assert "fetch" not in conn.log and "cursor" not in conn.log
+
+
+@pytest.mark.asyncio
+async def test_statement_timeout_not_rerun_in_psql(monkeypatch):
+    conn = FakeConn(error=asyncpg.exceptions.QueryCanceledError("canceling statement due to statement timeout"))
+    pg, psql_calls = make_pg(monkeypatch, conn)
+    r = await pg.execute_query("SELECT pg_sleep(100)", have_human_confirmation=False)
+    assert r == "ERROR:  canceling statement due to statement timeout"
+    assert not psql_calls
+
+
+@pytest.mark.asyncio
+async def test_connection_failure_falls_back_to_psql(monkeypatch):
+    conn = FakeConn(error=ConnectionRefusedError("no server"))
+    pg, psql_calls = make_pg(monkeypatch, conn)
+    assert await pg.execute_query("SELECT 1", have_human_confirmation=False) == "from psql"
+    assert psql_calls == ["SELECT 1"]
+
+
+@pytest.mark.asyncio
+async def test_non_transactional_statements_run_outside_transaction(monkeypatch):
+    for q in ["VACUUM ANALYZE t", "create index concurrently i on t (a)", "CREATE DATABASE x", "ALTER SYSTEM SET work_mem = '64MB'", "REINDEX (VERBOSE) DATABASE x"]:
+        assert fi_postgres._needs_no_transaction(q), q
+        conn = FakeConn(statusmsg=q.split()[0].upper())
+        pg, psql_calls = make_pg(monkeypatch, conn)
+        r = await pg.execute_query(q, have_human_confirmation=True)
+        assert r == "Query executed successfully:\n\n" + q.split()[0].upper()
+        assert conn.log == [("execute", "SET statement_timeout = 60000", False), ("execute", q, False)]
+        assert not psql_calls
+    for q in ["SELECT 'VACUUM'", "CREATE INDEX i ON t (a)", "-- VACUUM\nSELECT 1", "UPDATE t SET note = 'concurrently'"]:
+        assert not fi_postgres._needs_no_transaction(q), q
+
+
+@pytest.mark.skipif(not os.environ.get("PGHOST"), reason="needs a postgres server, PGHOST/PGUSER/PGPASSWORD like psql")
+@pytest.mark.asyncio
+async def test_driver_output_equals_psql_on_real_server():
+    q = "SELECT g, g * 0.5 AS half, now()::date AS d, E'a,b' AS s, NULL AS n, g % 2 = 0 AS even, '\\x01ff'::bytea AS raw FROM generate_series(1, 5) g"
+    driver = fi_postgres.IntegrationPostgres()
+    psql = fi_postgres.IntegrationPostgres(use_driver=False)
+    try:
+        assert await driver.execute_query(q, have_human_confirmation=False) == await psql.execute_query(q, have_human_confirmation=False)
+        assert (await driver.execute_query("VACUUM", have_human_confirmation=True)).startswith("Query executed successfully")
+    finally:
+        await driver.close()
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.tools import BaseTool, StructuredTool
+from pydantic import BaseModel, Field
+
+from flexus_client_kit import ckit_blocking
+from flexus_client_kit.integrations import langchain_adapter
+
+
+def slow_lookup(query: str, seconds: float = 0.3) -> str:
+    """Look something up, slowly and synchronously, like a blocking SDK would."""
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < seconds:
+        if ckit_blocking.cancel_requested():
+            return "cancelled"
+        time.sleep(0.01)
+    return f"found {query}"
+
+
+async def fast_lookup(query: str) -> str:
+    """Look something up asynchronously."""
+    return f"found {query} fast"
+
+
+class SlowLookupInput(BaseModel):
+    query: str = Field(description="what to look up")
+    seconds: float = Field(default=0.3, description="how long it takes")
+
+
+class SlowLookupTool(BaseTool):
+    # the shape of most community toolkits: a class-level schema and only _run()
+    name: str = "slow_lookup"
+    description: str = "slow sync lookup"
+    args_schema: type[BaseModel] = SlowLookupInput
+
+    def _run(self, query: str, seconds: float = 0.3) -> str:
+        return slow_lookup(query, seconds)
+
+
+def make_slow_tool(name: str) -> BaseTool:
+    return SlowLookupTool(name=name)
+
+
+async def measure_stall(stop: asyncio.Event, out: dict) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.005)
+        out["max"] = max(out["max"], time.perf_counter() - t0 - 0.005)
+
+
+def test_sync_only_detection():
+    assert langchain_adapter.is_sync_only(make_slow_tool("slow_detect"))
+    assert langchain_adapter.is_sync_only(StructuredTool.from_function(func=slow_lookup, name="slow_fn_detect", description="sync"))
+    assert not langchain_adapter.is_sync_only(StructuredTool.from_function(coroutine=fast_lookup, name="fast_detect", description="async"))
+
+
+@pytest.mark.asyncio
+async def test_slow_sync_tool_runs_off_loop():
+    tool = make_slow_tool("slow_off_loop")
+    stop, stall = asyncio.Event(), {"max": 0.0}
+    meter = asyncio.create_task(measure_stall(stop, stall))
+    t0 = time.monotonic()
+    results = await asyncio.gather(*[langchain_adapter.run_langchain_tool(tool, {"query": f"q{i}"}) for i in range(4)])
+    took = time.monotonic() - t0
+    stop.set()
+    await meter
+    assert [r for r, _ in results] == [f"found q{i}" for i in range(4)]
+    assert took < 0.3 * 4 * 0.75, "4 calls should overlap in the pool"
+    assert stall["max"] < 0.1, "event loop was blocked for %.3fs" % stall["max"]
+    m = langchain_adapter.metrics_snapshot()["slow_off_loop"]
+    assert m["calls"] == 4 and m["sync_only"] and m["latency_max_s"] >= 0.3
+
+
+@pytest.mark.asyncio
+async def test_timeout_cancels_running_call():
+    tool = make_slow_tool("slow_timeout")
+    t0 = time.monotonic()
+    result, is_auth_error = await langchain_adapter.run_langchain_tool(tool, {"query": "x", "seconds": 5.0}, timeout=0.2)
+    assert time.monotonic() - t0 < 1.0
+    assert "did not finish" in result and not is_auth_error
+    assert langchain_adapter.metrics_snapshot()["slow_timeout"]["timeouts"] == 1
+    await asyncio.sleep(0.1)
+    pool = ckit_blocking.metrics_snapshot()["langchain_SlowLookupTool"]
+    assert pool["cancelled_running"] >= 1 and pool["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_async_tool_stays_on_loop():
+    tool = StructuredTool.from_function(coroutine=fast_lookup, name="fast_async", description="async lookup")
+    result, _ = await langchain_adapter.run_langchain_tool(tool, {"query": "y"})
+    assert result == "found y fast"
+    assert not langchain_adapter.metrics_snapshot()["fast_async"]["sync_only"]
+
+
+def test_params_cached_per_class():
+    a, b = make_slow_tool("slow_params"), make_slow_tool("slow_params")
+    p1 = langchain_adapter.langchain_tool_to_cloudtool_params(a)
+    n = len(langchain_adapter._params_cache)
+    p2 = langchain_adapter.langchain_tool_to_cloudtool_params(b)
+    assert p1 == p2 and len(langchain_adapter._params_cache) == n
+    assert set(p1["properties"]) == {"query", "seconds"}
+    p2["properties"].clear()
+    assert langchain_adapter.langchain_tool_to_cloudtool_params(a)["properties"], "callers must get a copy"
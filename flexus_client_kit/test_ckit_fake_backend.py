@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import gql
+import pytest
+
+from flexus_client_kit import ckit_client, ckit_fake_backend as fb
+
+
+def client(be: fb.FakeFlexusBackend) -> ckit_client.FlexusClient:
+    return ckit_client.FlexusClient("fake_test", api_key="fx-fake", base_url=be.base_url, skip_logger_init=True)
+
+
+@pytest.mark.asyncio
+async def test_aliased_mutation_partial_errors_and_faults():
+    be = fb.FakeFlexusBackend(faults=fb.Faults(graphql_error=0.5), seed=3)
+    await be.start()
+    try:
+        q = " ".join("h%d: bot_confirm_exists(n: %d)" % (i, i) for i in range(20))
+        out = await be.execute("mutation Beat { %s nobody_resolves_this }" % q, {}, {})
+        failed = [e["path"][0] for e in out["errors"]]
+        assert 0 < len(failed) < 20
+        assert all(out["data"][a] is None for a in failed)
+        assert sum(v is True for v in out["data"].values()) == 20 - len(failed)
+        assert be.calls["bot_confirm_exists"] == 20 and be.unknown["nobody_resolves_this"] == 1
+
+        be.faults = fb.Faults(http_429=1.0)
+        async with (await client(be).use_http_on_behalf(None, "")) as http:
+            with pytest.raises(gql.transport.exceptions.TransportServerError, match="429"):
+                await http.execute(gql.gql("mutation M { bot_confirm_exists }"))
+    finally:
+        await be.stop()
+
+
+@pytest.mark.asyncio
+async def test_cloudtool_subscription_filter_record_and_replay(tmp_path):
+    path = str(tmp_path / "stream.jsonl")
+    be = fb.FakeFlexusBackend(record_path=path)
+    await be.start()
+    got = []
+
+    async def subscriber(be, names):
+        try:
+            async with (await client(be).use_ws()) as ws:
+                async for r in ws.subscribe(gql.gql("subscription W($names: [String!]!) { cloudtool_wait_for_call(tool_names: $names) { fcall_id fcall_name } }"),
+                        variable_values={"names": names}):
+                    got.append((names[0], r["cloudtool_wait_for_call"]["fcall_id"]))
+        except gql.transport.exceptions.TransportError:
+            pass
+
+    try:
+        subs = [asyncio.create_task(subscriber(be, ["a"])), asyncio.create_task(subscriber(be, ["b"]))]
+        while len(be.subscribers[fb.CLOUDTOOL_SUBS]) < 2:
+            await asyncio.sleep(0.01)
+        for i, name in enumerate("abab"):
+            assert be.call_tool(fb.make_toolcall("c%d" % i, name, {})) == 1
+        while len(got) < 4:
+            await asyncio.sleep(0.01)
+        be.complete_all()
+        await asyncio.wait_for(asyncio.gather(*subs), 5)
+    finally:
+        await be.stop()
+    assert sorted(got) == [("a", "c0"), ("a", "c2"), ("b", "c1"), ("b", "c3")]
+
+    with open(path) as f:
+        recorded = [json.loads(x) for x in f]
+    assert [r["event"]["fcall_id"] for r in recorded] == ["c0", "c1", "c2", "c3"]
+
+    be = fb.FakeFlexusBackend()
+    await be.start()
+    got.clear()
+    try:
+        sub = asyncio.create_task(subscriber(be, ["a"]))
+        assert await be.replay(path, speed=0) == 4
+        while len(got) < 4:
+            await asyncio.sleep(0.01)
+        be.complete_all()
+        await asyncio.wait_for(sub, 5)
+    finally:
+        await be.stop()
+    assert got == [("a", "c0"), ("a", "c1"), ("a", "c2"), ("a", "c3")], "replay sends everything it recorded, no filtering"
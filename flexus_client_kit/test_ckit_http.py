@@ -0,0 +1,153 @@
+import asyncio
+import http.server
+import threading
+import time
+
+import httpx
+import pytest
+
+from flexus_client_kit import ckit_http
+
+
+def mock_client(handler, **kwargs) -> ckit_http.RateLimitedClient:
+    c = ckit_http.RateLimitedClient("http://test", **kwargs)
+    c.client = httpx.AsyncClient(base_url="http://test", transport=httpx.MockTransport(handler))
+    return c
+
+
+@pytest.mark.asyncio
+async def test_retry_after_honoured_and_bucket_paused():
+    hits = []
+
+    async def handler(request):
+        hits.append(time.monotonic())
+        if len(hits) <= 2:
+            return httpx.Response(429, headers={"Retry-After": "0.2"})
+        return httpx.Response(200, json={"ok": True})
+
+    c = mock_client(handler, rate_limit=ckit_http.RateLimit(rate=100, burst=10))
+    t0 = time.monotonic()
+    r = await c.request("GET", "/x", credential_key="tok")
+    assert r.status_code == 200 and time.monotonic() - t0 >= 0.4
+    assert c.metrics.throttled == 2 and c.metrics.retries == 2
+    assert c.buckets["tok"].paused_until > 0
+
+
+@pytest.mark.asyncio
+async def test_post_5xx_not_retried_but_429_is():
+    statuses = [503, 429, 200]
+
+    async def handler(request):
+        return httpx.Response(statuses.pop(0), headers={"Retry-After": "0"})
+
+    c = mock_client(handler)
+    assert (await c.request("POST", "/x")).status_code == 503
+    assert (await c.request("POST", "/x")).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_buckets_per_credential_and_bounded(monkeypatch):
+    async def handler(request):
+        return httpx.Response(200)
+
+    c = mock_client(handler, rate_limit=ckit_http.RateLimit(rate=20, burst=5))
+    t0 = time.monotonic()
+    await asyncio.gather(*[c.request("GET", "/x", credential_key="tok1") for _ in range(15)])
+    assert time.monotonic() - t0 >= (15 - 5) / 20 * 0.9
+    t0 = time.monotonic()
+    await asyncio.gather(*[c.request("GET", "/x", credential_key=f"other{i}") for i in range(5)])
+    assert time.monotonic() - t0 < 0.2, "fresh credentials have their own full buckets"
+
+    monkeypatch.setattr(ckit_http, "BUCKETS_MAX", 3)
+    for i in range(10):
+        await c.request("GET", "/x", credential_key=f"many{i}")
+    await c.request("GET", "/x", credential_key="many7")
+    await c.request("GET", "/x", credential_key="new")
+    assert list(c.buckets) == ["many9", "many7", "new"]
+
+
+@pytest.mark.asyncio
+async def test_breaker_lets_exactly_one_probe_through():
+    state = {"down": True, "hits": 0}
+
+    async def handler(request):
+        state["hits"] += 1
+        await asyncio.sleep(0.1)
+        return httpx.Response(500 if state["down"] else 200)
+
+    c = mock_client(handler, breaker_failures=2, breaker_reset=0.2, max_retries=0)
+    for _ in range(2):
+        assert (await c.request("GET", "/x")).status_code == 500
+    with pytest.raises(ckit_http.CircuitOpenError):
+        await c.request("GET", "/x")
+
+    await asyncio.sleep(0.25)
+    state["down"], state["hits"] = False, 0
+    results = await asyncio.gather(*[c.request("GET", "/x") for _ in range(5)], return_exceptions=True)
+    assert state["hits"] == 1
+    assert sum(isinstance(r, ckit_http.CircuitOpenError) for r in results) == 4
+    assert (await c.request("GET", "/x")).status_code == 200, "the probe succeeded, circuit closed"
+
+    # a probe that gets cancelled doesn't leave the circuit stuck half-open
+    state["down"] = True
+    for _ in range(2):
+        await c.request("GET", "/x")
+    await asyncio.sleep(0.25)
+    probe = asyncio.create_task(c.request("GET", "/x"))
+    await asyncio.sleep(0.01)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+    state["down"] = False
+    assert (await c.request("GET", "/x")).status_code == 200
+
+
+def test_client_of_a_finished_loop_is_closed():
+    closed = threading.Event()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive, so the connection stays in the pool
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def finish(self):
+            super().finish()
+            closed.set()
+
+        def log_message(self, *args):
+            pass
+
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:%d" % srv.server_address[1]
+    try:
+        async def use():
+            c = ckit_http.get_client(base)
+            assert (await c.request("GET", "/")).status_code == 200
+            return c
+
+        first = asyncio.run(use())
+        assert not closed.wait(0.2)
+        second = asyncio.run(use())
+        assert second is not first
+        assert closed.wait(2.0), "the pooled connection of the first loop's client should be shut down"
+    finally:
+        ckit_http._clients.pop(base, None)
+        srv.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_breaker_per_credential():
+    async def handler(request):
+        return httpx.Response(500 if request.headers.get("Authorization") == "bad" else 200)
+
+    c = mock_client(handler, breaker_failures=2, breaker_per_credential=True)
+    for _ in range(2):
+        await c.request("GET", "/x", credential_key="bad", headers={"Authorization": "bad"})
+    with pytest.raises(ckit_http.CircuitOpenError):
+        await c.request("GET", "/x", credential_key="bad", headers={"Authorization": "bad"})
+    assert (await c.request("GET", "/x", credential_key="good", headers={"Authorization": "good"})).status_code == 200
@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+from flexus_client_kit import ckit_integrations_db
+
+
+NAMES = ["flexus_policy_document", "google_calendar", "jira", "erp[meta, data]", "newsapi"]
+
+LOAD = """
+import json, sys
+from pathlib import Path
+from flexus_client_kit import ckit_integrations_db
+recs = ckit_integrations_db.static_integrations_load(Path("."), %r, builtin_skills=[])
+print(json.dumps({
+    "loaded": "flexus_client_kit.integrations.fi_google_calendar" in sys.modules,
+    "recs": [[r.integr_name, r.integr_provider, r.integr_scopes, r.integr_prompt, r.integr_lazy,
+              [t.openai_style_tool() for t in r.integr_tools]] for r in recs],
+}))
+""" % NAMES
+
+
+def load_in_subprocess(cache: str, eager: bool = False) -> dict:
+    env = {**os.environ, "FLEXUS_INTEGRATIONS_CACHE": cache, "FLEXUS_INTEGRATIONS_EAGER": "1" if eager else ""}
+    out = subprocess.run([sys.executable, "-c", LOAD], env=env, cwd=Path(__file__).parent.parent, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_schema_cache_skips_imports_and_matches_eager(tmp_path):
+    cache = str(tmp_path / "schema.json")
+    cold = load_in_subprocess(cache)
+    assert cold["loaded"] and os.path.exists(cache)
+    warm = load_in_subprocess(cache)
+    assert not warm["loaded"], "second start should describe tools from the cache, not by importing fi_google_calendar"
+    assert warm["recs"] == cold["recs"]
+    eager = load_in_subprocess(cache, eager=True)
+    assert [r[:4] + r[5:] for r in eager["recs"]] == [r[:4] + r[5:] for r in cold["recs"]]
+    assert [r[4] for r in cold["recs"]] == [False, False, False, False, True]
+
+
+@pytest.mark.asyncio
+async def test_generic_integration_built_on_first_call(monkeypatch):
+    monkeypatch.setattr(ckit_integrations_db, "EAGER", False)
+    handlers = {}
+    rcx = types.SimpleNamespace(
+        persona=types.SimpleNamespace(persona_id="p1"),
+        messengers=[],
+        personal_mongo=None,
+        external_auth={"notion": {"api_key": "secret_x"}},
+        fake_connected_providers=[],
+        running_test_scenario=False,
+        fclient=None,
+        on_tool_call=lambda name: (lambda f: handlers.setdefault(name, f)),
+    )
+    recs = ckit_integrations_db.static_integrations_load(Path("."), ["notion"], builtin_skills=[])
+    objs = await ckit_integrations_db.main_loop_integrations_init(recs, rcx)
+    lazy = objs["notion"]
+    assert isinstance(lazy, ckit_integrations_db._LazyIntegration) and lazy._obj is None
+    assert list(handlers) == ["notion"]
+
+    out = await handlers["notion"](None, {"op": "help"})
+    assert isinstance(out, str) and out
+    assert type(lazy._obj).__name__ == "IntegrationNotion"
+    assert await lazy.get() is lazy._obj
@@ -0,0 +1,85 @@
+import asyncio
+import io
+import json
+import logging
+
+import pytest
+
+from flexus_client_kit import ckit_logs, ckit_utils
+
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    log = logging.getLogger(name)
+    log.handlers = [handler]
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    return log
+
+
+@pytest.mark.asyncio
+async def test_json_lines_carry_task_context():
+    out = io.StringIO()
+    h = ckit_logs.make_handler(out, use_json=True, sync=False)
+    log = make_logger("test_ckit_logs_json", h)
+
+    async def persona(pid: str):
+        ckit_logs.set_log_context(persona_id=pid)
+        await asyncio.sleep(0)
+        with ckit_logs.log_context(ft_id="ft1", fcall_id="call_" + pid):
+            log.info("tool call %s", pid)
+        log.info("after %s", pid)
+
+    await asyncio.gather(persona("p1"), persona("p2"))
+    payload = {"n": 1}
+    log.info("mutated later %r", payload)
+    payload["n"] = 2
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        log.exception("failed")
+    h.close()
+    lines = [json.loads(x) for x in out.getvalue().splitlines()]
+    by_msg = {d["msg"]: d for d in lines}
+    assert by_msg["tool call p1"]["persona_id"] == "p1" and by_msg["tool call p1"]["fcall_id"] == "call_p1"
+    assert by_msg["tool call p2"]["ft_id"] == "ft1" and by_msg["tool call p2"]["persona_id"] == "p2"
+    assert "fcall_id" not in by_msg["after p1"] and by_msg["after p2"]["persona_id"] == "p2"
+    assert "mutated later {'n': 1}" in by_msg
+    assert "ValueError: boom" in by_msg["failed"]["exc"]
+    assert "persona_id" not in by_msg["failed"]
+
+
+def test_text_output_unchanged_and_sampling_counts():
+    out = io.StringIO()
+    h = ckit_logs.make_handler(out, use_json=False, sync=True)
+    log = make_logger("test_ckit_logs_text", h)
+    old_rate, old_burst = ckit_logs.SAMPLE_RATE, ckit_logs.SAMPLE_BURST
+    ckit_logs.SAMPLE_RATE, ckit_logs.SAMPLE_BURST = 0.001, 3
+    try:
+        for i in range(10):
+            log.info("line %d", i)
+        log.warning("warnings are never sampled")
+    finally:
+        ckit_logs.SAMPLE_RATE, ckit_logs.SAMPLE_BURST = old_rate, old_burst
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 4
+    assert " test_ckit_logs_text [INFO] line 0" in lines[0]
+    assert "[WARN] ⚠️  warnings are never sampled" in lines[3]
+
+
+def test_sampling_is_off_by_default():
+    assert ckit_logs.SAMPLE_RATE == 0
+    out = io.StringIO()
+    log = make_logger("test_ckit_logs_default", ckit_logs.make_handler(out, use_json=False, sync=True))
+    for i in range(ckit_logs.SAMPLE_BURST * 2):
+        log.info("line %d", i)
+    assert len(out.getvalue().splitlines()) == ckit_logs.SAMPLE_BURST * 2
+
+
+def test_throttle_is_bounded():
+    seen = []
+    for i in range(ckit_logs.SAMPLE_KEYS_MAX + 500):
+        ckit_utils.log_with_throttle(seen.append, f"distinct message {i}", interval_seconds=60)
+    ckit_utils.log_with_throttle(seen.append, "distinct message 0", interval_seconds=60)
+    ckit_utils.log_with_throttle(seen.append, f"distinct message {ckit_logs.SAMPLE_KEYS_MAX + 499}", interval_seconds=60)
+    assert len(ckit_utils._throttle.buckets) == ckit_logs.SAMPLE_KEYS_MAX
+    assert len(seen) == ckit_logs.SAMPLE_KEYS_MAX + 501, "evicted key logs again, recent one stays throttled"
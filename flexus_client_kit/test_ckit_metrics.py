@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import gql
+import pytest
+from aiohttp import web
+
+from flexus_client_kit import ckit_client, ckit_metrics, ckit_mongo
+
+
+@pytest.fixture
+def tracing(monkeypatch):
+    monkeypatch.setattr(ckit_metrics, "TRACE_ENABLED", True)
+    ckit_metrics.drain_spans()
+    yield
+    ckit_metrics.drain_spans()
+
+
+@pytest.mark.asyncio
+async def test_tool_call_trace_links_downstream_calls(tracing, tmp_path):
+    async def graphql(request):
+        body = await request.json()
+        if "Broken" in body["query"]:
+            return web.json_response({"errors": [{"message": "nope"}]})
+        return web.json_response({"data": {"ping": "pong"}})
+
+    app = web.Application()
+    app.router.add_post("/v1/graphql", graphql)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    fclient = ckit_client.FlexusClient("metrics_test", api_key="fx-test", base_url=f"http://127.0.0.1:{port}", skip_logger_init=True)
+
+    @ckit_metrics.metered(ckit_metrics.MONGO_SECONDS, "mongo")
+    async def mongo_lookup(path: str) -> str:
+        await asyncio.sleep(0)
+        return path
+
+    async def tool(fcall_id: str) -> None:
+        with ckit_metrics.tool_call("bot", "metrics_test_tool", fcall_id, "ft1"):
+            async with await fclient.use_http_on_behalf(None, "") as http:
+                await http.execute(gql.gql("query MetricsPing { ping }"))
+                with pytest.raises(gql.transport.exceptions.TransportQueryError):
+                    await http.execute(gql.gql("query MetricsBroken { ping }"))
+            await asyncio.gather(mongo_lookup("a"), mongo_lookup("b"))
+
+    try:
+        before = ckit_metrics.GRAPHQL_SECONDS.series.get(("MetricsPing", "ok"), [0] * 18)[:-1]
+        await asyncio.gather(tool("call_a"), tool("call_b"))
+        async with await fclient.use_http() as http:   # outside any tool call: metered, not traced
+            await http.execute(gql.gql("query MetricsPing { ping }"))
+    finally:
+        await runner.cleanup()
+
+    assert sum(ckit_metrics.GRAPHQL_SECONDS.series[("MetricsPing", "ok")][:-1]) - sum(before) == 3
+    assert sum(ckit_metrics.GRAPHQL_SECONDS.series[("MetricsBroken", "error")][:-1]) >= 2
+    assert sum(ckit_metrics.MONGO_SECONDS.series[("mongo_lookup", "ok")][:-1]) >= 4
+
+    spans = list(ckit_metrics.finished_spans)
+    assert len(spans) == 2 * 5
+    roots = {s.attrs["fcall_id"]: s for s in spans if not s.parent_id}
+    assert set(roots) == {"call_a", "call_b"}
+    for fcall_id, root in roots.items():
+        assert root.trace_id == ckit_metrics.trace_id_for(fcall_id)
+        children = sorted(s.name for s in spans if s.parent_id == root.span_id)
+        assert children == ["graphql MetricsBroken", "graphql MetricsPing", "mongo.mongo_lookup", "mongo.mongo_lookup"]
+        assert all(s.trace_id == root.trace_id for s in spans if s.parent_id == root.span_id)
+    assert "nope" in [s.error for s in spans if s.name == "graphql MetricsBroken"][0]
+
+    path = tmp_path / "spans.jsonl"
+    assert ckit_metrics.write_spans(str(path), "metrics_test") == 10
+    req = json.loads(path.read_text().splitlines()[0])
+    otlp_spans = req["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(otlp_spans) == 10 and all(len(s["traceId"]) == 32 and len(s["spanId"]) == 16 for s in otlp_spans)
+    assert not ckit_metrics.finished_spans
+
+
+@pytest.mark.asyncio
+async def test_nested_mongo_helpers_metered_once(tracing):
+    class FakeCollection:
+        async def find_one(self, query, projection=None):
+            return None
+
+        async def insert_one(self, doc):
+            return type("InsertResult", (), {"inserted_id": "id1"})()
+
+    def observations(op):
+        return sum(ckit_metrics.MONGO_SECONDS.series.get((op, "ok"), [0] * 18)[:-1])
+
+    before = {op: observations(op) for op in ("mongo_overwrite", "mongo_store_file", "mongo_spill_list")}
+    with ckit_metrics.tool_call("bot", "metrics_test_tool", "call_m", "ft1"):
+        await ckit_mongo.mongo_overwrite(FakeCollection(), "a.json", b"{}")
+        await ckit_mongo.mongo_spill_list(FakeCollection(), "spill", ["x" * 100] * 300)
+    assert observations("mongo_overwrite") - before["mongo_overwrite"] == 1
+    assert observations("mongo_store_file") == before["mongo_store_file"]
+    assert observations("mongo_spill_list") - before["mongo_spill_list"] == 1
+    assert sorted(s.name for s in ckit_metrics.finished_spans if s.parent_id) == ["mongo.mongo_overwrite", "mongo.mongo_spill_list"]
+
+
+def test_prometheus_text(monkeypatch):
+    h = ckit_metrics.histogram("test_latency_seconds", "test", ("op",), buckets=(0.1, 1.0))
+    for v in [0.05, 0.1, 0.5, 5.0]:
+        h.observe(v, 'we"ird\\op')
+    c = ckit_metrics.counter("test_things_total", "test", ("kind",))
+    monkeypatch.setattr(ckit_metrics, "SERIES_MAX", 3)
+    for i in range(10):
+        c.inc("k%d" % i)
+    assert ckit_metrics.counter("test_things_total", "test", ("kind",)) is c
+    text = ckit_metrics.render_prometheus()
+    assert 'test_latency_seconds_bucket{op="we\\"ird\\\\op",le="0.1"} 2' in text
+    assert 'test_latency_seconds_bucket{op="we\\"ird\\\\op",le="1.0"} 3' in text
+    assert 'test_latency_seconds_bucket{op="we\\"ird\\\\op",le="+Inf"} 4' in text
+    assert 'test_latency_seconds_count{op="we\\"ird\\\\op"} 4' in text
+    assert 'test_things_total{kind="other"} 7' in text
+    assert "flexus_logs_written" in text, "ckit_logs is loaded, its snapshot should be exported"
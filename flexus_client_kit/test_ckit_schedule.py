@@ -0,0 +1,128 @@
+import random
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from flexus_client_kit import ckit_schedule
+
+
+# Randomized properties against the day-by-day / month-by-month stepping that ckit_schedule used before the engine.
+# The reference is kept here verbatim (minus the unreachable branch), including its habit of comparing wall clocks.
+
+
+def reference_next_run(sched_when: str, last_run_ts: float, ws_timezone: str, random_seed: str) -> float:
+    tz = ZoneInfo(ws_timezone)
+    kind, *p = ckit_schedule.parse_sched_when(sched_when)
+    if kind == "EVERY":
+        period = p[0]
+        raw = 0
+        for ch in random_seed:
+            raw = (raw * 131 + ord(ch)) & 0xFFFFFFFF
+        shift = (raw / 2**32) * period
+        delta = (period - (last_run_ts - shift) % period) % period
+        if delta == 0:
+            delta = period
+        return last_run_ts + delta
+    elif kind == "WEEKDAYS":
+        last_dt = datetime.fromtimestamp(last_run_ts, tz=tz)
+        days, h, m = p
+        day = last_dt.date()
+        while True:
+            candidate = datetime.combine(day, datetime.min.time(), tz).replace(hour=h, minute=m)
+            if candidate > last_dt and candidate.weekday() in days:
+                return candidate.timestamp()
+            day += timedelta(days=1)
+    else:
+        last_dt = datetime.fromtimestamp(last_run_ts, tz=tz)
+        day_num, h, m = p
+        y, mo = last_dt.year, last_dt.month
+        while True:
+            if day_num == -1:
+                nm = datetime(y, mo, 28, tzinfo=tz) + timedelta(days=4)
+                d = (nm - timedelta(days=nm.day)).day
+            else:
+                d = day_num
+            try:
+                candidate = datetime(y, mo, d, h, m, tzinfo=tz)
+            except ValueError:
+                candidate = None
+            if candidate and candidate > last_dt:
+                return candidate.timestamp()
+            if mo == 12:
+                y, mo = y + 1, 1
+            else:
+                mo += 1
+
+
+ZONES = ["UTC", "Europe/Berlin", "America/New_York", "America/Sao_Paulo", "Australia/Lord_Howe", "Asia/Kolkata", "Pacific/Chatham"]
+DAYS = "MO TU WE TH FR SA SU".split()
+
+
+def random_sched_when(rnd: random.Random) -> str:
+    kind = rnd.choice(["EVERY", "WEEKDAYS", "MONTHDAY"])
+    # 01:30 and 02:30 fall into DST gaps and repeated hours in several of the zones above
+    hm = "%02d:%02d" % rnd.choice([(rnd.randrange(24), rnd.randrange(60)), (1, 30), (2, 30), (0, 0), (23, 59)])
+    if kind == "EVERY":
+        return "EVERY:%d%s" % (rnd.randint(1, 48), rnd.choice("mh"))
+    if kind == "WEEKDAYS":
+        return "WEEKDAYS:%s/%s" % (":".join(rnd.sample(DAYS, rnd.randint(1, 7))), hm)
+    return "MONTHDAY:%d/%s" % (rnd.choice([-1, 1, 15, 28, 29, 30, 31, rnd.randint(1, 31)]), hm)
+
+
+def random_last_run(rnd: random.Random, tz: ZoneInfo) -> float:
+    if rnd.random() < 0.5:
+        return rnd.uniform(datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp(), datetime(2030, 1, 1, tzinfo=timezone.utc).timestamp())
+    # right around a DST transition, if the zone has one in the next 45 days
+    t = datetime(rnd.randint(2021, 2029), rnd.choice([3, 4, 9, 10, 11]), 1, tzinfo=timezone.utc).timestamp()
+    prev = datetime.fromtimestamp(t, tz).utcoffset()
+    for _ in range(45 * 8):
+        t += 3 * 3600
+        if datetime.fromtimestamp(t, tz).utcoffset() != prev:
+            break
+    return t + rnd.uniform(-4 * 3600, 2 * 3600)
+
+
+def test_matches_reference_randomized():
+    rnd = random.Random(20261018)
+    differ = 0
+    for _ in range(10000):
+        sched_when = random_sched_when(rnd)
+        zone = rnd.choice(ZONES)
+        last = random_last_run(rnd, ZoneInfo(zone))
+        seed = rnd.choice(["", "persona1", "x" * rnd.randint(1, 20)])
+        got = ckit_schedule.calculate_next_run(sched_when, last, zone, seed)
+        want = reference_next_run(sched_when, last, zone, seed)
+        assert got > last, (sched_when, zone, last, got)
+        if want > last:
+            assert got == want, (sched_when, zone, last, got, want)
+        else:
+            differ += 1   # the reference went back in time inside a repeated hour
+    assert differ < 100
+
+
+def test_fall_back_hour_moves_forward():
+    # 2026-11-01 01:30 happens twice in New York, a run during the second pass must not be followed by the first
+    tz = ZoneInfo("America/New_York")
+    second_pass = datetime(2026, 11, 1, 1, 40, tzinfo=tz, fold=1).timestamp()
+    got = ckit_schedule.calculate_next_run("WEEKDAYS:SU:MO/01:50", second_pass, "America/New_York", "")
+    assert reference_next_run("WEEKDAYS:SU:MO/01:50", second_pass, "America/New_York", "") < second_pass
+    assert got > second_pass
+    assert datetime.fromtimestamp(got, tz).replace(tzinfo=None) == datetime(2026, 11, 2, 1, 50)
+
+
+def test_monthday_that_never_happens_is_rejected():
+    for bad in ["MONTHDAY:32/10:00", "MONTHDAY:0/10:00", "MONTHDAY:-2/10:00", "WEEKDAYS:MO/25:00"]:
+        with pytest.raises(ValueError):
+            ckit_schedule.calculate_next_run(bad, 1.7e9, "UTC", "")
+    assert ckit_schedule.calculate_next_runs([("MONTHDAY:32/10:00", 1.7e9, "UTC", ""), ("EVERY:1h", 3600.0 * 5 + 1, "UTC", "")]) == [ckit_schedule.NEVER, 3600.0 * 6]
+
+
+def test_monthday_31_skips_short_months():
+    tz = ZoneInfo("Europe/Berlin")
+    t = datetime(2026, 1, 31, 12, 0, tzinfo=tz).timestamp()
+    seen = []
+    for _ in range(7):
+        t = ckit_schedule.calculate_next_run("MONTHDAY:31/12:00", t, "Europe/Berlin", "")
+        seen.append(datetime.fromtimestamp(t, tz).month)
+    assert seen == [3, 5, 7, 8, 10, 12, 1]
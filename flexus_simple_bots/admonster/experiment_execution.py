@@ -1,10 +1,12 @@
+import asyncio
 import json
 import logging
 import time
 from dataclasses import dataclass, field
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from flexus_client_kit import ckit_cloudtool
+from flexus_client_kit import ckit_http
 
 from flexus_client_kit import ckit_ask_model
 from flexus_client_kit import ckit_client
@@ -17,6 +19,12 @@ from flexus_client_kit.integrations.facebook import adsets as fb_adsets
 
 logger = logging.getLogger("experiment_execution")
 
+MONITOR_CONCURRENCY = 8            # experiments checked at the same time
+MONITOR_TICK_BUDGET_S = 300.0      # an hourly tick gives up on whatever is still fetching after this
+INSIGHTS_COALESCE_S = 0.05         # collect insights requests from concurrent experiments into one Graph call
+# Marketing API throttles per ad account, keep monitoring well below what interactive tool calls need
+AD_ACCOUNT_RATE_LIMIT = ckit_http.RateLimit(rate=2.0, burst=10.0)
+
 
 LAUNCH_EXPERIMENT_TOOL = ckit_cloudtool.CloudTool(
     strict=False,
@@ -61,6 +69,60 @@ class ExperimentTracking:
     start_ts: float
     facebook_campaign_ids: List[str] = field(default_factory=list)
     facebook_adset_ids: List[str] = field(default_factory=list)
+    last_check_ts: float = 0.0
+
+
+class _InsightsBatcher:
+    """
+    Experiments are checked concurrently, each asks for its campaigns' insights; requests arriving within
+    INSIGHTS_COALESCE_S for the same ad account and day window go out as one get_insights_multi() call.
+    """
+    def __init__(self, experiment_execution: "IntegrationExperimentExecution"):
+        self.ee = experiment_execution
+        self.pending: Dict[Tuple[str, int], Dict[str, asyncio.Future]] = {}
+        self.flushers: List[asyncio.Task] = []
+
+    async def get(self, ad_account_id: str, campaign_id: str, days: int) -> str:
+        key = (ad_account_id, days)
+        group = self.pending.setdefault(key, {})
+        fut = group.get(campaign_id)
+        if fut is None:
+            fut = group[campaign_id] = asyncio.get_running_loop().create_future()
+            if len(group) == 1:
+                self.flushers.append(asyncio.create_task(self._flush_later(key)))
+            elif len(group) >= fb_campaigns.INSIGHTS_MULTI_MAX_IDS:
+                self.flushers.append(asyncio.create_task(self._flush(key)))
+        return await asyncio.shield(fut)   # one waiter hitting the deadline must not cancel the shared request
+
+    async def _flush_later(self, key: Tuple[str, int]) -> None:
+        await asyncio.sleep(INSIGHTS_COALESCE_S)
+        await self._flush(key)
+
+    async def _flush(self, key: Tuple[str, int]) -> None:
+        group = self.pending.pop(key, None)
+        if not group:
+            return
+        ad_account_id, days = key
+        try:
+            await self.ee._account_bucket(ad_account_id).acquire()
+            results = await fb_campaigns.get_insights_multi(self.ee.facebook_integration.client, list(group.keys()), days=days)
+        except Exception as e:
+            for fut in group.values():
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for campaign_id, fut in group.items():
+            if not fut.done():
+                fut.set_result(results.get(campaign_id, f"No insights data found for campaign {campaign_id}"))
+
+    async def close(self) -> None:
+        for t in self.flushers:
+            t.cancel()
+        await asyncio.gather(*self.flushers, return_exceptions=True)
+        for group in self.pending.values():
+            for fut in group.values():
+                fut.cancel()
+        self.pending.clear()
 
 
 class IntegrationExperimentExecution:
@@ -82,6 +144,13 @@ class IntegrationExperimentExecution:
         self.facebook_integration = facebook_integration
         # experiment_id -> ExperimentTracking
         self.tracked_experiments: Dict[str, ExperimentTracking] = {}
+        self._account_buckets: Dict[str, ckit_http.TokenBucket] = {}
+
+    def _account_bucket(self, ad_account_id: str) -> ckit_http.TokenBucket:
+        b = self._account_buckets.get(ad_account_id)
+        if b is None:
+            b = self._account_buckets[ad_account_id] = ckit_http.TokenBucket(AD_ACCOUNT_RATE_LIMIT)
+        return b
 
     def track_experiment_task(self, task: ckit_kanban.FPersonaKanbanTaskOutput) -> None:
         """
@@ -128,7 +197,7 @@ class IntegrationExperimentExecution:
             return "ERROR: Facebook integration not available."
         # Read ad_account_id from policy document
         try:
-            config_doc = await self.pdoc_integration.pdoc_cat("/company/ad-ops-config", persona_id=self.pdoc_integration.rcx.persona.persona_id, fcall_untrusted_key=toolcall.fcall_untrusted_key)
+            config_doc = await self.pdoc_integration.pdoc_cat("/company/ad-ops-config", persona_id=self.pdoc_integration.rcx.persona.persona_id, fcall_untrusted_key=toolcall.fcall_untrusted_key, max_age=None)
             ad_account_id = config_doc.pdoc_content.get("facebook_ad_account_id", "")
         except Exception as e:
             return f"ERROR: Could not read /company/ad-ops-config: {e}"
@@ -139,7 +208,7 @@ class IntegrationExperimentExecution:
         # 1. Read tactics-campaigns document (new format: 4 separate docs)
         tactics_path = f"/gtm/discovery/{experiment_id}/tactics-campaigns"
         try:
-            tactics_doc = await self.pdoc_integration.pdoc_cat(tactics_path, persona_id=self.pdoc_integration.rcx.persona.persona_id, fcall_untrusted_key=toolcall.fcall_untrusted_key)
+            tactics_doc = await self.pdoc_integration.pdoc_cat(tactics_path, persona_id=self.pdoc_integration.rcx.persona.persona_id, fcall_untrusted_key=toolcall.fcall_untrusted_key, max_age=None)
             tactics_raw = tactics_doc.pdoc_content
             # Extract from wrapper: {"tactics_campaigns": {"meta": {...}, "campaigns": [...]}}
             tactics = tactics_raw.get("tactics_campaigns", tactics_raw) if isinstance(tactics_raw, dict) else {}
@@ -239,6 +308,7 @@ class IntegrationExperimentExecution:
                 "microfrontend": "admonster",
             },
             "experiment_status": "active" if activate_immediately else "paused",
+            "ad_account_id": ad_account_id,
             "start_ts": time.time(),
             "current_day": 0,
             "campaigns": {c["local_id"]: c for c in created_campaigns},
@@ -261,15 +331,22 @@ class IntegrationExperimentExecution:
         # 6. Update task details with experiment tracking info
         if toolcall.fcall_ft_id:
             try:
-                tasks = await ckit_kanban.get_tasks_by_thread(await self.fclient.use_http_on_behalf(self.pdoc_integration.rcx.persona.persona_id, toolcall.fcall_untrusted_key), toolcall.fcall_ft_id)
+                http = await self.fclient.use_http_on_behalf(self.pdoc_integration.rcx.persona.persona_id, toolcall.fcall_untrusted_key)
+                tasks = await ckit_kanban.get_tasks_by_thread(http, toolcall.fcall_ft_id)
+                updates = {}
                 for task in tasks:
                     task_details = task.ktask_details if isinstance(task.ktask_details, dict) else json.loads(task.ktask_details or "{}")
                     task_details["experiment_id"] = experiment_id
                     task_details["start_ts"] = runtime_inner["start_ts"]
                     task_details["facebook_campaign_ids"] = [c["facebook_id"] for c in created_campaigns]
                     task_details["facebook_adset_ids"] = [a["facebook_id"] for a in created_adsets]
-                    await ckit_kanban.bot_kanban_update_details(await self.fclient.use_http_on_behalf(self.pdoc_integration.rcx.persona.persona_id, toolcall.fcall_untrusted_key), task.ktask_id, task_details)
-                    logger.info(f"Updated task {task.ktask_id} with experiment {experiment_id}")
+                    updates[task.ktask_id] = task_details
+                if updates:
+                    for ktask_id, r in (await ckit_kanban.bot_kanban_update_details_many(http, updates)).items():
+                        if r.ok:
+                            logger.info(f"Updated task {ktask_id} with experiment {experiment_id}")
+                        else:
+                            logger.warning(f"Failed to update task {ktask_id}: {r.error}")
             except Exception as e:
                 logger.warning(f"Failed to update task details: {e}")
 
@@ -294,89 +371,119 @@ class IntegrationExperimentExecution:
             result += 'facebook(op="update_campaign", args={"campaign_id": "...", "status": "ACTIVE"})'
         return result
 
-    async def update_active_experiments(self) -> None:
+    async def update_active_experiments(self, budget_s: float = MONITOR_TICK_BUDGET_S) -> None:
         """
         Called hourly from main loop.
-        For each tracked experiment:
-        - Fetches metrics from Facebook
+        For each tracked experiment, up to MONITOR_CONCURRENCY at a time:
+        - Fetches metrics from Facebook (insights for all campaigns batched across experiments)
         - Applies stop/accelerate rules from metrics doc
         - Executes actions (pause/unpause/budget changes)
         - Updates runtime doc and notifies user
+        Fetching is bounded by budget_s, experiments not fetched in time are skipped until the next tick and
+        go first then (least recently checked first), so a slow ad account can't delay the whole schedule.
         """
         if not self.tracked_experiments:
             return
         if not self.facebook_integration:
             logger.warning("Cannot update experiments: Facebook integration not configured")
             return
-        for experiment_id, tracking in list(self.tracked_experiments.items()):
-            try:
-                await self._check_single_experiment(experiment_id, tracking)
-            except Exception as e:
-                logger.error(f"Error checking experiment {experiment_id}: {e}", exc_info=e)
+        deadline = time.monotonic() + budget_s
+        sem = asyncio.Semaphore(MONITOR_CONCURRENCY)
+        batcher = _InsightsBatcher(self)
+        skipped = []
+        failed = []
+
+        async def one(experiment_id: str, tracking: ExperimentTracking) -> None:
+            async with sem:
+                if time.monotonic() >= deadline:
+                    skipped.append(experiment_id)
+                    return
+                try:
+                    if await self._check_single_experiment(experiment_id, tracking, batcher, deadline):
+                        tracking.last_check_ts = time.time()
+                    else:
+                        skipped.append(experiment_id)
+                except Exception as e:
+                    # last_check_ts stays as it was, so it goes first on the next tick
+                    failed.append(experiment_id)
+                    logger.error(f"Error checking experiment {experiment_id}: {e}", exc_info=e)
+
+        todo = sorted(self.tracked_experiments.items(), key=lambda kv: kv[1].last_check_ts)
+        t0 = time.monotonic()
+        try:
+            await asyncio.gather(*[one(experiment_id, tracking) for experiment_id, tracking in todo])
+        finally:
+            await batcher.close()
+        logger.info("Checked %d experiments in %.1fs, %d skipped for the deadline: %s, %d failed: %s", len(todo) - len(skipped) - len(failed), time.monotonic() - t0, len(skipped), skipped[:10], len(failed), failed[:10])
+
+    async def _load_doc_content(self, path: str, max_age: Optional[float] = None) -> Any:
+        pid = self.pdoc_integration.rcx.persona.persona_id
+        doc = await self.pdoc_integration.pdoc_cat(path, persona_id=pid, fcall_untrusted_key="", max_age=max_age)
+        return doc.pdoc_content
 
-    async def _check_single_experiment(self, experiment_id: str, tracking: ExperimentTracking) -> None:
-        """Check and optimize a single experiment."""
+    async def _check_single_experiment(
+        self,
+        experiment_id: str,
+        tracking: ExperimentTracking,
+        batcher: _InsightsBatcher,
+        deadline: float,
+    ) -> bool:
+        """Check and optimize a single experiment. Returns False if fetching didn't finish before the deadline, raises if the runtime doc can't be loaded."""
         pid = self.pdoc_integration.rcx.persona.persona_id
 
-        # 1. Load runtime doc (wrapped in meta-runtime key)
+        # 1-3. Load runtime doc (wrapped in meta-runtime key), metrics doc (for rules) and tactics-tracking doc (for iteration_guide)
         runtime_path = f"/gtm/discovery/{experiment_id}/meta-runtime"
         try:
-            runtime_doc = await self.pdoc_integration.pdoc_cat(runtime_path, persona_id=pid, fcall_untrusted_key="")
-            raw_content = runtime_doc.pdoc_content
-            # Extract inner runtime from meta-runtime wrapper
-            runtime = raw_content.get("meta_runtime", raw_content) if isinstance(raw_content, dict) else {}
-        except Exception as e:
-            logger.warning(f"Could not load runtime for {experiment_id}: {e}")
-            return
+            raw_content, metrics, tactics_raw = await asyncio.wait_for(asyncio.gather(
+                self._load_doc_content(runtime_path, max_age=0),   # read, modified and overwritten below, never from the cache
+                self._load_doc_content(f"/gtm/discovery/{experiment_id}/metrics"),
+                self._load_doc_content(f"/gtm/discovery/{experiment_id}/tactics-tracking"),
+                return_exceptions=True,
+            ), timeout=max(deadline - time.monotonic(), 0.0))
+        except asyncio.TimeoutError:
+            logger.warning(f"Deadline reached loading docs for {experiment_id}, will retry next tick")
+            return False
+        if isinstance(raw_content, BaseException):
+            raise RuntimeError(f"Could not load runtime for {experiment_id}: {raw_content}") from raw_content
+        # Extract inner runtime from meta-runtime wrapper
+        runtime = raw_content.get("meta_runtime", raw_content) if isinstance(raw_content, dict) else {}
         if not runtime or runtime.get("experiment_status") == "completed":
-            return
-
-        # 2. Load metrics doc (for rules)
-        metrics_path = f"/gtm/discovery/{experiment_id}/metrics"
-        metrics = None
-        try:
-            metrics_doc = await self.pdoc_integration.pdoc_cat(metrics_path, persona_id=pid, fcall_untrusted_key="")
-            metrics = metrics_doc.pdoc_content
-        except Exception:
-            pass
-
-        # 3. Load tactics-tracking doc (for iteration_guide)
-        tactics_tracking_path = f"/gtm/discovery/{experiment_id}/tactics-tracking"
+            return True
+        if isinstance(metrics, BaseException):
+            metrics = None
         tactics_tracking = None
-        try:
-            tactics_doc = await self.pdoc_integration.pdoc_cat(tactics_tracking_path, persona_id=pid, fcall_untrusted_key="")
-            tactics_raw = tactics_doc.pdoc_content
+        if not isinstance(tactics_raw, BaseException):
             # Extract from wrapper: {"tactics_tracking": {"meta": {...}, "iteration_guide": {...}}}
             tactics_tracking = tactics_raw.get("tactics_tracking", tactics_raw) if isinstance(tactics_raw, dict) else {}
-        except Exception:
-            pass
 
         # 4. Calculate current day
         start_ts = runtime.get("start_ts", time.time())
         current_day = int((time.time() - start_ts) / 86400) + 1
         runtime["current_day"] = current_day
 
-        # 5. Fetch insights for each campaign
+        # 5. Fetch insights for all campaigns at once, the batcher merges them with other experiments' campaigns
+        ad_account_id = runtime.get("ad_account_id") or self.facebook_integration.client.ad_account_id
+        campaigns = runtime.get("campaigns", {})
+        with_fb_id = [(local_id, camp_info) for local_id, camp_info in campaigns.items() if camp_info.get("facebook_id")]
+        try:
+            insights_results = await asyncio.wait_for(asyncio.gather(
+                *[batcher.get(ad_account_id, camp_info["facebook_id"], current_day) for _, camp_info in with_fb_id],
+                return_exceptions=True,
+            ), timeout=max(deadline - time.monotonic(), 0.0))
+        except asyncio.TimeoutError:
+            logger.warning(f"Deadline reached fetching insights for {experiment_id} (ad account {ad_account_id}), will retry next tick")
+            return False
+
         actions_taken = []
         metrics_summary = {}
-        campaigns = runtime.get("campaigns", {})
-        for local_id, camp_info in campaigns.items():
-            fb_id = camp_info.get("facebook_id")
-            if not fb_id:
-                continue
-            # Get insights from Facebook
-            try:
-                insights_result = await fb_campaigns.get_insights(
-                    self.facebook_integration.client,
-                    fb_id,
-                    days=current_day,
-                )
-                camp_metrics = self._parse_insights(insights_result)
-                metrics_summary[local_id] = camp_metrics
-                camp_info["latest_metrics"] = camp_metrics
-            except Exception as e:
-                logger.warning(f"Could not get insights for campaign {fb_id}: {e}")
+        for (local_id, camp_info), insights_result in zip(with_fb_id, insights_results):
+            fb_id = camp_info["facebook_id"]
+            if isinstance(insights_result, BaseException):
+                logger.warning(f"Could not get insights for campaign {fb_id}: {insights_result}")
                 continue
+            camp_metrics = self._parse_insights(insights_result)
+            metrics_summary[local_id] = camp_metrics
+            camp_info["latest_metrics"] = camp_metrics
 
             # 6. Apply rules
             if metrics:
@@ -386,6 +493,7 @@ class IntegrationExperimentExecution:
                     metrics.get("stop_rules", []),
                     metrics.get("accelerate_rules", []),
                     current_day,
+                    ad_account_id,
                 )
                 actions_taken.extend(rule_actions)
 
@@ -427,6 +535,7 @@ class IntegrationExperimentExecution:
         # 9. Notify user in thread
         if tracking.thread_id and (actions_taken or current_day % 7 == 0):
             await self._notify_user(tracking, current_day, metrics_summary, actions_taken)
+        return True
 
     async def _apply_rules(
         self,
@@ -435,6 +544,7 @@ class IntegrationExperimentExecution:
         stop_rules: List[Dict[str, Any]],
         accelerate_rules: List[Dict[str, Any]],
         current_day: int,
+        ad_account_id: str = "",
     ) -> List[Dict[str, Any]]:
         """Apply stop and accelerate rules, execute actions, return list of actions taken."""
         actions = []
@@ -467,6 +577,7 @@ class IntegrationExperimentExecution:
                 # Execute pause action
                 if "pause" in action_name.lower() and camp_info.get("status") != "PAUSED":
                     try:
+                        await self._account_bucket(ad_account_id).acquire()
                         await fb_campaigns.update_campaign(
                             self.facebook_integration.client,
                             fb_campaign_id,
@@ -506,6 +617,7 @@ class IntegrationExperimentExecution:
                 if current_budget > 0:
                     new_budget = current_budget * 2
                     try:
+                        await self._account_bucket(ad_account_id).acquire()
                         await fb_campaigns.update_campaign(
                             self.facebook_integration.client,
                             fb_campaign_id,
@@ -1,16 +1,23 @@
+import asyncio
 import json
 import logging
 import time
 import aiohttp
 import random
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from flexus_client_kit import ckit_cloudtool
+from flexus_simple_bots.productman.integrations import survey_response_store
 
 
 logger = logging.getLogger("survey_research")
 
+SURVEYMONKEY_API = "https://api.surveymonkey.com/v3"
+SM_PAGE_SIZE = 100               # bulk endpoint maximum
+SM_POLL_CONCURRENCY = 4          # SurveyMonkey allows 120 requests/minute per token
+RESPONSES_SHOWN = 10             # full text for the latest few, the rest is summarized per question
+
 SURVEY_RESEARCH_TOOL = ckit_cloudtool.CloudTool(
     strict=False,
     name="survey",
@@ -95,7 +102,7 @@ For single_choice/multiple_choice: include "choices": ["option1", "option2", ...
 
 
 class IntegrationSurveyResearch:
-    def __init__(self, surveymonkey_token: str, prolific_token: str, pdoc_integration, fclient):
+    def __init__(self, surveymonkey_token: str, prolific_token: str, pdoc_integration, fclient, personal_mongo=None, surveymonkey_api: str = SURVEYMONKEY_API):
         if not surveymonkey_token or not prolific_token:
             from flexus_simple_bots.productman.integrations import survey_research_mock
             global aiohttp
@@ -107,6 +114,9 @@ class IntegrationSurveyResearch:
         self.pdoc_integration = pdoc_integration
         self.fclient = fclient
         self.tracked_surveys = {}
+        self.sm_api = surveymonkey_api
+        self.response_store = survey_response_store.SurveyResponseStore(personal_mongo)
+        self._session = None
 
         filters_file = os.path.join(os.path.dirname(__file__), 'prolific_filters.json')
         with open(filters_file, 'r') as f:
@@ -126,21 +136,29 @@ class IntegrationSurveyResearch:
             "Content-Type": "application/json",
         }
 
+    def _http(self):
+        # one pooled session for the integration, keeps TLS connections to SurveyMonkey and Prolific alive
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
     async def _make_request(self, method: str, url: str, headers: dict, json_data=None, params=None):
-        async with aiohttp.ClientSession() as session:
-            async with session.request(
-                    method=method,
-                    url=url,
-                    headers=headers,
-                    json=json_data,
-                    params=params,
-                    timeout=aiohttp.ClientTimeout(total=30),
-            ) as resp:
-                if resp.status >= 400:
-                    error_text = await resp.text()
-                    logger.warning(f"API error {method} {url}: {resp.status} - {error_text}")
-                    resp.raise_for_status()
-                return await resp.json()
+        async with self._http().request(
+                method=method,
+                url=url,
+                headers=headers,
+                json=json_data,
+                params=params,
+        ) as resp:
+            if resp.status >= 400:
+                error_text = await resp.text()
+                logger.warning(f"API error {method} {url}: {resp.status} - {error_text}")
+                resp.raise_for_status()
+            return await resp.json()
 
     async def handle_survey_research(self, toolcall: ckit_cloudtool.FCloudtoolCall, model_produced_args: Dict[str, Any]) -> str:
         if not model_produced_args:
@@ -558,8 +576,10 @@ class IntegrationSurveyResearch:
                 from flexus_client_kit import ckit_kanban
 
                 try:
-                    tasks = await ckit_kanban.get_tasks_by_thread(await self.fclient.use_http_on_behalf(self.pdoc_integration.rcx.persona.persona_id, toolcall.fcall_untrusted_key), toolcall.fcall_ft_id)
+                    http = await self.fclient.use_http_on_behalf(self.pdoc_integration.rcx.persona.persona_id, toolcall.fcall_untrusted_key)
+                    tasks = await ckit_kanban.get_tasks_by_thread(http, toolcall.fcall_ft_id)
 
+                    updates = {}
                     for task in tasks:
                         task_details = task.ktask_details if isinstance(task.ktask_details, dict) else json.loads(task.ktask_details or "{}")
                         task_details["survey_id"] = survey_id
@@ -571,9 +591,13 @@ class IntegrationSurveyResearch:
                             "last_checked": time.strftime("%Y-%m-%d %H:%M:%S"),
                             "completed_notified": False
                         }
-
-                        await ckit_kanban.bot_kanban_update_details(await self.fclient.use_http_on_behalf(self.pdoc_integration.rcx.persona.persona_id, toolcall.fcall_untrusted_key), task.ktask_id, task_details)
-                        logger.info(f"Updated task {task.ktask_id} with survey tracking info")
+                        updates[task.ktask_id] = task_details
+                    if updates:
+                        for ktask_id, r in (await ckit_kanban.bot_kanban_update_details_many(http, updates)).items():
+                            if r.ok:
+                                logger.info(f"Updated task {ktask_id} with survey tracking info")
+                            else:
+                                logger.error(f"Failed to update task {ktask_id} with survey info: {r.error}")
                 except Exception as e:
                     logger.error(f"Failed to update task with survey info: {e}")
 
@@ -615,130 +639,144 @@ class IntegrationSurveyResearch:
         if not hypothesis_slug:
             return "Error: hypothesis_slug is required (e.g. 'private-practice')"
 
-        all_responses = []
-        page, per_page, total = 1, 100, None
-
-        async with aiohttp.ClientSession() as session:
-            while True:
-                async with session.get(
-                        f"https://api.surveymonkey.com/v3/surveys/{survey_id}/responses/bulk",
-                        headers=self._sm_headers(),
-                        params={
-                            "simple": "true",
-                            "page": page,
-                            "per_page": per_page,
-                        },
-                        timeout=aiohttp.ClientTimeout(total=30),
-                ) as resp:
-                    resp.raise_for_status()
-                    data = await resp.json()
-
-                    if total is None:
-                        total = data.get("total", 0)
-
-                    page_responses = data.get("data", [])
-                    all_responses.extend(page_responses)
-
-                    if len(page_responses) < per_page or len(all_responses) >= total:
-                        break
-
-                    page += 1
+        try:
+            st = await self._sync_responses(survey_id)
+        except aiohttp.ClientError as e:
+            return f"Error fetching responses: API request failed - {e}"
 
-        completion_rate = (len(all_responses) / target_responses * 100) if target_responses > 0 else 0
-        is_completed = target_responses > 0 and len(all_responses) >= target_responses
+        total = st["count"]
+        completion_rate = (total / target_responses * 100) if target_responses > 0 else 0
+        is_completed = target_responses > 0 and total >= target_responses
 
         result = f"📊 Survey Responses (Survey ID: {survey_id})\n"
-        result += f"Total responses: {len(all_responses)} / {target_responses} ({completion_rate:.1f}%)\n"
+        result += f"Total responses: {total} / {target_responses} ({completion_rate:.1f}%)\n"
         result += f"Status: {'COMPLETED ✅' if is_completed else 'IN_PROGRESS ⏳'}\n"
         result += "=" * 50 + "\n\n"
 
-        if not all_responses:
+        if not total:
             result += "No responses found yet.\n"
-
-        responses_data = []
-        for idx, r in enumerate(all_responses, 1):
-            response_entry = {
-                "response_id": r.get('id', 'N/A'),
-                "status": r.get('response_status', 'N/A'),
-                "submitted": r.get('date_modified') or r.get('date_created', 'N/A'),
-                "answers": r
-            }
-
-            result += f"Response #{idx} (ID: {r.get('id', 'N/A')})\n"
-            result += f"Status: {r.get('response_status', 'N/A')}\n"
-            result += f"Submitted: {r.get('date_modified') or r.get('date_created', 'N/A')}\n\n"
-
-            for page_obj in r.get("pages", []):
-                for q in page_obj.get("questions", []):
-                    q_text = None
-                    headings = q.get("headings", [])
-                    if headings and isinstance(headings, list):
-                        if isinstance(headings[0], dict):
-                            q_text = headings[0].get("heading", "")
-
-                    answers = q.get("answers", [])
-                    if not answers:
-                        continue
-
-                    parts = []
-                    for a in answers:
-                        if "text" in a and a["text"]:
-                            parts.append(a["text"])
-                        elif "choice_id" in a:
-                            parts.append(f"choice_id={a['choice_id']}")
-
-                    if q_text and parts:
+        else:
+            result += "Answers by question:\n\n"
+            for agg in st["questions"].values():
+                result += f"Q: {agg['heading']} ({agg['answered']} answered)\n"
+                for label, n in sorted(agg["choices"].items(), key=lambda kv: -kv[1]):
+                    result += f"  {label}: {n} ({n / max(agg['answered'], 1) * 100:.0f}%)\n"
+                if agg["text_answers"]:
+                    result += f"  {agg['text_answers']} text answers, latest:\n"
+                    for t in agg["samples"]:
+                        result += f"  - {t}\n"
+                result += "\n"
+
+            recent = await self.response_store.recent(survey_id, RESPONSES_SHOWN)
+            result += f"Latest {len(recent)} of {total} responses:\n\n"
+            for r in reversed(recent):
+                result += f"Response ID: {r.get('id', 'N/A')}\n"
+                result += f"Status: {r.get('response_status', 'N/A')}\n"
+                result += f"Submitted: {r.get('date_modified') or r.get('date_created', 'N/A')}\n\n"
+                for _qid, q_text, labels, texts in survey_response_store.iter_answers(r):
+                    if q_text and (labels or texts):
                         result += f"Q: {q_text}\n"
-                        result += f"A: {', '.join(parts)}\n\n"
-
-            result += "-" * 30 + "\n\n"
-            responses_data.append(response_entry)
+                        result += f"A: {', '.join(labels + texts)}\n\n"
+                result += "-" * 30 + "\n\n"
 
         if self.pdoc_integration:
             results_path = f"/gtm/discovery/{idea_slug}/{hypothesis_slug}/survey-results"
-            results_content = {
-                "survey_results": {
-                    "meta": {
-                        "survey_id": survey_id,
-                        "total_responses": len(all_responses),
-                        "target_responses": target_responses,
-                        "completion_rate": completion_rate,
-                        "saved_at": time.strftime("%Y-%m-%d %H:%M:%S"),
-                        "idea_slug": idea_slug,
-                        "hypothesis_slug": hypothesis_slug,
-                        "status": "COMPLETED" if is_completed else "IN_PROGRESS"
-                    },
-                    "responses": responses_data,
-                    "summary": {
-                        "total_collected": len(all_responses),
-                        "completion_status": "COMPLETED" if is_completed else "IN_PROGRESS"
+            # The document carries every response, only rewrite it when something changed since the last save
+            written_key = f"{total}/{target_responses}"
+            if st["pdoc_written"].get(results_path) == written_key:
+                result += f"\n📁 Results up to date in: {results_path}\n\n"
+            else:
+                responses_data = [{
+                    "response_id": r.get('id', 'N/A'),
+                    "status": r.get('response_status', 'N/A'),
+                    "submitted": r.get('date_modified') or r.get('date_created', 'N/A'),
+                    "answers": r
+                } for r in await self.response_store.all_responses(survey_id)]
+                results_content = {
+                    "survey_results": {
+                        "meta": {
+                            "survey_id": survey_id,
+                            "total_responses": total,
+                            "target_responses": target_responses,
+                            "completion_rate": completion_rate,
+                            "saved_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                            "idea_slug": idea_slug,
+                            "hypothesis_slug": hypothesis_slug,
+                            "status": "COMPLETED" if is_completed else "IN_PROGRESS"
+                        },
+                        "responses": responses_data,
+                        "summary": {
+                            "total_collected": total,
+                            "completion_status": "COMPLETED" if is_completed else "IN_PROGRESS",
+                            "questions": list(st["questions"].values()),
+                        }
                     }
                 }
-            }
 
-            try:
-                await self.pdoc_integration.pdoc_overwrite(
-                    results_path,
-                    json.dumps(results_content, indent=2),
-                    persona_id=self.pdoc_integration.rcx.persona.persona_id,
-                    fcall_untrusted_key=toolcall.fcall_untrusted_key,
-                )
-                result += f"\n📁 Results saved to: {results_path}\n"
-                result += f"✍️ {results_path}\n\n"
-            except aiohttp.ClientError as e:
-                result += f"\n⚠️ Failed to save results (API error): {e}\n\n"
-            except json.JSONDecodeError as e:
-                result += f"\n⚠️ Failed to save results (JSON error): {e}\n\n"
+                try:
+                    await self.pdoc_integration.pdoc_overwrite(
+                        results_path,
+                        json.dumps(results_content, indent=2),
+                        persona_id=self.pdoc_integration.rcx.persona.persona_id,
+                        fcall_untrusted_key=toolcall.fcall_untrusted_key,
+                    )
+                    st["pdoc_written"][results_path] = written_key
+                    await self.response_store.save(survey_id)
+                    result += f"\n📁 Results saved to: {results_path}\n"
+                    result += f"✍️ {results_path}\n\n"
+                except aiohttp.ClientError as e:
+                    result += f"\n⚠️ Failed to save results (API error): {e}\n\n"
+                except json.JSONDecodeError as e:
+                    result += f"\n⚠️ Failed to save results (JSON error): {e}\n\n"
 
         if is_completed:
             result += "🎉 SURVEY COMPLETED! All target responses collected.\n"
             result += "✅ You should now move the kanban task to DONE state.\n"
         else:
-            result += f"⏳ Survey still in progress. {target_responses - len(all_responses)} more responses needed.\n"
+            result += f"⏳ Survey still in progress. {target_responses - total} more responses needed.\n"
             result += "❌ DO NOT finish the task yet. Check again later for more responses.\n"
 
         return result
 
+    async def _sync_responses(self, survey_id: str) -> Dict[str, Any]:
+        # Only what changed since the stored cursor is downloaded, sorted by date_modified so the cursor can
+        # advance page by page; each page is persisted before the next one is requested.
+        store = self.response_store
+        async with store.lock(survey_id):
+            st = await store.load(survey_id)
+            cursor = st["cursor"]
+            params = {"simple": "true", "per_page": SM_PAGE_SIZE, "sort_by": "date_modified", "sort_order": "ASC"}
+            if cursor:
+                params["start_modified_at"] = cursor[:19]
+            page = 1
+            while True:
+                headers = self._sm_headers()
+                # an ETag only describes the same query, i.e. the same start_modified_at
+                if page == 1 and st["etag"] and st["etag_cursor"] == cursor:
+                    headers["If-None-Match"] = st["etag"]
+                async with self._http().get(
+                        f"{self.sm_api}/surveys/{survey_id}/responses/bulk",
+                        headers=headers,
+                        params={**params, "page": page},
+                ) as resp:
+                    if resp.status == 304:
+                        return st
+                    if resp.status >= 400:
+                        logger.warning(f"API error GET responses of {survey_id}: {resp.status} - {await resp.text()}")
+                        resp.raise_for_status()
+                    data = await resp.json()
+                    etag = resp.headers.get("ETag", "")
+                page_responses = data.get("data", [])
+                changed = await store.ingest(survey_id, page_responses)
+                if page == 1 and (etag, cursor) != (st["etag"], st["etag_cursor"]):
+                    st["etag"], st["etag_cursor"] = etag, cursor
+                    if not changed:
+                        await store.save(survey_id)
+                if len(page_responses) < SM_PAGE_SIZE:
+                    break
+                page += 1
+        return st
+
     def track_survey_task(self, task):
         if not task.ktask_details:
             return
@@ -761,54 +799,56 @@ class IntegrationSurveyResearch:
         if not self.tracked_surveys:
             return
 
-        for survey_id, tracking_info in list(self.tracked_surveys.items()):
+        sem = asyncio.Semaphore(SM_POLL_CONCURRENCY)
+
+        async def poll(survey_id, tracking_info):
+            async with sem:
+                await self._update_survey(fclient, update_task_callback, survey_id, tracking_info)
+
+        await asyncio.gather(*[poll(survey_id, tracking_info) for survey_id, tracking_info in list(self.tracked_surveys.items())])
+
+    async def _update_survey(self, fclient, update_task_callback, survey_id: str, tracking_info: Dict[str, Any]):
+        try:
             try:
-                try:
-                    response_data = await self._make_request(
-                        "GET",
-                        f"https://api.surveymonkey.com/v3/surveys/{survey_id}/responses/bulk",
-                        self._sm_headers(),
-                        params={"per_page": 1}
-                    )
-                except Exception as e:
-                    logger.warn(f"Could not fetch survey {survey_id} status: {e}")
-                    continue
-
-                if not response_data:
-                    continue
-
-                response_count = response_data.get("total", 0)
-                target_responses = tracking_info["target_responses"]
-                is_completed = target_responses > 0 and response_count >= target_responses
-
-                await update_task_callback(
-                    task_id=tracking_info["task_id"],
-                    survey_id=survey_id,
-                    response_count=response_count,
-                    is_completed=is_completed,
-                    survey_status="active"
-                )
+                st = await self._sync_responses(survey_id)
+            except Exception as e:
+                logger.warning(f"Could not fetch survey {survey_id} status: {e}")
+                return
 
-                if is_completed and not tracking_info["completed_notified"] and tracking_info["thread_id"]:
-                    message = f"📊 Survey completed!\nSurvey ID: {survey_id}\nTotal responses: {response_count}\nTarget responses: {target_responses}"
+            response_count = st["count"]
+            target_responses = tracking_info["target_responses"]
+            is_completed = target_responses > 0 and response_count >= target_responses
+            if response_count == tracking_info["last_response_count"] and (not is_completed or tracking_info["completed_notified"]):
+                return
 
-                    from flexus_client_kit import ckit_ask_model
-                    http = await fclient.use_http_on_behalf(self.pdoc_integration.rcx.persona.persona_id, "")
-                    await ckit_ask_model.thread_add_user_messages(
-                        http, tracking_info["thread_id"],
-                        [ckit_ask_model.FThreadMessageInput(content=message, ftm_author_label1="system", ftm_author_label2="", ftm_provenance={"system_type": "survey_research_integration"})],
-                        "survey_research_integration",
-                    )
+            await update_task_callback(
+                task_id=tracking_info["task_id"],
+                survey_id=survey_id,
+                response_count=response_count,
+                is_completed=is_completed,
+                survey_status="active"
+            )
+
+            if is_completed and not tracking_info["completed_notified"] and tracking_info["thread_id"]:
+                message = f"📊 Survey completed!\nSurvey ID: {survey_id}\nTotal responses: {response_count}\nTarget responses: {target_responses}"
 
-                    tracking_info["completed_notified"] = True
-                    logger.info(f"Posted completion message for survey {survey_id}")
+                from flexus_client_kit import ckit_ask_model
+                http = await fclient.use_http_on_behalf(self.pdoc_integration.rcx.persona.persona_id, "")
+                await ckit_ask_model.thread_add_user_messages(
+                    http, tracking_info["thread_id"],
+                    [ckit_ask_model.FThreadMessageInput(content=message, ftm_author_label1="system", ftm_author_label2="", ftm_provenance={"system_type": "survey_research_integration"})],
+                    "survey_research_integration",
+                )
 
-                tracking_info["last_response_count"] = response_count
+                tracking_info["completed_notified"] = True
+                logger.info(f"Posted completion message for survey {survey_id}")
 
-            except aiohttp.ClientError as e:
-                logger.error(f"Error updating survey {survey_id}: API request failed", exc_info=e)
-            except KeyError as e:
-                logger.error(f"Error updating survey {survey_id}: missing key {e}")
+            tracking_info["last_response_count"] = response_count
+
+        except aiohttp.ClientError as e:
+            logger.error(f"Error updating survey {survey_id}: API request failed", exc_info=e)
+        except KeyError as e:
+            logger.error(f"Error updating survey {survey_id}: missing key {e}")
 
     async def update_task_survey_status(self, task_id: str, survey_id: str, response_count: int, is_completed: bool, survey_status: str):
         from flexus_client_kit import ckit_kanban
@@ -835,7 +875,11 @@ class IntegrationSurveyResearch:
                 }
             }
 
-            await ckit_kanban.bot_kanban_update_details(await self.fclient.use_http_on_behalf(self.pdoc_integration.rcx.persona.persona_id, ""), task_id, details)
+            # the poller walks every tracked survey, the batcher sends the status updates of one pass together
+            r = await ckit_kanban.get_batcher(self.fclient, self.pdoc_integration.rcx.persona.persona_id).update_details(task_id, details)
+            if not r.ok:
+                logger.error(f"Failed to update task {task_id} survey status: {r.error}")
+                return
             logger.info(f"Updated task {task_id} survey status: {response_count}/{target_responses} responses, completed={is_completed}")
 
         except aiohttp.ClientError as e:
@@ -880,7 +924,7 @@ class IntegrationSurveyResearch:
 
         survey = await self._make_request(
             "POST",
-            "https://api.surveymonkey.com/v3/surveys",
+            f"{self.sm_api}/surveys",
             self._sm_headers(),
             survey_payload
         )
@@ -897,7 +941,7 @@ class IntegrationSurveyResearch:
 
         collector = await self._make_request(
             "POST",
-            f"https://api.surveymonkey.com/v3/surveys/{survey_id}/collectors",
+            f"{self.sm_api}/surveys/{survey_id}/collectors",
             self._sm_headers(),
             collector_payload
         )
@@ -1,5 +1,9 @@
+import hashlib
+import json
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+
+from aiohttp import web
 
 logger = logging.getLogger("survey_research_mock")
 
@@ -10,9 +14,13 @@ mock_survey_counter = 10000
 mock_study_counter = 1000
 
 
+class MockClientError(Exception):
+    pass
+
+
 class MockSurveyResearchSession:
-    def __init__(self):
-        pass
+    def __init__(self, **kwargs):
+        self.closed = False
 
     async def __aenter__(self):
         return self
@@ -20,6 +28,9 @@ class MockSurveyResearchSession:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         pass
 
+    async def close(self):
+        self.closed = True
+
     def post(self, url, **kwargs):
         return MockSurveyResearchResponse("post", url, **kwargs)
 
@@ -39,6 +50,7 @@ class MockSurveyResearchResponse:
         self.url = url
         self.kwargs = kwargs
         self.status = 200
+        self.headers = {}
         self._json_data = None
 
         if "surveymonkey.com" in url:
@@ -54,11 +66,14 @@ class MockSurveyResearchResponse:
 
     def raise_for_status(self):
         if self.status >= 400:
-            raise Exception(f"HTTP {self.status}")
+            raise MockClientError(f"HTTP {self.status}")
 
     async def json(self):
         return self._json_data
 
+    async def text(self):
+        return json.dumps(self._json_data)
+
     def _handle_surveymonkey_request(self):
         if self.method == "post" and "/surveys" in self.url and "/collectors" not in self.url:
             self._handle_create_survey()
@@ -66,6 +81,9 @@ class MockSurveyResearchResponse:
             self._handle_create_collector()
         elif self.method == "patch" and "/collectors" in self.url:
             self._handle_update_collector()
+        elif self.method == "get" and self.url.endswith("/responses/bulk"):
+            survey_id = self.url.split("/surveys/")[1].split("/")[0]
+            self._json_data = bulk_responses_page(mock_responses.get(survey_id, []), self.kwargs.get("params") or {})
 
     def _handle_prolific_request(self):
         if self.method == "post" and "/studies" in self.url:
@@ -133,15 +151,8 @@ class MockSurveyResearchResponse:
 
 
 class MockAiohttp:
-    class ClientSession:
-        def __init__(self):
-            pass
-
-        async def __aenter__(self):
-            return MockSurveyResearchSession()
-
-        async def __aexit__(self, exc_type, exc_val, exc_tb):
-            pass
+    ClientSession = MockSurveyResearchSession
+    ClientError = MockClientError
 
     class ClientTimeout:
         def __init__(self, total=30):
@@ -167,3 +178,77 @@ def clear_mock_data():
     mock_survey_counter = 10000
     mock_study_counter = 1000
     logger.info("Cleared all mock data")
+
+
+def bulk_responses_page(responses: List[Dict[str, Any]], params: Dict[str, Any]) -> Dict[str, Any]:
+    # GET /v3/surveys/{id}/responses/bulk: start_modified_at (inclusive), sort_by=date_modified, page, per_page
+    rows = list(responses)
+    if since := params.get("start_modified_at"):
+        rows = [r for r in rows if r.get("date_modified", "")[:19] >= since]
+    if params.get("sort_by") == "date_modified":
+        rows.sort(key=lambda r: r.get("date_modified", ""), reverse=params.get("sort_order") == "DESC")
+    page, per_page = int(params.get("page", 1)), int(params.get("per_page", 50))
+    data = rows[(page - 1) * per_page:page * per_page]
+    out = {"data": data, "per_page": per_page, "page": page, "total": len(rows), "links": {}}
+    if page * per_page < len(rows):
+        out["links"]["next"] = f"page={page + 1}"
+    return out
+
+
+class MockSurveyMonkeyServer:
+    # A real local HTTP server for the responses endpoint, pass .api as surveymonkey_api to IntegrationSurveyResearch.
+    # Honours start_modified_at/sort_by/page/per_page and answers If-None-Match with 304, records every request.
+
+    def __init__(self):
+        self.responses: Dict[str, List[Dict[str, Any]]] = {}
+        self.requests: List[Dict[str, Any]] = []
+        self.api = ""
+        self._runner: Optional[web.AppRunner] = None
+
+    def add_responses(self, survey_id: str, responses: List[Dict[str, Any]]):
+        self.responses.setdefault(survey_id, []).extend(responses)
+
+    async def _bulk(self, request: web.Request) -> web.Response:
+        survey_id = request.match_info["survey_id"]
+        params = dict(request.query)
+        out = bulk_responses_page(self.responses.get(survey_id, []), params)
+        etag = '"%s"' % hashlib.md5(json.dumps(out, sort_keys=True).encode()).hexdigest()
+        not_modified = request.headers.get("If-None-Match") == etag
+        self.requests.append({"survey_id": survey_id, "params": params, "status": 304 if not_modified else 200})
+        if not_modified:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response(out, headers={"ETag": etag})
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/v3/surveys/{survey_id}/responses/bulk", self._bulk)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.api = f"http://127.0.0.1:{port}/v3"
+        return self.api
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def make_mock_response(response_id: str, date_modified: str, answers: Dict[str, Any]) -> Dict[str, Any]:
+    # answers: {"question heading": "free text" or ["choice label", ...]}, in SurveyMonkey simple=true shape
+    questions = []
+    for n, (heading, a) in enumerate(answers.items()):
+        if isinstance(a, list):
+            sm_answers = [{"choice_id": f"c{n}_{label}", "simple_text": label} for label in a]
+        else:
+            sm_answers = [{"text": a, "simple_text": a}]
+        questions.append({"id": f"q{n}", "headings": [{"heading": heading}], "answers": sm_answers})
+    return {
+        "id": response_id,
+        "response_status": "completed",
+        "date_created": date_modified,
+        "date_modified": date_modified,
+        "pages": [{"id": "p1", "questions": questions}],
+    }
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pymongo.collection import Collection
+
+from flexus_client_kit import ckit_mongo
+
+logger = logging.getLogger("survey_store")
+
+
+# Incremental store for SurveyMonkey responses. Each response is fetched once, appended to a chunk file in the
+# persona's mongo, and folded into per-question aggregates kept in the survey state document:
+#
+#   survey-responses/{survey_id}/state.json        cursor (last date_modified), index of seen ids, aggregates
+#   survey-responses/{survey_id}/chunk-0000.json   up to CHUNK_SIZE raw responses, in arrival order
+#
+# A response that comes back with a newer date_modified (respondent edited it) is subtracted from the aggregates
+# using the stored copy and replaced in its chunk. Without mongo (tests, local runs) chunks stay in memory.
+
+
+CHUNK_SIZE = 100                 # simple=true responses are a few KB each, stays well under ckit_mongo.MAX_FILE_SIZE
+SAMPLES_PER_QUESTION = 5         # most recent open-ended answers kept per question
+STORE_TTL = 90 * 86400
+
+
+def _new_state(survey_id: str) -> Dict[str, Any]:
+    return {
+        "survey_id": survey_id,
+        "cursor": "",            # max date_modified seen, goes into start_modified_at
+        "count": 0,
+        "chunks": 0,
+        "index": {},             # response_id -> [chunk_no, date_modified]
+        "questions": {},         # question_id -> aggregate, see _apply()
+        "etag": "",              # of the first page, for If-None-Match
+        "etag_cursor": "",       # the cursor that page was requested with
+        "pdoc_written": {},       # survey-results path -> "count/target" last written there
+    }
+
+
+def iter_answers(response: Dict[str, Any]) -> Iterator[Tuple[str, str, List[str], List[str]]]:
+    # (question_id, heading, choice labels, free text) for every answered question
+    for page_obj in response.get("pages", []):
+        for q in page_obj.get("questions", []):
+            answers = q.get("answers", [])
+            if not answers:
+                continue
+            heading = ""
+            headings = q.get("headings", [])
+            if headings and isinstance(headings, list) and isinstance(headings[0], dict):
+                heading = headings[0].get("heading", "")
+            labels, texts = [], []
+            for a in answers:
+                if a.get("choice_id"):
+                    labels.append(a.get("simple_text") or f"choice_id={a['choice_id']}")
+                elif a.get("text"):
+                    texts.append(a["text"])
+            yield str(q.get("id") or heading), heading, labels, texts
+
+
+def _apply(questions: Dict[str, Any], response: Dict[str, Any], sign: int) -> None:
+    for qid, heading, labels, texts in iter_answers(response):
+        agg = questions.setdefault(qid, {"heading": heading, "answered": 0, "choices": {}, "text_answers": 0, "samples": []})
+        if heading:
+            agg["heading"] = heading
+        agg["answered"] += sign
+        for label in labels:
+            n = agg["choices"].get(label, 0) + sign
+            if n > 0:
+                agg["choices"][label] = n
+            else:
+                agg["choices"].pop(label, None)
+        agg["text_answers"] += sign * len(texts)
+        for t in texts:
+            if sign > 0:
+                agg["samples"] = (agg["samples"] + [t])[-SAMPLES_PER_QUESTION:]
+            elif t in agg["samples"]:
+                agg["samples"].remove(t)
+
+
+class SurveyResponseStore:
+    def __init__(self, mongo_collection: Optional[Collection] = None):
+        self.mongo = mongo_collection
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._chunks: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def lock(self, survey_id: str) -> asyncio.Lock:
+        # the poller and a tool call must not ingest the same page twice
+        if survey_id not in self._locks:
+            self._locks[survey_id] = asyncio.Lock()
+        return self._locks[survey_id]
+
+    def _path(self, survey_id: str, name: str) -> str:
+        return f"survey-responses/{survey_id}/{name}.json"
+
+    async def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        if self.mongo is None:
+            return None
+        doc = await ckit_mongo.mongo_retrieve_file(self.mongo, path)
+        return doc.get("json") if doc else None
+
+    async def _write(self, path: str, content: Dict[str, Any]) -> None:
+        if self.mongo is None:
+            return
+        await ckit_mongo.mongo_overwrite(self.mongo, path, json.dumps(content).encode("utf-8"), ttl=STORE_TTL)
+
+    async def load(self, survey_id: str) -> Dict[str, Any]:
+        st = self._states.get(survey_id)
+        if st is None:
+            st = await self._read(self._path(survey_id, "state")) or _new_state(survey_id)
+            self._states[survey_id] = st
+        return st
+
+    async def save(self, survey_id: str) -> None:
+        await self._write(self._path(survey_id, "state"), self._states[survey_id])
+
+    async def _chunk(self, survey_id: str, n: int) -> List[Dict[str, Any]]:
+        key = (survey_id, n)
+        if key not in self._chunks:
+            doc = await self._read(self._path(survey_id, "chunk-%04d" % n))
+            self._chunks[key] = doc["responses"] if doc else []
+        return self._chunks[key]
+
+    async def _peek_chunk(self, survey_id: str, n: int) -> List[Dict[str, Any]]:
+        # read-only access, doesn't pull old chunks into memory
+        if (survey_id, n) in self._chunks:
+            return self._chunks[(survey_id, n)]
+        doc = await self._read(self._path(survey_id, "chunk-%04d" % n))
+        return doc["responses"] if doc else []
+
+    async def ingest(self, survey_id: str, responses: List[Dict[str, Any]]) -> int:
+        # Caller holds lock(survey_id). Returns how many responses were new or changed.
+        st = await self.load(survey_id)
+        dirty = set()
+        changed = 0
+        for r in responses:
+            rid = str(r.get("id", ""))
+            modified = r.get("date_modified") or r.get("date_created") or ""
+            if not rid:
+                continue
+            seen = st["index"].get(rid)
+            if seen is not None and seen[1] >= modified:
+                continue   # start_modified_at is inclusive, the boundary response comes back every time
+            if seen is not None:
+                chunk = await self._chunk(survey_id, seen[0])
+                for i, old in enumerate(chunk):
+                    if str(old.get("id")) == rid:
+                        _apply(st["questions"], old, -1)
+                        chunk[i] = r
+                        break
+                st["index"][rid] = [seen[0], modified]
+                dirty.add(seen[0])
+            else:
+                n = max(st["chunks"] - 1, 0)
+                chunk = await self._chunk(survey_id, n)
+                if len(chunk) >= CHUNK_SIZE:
+                    n += 1
+                    chunk = await self._chunk(survey_id, n)
+                st["chunks"] = n + 1
+                chunk.append(r)
+                st["index"][rid] = [n, modified]
+                st["count"] += 1
+                dirty.add(n)
+            _apply(st["questions"], r, +1)
+            st["cursor"] = max(st["cursor"], modified)
+            changed += 1
+        if changed:
+            for n in sorted(dirty):
+                await self._write(self._path(survey_id, "chunk-%04d" % n), {"responses": self._chunks[(survey_id, n)]})
+            await self.save(survey_id)
+            # with mongo the chunks are the source of truth, keep only the tail one around
+            if self.mongo is not None:
+                for key in [k for k in self._chunks if k[0] == survey_id and k[1] != st["chunks"] - 1]:
+                    del self._chunks[key]
+        return changed
+
+    async def recent(self, survey_id: str, limit: int) -> List[Dict[str, Any]]:
+        st = await self.load(survey_id)
+        out: List[Dict[str, Any]] = []
+        for n in range(st["chunks"] - 1, -1, -1):
+            out = (await self._peek_chunk(survey_id, n)) + out
+            if len(out) >= limit:
+                break
+        return out[-limit:] if limit else []
+
+    async def all_responses(self, survey_id: str) -> List[Dict[str, Any]]:
+        st = await self.load(survey_id)
+        out: List[Dict[str, Any]] = []
+        for n in range(st["chunks"]):
+            out.extend(await self._peek_chunk(survey_id, n))
+        return out
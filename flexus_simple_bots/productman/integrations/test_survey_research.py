@@ -1,4 +1,5 @@
 import pytest
+import pytest_asyncio
 import json
 import time
 from dataclasses import dataclass
@@ -55,11 +56,13 @@ def make_toolcall(ft_id: str = "test_ft_123", confirmed: bool = False) -> ckit_c
         fcall_id="fcall_123",
         fcall_ft_id=ft_id,
         fcall_ft_btest_name="",
+        fcall_fexp_name="",
         fcall_ftm_alt=0,
         fcall_called_ftm_num=1,
         fcall_call_n=0,
         fcall_name="survey",
         fcall_arguments="{}",
+        fcall_result_ftm_num=0,
         fcall_created_ts=time.time(),
         fcall_untrusted_key="key123",
         connected_persona_id="persona_123",
@@ -780,5 +783,104 @@ class TestFilterValidation:
         assert "✅" in result
 
 
+@pytest_asyncio.fixture
+async def sm_server():
+    server = survey_research_mock.MockSurveyMonkeyServer()
+    await server.start()
+    yield server
+    await server.stop()
+
+
+@pytest_asyncio.fixture
+async def live_integration(sm_server, mock_pdoc, mock_fclient, monkeypatch):
+    import aiohttp
+    monkeypatch.setattr(survey_research, "aiohttp", aiohttp)   # an earlier fixture may have swapped in MockAiohttp
+    mock_pdoc.rcx = MagicMock()
+    integr = survey_research.IntegrationSurveyResearch(
+        surveymonkey_token="sm-test",
+        prolific_token="pr-test",
+        pdoc_integration=mock_pdoc,
+        fclient=mock_fclient,
+        surveymonkey_api=sm_server.api,
+    )
+    yield integr
+    await integr.close()
+
+
+def make_responses(start: int, n: int, day: str = "2025-01-10") -> List[Dict[str, Any]]:
+    return [
+        survey_research_mock.make_mock_response(
+            f"r{i}",
+            f"{day}T10:{i // 60:02d}:{i % 60:02d}+00:00",
+            {"Your role?": ["Dentist" if i % 3 else "Assistant"], "Biggest pain?": f"pain {i}"},
+        )
+        for i in range(start, start + n)
+    ]
+
+
+RESPONSES_ARGS = {"survey_id": "777", "target_responses": 200, "idea_slug": "i", "hypothesis_slug": "h"}
+
+
+class TestIncrementalResponses:
+    @pytest.mark.asyncio
+    async def test_only_new_responses_are_fetched(self, live_integration, sm_server, mock_pdoc, toolcall):
+        sm_server.add_responses("777", make_responses(0, 150))
+        result = await live_integration.handle_survey_research(toolcall, {"op": "responses", "args": RESPONSES_ARGS})
+        assert "Total responses: 150 / 200" in result
+        assert "Dentist: 100 (67%)" in result and "Assistant: 50 (33%)" in result
+        assert len(mock_pdoc.storage["/gtm/discovery/i/h/survey-results"]["survey_results"]["responses"]) == 150
+        assert [r["params"]["page"] for r in sm_server.requests] == ["1", "2"]
+
+        # nothing changed: one request that only returns the boundary response, then 304s, no pdoc rewrite
+        sm_server.requests.clear()
+        mock_pdoc.storage.clear()
+        for _ in range(3):
+            result = await live_integration.handle_survey_research(toolcall, {"op": "responses", "args": RESPONSES_ARGS})
+            assert "Total responses: 150 / 200" in result
+        assert [r["status"] for r in sm_server.requests] == [200, 304, 304]
+        assert not mock_pdoc.storage
+
+        # 60 new responses and one edited: only those travel, aggregates follow the edit
+        edited = make_responses(0, 1, day="2025-01-11")[0]
+        edited["pages"][0]["questions"][0]["answers"] = [{"choice_id": "c0_Dentist", "simple_text": "Dentist"}]
+        sm_server.responses["777"][0] = edited
+        sm_server.add_responses("777", make_responses(150, 60, day="2025-01-11"))
+        sm_server.requests.clear()
+        result = await live_integration.handle_survey_research(toolcall, {"op": "responses", "args": RESPONSES_ARGS})
+        assert "Total responses: 210 / 200" in result and "SURVEY COMPLETED" in result
+        assert sm_server.requests[0]["params"]["start_modified_at"] == "2025-01-10T10:02:29"
+        assert sum(len(survey_research_mock.bulk_responses_page(sm_server.responses["777"], r["params"])["data"]) for r in sm_server.requests) == 62
+        st = await live_integration.response_store.load("777")
+        role = next(q for q in st["questions"].values() if q["heading"] == "Your role?")
+        assert role["answered"] == 210 and sum(role["choices"].values()) == 210 and role["choices"]["Assistant"] == 69
+
+    @pytest.mark.asyncio
+    async def test_status_polling_is_concurrent_and_skips_unchanged(self, live_integration, sm_server):
+        for n in range(6):
+            sm_server.add_responses(f"s{n}", make_responses(0, n + 1))
+            live_integration.tracked_surveys[f"s{n}"] = {
+                "task_id": f"t{n}", "thread_id": "", "target_responses": 100,
+                "last_response_count": 0, "completed_notified": False,
+            }
+        updates = []
+
+        async def on_update(**kw):
+            updates.append(kw)
+
+        await live_integration.update_active_surveys(None, on_update)
+        assert sorted((u["survey_id"], u["response_count"]) for u in updates) == [(f"s{n}", n + 1) for n in range(6)]
+
+        # the cursor moved, so the next poll re-reads the boundary response once, then the ETag sticks
+        updates.clear()
+        await live_integration.update_active_surveys(None, on_update)
+        assert not updates
+
+        sm_server.requests.clear()
+        sm_server.add_responses("s2", make_responses(10, 2, day="2025-01-12"))
+        await live_integration.update_active_surveys(None, on_update)
+        assert [(u["survey_id"], u["response_count"]) for u in updates] == [("s2", 5)]
+        assert sorted(r["status"] for r in sm_server.requests) == [200] + [304] * 5
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
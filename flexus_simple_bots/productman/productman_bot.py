@@ -194,14 +194,15 @@ TOOLS_ALL = [
 
 async def productman_main_loop(fclient: ckit_client.FlexusClient, rcx: ckit_bot_exec.RobotContext) -> None:
     setup = ckit_bot_exec.official_setup_mixing_procedure(PRODUCTMAN_SETUP_SCHEMA, rcx.persona.persona_setup)
-    integr_objects = await ckit_integrations_db.main_loop_integrations_init(PRODUCTMAN_INTEGRATIONS, rcx, setup)
+    integr_objects = await ckit_integrations_db.main_loop_integrations_init(PRODUCTMAN_INTEGRATIONS, rcx, setup, need_mongo=True)
     pdoc_integration: fi_pdoc.IntegrationPdoc = integr_objects["flexus_policy_document"]
 
     survey_research_integration = survey_research.IntegrationSurveyResearch(
         surveymonkey_token=os.getenv("SURVEYMONKEY_ACCESS_TOKEN", ""),
         prolific_token=os.getenv("PROLIFIC_API_TOKEN", ""),
         pdoc_integration=pdoc_integration,
-        fclient=fclient
+        fclient=fclient,
+        personal_mongo=rcx.personal_mongo,
     )
 
     @rcx.on_updated_task
@@ -345,6 +346,7 @@ async def productman_main_loop(fclient: ckit_client.FlexusClient, rcx: ckit_bot_
                 last_survey_update = current_time
 
     finally:
+        await survey_research_integration.close()
         logger.info("%s exit" % (rcx.persona.persona_id,))
 
 
@@ -468,14 +468,15 @@ async def telegram_groupmod_main_loop(
             "message_count": len(buf),
             "instruction": "Call telegram_mod_buffer(chat_id=%s) to retrieve messages, then review for violations." % chat_id,
         }
-        await ckit_kanban.bot_kanban_post_into_inbox(
-            await fclient.use_http_on_behalf(rcx.persona.persona_id, ""),
-            rcx.persona.persona_id,
+        r = await ckit_kanban.get_batcher(fclient, rcx.persona.persona_id).post(ckit_kanban.FKanbanPost(
             title=title,
             details_json=json.dumps(details, ensure_ascii=False),
             provenance_message="telegram_buffer_review",
             fexp_name="review_messages",
-        )
+        ))
+        if not r.ok:
+            logger.warning("buffer task for chat %s not posted: %s", chat_id, r.error)
+            return
         logger.info("posted buffer task (%s): %d messages for chat %s", reason, len(buf), chat_id)
 
     async def maybe_post_time_task(chat_id: str):
@@ -569,8 +570,8 @@ async def telegram_groupmod_main_loop(
     last_sync = time.time()
     try:
         while not ckit_shutdown.shutdown_event.is_set():
-            for chat_id in list(buffers.keys()):
-                await maybe_post_time_task(chat_id)
+            # time-step reviews for all chats come due together, posted concurrently the batcher sends them in one request
+            await asyncio.gather(*[maybe_post_time_task(chat_id) for chat_id in list(buffers.keys())])
             await rcx.unpark_collected_events(sleep_if_no_work=10.0)
             now = time.time()
             if now - last_sync >= 10.0:
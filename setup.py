@@ -57,6 +57,7 @@ setup(
         "atlassian-python-api",
         "html2text",
         "pandas",
+        "asyncpg",
         "playwright",
         "openai",
         "xai-sdk",